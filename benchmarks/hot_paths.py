@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for ServiceBook Pros hot paths
+Times the pure-Python pricing, flat rate parsing, templating, scoring and
+PDF code of all three apps on fixed fixture data (the fr*.txt price books)
+
+    python benchmarks/hot_paths.py --save          # record benchmarks/hot_paths_baseline.json
+    python benchmarks/hot_paths.py                 # compare with it
+    python benchmarks/hot_paths.py -k parse        # only benchmarks whose name contains 'parse'
+"""
+
+import argparse
+import ast
+import gc
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import timeit
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hot_paths_baseline.json')
+
+APPS = {
+    'api': os.path.join(REPO_ROOT, 'servicebook-pros-api'),
+    'backend': os.path.join(REPO_ROOT, 'servicebook-pros-backend'),
+    'multitenant': os.path.join(REPO_ROOT, 'servicebook-pros-multitenant'),
+}
+
+def _fixture_number(path):
+    return int(re.search(r'fr(\d+)\.txt$', path).group(1))
+
+# A fixed, mixed-size sample of the price books keeps runs comparable
+FIXTURE_FILES = sorted(
+    (os.path.join(REPO_ROOT, name) for name in os.listdir(REPO_ROOT) if re.fullmatch(r'fr\d+\.txt', name)),
+    key=_fixture_number
+)[:8]
+
+class Skip(Exception):
+    """A benchmark cannot run here (e.g. an optional dependency is missing)"""
+
+_benchmarks = []
+
+def benchmark(name, app=None):
+    """Register a benchmark.
+
+    The decorated function does the setup and returns the zero-argument
+    callable that is timed. `app` names the application whose ``src``
+    package must be importable during setup and timing.
+    """
+    def decorator(setup):
+        _benchmarks.append((name, app, setup))
+        return setup
+    return decorator
+
+@contextmanager
+def app_source(app):
+    """Make one app's ``src`` package importable; the apps share that name"""
+    if app is None:
+        yield
+        return
+    _drop_src_modules()
+    sys.path.insert(0, APPS[app])
+    try:
+        yield
+    finally:
+        sys.path.remove(APPS[app])
+        _drop_src_modules()
+
+def _drop_src_modules():
+    for module in [name for name in sys.modules if name == 'src' or name.startswith('src.')]:
+        del sys.modules[module]
+
+def load_script_functions(path, *names):
+    """Load functions from a script without running its top level.
+
+    The import scripts connect to the app database when imported, so only
+    their stdlib imports and the requested functions are executed.
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    body = []
+    for node in tree.body:
+        if isinstance(node, ast.Import) or (isinstance(node, ast.ImportFrom) and not (node.module or '').startswith('src')):
+            body.append(node)
+        elif isinstance(node, ast.FunctionDef) and node.name in names:
+            body.append(node)
+    namespace = {'__name__': os.path.splitext(os.path.basename(path))[0], '__file__': path}
+    exec(compile(ast.Module(body=body, type_ignores=[]), path, 'exec'), namespace)
+    missing = [name for name in names if name not in namespace]
+    if missing:
+        raise Skip(f"{', '.join(missing)} not found in {os.path.relpath(path, REPO_ROOT)}")
+    return [namespace[name] for name in names]
+
+# ---------------------------------------------------------------------------
+# Pricing
+# ---------------------------------------------------------------------------
+
+@benchmark('pricing.flat_rate_labor_rate', app='api')
+def bench_flat_rate_labor_rate():
+    from src.models.pricing import FlatRatePricingItem, ServiceCategory
+
+    items = [
+        FlatRatePricingItem(item_code=f'FR-{n}', title='Water heater swap', description='x',
+                            category=ServiceCategory.PLUMBING, good_price=450.0 + n, better_price=560.0 + n,
+                            best_price=690.0 + n, labor_hours=1.5 + n % 4, base_labor_rate=75.0)
+        for n in range(100)
+    ]
+
+    def run():
+        for item in items:
+            item.calculate_prices_with_labor_rate(92.5)
+    return run
+
+@benchmark('pricing.company_effective_price', app='multitenant')
+def bench_company_effective_price():
+    from sqlalchemy.orm import configure_mappers
+    import src.models.company  # noqa: F401  (relationship targets)
+    import src.models.materials  # noqa: F401
+    from src.models.pricing import CompanyService, MasterService
+
+    configure_mappers()
+    masters = [MasterService(service_code=f'EL-01-{n:03d}', category_code='EL-01', service_name='Outlet',
+                             base_labor_hours=1.0 + n % 3, base_material_cost=20 + n, base_price=150)
+               for n in range(100)]
+    services = []
+    for n, master in enumerate(masters):
+        service = CompanyService(company_id=1, service_code=master.service_code,
+                                 custom_price=None if n % 3 else 199 + n,
+                                 price_adjustment_percent=5 if n % 2 else 0,
+                                 price_adjustment_amount=10 if n % 5 == 0 else 0)
+        service.master_service = master
+        services.append(service)
+
+    def run():
+        for service in services:
+            service.get_effective_price(125.0)
+    return run
+
+# ---------------------------------------------------------------------------
+# Flat rate price book parsing
+# ---------------------------------------------------------------------------
+
+def _parse_all(parse):
+    def run():
+        for path in FIXTURE_FILES:
+            parse(path)
+    return run
+
+@benchmark('parse.flat_rate_import_script')
+def bench_parse_import_script():
+    parse, = load_script_functions(os.path.join(REPO_ROOT, 'process_flat_rate_files.py'), 'parse_flat_rate_file')
+    return _parse_all(parse)
+
+@benchmark('parse.flat_rate_populate_database')
+def bench_parse_populate_database():
+    parse, = load_script_functions(os.path.join(APPS['backend'], 'populate_database.py'), 'parse_flat_rate_file')
+    return _parse_all(parse)
+
+@benchmark('parse.flat_rate_debug_parser')
+def bench_parse_debug_parser():
+    parse, = load_script_functions(os.path.join(APPS['backend'], 'debug_parser.py'), 'parse_flat_rate_file')
+    run_all = _parse_all(parse)
+    devnull = open(os.devnull, 'w')
+
+    # This variant traces every line it reads; keep that off the terminal
+    def run():
+        with redirect_stdout(devnull):
+            run_all()
+    return run
+
+@benchmark('parse.categorize_service')
+def bench_categorize_service():
+    parse, categorize = load_script_functions(os.path.join(APPS['backend'], 'populate_database.py'),
+                                              'parse_flat_rate_file', 'categorize_service')
+    services = [service for path in FIXTURE_FILES for service in parse(path)]
+
+    def run():
+        for service in services:
+            categorize(service['name'], service['description'])
+    return run
+
+# ---------------------------------------------------------------------------
+# Messaging
+# ---------------------------------------------------------------------------
+
+TEMPLATE = (
+    "Hi {{customer_first_name}}, this is {{company_name}}. {{technician_name}} is scheduled for "
+    "{{job_title}} at {{job_address}} on {{job_date}} at {{job_time}}. Your estimate is "
+    "{{estimate_amount}}. Questions? Call {{company_phone}}. Reply STOP to opt out."
+)
+TEMPLATE_DATA = {
+    'customer_name': 'Sarah Johnson', 'customer_first_name': 'Sarah', 'customer_last_name': 'Johnson',
+    'technician_name': 'Mike Rodriguez', 'job_title': 'Panel upgrade', 'job_date': 'March 14, 2025',
+    'job_time': '9:00 AM', 'company_name': 'ServiceBook Pros Demo', 'company_phone': '(555) 123-4567',
+    'estimate_amount': '$1,850.00', 'invoice_amount': '$1,850.00', 'job_address': '123 Main St, Miami FL',
+    'completion_time': '2:30 PM',
+}
+
+@benchmark('messaging.replace_template_variables', app='api')
+def bench_replace_template_variables():
+    from src.utils.communication_service import CommunicationService
+
+    service = CommunicationService()
+
+    def run():
+        for _ in range(100):
+            service._replace_template_variables(TEMPLATE, TEMPLATE_DATA)
+    return run
+
+@benchmark('messaging.render_template_batch', app='api')
+def bench_render_template_batch():
+    from src.utils.templating import compile_template
+
+    template = compile_template(TEMPLATE.replace('{{estimate_amount}}', '{{estimate_total|currency}}'))
+    rows = [dict(TEMPLATE_DATA, customer_first_name=f'Customer {n}', estimate_total=150 + n * 7.5)
+            for n in range(500)]
+
+    def run():
+        template.render_many(rows)
+    return run
+
+# ---------------------------------------------------------------------------
+# AI scoring
+# ---------------------------------------------------------------------------
+
+@benchmark('ai.job_priority_score', app='api')
+def bench_job_priority_score():
+    from src.models.ai_features import AIFeatureUtils
+
+    cases = [({'urgency': urgency, 'estimated_value': value, 'location_efficiency': efficiency},
+              {'tier': tier, 'satisfaction_score': satisfaction})
+             for urgency in ('emergency', 'urgent', 'normal', 'low')
+             for value in (150, 450, 1200)
+             for efficiency in (0.5, 0.9)
+             for tier, satisfaction in (('premium', 5), ('standard', 2), ('basic', 4))]
+
+    def run():
+        for job, customer in cases:
+            AIFeatureUtils.calculate_job_priority_score(job, customer, {})
+    return run
+
+@benchmark('ai.equipment_failure', app='api')
+def bench_equipment_failure():
+    from src.models.ai_features import AIFeatureUtils
+
+    cases = [({'age_years': age, 'days_since_maintenance': days, 'recommended_maintenance_interval': 365},
+              {'issues': [{}] * issues}, {'intensity': intensity})
+             for age in (2, 7, 12, 18) for days in (100, 400, 600, 900)
+             for issues in (0, 3, 6) for intensity in ('normal', 'moderate', 'heavy')]
+
+    def run():
+        for equipment, history, usage in cases:
+            AIFeatureUtils.predict_equipment_failure(equipment, history, usage)
+    return run
+
+@benchmark('ai.customer_insights', app='api')
+def bench_customer_insights():
+    from src.models.ai_features import AIFeatureUtils
+
+    jobs = [{'total_amount': 180.0 + 37 * n} for n in range(40)]
+    payments = [{'days_late': n % 4} for n in range(40)]
+
+    def run():
+        for months in (3, 12, 36, 60):
+            AIFeatureUtils.generate_customer_insights({'relationship_months': months}, jobs, payments)
+    return run
+
+# ---------------------------------------------------------------------------
+# Invoice PDFs
+# ---------------------------------------------------------------------------
+
+@benchmark('pdf.build_invoice_pdf', app='backend')
+def bench_build_invoice_pdf():
+    from src.routes.invoices import _build_invoice_pdf, _invoices
+
+    invoice = dict(_invoices[0], line_items=_invoices[0]['line_items'] * 10)
+
+    def run():
+        _build_invoice_pdf(invoice)
+    return run
+
+@benchmark('pdf.invoice_pdf_generator', app='multitenant')
+def bench_invoice_pdf_generator():
+    try:
+        from src.utils.pdf_generator import InvoicePDFGenerator
+    except ImportError as error:
+        raise Skip(f'reportlab not installed ({error})')
+
+    generator = InvoicePDFGenerator()
+    invoice = {'invoice_number': 'INV-2025-0042', 'invoice_date': '2025-03-14', 'due_date': '2025-04-13',
+               'status': 'sent', 'subtotal': 1850.0, 'tax_rate': 7.0, 'tax_amount': 129.5,
+               'total_amount': 1979.5, 'notes': 'Thank you for your business.'}
+    company = {'company_name': 'ServiceBook Pros Demo', 'address': '123 Service St', 'city': 'Miami',
+               'state': 'FL', 'zip_code': '33101', 'phone': '(555) 123-4567', 'email': 'office@example.com'}
+    customer = {'first_name': 'Sarah', 'last_name': 'Johnson', 'address': '42 Palm Ave', 'city': 'Miami',
+                'state': 'FL', 'zip_code': '33133', 'phone': '(555) 987-6543', 'email': 'sarah@example.com'}
+    line_items = [{'description': f'Line item {n}', 'quantity': 1 + n % 3, 'unit_price': 85.0 + n,
+                   'total_price': (1 + n % 3) * (85.0 + n)} for n in range(20)]
+
+    def run():
+        generator.generate_invoice_pdf(invoice, company, customer, line_items)
+    return run
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def measure(func, rounds, min_time):
+    """Per-call timings (seconds) over `rounds` rounds of an auto-sized loop"""
+    timer = timeit.Timer(func)
+    loops, elapsed = timer.autorange()
+    if elapsed < min_time:
+        loops = max(1, int(loops * min_time / max(elapsed, 1e-9)))
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        times = [timer.timeit(loops) / loops for _ in range(rounds)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        'loops': loops,
+        'rounds': rounds,
+        'min_us': round(min(times) * 1e6, 3),
+        'median_us': round(statistics.median(times) * 1e6, 3),
+        'mean_us': round(statistics.mean(times) * 1e6, 3),
+        'stdev_us': round(statistics.stdev(times) * 1e6, 3) if len(times) > 1 else 0.0,
+        'ops_per_sec': round(1 / statistics.median(times), 1),
+    }
+
+def run_benchmarks(selected, rounds, min_time):
+    results = {}
+    for name, app, setup in selected:
+        with app_source(app):
+            try:
+                func = setup()
+                results[name] = measure(func, rounds, min_time)
+                print(f"{name:<40}{results[name]['median_us']:>14.1f} us  (min {results[name]['min_us']:.1f})")
+            except Skip as reason:
+                results[name] = {'skipped': str(reason)}
+                print(f'{name:<40}{"skipped":>14}     {reason}')
+    return results
+
+def compare(results, baseline, threshold):
+    print(f"\n{'benchmark':<40}{'baseline':>12}{'now':>12}{'change':>10}")
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if 'median_us' not in current or not previous or 'median_us' not in previous:
+            continue
+        change = (current['median_us'] - previous['median_us']) / previous['median_us']
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  SLOWER'
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{name:<40}{previous['median_us']:>12.1f}{current['median_us']:>12.1f}{change:>+10.0%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark ServiceBook Pros hot paths')
+    parser.add_argument('-k', dest='keyword', help='only run benchmarks whose name contains this')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per round (at least)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative change reported as slower/faster')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    selected = [entry for entry in _benchmarks if not args.keyword or args.keyword in entry[0]]
+    results = {
+        'meta': {
+            'recorded_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'fixtures': [os.path.basename(path) for path in FIXTURE_FILES],
+        },
+        'benchmarks': run_benchmarks(selected, args.rounds, args.min_time),
+    }
+
+    for path in filter(None, [args.output, args.baseline if args.save else None]):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResults written to {path}')
+
+    if not args.save and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results['benchmarks'], json.load(f), args.threshold)
+        if regressions and args.fail_on_regression:
+            raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Worker memory report for ServiceBook Pros
+Serves an app with gunicorn twice, loading it in every worker and then once
+in a preloading master, and compares RSS, PSS and private memory per worker
+
+    python benchmarks/worker_memory.py backend                 # 4 workers
+    python benchmarks/worker_memory.py api --workers 8 --requests 400
+    python benchmarks/worker_memory.py api --output memory.json
+
+Linux only (reads /proc). PSS splits each shared page between the processes
+mapping it, so its total is what the workers really cost together.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APPS = {
+    'api': {
+        'root': os.path.join(REPO_ROOT, 'servicebook-pros-api'),
+        'login': ('/api/auth/login', {'username': 'demo_admin', 'password': 'demo123'}),
+        'paths': ['/api/customers/?per_page=50', '/api/jobs/jobs?per_page=50', '/api/invoices/invoices?per_page=50',
+                  '/api/pricing/pricing/categories', '/api/analytics/analytics/dashboard',
+                  '/api/bi/dashboard/summary', '/api/ai/api/ai/automations'],
+    },
+    'backend': {
+        'root': os.path.join(REPO_ROOT, 'servicebook-pros-backend'),
+        'login': None,
+        'paths': ['/api/pricing/categories', '/api/pricing/stats', '/api/pricing/services/search?q=outlet'],
+    },
+    'multitenant': {
+        'root': os.path.join(REPO_ROOT, 'servicebook-pros-multitenant'),
+        'login': ('/api/auth/login', {'username': 'elite_admin', 'password': 'elite123'}),
+        'paths': ['/api/materials/categories', '/api/materials/subcategories', '/api/pricing/categories'],
+    },
+}
+
+MODES = (
+    ('per-worker load', 'false'),
+    ('preloaded master', 'true'),
+)
+
+class Client:
+    """Minimal HTTP client keeping the session cookie or bearer token"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.token = None
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        req.add_header('Content-Type', 'application/json')
+        if self.token:
+            req.add_header('Authorization', f'Bearer {self.token}')
+        try:
+            with self.opener.open(req, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def login(self, path, credentials):
+        status, body = self.request('POST', path, credentials)
+        if status != 200:
+            raise SystemExit(f'login failed ({status}): {body[:200]!r}')
+        self.token = json.loads(body).get('access_token')
+
+def memory_usage(pid):
+    """{'rss', 'pss', 'shared', 'private'} in KiB from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                # the process name may contain spaces; fields resume after ')'
+                ppid = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+def start_server(app, workers, port, preload):
+    executable = shutil.which('gunicorn')
+    if executable is None:
+        raise SystemExit('gunicorn is not installed (pip install gunicorn)')
+    env = dict(os.environ, GUNICORN_PRELOAD=preload)
+    process = subprocess.Popen(
+        [executable, '-c', 'gunicorn.conf.py', '-w', str(workers), '-b', f'127.0.0.1:{port}', 'src.main:app'],
+        cwd=app['root'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    client = Client(f'http://127.0.0.1:{port}')
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            if client.request('GET', '/api/health')[0] == 200 and len(child_pids(process.pid)) >= workers:
+                return process, client
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise SystemExit('gunicorn did not become healthy within 120s')
+
+def measure(app, workers, port, preload, requests):
+    process, client = start_server(app, workers, port, preload)
+    try:
+        if app['login']:
+            client.login(*app['login'])
+        # Enough requests that every worker has served each path a few times
+        for number in range(requests):
+            client.request('GET', app['paths'][number % len(app['paths'])])
+        time.sleep(1)
+        return {
+            'master': memory_usage(process.pid),
+            'workers': [memory_usage(pid) for pid in child_pids(process.pid)],
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+def print_report(results):
+    for mode, usage in results.items():
+        print(f'\n{mode}')
+        print(f"  {'process':<10} {'RSS MiB':>9} {'PSS MiB':>9} {'shared':>9} {'private':>9}")
+        rows = [('master', usage['master'])] + [(f'worker {n}', w) for n, w in enumerate(usage['workers'], 1)]
+        for name, row in rows:
+            print(f"  {name:<10} {row['rss'] / 1024:>9.1f} {row['pss'] / 1024:>9.1f} "
+                  f"{row['shared'] / 1024:>9.1f} {row['private'] / 1024:>9.1f}")
+        total_pss = sum(row['pss'] for _, row in rows)
+        usage['total_pss'] = total_pss
+        print(f"  {'total PSS':<10} {total_pss / 1024:>9.1f} MiB")
+
+    before, after = (results[mode]['total_pss'] for mode, _ in MODES)
+    if before:
+        print(f'\nPreloading changes the total by {(after - before) / 1024:+.1f} MiB ({(after - before) / before * 100:+.0f}%)')
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare gunicorn worker memory with and without preloading')
+    parser.add_argument('app', choices=sorted(APPS))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200, help='requests per mode after startup')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='also write the measurements to this JSON file')
+    args = parser.parse_args()
+
+    if not sys.platform.startswith('linux'):
+        raise SystemExit('worker_memory.py reads /proc and runs on Linux only')
+
+    app = APPS[args.app]
+    # Create and seed the database once, so workers loading the app on their
+    # own do not race to do it
+    subprocess.run([sys.executable, '-c', 'import src.main'], cwd=app['root'], check=True,
+                   stdout=subprocess.DEVNULL)
+    results = {}
+    for mode, preload in MODES:
+        results[mode] = measure(app, args.workers, args.port, preload, args.requests)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'app': args.app, 'workers': args.workers, 'modes': results}, f, indent=2)
+        print(f'\nResults written to {args.output}')
+
+if __name__ == '__main__':
+    main()
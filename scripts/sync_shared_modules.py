@@ -0,0 +1,78 @@
+"""
+Shared module sync for ServiceBook Pros
+The API, multi-tenant and backend apps are each built and deployed from
+their own directory (render.yaml rootDir, Docker build context) and import
+their code as the ``src`` package, so infrastructure modules they share are
+copied into each app rather than imported from outside it. Each module has
+one copy to edit, normally servicebook-pros-api's; this script writes it
+over the others behind a one-line header naming that copy, and with
+--check fails when any copy has drifted.
+
+    python scripts/sync_shared_modules.py          # copy from the edited copies
+    python scripts/sync_shared_modules.py --check  # exit 1 on drift
+"""
+
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API = 'servicebook-pros-api'
+MULTITENANT = 'servicebook-pros-multitenant'
+BACKEND = 'servicebook-pros-backend'
+
+# module -> (app whose copy is edited, apps holding a copy of it)
+SHARED_MODULES = {
+    'src/utils/database.py': (API, (MULTITENANT, BACKEND)),
+    'src/utils/http_cache.py': (API, (MULTITENANT, BACKEND)),
+    'src/utils/cache.py': (API, (MULTITENANT, BACKEND)),
+    'src/utils/profiling.py': (API, (MULTITENANT, BACKEND)),
+    'src/utils/prefork.py': (API, (MULTITENANT, BACKEND)),
+    'src/utils/startup.py': (API, (MULTITENANT,)),
+    'src/utils/outbox.py': (API, (MULTITENANT,)),
+    'src/models/data_version.py': (API, (MULTITENANT, BACKEND)),
+    # The API has no service catalog
+    'src/utils/catalog_counts.py': (BACKEND, (MULTITENANT,)),
+}
+
+def header(module, source_app):
+    return f'# Generated copy: edit {source_app}/{module} and run scripts/sync_shared_modules.py\n'
+
+def expected_copy(module, source_app):
+    """What every copy of ``module`` should contain: the header, then the source"""
+    with open(os.path.join(ROOT, source_app, module)) as source:
+        return header(module, source_app) + source.read()
+
+def drifted():
+    """(module, source app, app) for each copy that differs from its source"""
+    copies = []
+    for module, (source_app, apps) in SHARED_MODULES.items():
+        expected = expected_copy(module, source_app)
+        for app in apps:
+            copy = os.path.join(ROOT, app, module)
+            if not os.path.exists(copy):
+                copies.append((module, source_app, app))
+                continue
+            with open(copy) as f:
+                if f.read() != expected:
+                    copies.append((module, source_app, app))
+    return copies
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Copy shared modules into the apps that hold a copy')
+    parser.add_argument('--check', action='store_true', help='Only report copies that differ')
+    args = parser.parse_args(argv)
+
+    copies = drifted()
+    if args.check:
+        for module, source_app, app in copies:
+            print(f'{app}/{module} differs from {source_app}/{module}')
+        return 1 if copies else 0
+    for module, source_app, app in copies:
+        with open(os.path.join(ROOT, app, module), 'w') as copy:
+            copy.write(expected_copy(module, source_app))
+        print(f'Updated {app}/{module}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
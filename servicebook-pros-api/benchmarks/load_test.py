@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+API load test for ServiceBook Pros
+Drives the main read endpoints with concurrent clients against synthetic
+data, records p50/p95/p99 per endpoint and compares them with a baseline
+
+    # in-process Flask test client on a fresh SQLite database
+    python benchmarks/load_test.py --save-baseline
+
+    # after a change: same run, compared with benchmarks/baseline.json
+    python benchmarks/load_test.py --fail-on-regression
+
+    # a local gunicorn with 4 workers, or an already running server
+    python benchmarks/load_test.py --gunicorn 4
+    python benchmarks/load_test.py --url http://localhost:5000 --username demo_admin --password demo123
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+API_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_ROOT)
+
+from benchmarks.synthetic_data import Scale, generate
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# name -> path; the read paths the dashboard and mobile app hit most
+ENDPOINTS = {
+    'customers.list': '/api/customers/?per_page=50',
+    'customers.list_compact': '/api/customers/?per_page=50&view=compact',
+    'customers.stats': '/api/customers/stats',
+    'jobs.list': '/api/jobs/jobs?per_page=50',
+    'jobs.list_compact': '/api/jobs/jobs?per_page=50&view=compact',
+    'jobs.stats': '/api/jobs/jobs/stats',
+    'invoices.list': '/api/invoices/invoices?per_page=50',
+    'invoices.stats': '/api/invoices/invoices/stats',
+    'analytics.dashboard': '/api/analytics/analytics/dashboard',
+    'pricing.items': '/api/pricing/pricing/items?per_page=50',
+    'pricing.categories': '/api/pricing/pricing/categories',
+    'inventory.items': '/api/inventory/inventory/items?per_page=50',
+}
+
+class ClientRunner:
+    """Requests through Flask's test client, one client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, token=None, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = client.open(path, method=method, headers=headers, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+class HttpRunner:
+    """Requests over HTTP to a running server"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, token=None, body=None):
+        headers = {'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                payload = response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            payload = error.read()
+            status = error.code
+        if method == 'POST':
+            try:
+                return status, json.loads(payload)
+            except ValueError:
+                return status, None
+        return status, None
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies, errors, wall_time):
+    values = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'rps': round(len(values) / wall_time, 1) if wall_time else None,
+        'mean_ms': ms(sum(values) / len(values)) if values else None,
+        'p50_ms': ms(percentile(values, 0.50)),
+        'p95_ms': ms(percentile(values, 0.95)),
+        'p99_ms': ms(percentile(values, 0.99)),
+        'max_ms': ms(values[-1]) if values else None,
+    }
+
+def login(runner, username, password):
+    status, body = runner.request('POST', '/api/auth/login', body={'username': username, 'password': password})
+    if status != 200 or not body:
+        raise SystemExit(f'Login failed for {username}: HTTP {status}')
+    return body['access_token']
+
+def run_endpoint(runner, path, tokens, requests, concurrency, warmup):
+    for index in range(warmup):
+        runner.request('GET', path, tokens[index % len(tokens)])
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(index):
+        nonlocal errors
+        started = time.perf_counter()
+        status, _ = runner.request('GET', path, tokens[index % len(tokens)])
+        elapsed = time.perf_counter() - started
+        with lock:
+            if status >= 400:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return summarize(latencies, errors, time.perf_counter() - wall_started)
+
+def compare(results, baseline, threshold, noise_floor_ms):
+    """Endpoints whose p50/p95/p99 grew by more than `threshold` (and the noise floor)"""
+    regressions = []
+    rows = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous:
+            rows.append((name, current, None, []))
+            continue
+        flagged = []
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            before, after = previous.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            if after > before * (1 + threshold) and after - before > noise_floor_ms:
+                flagged.append(metric)
+        if flagged:
+            regressions.append(name)
+        rows.append((name, current, previous, flagged))
+    return rows, regressions
+
+def print_report(results, rows=None):
+    print(f"\n{'endpoint':<26}{'p50':>10}{'p95':>10}{'p99':>10}{'rps':>9}{'err':>6}   vs baseline (p50/p95/p99)")
+    rows = rows or [(name, current, None, []) for name, current in results['endpoints'].items()]
+    for name, current, previous, flagged in rows:
+        line = (f"{name:<26}{current['p50_ms'] or 0:>10.2f}{current['p95_ms'] or 0:>10.2f}"
+                f"{current['p99_ms'] or 0:>10.2f}{current['rps'] or 0:>9.1f}{current['errors']:>6}")
+        if previous:
+            deltas = []
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+                before, after = previous.get(metric), current.get(metric)
+                deltas.append(f'{(after - before) / before * 100:+.0f}%' if before and after is not None else 'n/a')
+            line += '   ' + '/'.join(deltas) + ('   REGRESSION ' + ','.join(flagged) if flagged else '')
+        print(line)
+
+def start_gunicorn(workers, port, env):
+    executable = shutil.which('gunicorn')
+    if executable is None:
+        raise SystemExit('gunicorn is not installed (pip install gunicorn)')
+    process = subprocess.Popen(
+        [executable, '-w', str(workers), '-b', f'127.0.0.1:{port}', 'src.main:app'],
+        cwd=API_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    runner = HttpRunner(f'http://127.0.0.1:{port}')
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if runner.request('GET', '/api/health')[0] == 200:
+                return process, runner
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise SystemExit('gunicorn did not become healthy within 60s')
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the ServiceBook Pros API')
+    parser.add_argument('--url', help='benchmark a running server instead of a local copy')
+    parser.add_argument('--username', help='with --url: login to use (repeatable via comma list)')
+    parser.add_argument('--password', help='with --url: password for --username')
+    parser.add_argument('--gunicorn', type=int, metavar='WORKERS', help='serve the synthetic data with gunicorn')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--database-url', help='database for the synthetic data (default: temporary SQLite file)')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--endpoints', help='comma separated subset of: ' + ', '.join(ENDPOINTS))
+    parser.add_argument('--tenants', type=int, default=3)
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--jobs', type=int, default=500)
+    parser.add_argument('--invoices', type=int, default=300)
+    parser.add_argument('--catalog', type=int, default=150)
+    parser.add_argument('--inventory', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write this run as JSON')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.20, help='allowed relative slowdown (0.20 = 20%%)')
+    parser.add_argument('--noise-floor-ms', type=float, default=1.0, help='ignore slowdowns smaller than this')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    endpoints = ENDPOINTS
+    if args.endpoints:
+        endpoints = {name: ENDPOINTS[name] for name in args.endpoints.split(',')}
+
+    scale = Scale(args.tenants, args.customers, args.jobs, args.invoices, args.catalog, args.inventory,
+                  seed=args.seed)
+    server = None
+    workdir = None
+    if args.url:
+        if not (args.username and args.password):
+            raise SystemExit('--url needs --username and --password')
+        runner = HttpRunner(args.url)
+        credentials = [(username, args.password) for username in args.username.split(',')]
+        target = args.url
+    else:
+        if args.database_url:
+            os.environ['DATABASE_URL'] = args.database_url
+        else:
+            workdir = tempfile.mkdtemp(prefix='sbp-bench-')
+            os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+        from src.main import app
+        from src.models.user import db
+
+        started = time.perf_counter()
+        with app.app_context():
+            tenants = generate(scale)
+            db.session.commit()
+        print(f'Generated {scale.tenants} tenants in {time.perf_counter() - started:.1f}s')
+        credentials = [(tenant['username'], tenant['password']) for tenant in tenants]
+
+        if args.gunicorn:
+            server, runner = start_gunicorn(args.gunicorn, args.port, dict(os.environ))
+            target = f'gunicorn x{args.gunicorn}'
+        else:
+            runner = ClientRunner(app)
+            target = 'flask-test-client'
+
+    try:
+        tokens = [login(runner, username, password) for username, password in credentials]
+        results = {
+            'meta': {
+                'recorded_at': datetime.utcnow().isoformat(),
+                'target': target,
+                'scale': scale.to_dict(),
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+            },
+            'endpoints': {},
+        }
+        for name, path in endpoints.items():
+            results['endpoints'][name] = run_endpoint(runner, path, tokens, args.requests,
+                                                      args.concurrency, args.warmup)
+            print(f"  {name}: p95 {results['endpoints'][name]['p95_ms']} ms")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print_report(results)
+        print(f'\nBaseline written to {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('scale') != results['meta']['scale'] or baseline['meta'].get('target') != target:
+            print('\nWarning: baseline was recorded with a different scale or target')
+        rows, regressions = compare(results, baseline, args.threshold, args.noise_floor_ms)
+        print_report(results, rows)
+        print(f"\n{len(regressions)} endpoint(s) regressed more than {args.threshold:.0%}"
+              + (f": {', '.join(regressions)}" if regressions else ''))
+    else:
+        print_report(results)
+        print(f'\nNo baseline at {args.baseline}; run with --save-baseline to record one')
+
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
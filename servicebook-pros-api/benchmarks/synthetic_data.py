@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Synthetic benchmark data for ServiceBook Pros
+Scales tenants, customers, jobs, invoices, pricing catalog and inventory
+with a fixed seed so every run measures the same data set
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert
+from werkzeug.security import generate_password_hash
+
+BENCH_PASSWORD = 'bench123'
+
+FIRST_NAMES = ['John', 'Sarah', 'Mike', 'Lisa', 'David', 'Maria', 'James', 'Linda', 'Robert', 'Karen',
+               'Carlos', 'Angela', 'Kevin', 'Nancy', 'Brian', 'Olivia', 'Jason', 'Emily', 'Mark', 'Grace']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Lee']
+CITIES = [('Miami', 'FL', '331'), ('Tampa', 'FL', '336'), ('Orlando', 'FL', '328'), ('Atlanta', 'GA', '303'),
+          ('Houston', 'TX', '770'), ('Phoenix', 'AZ', '850')]
+JOB_TITLES = ['Replace water heater', 'Panel upgrade', 'AC not cooling', 'Install ceiling fan',
+              'Clear main drain', 'GFCI outlet repair', 'Furnace tune-up', 'Leaking faucet',
+              'Whole-house surge protector', 'Thermostat replacement']
+
+class Scale:
+    """How much data to generate; `per tenant` counts unless noted"""
+
+    def __init__(self, tenants=3, customers=200, jobs=500, invoices=300, catalog=150, inventory=100,
+                 line_items=4, seed=42):
+        self.tenants = tenants
+        self.customers = customers
+        self.jobs = jobs
+        self.invoices = invoices
+        self.catalog = catalog
+        self.inventory = inventory
+        self.line_items = line_items
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+def _next_id(model):
+    from src.models.user import db
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+def _bulk_insert(model, rows):
+    from src.models.user import db
+    if rows:
+        db.session.execute(insert(model), rows)
+
+def generate(scale: Scale):
+    """Insert `scale.tenants` benchmark companies with their data.
+
+    Returns [{'company_id', 'username', 'password'}] for the load test.
+    Call inside an app context; the caller commits.
+    """
+    from src.models.user import db, User
+    from src.models.company import Company
+    from src.models.customer import Customer
+    from src.models.job import Job, JobStatus, JobPriority
+    from src.models.invoice import Invoice, InvoiceLineItem, InvoiceStatus
+    from src.models.pricing import FlatRatePricingItem, ServiceCategory
+    from src.models.inventory import InventoryItem, InventoryCategory
+
+    rng = random.Random(scale.seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    tenants = []
+
+    ids = {model: _next_id(model) for model in (Company, User, Customer, Job, Invoice, InvoiceLineItem,
+                                                  FlatRatePricingItem, InventoryItem)}
+
+    def take_id(model):
+        value = ids[model]
+        ids[model] += 1
+        return value
+
+    for tenant in range(scale.tenants):
+        company_id = take_id(Company)
+        tag = f'B{company_id}'
+        _bulk_insert(Company, [{
+            'id': company_id,
+            'name': f'Benchmark Services {company_id}',
+            'email': f'office{company_id}@bench.example.com',
+            'phone': f'(555) 400-{company_id:04d}',
+        }])
+
+        admin_id = take_id(User)
+        username = f'bench_admin_{company_id}'
+        technician_ids = [take_id(User) for _ in range(5)]
+        _bulk_insert(User, [{
+            'id': admin_id, 'username': username, 'email': f'{username}@bench.example.com',
+            'password_hash': password_hash, 'first_name': 'Bench', 'last_name': 'Admin',
+            'role': 'admin', 'company_id': company_id,
+        }] + [{
+            'id': user_id, 'username': f'bench_tech_{user_id}', 'email': f'tech{user_id}@bench.example.com',
+            'password_hash': password_hash, 'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES), 'role': 'technician', 'company_id': company_id,
+        } for user_id in technician_ids])
+
+        customer_ids = []
+        customers = []
+        for _ in range(scale.customers):
+            customer_id = take_id(Customer)
+            customer_ids.append(customer_id)
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            city, state, zip_prefix = rng.choice(CITIES)
+            customers.append({
+                'id': customer_id, 'company_id': company_id, 'first_name': first, 'last_name': last,
+                'email': f'{first.lower()}.{last.lower()}{customer_id}@example.com',
+                'phone': f'(555) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}',
+                'address': f'{rng.randint(100, 9999)} {rng.choice(LAST_NAMES)} St',
+                'city': city, 'state': state, 'zip_code': f'{zip_prefix}{rng.randint(10, 99)}',
+                'customer_type': rng.choice(['residential', 'residential', 'commercial']),
+                'status': rng.choice(['active', 'active', 'active', 'inactive', 'prospect']),
+                'tags': ','.join(rng.sample(['vip', 'maintenance-plan', 'new', 'referral', 'warranty'], 2)),
+                'created_at': now - timedelta(days=rng.randint(0, 720)),
+            })
+        _bulk_insert(Customer, customers)
+
+        job_ids = []
+        jobs = []
+        for number in range(scale.jobs):
+            job_id = take_id(Job)
+            job_ids.append(job_id)
+            scheduled = now + timedelta(days=rng.randint(-180, 60), hours=rng.randint(7, 17))
+            status = rng.choice(list(JobStatus))
+            jobs.append({
+                'id': job_id, 'company_id': company_id, 'customer_id': rng.choice(customer_ids),
+                'job_number': f'{tag}-JOB-{number + 1:06d}', 'title': rng.choice(JOB_TITLES),
+                'description': 'Synthetic benchmark job', 'category': rng.choice(['plumbing', 'electrical', 'hvac']),
+                'priority': rng.choice(list(JobPriority)), 'status': status,
+                'scheduled_date': scheduled, 'estimated_duration': rng.choice([60, 90, 120, 240]),
+                'assigned_technician_id': rng.choice(technician_ids),
+                'estimated_cost': round(rng.uniform(150, 4500), 2),
+                'labor_hours': round(rng.uniform(1, 8), 1),
+                'completed_at': scheduled + timedelta(hours=3) if status == JobStatus.COMPLETED else None,
+                'created_at': scheduled - timedelta(days=rng.randint(1, 30)),
+            })
+        _bulk_insert(Job, jobs)
+
+        invoices = []
+        line_items = []
+        for number in range(scale.invoices):
+            invoice_id = take_id(Invoice)
+            invoice_date = now - timedelta(days=rng.randint(0, 365))
+            subtotal = 0.0
+            for _ in range(rng.randint(1, scale.line_items)):
+                quantity = rng.randint(1, 3)
+                unit_price = round(rng.uniform(25, 900), 2)
+                subtotal += quantity * unit_price
+                line_items.append({
+                    'id': take_id(InvoiceLineItem), 'invoice_id': invoice_id,
+                    'item_type': rng.choice(['service', 'material', 'labor']),
+                    'description': rng.choice(JOB_TITLES), 'quantity': quantity,
+                    'unit_price': unit_price, 'total_price': round(quantity * unit_price, 2),
+                })
+            subtotal = round(subtotal, 2)
+            tax = round(subtotal * 0.085, 2)
+            status = rng.choice(list(InvoiceStatus))
+            paid = subtotal + tax if status == InvoiceStatus.PAID else 0.0
+            invoices.append({
+                'id': invoice_id, 'company_id': company_id, 'customer_id': rng.choice(customer_ids),
+                'job_id': rng.choice(job_ids) if job_ids else None,
+                'invoice_number': f'{tag}-INV-{number + 1:06d}', 'title': 'Service invoice',
+                'status': status, 'invoice_date': invoice_date, 'due_date': invoice_date + timedelta(days=30),
+                'subtotal': subtotal, 'tax_amount': tax, 'total_amount': subtotal + tax,
+                'paid_amount': paid, 'balance_due': subtotal + tax - paid,
+                'paid_at': invoice_date + timedelta(days=rng.randint(1, 30)) if paid else None,
+                'created_at': invoice_date,
+            })
+        _bulk_insert(Invoice, invoices)
+        _bulk_insert(InvoiceLineItem, line_items)
+
+        categories = list(ServiceCategory)
+        _bulk_insert(FlatRatePricingItem, [{
+            'id': take_id(FlatRatePricingItem), 'company_id': company_id,
+            'item_code': f'{tag}-FR-{number + 1:05d}', 'title': f'{rng.choice(JOB_TITLES)} ({number + 1})',
+            'description': 'Synthetic flat rate task', 'category': categories[number % len(categories)],
+            'good_price': (good := round(rng.uniform(89, 1500), 2)),
+            'better_price': round(good * 1.2, 2), 'best_price': round(good * 1.45, 2),
+            'labor_hours': round(rng.uniform(0.5, 6), 1), 'material_cost': round(rng.uniform(0, 400), 2),
+            'is_emergency': number % 10 == 0, 'tags': '["benchmark"]',
+        } for number in range(scale.catalog)])
+
+        inventory_categories = list(InventoryCategory)
+        _bulk_insert(InventoryItem, [{
+            'id': take_id(InventoryItem), 'company_id': company_id, 'sku': f'{tag}-SKU-{number + 1:05d}',
+            'name': f'Part {number + 1}', 'category': inventory_categories[number % len(inventory_categories)],
+            'cost_price': (cost := round(rng.uniform(1, 250), 2)), 'retail_price': round(cost * 1.4, 2),
+            'quantity_on_hand': (on_hand := float(rng.randint(0, 80))), 'quantity_available': on_hand,
+        } for number in range(scale.inventory)])
+
+        tenants.append({'company_id': company_id, 'username': username, 'password': BENCH_PASSWORD})
+
+    db.session.flush()
+    return tenants
+
+def main():
+    parser = argparse.ArgumentParser(description='Load synthetic benchmark data into DATABASE_URL')
+    parser.add_argument('--tenants', type=int, default=3)
+    parser.add_argument('--customers', type=int, default=200, help='per tenant')
+    parser.add_argument('--jobs', type=int, default=500, help='per tenant')
+    parser.add_argument('--invoices', type=int, default=300, help='per tenant')
+    parser.add_argument('--catalog', type=int, default=150, help='flat rate items per tenant')
+    parser.add_argument('--inventory', type=int, default=100, help='inventory items per tenant')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from src.main import app
+    from src.models.user import db
+
+    scale = Scale(args.tenants, args.customers, args.jobs, args.invoices, args.catalog, args.inventory,
+                  seed=args.seed)
+    with app.app_context():
+        tenants = generate(scale)
+        db.session.commit()
+    for tenant in tenants:
+        print(f"company {tenant['company_id']}: login {tenant['username']} / {tenant['password']}")
+
+if __name__ == '__main__':
+    main()
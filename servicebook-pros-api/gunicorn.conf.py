@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration for ServiceBook Pros
+The app is loaded once in the master and its read-only state warmed before
+the workers fork, so they share those pages copy-on-write
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = 'gthread'
+# An open /api/live/stream holds a thread for up to LIVE_MAX_STREAM_SECONDS,
+# so each worker gets LIVE_MAX_STREAMS threads on top of GUNICORN_THREADS and
+# refuses streams beyond that (503); requests always keep their own threads.
+# Size LIVE_MAX_STREAMS x workers for the dashboards and technician apps
+# connected at once, or serve /api/live/ from a second instance of this app
+# with a larger LIVE_MAX_STREAMS and route that path to it at the proxy.
+threads = int(os.environ.get('GUNICORN_THREADS', 1)) + int(os.environ.get('LIVE_MAX_STREAMS', 16))
+# GUNICORN_PRELOAD=false loads the app in every worker instead (the memory
+# report uses it as the baseline)
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+# The BI and AI blueprints are imported by the hooks below rather than when
+# the app is, which is only safe because the hooks run before serving
+os.environ.setdefault('LAZY_BLUEPRINTS', 'true')
+
+def when_ready(server):
+    if preload_app:
+        from src.main import app
+        from src.models.user import db
+        from src.utils.prefork import prepare_for_fork
+        prepare_for_fork(app, db)
+
+def post_fork(server, worker):
+    if preload_app:
+        from src.main import app
+        from src.models.user import db
+        from src.utils.prefork import after_fork
+        after_fork(app, db)
+
+def post_worker_init(worker):
+    # Already done in a preloading master unless its warm-up failed
+    from src.main import app
+    from src.utils.startup import load_lazy_blueprints
+    load_lazy_blueprints(app)
@@ -3,17 +3,34 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+from src.utils.startup import (
+    StartupTimer, LazyBlueprint, auto_init_db, lazy_blueprints_enabled, load_lazy_blueprints
+)
+startup = StartupTimer()
+
+import click
 from flask import Flask, send_from_directory, jsonify
 from flask_cors import CORS
 from src.models.user import db
 from src.routes.user import user_bp
+from src.utils.database import configure_database, init_engines, get_pool_metrics
+from src.utils.replica import ReplicaRouter, sync_sqlite_replica
+from src.utils.query_budget import init_query_budget
+from src.utils.profiling import init_profiling
+from src.utils.serializer import init_json
+from src.utils.http_cache import CachePolicy, init_http_cache
+from src.utils.cache import init_cache
+from src.utils.index_advisor import create_missing_columns, create_missing_indexes, install_query_capture, replace_unique_constraints, run_index_advisor
+from src.utils.prefork import warmup
+startup.mark('imports')
 
 # Create Flask app
 app = Flask(__name__, static_folder='static', static_url_path='')
 CORS(app, origins=['*'], allow_headers=['*'], methods=['*'], supports_credentials=True)
+init_json(app)
 
 # Import routes
-from src.routes.auth import auth_bp
+from src.routes.auth import auth_bp, admin_required, current_company_scope
 from src.routes.customers import customers_bp
 from src.routes.jobs import jobs_bp
 from src.routes.estimates import estimates_bp
@@ -24,8 +41,12 @@ from src.routes.pricing import pricing_bp
 from src.routes.inventory import inventory_bp
 from src.routes.technicians import technicians_bp
 from src.routes.communication import communication_bp
-from src.routes.business_intelligence import business_intelligence_bp
-from src.routes.ai_features import ai_features_bp
+from src.routes.live import live_bp
+from src.utils.communication_service import init_outbox
+from src.utils.reminders import init_reminders
+from src.utils.rollups import backfill_rollups, init_rollups, rebuild_rollups
+from src.utils.automations import init_automations, mark_overdue_invoices
+from src.utils.live import init_live
 
 # Register blueprints
 app.register_blueprint(user_bp, url_prefix='/api/users')
@@ -40,14 +61,72 @@ app.register_blueprint(pricing_bp, url_prefix='/api/pricing')
 app.register_blueprint(inventory_bp, url_prefix='/api/inventory')
 app.register_blueprint(technicians_bp, url_prefix='/api/technicians')
 app.register_blueprint(communication_bp, url_prefix='/api/communication')
-app.register_blueprint(business_intelligence_bp, url_prefix='/api/bi')
-app.register_blueprint(ai_features_bp, url_prefix='/api/ai')
+app.register_blueprint(live_bp, url_prefix='/api/live')
+
+# Business intelligence and AI routes are rarely hit and slow to import. With
+# LAZY_BLUEPRINTS (set by gunicorn.conf.py) the server imports them before it
+# serves, so the CLI and outbox worker never do
+if lazy_blueprints_enabled():
+    LazyBlueprint(app, 'src.routes.business_intelligence', 'business_intelligence_bp', '/api/bi')
+    LazyBlueprint(app, 'src.routes.ai_features', 'ai_features_bp', '/api/ai')
+else:
+    from src.routes.business_intelligence import business_intelligence_bp
+    from src.routes.ai_features import ai_features_bp
+    app.register_blueprint(business_intelligence_bp, url_prefix='/api/bi')
+    app.register_blueprint(ai_features_bp, url_prefix='/api/ai')
+startup.mark('blueprints')
+
+# Under a preloading server the lazy blueprints are imported once in the
+# master instead of in every worker
+@warmup('lazy blueprints')
+def warm_lazy_blueprints():
+    load_lazy_blueprints(app)
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_database(app, f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}")
 app.config['SECRET_KEY'] = 'servicebook-pros-secret-key-2024'
+replica_router = ReplicaRouter(app, db)
 db.init_app(app)
+init_engines(app, db)
+init_query_budget(app, db)
+# Request timing, slow-query log, Server-Timing, /metrics and /api/_debug/profile
+init_profiling(app, db, admin_required=admin_required)
+
+# Conditional GETs and compression. Pricing and settings reads depend only on
+# the tenant's data, so their ETags come from the tenant data version and
+# repeat requests are answered before the view runs.
+init_http_cache(app, db, scope=current_company_scope, policies={
+    'pricing': CachePolicy('private, no-cache', versioned=True),
+    'settings': CachePolicy('private, no-cache', versioned=True),
+    'auth': CachePolicy('no-store'),
+})
+
+# Application cache for route results and service lookups (REDIS_URL to share it)
+cache = init_cache(app, db)
+
+# SMS/email outbox (OUTBOX_* settings); delivered by `flask outbox-worker` or,
+# with OUTBOX_INLINE_WORKER, by a thread in the process that queued them
+outbox = init_outbox(app)
+
+# Appointment reminders and completion notices, on each company's
+# reminder_tick_minutes (`flask reminders-run`, or a thread per web process)
+reminders = init_reminders(app)
+
+# Daily communication counters behind /api/communication/analytics, updated
+# in the same flush as the logs and questions they count
+init_rollups(app)
+
+# Event-based SmartAutomations, run on a worker pool when a commit changes a
+# job's status, makes an invoice overdue or marks an estimate viewed
+automations = init_automations(app)
+
+# Committed job, clock-in, material request and message changes, pushed to
+# /api/live/stream (through Redis pub/sub when REDIS_URL is set)
+live = init_live(app)
+
+if os.environ.get('QUERY_CAPTURE_FILE'):
+    install_query_capture(app, os.environ['QUERY_CAPTURE_FILE'])
+startup.mark('extensions')
 
 # Import all models to ensure they're created
 from src.models.customer import Customer
@@ -55,17 +134,29 @@ from src.models.job import Job, JobStatus
 from src.models.estimate import Estimate
 from src.models.invoice import Invoice
 from src.models.company import Company
+from src.models.sequence import DocumentSequence
+from src.models.data_version import DataVersion
 from src.models.pricing import FlatRatePricingItem, PricingTemplate, CompanyPricingSettings
 from src.models.inventory import InventoryItem, StockMovement
 from src.models.technician import Technician, TechnicianSchedule
-from src.models.communication import MessageTemplate, CommunicationLog, CustomerQuestion, NotificationSettings, AutomatedMessage
-from src.models.business_intelligence import BusinessMetric, CustomReport, RevenueAnalytics, CustomerAnalytics, TechnicianPerformance, PredictiveInsight
-from src.models.ai_features import AIJobRecommendation, PredictiveMaintenance, AIInsight, SmartAutomation, CustomerBehaviorAnalysis, AIPerformanceMetrics
+from src.models.communication import MessageTemplate, CommunicationLog, CustomerQuestion, NotificationSettings, AutomatedMessage, OutboxMessage, Campaign, CampaignRecipient, JobNotification, CommunicationDailyStat
+startup.mark('models')
 
-with app.app_context():
-    db.create_all()
+def init_db():
+    """Create missing tables, columns and indexes and update changed unique
+    constraints on the primary"""
+    # The lazily loaded blueprints' models still belong in the schema
+    from src.models.business_intelligence import BusinessMetric, CustomReport, RevenueAnalytics, CustomerAnalytics, TechnicianPerformance, PredictiveInsight
+    from src.models.ai_features import AIJobRecommendation, PredictiveMaintenance, AIInsight, SmartAutomation, CustomerBehaviorAnalysis, AIPerformanceMetrics
     
-    # Initialize demo data
+    # Schema lives on the primary only; a replica receives it through replication
+    db.create_all(bind_key=None)
+    created = create_missing_columns() + replace_unique_constraints() + create_missing_indexes()
+    backfill_rollups()
+    return created
+
+def seed_demo():
+    """Load the demo tenant's data unless it is already there"""
     try:
         from src.utils.init_enhanced_demo_data import init_enhanced_demo_data
         init_enhanced_demo_data()
@@ -78,6 +169,126 @@ with app.app_context():
         except Exception as e2:
             print(f"Warning: Could not initialize demo data: {e2}")
 
+# Local development builds the schema and demo data at boot. Deployments set
+# AUTO_INIT_DB=false and run `flask init-db` / `flask seed-demo` once instead.
+if auto_init_db():
+    with app.app_context():
+        with startup.phase('schema'):
+            init_db()
+        with startup.phase('seed'):
+            seed_demo()
+startup.log('ServiceBook Pros API')
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables, columns and indexes"""
+    created = init_db()
+    click.echo(f"Schema ready; added or changed: {', '.join(created) if created else 'none'}")
+
+@app.cli.command('seed-demo')
+def seed_demo_command():
+    """Load the demo company, users and sample data"""
+    init_db()
+    seed_demo()
+    click.echo('Demo data loaded')
+
+@app.cli.command('startup-report')
+def startup_report_command():
+    """Print how long each phase of this process's boot took"""
+    report = startup.report()
+    click.echo(f"total {report['total_ms']:.0f}ms")
+    for name, ms in report['phases_ms'].items():
+        click.echo(f"  {name:<12} {ms:>8.1f}ms")
+
+@app.cli.command('index-advisor')
+@click.option('--company-id', default=1, show_default=True, help='Tenant used for the representative queries')
+@click.option('--captured', type=click.Path(exists=True), help='JSON lines file written via QUERY_CAPTURE_FILE')
+@click.option('--strict', is_flag=True, help='Exit non-zero when any query scans a full table')
+def index_advisor(company_id, captured, strict):
+    """Replay query shapes through EXPLAIN and flag full table scans"""
+    created = create_missing_indexes()
+    if created:
+        click.echo(f"Created indexes: {', '.join(created)}")
+    
+    report = run_index_advisor(company_id=company_id, captured_file=captured)
+    flagged = [entry for entry in report if entry['full_scans']]
+    
+    for entry in report:
+        marker = 'FULL SCAN' if entry['full_scans'] else 'ok'
+        click.echo(f"[{marker}] {entry['statement'][:160]}")
+        for line in entry['plan']:
+            click.echo(f"    {line}")
+    
+    click.echo(f"\n{len(report)} query shapes checked, {len(flagged)} with full table scans")
+    if strict and flagged:
+        raise SystemExit(1)
+
+@app.cli.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Deliver one batch of due messages and exit')
+@click.option('--concurrency', type=int, help='Parallel deliveries (default OUTBOX_CONCURRENCY)')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to wait when the queue is empty')
+def outbox_worker(once, concurrency, poll_interval):
+    """Deliver queued SMS and email"""
+    outbox.inline_worker = False
+    if concurrency:
+        outbox.concurrency = concurrency
+    if once:
+        outcomes = outbox.drain()
+        click.echo(', '.join(f'{status} {count}' for status, count in outcomes.items()) or 'Nothing due')
+        return
+    click.echo(f'Outbox worker {outbox.worker_id} running with {outbox.concurrency} threads')
+    try:
+        outbox.run(poll_interval=poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+@app.cli.command('outbox-requeue')
+@click.argument('message_ids', nargs=-1, type=int)
+def outbox_requeue(message_ids):
+    """Retry dead-lettered messages (all of them when no ids are given)"""
+    count = outbox.requeue_dead(db.session, list(message_ids))
+    db.session.commit()
+    click.echo(f'Requeued {count} messages')
+
+@app.cli.command('reminders-run')
+@click.option('--once', is_flag=True, help='Run a single tick and exit')
+def reminders_run(once):
+    """Queue due appointment reminders and completion notices"""
+    if once:
+        for kind, counts in reminders.run_once().items():
+            click.echo(f"{kind}: {counts['queued']} queued, {counts['skipped']} skipped")
+        return
+    click.echo('Reminder scheduler running')
+    try:
+        reminders.run(app)
+    except KeyboardInterrupt:
+        pass
+
+@app.cli.command('automations-sweep')
+def automations_sweep():
+    """Mark invoices past due as overdue, firing invoice.overdue automations (run from cron)"""
+    changed = mark_overdue_invoices()
+    click.echo(f'{changed} invoices became overdue')
+    # Let the automations this started finish before exiting
+    automations.shutdown()
+
+@app.cli.command('analytics-rebuild')
+@click.option('--company-id', type=int, help='Only rebuild this company\'s rollups')
+def analytics_rebuild(company_id):
+    """Recompute the daily communication rollups from the logs and questions"""
+    written = rebuild_rollups(company_id)
+    click.echo(f'Wrote {written} rollup rows')
+
+@app.cli.command('replica-sync')
+def replica_sync():
+    """Copy the SQLite primary into the SQLite replica (local testing only)"""
+    primary = db.engines[None].url
+    replica = db.engines.get('replica')
+    if replica is None or primary.get_backend_name() != 'sqlite' or replica.url.get_backend_name() != 'sqlite':
+        raise click.ClickException('REPLICA_DATABASE_URL must point at a SQLite file and the primary must be SQLite')
+    sync_sqlite_replica(primary.database, replica.url.database)
+    click.echo(f"Copied {primary.database} -> {replica.url.database}")
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -103,6 +314,52 @@ def health_check():
         'version': '1.0.0'
     }), 200
 
+# Database pool metrics
+@app.route('/api/health/database')
+def database_health():
+    return jsonify({
+        'status': 'healthy',
+        'pools': get_pool_metrics()
+    }), 200
+
+# Application cache metrics
+@app.route('/api/health/cache')
+def cache_health():
+    return jsonify({
+        'status': 'healthy',
+        'cache': cache.stats()
+    }), 200
+
+# Outbox queue depth and dead letters
+@app.route('/api/health/outbox')
+def outbox_health():
+    stats = outbox.stats(db.session)
+    return jsonify({
+        'status': 'degraded' if stats['counts']['dead'] else 'healthy',
+        'outbox': stats
+    }), 200
+
+# Live event subscribers of this worker
+@app.route('/api/health/live')
+def live_health():
+    return jsonify({
+        'status': 'healthy',
+        'live': live.stats()
+    }), 200
+
+# Boot phase timings of this worker and which lazy blueprints have loaded
+@app.route('/api/health/startup')
+def startup_health():
+    return jsonify({
+        'status': 'healthy',
+        'startup': startup.report(),
+        'auto_init_db': auto_init_db(),
+        'lazy_blueprints': {
+            lazy.url_prefix: lazy.blueprint is not None
+            for lazy in app.extensions.get('lazy_blueprints', [])
+        }
+    }), 200
+
 # API documentation endpoint
 @app.route('/api/docs')
 def api_docs():
@@ -121,6 +378,7 @@ def api_docs():
             'inventory': '/api/inventory/*',
             'technicians': '/api/technicians/*',
             'communication': '/api/communication/*',
+            'live': '/api/live/stream',
             'business_intelligence': '/api/bi/*',
             'ai_features': '/api/ai/*'
         },
@@ -4,12 +4,14 @@ Handles intelligent job scheduling, predictive maintenance, automated insights,
 """
 
 from datetime import datetime, timedelta
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, JSON
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text, Boolean, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
+from src.models.user import db
 import json
 
-Base = declarative_base()
+# The app's model base, so these tables are part of db.create_all() and
+# reachable through db.session
+Base = db.Model
 
 class AIJobRecommendation(Base):
     """AI-generated job scheduling and routing recommendations"""
@@ -173,6 +175,12 @@ class SmartAutomation(Base):
     priority = Column(Integer, default=5)  # 1-10, higher = more important
     max_executions_per_day = Column(Integer, default=100)
     
+    # Execution state, written by src.utils.automations
+    executions_day = Column(Date)  # day executions_today counts
+    executions_today = Column(Integer)
+    last_executed_at = Column(DateTime)
+    last_error = Column(Text)
+    
     # Learning and adaptation
     performance_history = Column(JSON)  # Historical performance data
     learned_parameters = Column(JSON)  # AI-optimized parameters
@@ -180,6 +188,32 @@ class SmartAutomation(Base):
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_smart_automations_company_active', 'company_id', 'is_active'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'company_id': self.company_id,
+            'name': self.name,
+            'type': self.automation_type,
+            'description': self.description,
+            'status': 'active' if self.is_active else 'paused',
+            'trigger_type': self.trigger_type,
+            'trigger_conditions': self.trigger_conditions or {},
+            'actions': self.actions or [],
+            'priority': self.priority,
+            'max_executions_per_day': self.max_executions_per_day,
+            'execution_count': self.execution_count or 0,
+            'success_rate': self.success_rate or 0.0,
+            'executions_today': (self.executions_today or 0) if self.executions_day == datetime.utcnow().date() else 0,
+            'last_executed_at': self.last_executed_at.isoformat() if self.last_executed_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
 
 class CustomerBehaviorAnalysis(Base):
     """AI analysis of customer behavior patterns and preferences"""
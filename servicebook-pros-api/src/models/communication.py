@@ -4,7 +4,11 @@ Handles SMS, Email, and notification systems
 """
 
 from src.models.user import db
+from src.utils.outbox import OutboxMessageMixin
 from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import enum
 import json
 
@@ -80,6 +84,9 @@ class MessageTemplate(db.Model):
 class CommunicationLog(db.Model):
     __tablename__ = 'communication_logs'
     
+    # Message traffic bumps its own data version, not the tenant's (see http_cache)
+    data_family = 'communication'
+    
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
     
@@ -127,6 +134,14 @@ class CommunicationLog(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_communication_logs_company_created', 'company_id', 'created_at'),
+        db.Index('ix_communication_logs_company_status', 'company_id', 'status'),
+        db.Index('ix_communication_logs_customer_id', 'customer_id'),
+        db.Index('ix_communication_logs_job_id', 'job_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -162,6 +177,9 @@ class CommunicationLog(db.Model):
 class CustomerQuestion(db.Model):
     __tablename__ = 'customer_questions'
     
+    # Message traffic bumps its own data version, not the tenant's (see http_cache)
+    data_family = 'communication'
+    
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
     job_id = db.Column(db.Integer, db.ForeignKey('jobs.id'), nullable=False)
@@ -193,6 +211,13 @@ class CustomerQuestion(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_customer_questions_company_status', 'company_id', 'status'),
+        db.Index('ix_customer_questions_company_created', 'company_id', 'created_at'),
+        db.Index('ix_customer_questions_job_id', 'job_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -241,6 +266,7 @@ class NotificationSettings(db.Model):
     
     # Timing preferences
     reminder_hours_before = db.Column(db.Integer, default=24)
+    reminder_tick_minutes = db.Column(db.Integer, default=15)  # how often the reminder scheduler checks this company
     business_hours_start = db.Column(db.Time)
     business_hours_end = db.Column(db.Time)
     
@@ -263,6 +289,7 @@ class NotificationSettings(db.Model):
             'send_completion_notifications': self.send_completion_notifications,
             'send_invoice_notifications': self.send_invoice_notifications,
             'reminder_hours_before': self.reminder_hours_before,
+            'reminder_tick_minutes': self.reminder_tick_minutes,
             'business_hours_start': self.business_hours_start.isoformat() if self.business_hours_start else None,
             'business_hours_end': self.business_hours_end.isoformat() if self.business_hours_end else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -303,3 +330,194 @@ class AutomatedMessage(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class OutboxMessage(OutboxMessageMixin, db.Model):
+    """SMS/email queued for delivery; source_id is the CommunicationLog row"""
+    __tablename__ = 'outbox_messages'
+    
+    __table_args__ = (
+        db.Index('ix_outbox_messages_status_next_attempt', 'status', 'next_attempt_at'),
+        db.Index('ix_outbox_messages_company_status', 'company_id', 'status'),
+    )
+
+class Campaign(db.Model):
+    """One bulk send: a template rendered for every customer in an audience"""
+    __tablename__ = 'campaigns'
+    
+    # Message traffic bumps its own data version, not the tenant's (see http_cache)
+    data_family = 'communication'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    
+    # Message
+    template_id = db.Column(db.Integer, db.ForeignKey('message_templates.id'))
+    communication_type = db.Column(db.Enum(CommunicationType), nullable=False)
+    subject = db.Column(db.String(500))
+    message_body = db.Column(db.Text, nullable=False)
+    
+    # Recipients
+    audience = db.Column(db.String(50), nullable=False)  # jobs_tomorrow, churn_risk, all_customers, customers
+    audience_params = db.Column(db.Text)  # JSON parameters of the audience query
+    
+    # Delivery
+    rate_per_minute = db.Column(db.Integer)  # throughput cap; None for the provider rate only
+    send_at = db.Column(db.DateTime)
+    status = db.Column(db.String(20), default='queuing')  # queuing, queued, cancelled, failed
+    
+    # Progress of the queuing step; delivery counts come from the logs
+    total_recipients = db.Column(db.Integer, default=0)
+    queued_count = db.Column(db.Integer, default=0)
+    skipped_count = db.Column(db.Integer, default=0)
+    error_message = db.Column(db.Text)
+    
+    created_by_user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    queued_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_campaigns_company_created', 'company_id', 'created_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'company_id': self.company_id,
+            'name': self.name,
+            'template_id': self.template_id,
+            'communication_type': self.communication_type.value if self.communication_type else None,
+            'subject': self.subject,
+            'message_body': self.message_body,
+            'audience': self.audience,
+            'audience_params': json.loads(self.audience_params) if self.audience_params else {},
+            'rate_per_minute': self.rate_per_minute,
+            'send_at': self.send_at.isoformat() if self.send_at else None,
+            'status': self.status,
+            'total_recipients': self.total_recipients,
+            'queued_count': self.queued_count,
+            'skipped_count': self.skipped_count,
+            'error_message': self.error_message,
+            'created_by_user_id': self.created_by_user_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'queued_at': self.queued_at.isoformat() if self.queued_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class CampaignRecipient(db.Model):
+    """Links a campaign to the communication log of each message it queued"""
+    __tablename__ = 'campaign_recipients'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaigns.id'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
+    communication_log_id = db.Column(db.Integer, db.ForeignKey('communication_logs.id'), nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('campaign_id', 'customer_id', name='uq_campaign_recipients_customer'),
+        db.Index('ix_campaign_recipients_campaign_log', 'campaign_id', 'communication_log_id'),
+    )
+
+class JobNotification(db.Model):
+    """Marks a job notification (reminder, completion) as handled, so it is sent once"""
+    __tablename__ = 'job_notifications'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
+    job_id = db.Column(db.Integer, db.ForeignKey('jobs.id'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)  # appointment_reminder, job_completion
+    status = db.Column(db.String(20), nullable=False)  # queued, skipped (no contact details)
+    communication_log_id = db.Column(db.Integer, db.ForeignKey('communication_logs.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('job_id', 'kind', name='uq_job_notifications_job_kind'),
+    )
+    
+    def data_scope(self):
+        """Scheduler bookkeeping; no response depends on it (see http_cache)"""
+        return None
+
+class CommunicationDailyStat(db.Model):
+    """Per-company daily communication counters, kept current by src.utils.rollups.
+
+    One row per (company, day, channel); channel is a CommunicationType value
+    for messages and QUESTIONS_CHANNEL for customer questions. Rows are
+    keyed by the day the log or question was created, so a later status
+    change adjusts that day's row.
+    """
+    __tablename__ = 'communication_daily_stats'
+    
+    QUESTIONS_CHANNEL = 'questions'
+    COUNTERS = (
+        'message_count', 'sent_count', 'delivered_count', 'failed_count',
+        'question_count', 'pending_question_count', 'urgent_question_count',
+        'answered_question_count', 'response_seconds',
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    channel = db.Column(db.String(20), nullable=False)
+    
+    # Messages
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    sent_count = db.Column(db.Integer, nullable=False, default=0)  # sent, delivered or read
+    delivered_count = db.Column(db.Integer, nullable=False, default=0)  # delivered or read
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Customer questions
+    question_count = db.Column(db.Integer, nullable=False, default=0)
+    pending_question_count = db.Column(db.Integer, nullable=False, default=0)
+    urgent_question_count = db.Column(db.Integer, nullable=False, default=0)  # urgent and pending
+    answered_question_count = db.Column(db.Integer, nullable=False, default=0)
+    response_seconds = db.Column(db.Float, nullable=False, default=0.0)  # total over answered questions
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('company_id', 'day', 'channel', name='uq_communication_daily_stats_day'),
+    )
+    
+    @classmethod
+    def add(cls, connection, deltas):
+        """Add ``{(company_id, day, channel): {counter: delta}}`` on an open connection"""
+        table = cls.__table__
+        now = datetime.utcnow()
+        dialect = connection.dialect.name
+        for (company_id, day, channel), counters in sorted(deltas.items(), key=lambda item: item[0]):
+            counters = {name: delta for name, delta in counters.items() if delta}
+            if not counters:
+                continue
+            increments = {name: table.c[name] + delta for name, delta in counters.items()}
+            increments['updated_at'] = now
+            if dialect in ('sqlite', 'postgresql'):
+                insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+                connection.execute(
+                    insert(table)
+                    .values(company_id=company_id, day=day, channel=channel, updated_at=now,
+                            **{name: counters.get(name, 0) for name in cls.COUNTERS})
+                    .on_conflict_do_update(
+                        index_elements=[table.c.company_id, table.c.day, table.c.channel],
+                        set_=increments
+                    )
+                )
+                continue
+            result = connection.execute(
+                update(table).where(
+                    table.c.company_id == company_id, table.c.day == day, table.c.channel == channel
+                ).values(**increments)
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(
+                    company_id=company_id, day=day, channel=channel, updated_at=now,
+                    **{name: counters.get(name, 0) for name in cls.COUNTERS}
+                ))
+    
+    def to_dict(self):
+        return {
+            'company_id': self.company_id,
+            'day': self.day.isoformat() if self.day else None,
+            'channel': self.channel,
+            **{name: getattr(self, name) for name in self.COUNTERS}
+        }
@@ -31,6 +31,10 @@ class Company(db.Model):
     customers = db.relationship('Customer', backref='company_ref', lazy=True)
     jobs = db.relationship('Job', backref='company_ref', lazy=True)
     
+    def data_scope(self):
+        """A company's own row is part of its data version (see http_cache)"""
+        return f'company:{self.id}'
+
     def to_dict(self):
         return {
             'id': self.id,
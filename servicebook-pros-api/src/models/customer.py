@@ -45,6 +45,12 @@ class Customer(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_service_date = db.Column(db.DateTime)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_customers_company_status', 'company_id', 'status'),
+        db.Index('ix_customers_company_created', 'company_id', 'created_at'),
+    )
+    
     # Relationships
     jobs = db.relationship('Job', backref='customer', lazy=True)
     estimates = db.relationship('Estimate', backref='customer', lazy=True)
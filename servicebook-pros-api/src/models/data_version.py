@@ -0,0 +1,63 @@
+"""
+Data versions for ServiceBook Pros
+Per-tenant change counters used to build HTTP ETags
+"""
+
+from src.models.user import db
+from datetime import datetime
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+GLOBAL_SCOPE = 'global'
+
+class DataVersion(db.Model):
+    """One counter per scope ('company:<id>', 'company:<id>:<family>' or
+    'global'), bumped in the same transaction as every write to that scope"""
+    __tablename__ = 'data_versions'
+
+    scope = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'scope': self.scope,
+            'version': self.version,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    @classmethod
+    def bump(cls, connection, scopes):
+        """Increment the counters for `scopes` on an open connection"""
+        table = cls.__table__
+        now = datetime.utcnow()
+        dialect = connection.dialect.name
+        for scope in sorted(scopes):
+            if dialect in ('sqlite', 'postgresql'):
+                insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+                connection.execute(
+                    insert(table)
+                    .values(scope=scope, version=1, updated_at=now)
+                    .on_conflict_do_update(
+                        index_elements=[table.c.scope],
+                        set_={'version': table.c.version + 1, 'updated_at': now}
+                    )
+                )
+                continue
+            result = connection.execute(
+                update(table).where(table.c.scope == scope)
+                .values(version=table.c.version + 1, updated_at=now)
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(scope=scope, version=1, updated_at=now))
+
+    @classmethod
+    def current(cls, scopes):
+        """Current counter for each scope (0 when it has never been written)"""
+        rows = db.session.execute(
+            select(cls.scope, cls.version).where(cls.scope.in_(list(scopes)))
+        ).all()
+        versions = dict.fromkeys(scopes, 0)
+        versions.update({scope: version for scope, version in rows})
+        return versions
@@ -19,7 +19,7 @@ class Estimate(db.Model):
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
     
     # Estimate identification
-    estimate_number = db.Column(db.String(50), unique=True, nullable=False)
+    estimate_number = db.Column(db.String(50), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     
@@ -48,6 +48,15 @@ class Estimate(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Indexes
+    __table_args__ = (
+        # Numbers come from per-company sequences, so they repeat across tenants
+        db.UniqueConstraint('company_id', 'estimate_number', name='uq_estimates_company_estimate_number'),
+        db.Index('ix_estimates_company_status', 'company_id', 'status'),
+        db.Index('ix_estimates_company_created', 'company_id', 'created_at'),
+        db.Index('ix_estimates_customer_id', 'customer_id'),
+    )
+    
     # Relationships
     line_items = db.relationship('EstimateLineItem', backref='estimate', lazy=True, cascade='all, delete-orphan')
     
@@ -118,6 +127,11 @@ class EstimateLineItem(db.Model):
     # Order
     sort_order = db.Column(db.Integer, default=0)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_estimate_line_items_estimate_id', 'estimate_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -89,6 +89,11 @@ class InventoryItem(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_inventory_items_company_category', 'company_id', 'category'),
+    )
+    
     # Relationships
     stock_movements = db.relationship('StockMovement', backref='inventory_item', lazy=True)
     job_materials = db.relationship('JobMaterial', backref='inventory_item', lazy=True)
@@ -200,6 +205,11 @@ class StockMovement(db.Model):
     movement_date = db.Column(db.DateTime, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_stock_movements_item_date', 'inventory_item_id', 'movement_date'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -28,7 +28,7 @@ class Invoice(db.Model):
     estimate_id = db.Column(db.Integer, db.ForeignKey('estimates.id'))
     
     # Invoice identification
-    invoice_number = db.Column(db.String(50), unique=True, nullable=False)
+    invoice_number = db.Column(db.String(50), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     
@@ -60,6 +60,16 @@ class Invoice(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Indexes
+    __table_args__ = (
+        # Numbers come from per-company sequences, so they repeat across tenants
+        db.UniqueConstraint('company_id', 'invoice_number', name='uq_invoices_company_invoice_number'),
+        db.Index('ix_invoices_company_status', 'company_id', 'status'),
+        db.Index('ix_invoices_company_paid_at', 'company_id', 'paid_at'),
+        db.Index('ix_invoices_company_created', 'company_id', 'created_at'),
+        db.Index('ix_invoices_customer_id', 'customer_id'),
+    )
+    
     # Relationships
     line_items = db.relationship('InvoiceLineItem', backref='invoice', lazy=True, cascade='all, delete-orphan')
     payments = db.relationship('Payment', backref='invoice', lazy=True)
@@ -156,6 +166,11 @@ class InvoiceLineItem(db.Model):
     # Order
     sort_order = db.Column(db.Integer, default=0)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_invoice_line_items_invoice_id', 'invoice_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -199,6 +214,11 @@ class Payment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_payments_invoice_id', 'invoice_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -24,7 +24,7 @@ class Job(db.Model):
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
     
     # Job identification
-    job_number = db.Column(db.String(50), unique=True, nullable=False)
+    job_number = db.Column(db.String(50), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     
@@ -88,6 +88,16 @@ class Job(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     
+    # Indexes
+    __table_args__ = (
+        # Numbers come from per-company sequences, so they repeat across tenants
+        db.UniqueConstraint('company_id', 'job_number', name='uq_jobs_company_job_number'),
+        db.Index('ix_jobs_company_status', 'company_id', 'status'),
+        db.Index('ix_jobs_company_scheduled_date', 'company_id', 'scheduled_date'),
+        db.Index('ix_jobs_customer_id', 'customer_id'),
+        db.Index('ix_jobs_technician_scheduled_date', 'assigned_technician_id', 'scheduled_date'),
+    )
+    
     # Relationships
     assigned_technician = db.relationship('User', foreign_keys=[assigned_technician_id])
     
@@ -162,6 +172,11 @@ class JobNote(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_job_notes_job_created', 'job_id', 'created_at'),
+    )
+    
     # Relationships
     job = db.relationship('Job', backref='notes')
     user = db.relationship('User', backref='job_notes')
@@ -201,6 +216,11 @@ class JobTimeEntry(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_job_time_entries_job_start', 'job_id', 'start_time'),
+    )
+    
     # Relationships
     job = db.relationship('Job', backref='time_entries')
     user = db.relationship('User', backref='time_entries')
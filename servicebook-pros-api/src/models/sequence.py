@@ -0,0 +1,114 @@
+"""
+Document numbering sequences for ServiceBook Pros
+Per-company counters for job, estimate and invoice numbers
+"""
+
+from src.models.user import db
+from datetime import datetime
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+
+class DocumentSequence(db.Model):
+    __tablename__ = 'document_sequences'
+
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
+    document_type = db.Column(db.String(50), nullable=False)  # job, estimate, invoice
+
+    # Last number handed out for this company and document type
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('company_id', 'document_type', name='uq_document_sequence_company_type'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'company_id': self.company_id,
+            'document_type': self.document_type,
+            'last_value': self.last_value,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    @classmethod
+    def allocate(cls, company_id, document_type, count=1, seed=None):
+        """Atomically reserve `count` consecutive numbers and return the first one.
+
+        The counter is bumped with a single ``UPDATE ... RETURNING`` so the row
+        lock (or SQLite's write lock) is taken before the value is read; two
+        concurrent requests can never receive the same number. The reservation
+        is part of the caller's transaction and is released on rollback.
+
+        ``seed`` is an optional callable returning the highest number already
+        in use; it only runs once, when the counter row is first created.
+        """
+        if count < 1:
+            raise ValueError('count must be at least 1')
+
+        last_value = cls._increment(company_id, document_type, count)
+        if last_value is None:
+            cls._create(company_id, document_type, seed() if seed else 0)
+            last_value = cls._increment(company_id, document_type, count)
+
+        return last_value - count + 1
+
+    @classmethod
+    def allocate_block(cls, company_id, document_type, count, seed=None):
+        """Reserve a block of numbers for bulk imports, returned as a range"""
+        first = cls.allocate(company_id, document_type, count=count, seed=seed)
+        return range(first, first + count)
+
+    @classmethod
+    def _increment(cls, company_id, document_type, count):
+        result = db.session.execute(
+            update(cls)
+            .where(cls.company_id == company_id, cls.document_type == document_type)
+            .values(last_value=cls.last_value + count, updated_at=datetime.utcnow())
+            .returning(cls.last_value)
+        )
+        return result.scalar()
+
+    @classmethod
+    def _create(cls, company_id, document_type, start_value):
+        # Another worker may create the row between our UPDATE and INSERT;
+        # the unique constraint catches that and we simply use its row.
+        try:
+            with db.session.begin_nested():
+                db.session.add(cls(
+                    company_id=company_id,
+                    document_type=document_type,
+                    last_value=start_value or 0
+                ))
+        except IntegrityError:
+            pass
+
+def highest_existing_number(number_column, company_id):
+    """Highest numeric suffix already used by a company, e.g. 42 for JOB-000042"""
+    model = number_column.class_
+    latest = db.session.query(func.max(number_column)).filter(model.company_id == company_id).scalar()
+    if not latest:
+        return 0
+    try:
+        return int(latest.rsplit('-', 1)[-1])
+    except ValueError:
+        return 0
+
+def next_document_number(company_id, document_type, prefix, number_column):
+    """Allocate the next number for a document type and format it, e.g. JOB-000042
+
+    The first allocation for a company seeds the counter from the numbers
+    already stored in ``number_column``, so new numbers continue after the
+    company's existing documents. Numbers are unique per company only; the
+    models declare ``UniqueConstraint('company_id', <number>)`` to match.
+    """
+    value = DocumentSequence.allocate(
+        company_id, document_type,
+        seed=lambda: highest_existing_number(number_column, company_id)
+    )
+    return f"{prefix}-{value:06d}"
@@ -88,6 +88,11 @@ class Technician(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_technicians_company_status', 'company_id', 'status'),
+    )
+    
     # Relationships
     job_assignments = db.relationship('JobAssignment', backref='technician', lazy=True)
     time_entries = db.relationship('TimeEntry', backref='technician', lazy=True)
@@ -179,6 +184,12 @@ class JobAssignment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_job_assignments_technician_start', 'technician_id', 'scheduled_start'),
+        db.Index('ix_job_assignments_job_id', 'job_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -254,6 +265,11 @@ class TimeEntry(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Indexes
+    __table_args__ = (
+        db.Index('ix_time_entries_technician_start', 'technician_id', 'start_time'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
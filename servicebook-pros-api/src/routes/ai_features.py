@@ -7,6 +7,9 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime, timedelta
 import json
 import random
+from ..models.user import db
+from .auth import token_required
+from ..utils.automations import compile_trigger, validate_actions
 from ..models.ai_features import (
     AIJobRecommendation, PredictiveMaintenance, AIInsight, SmartAutomation,
     CustomerBehaviorAnalysis, AIPerformanceMetrics, AIFeatureUtils
@@ -442,73 +445,15 @@ def get_customer_analysis(customer_id):
 
 # Smart Automation
 @ai_features_bp.route('/api/ai/automations', methods=['GET'])
-def get_smart_automations():
+@token_required
+def get_smart_automations(current_user):
     """Get list of smart automations"""
     try:
-        company_id = request.args.get('company_id', 1)
-        
-        automations = [
-            {
-                'id': 1,
-                'name': 'Appointment Reminder Automation',
-                'type': 'communication',
-                'description': 'Automatically send appointment reminders 24 hours and 2 hours before scheduled jobs',
-                'status': 'active',
-                'trigger_type': 'time_based',
-                'success_rate': 0.94,
-                'executions_this_month': 156,
-                'impact_metrics': {
-                    'no_show_reduction': '35%',
-                    'customer_satisfaction_increase': '12%',
-                    'time_saved': '8 hours/month'
-                }
-            },
-            {
-                'id': 2,
-                'name': 'Follow-up Survey Automation',
-                'type': 'customer_feedback',
-                'description': 'Send satisfaction surveys 24 hours after job completion',
-                'status': 'active',
-                'trigger_type': 'event_based',
-                'success_rate': 0.87,
-                'executions_this_month': 89,
-                'impact_metrics': {
-                    'response_rate': '68%',
-                    'average_rating': '4.3/5',
-                    'issue_detection': '15% faster'
-                }
-            },
-            {
-                'id': 3,
-                'name': 'Preventive Maintenance Scheduler',
-                'type': 'scheduling',
-                'description': 'Automatically schedule preventive maintenance based on equipment age and service history',
-                'status': 'active',
-                'trigger_type': 'condition_based',
-                'success_rate': 0.91,
-                'executions_this_month': 34,
-                'impact_metrics': {
-                    'revenue_increase': '$2,100/month',
-                    'emergency_calls_reduced': '28%',
-                    'customer_retention': '+15%'
-                }
-            },
-            {
-                'id': 4,
-                'name': 'Dynamic Pricing Optimizer',
-                'type': 'pricing',
-                'description': 'Adjust pricing based on demand, technician availability, and customer segments',
-                'status': 'learning',
-                'trigger_type': 'condition_based',
-                'success_rate': 0.82,
-                'executions_this_month': 67,
-                'impact_metrics': {
-                    'revenue_optimization': '+8%',
-                    'booking_rate': '+12%',
-                    'profit_margin': '+5%'
-                }
-            }
-        ]
+        automations = SmartAutomation.query.filter_by(company_id=current_user.company_id).order_by(
+            SmartAutomation.priority.desc(), SmartAutomation.id
+        ).all()
+        automations = [automation.to_dict() for automation in automations]
+        executions = sum(a['execution_count'] for a in automations)
         
         return jsonify({
             'success': True,
@@ -516,41 +461,95 @@ def get_smart_automations():
             'summary': {
                 'total_automations': len(automations),
                 'active_automations': len([a for a in automations if a['status'] == 'active']),
-                'total_executions': sum(a['executions_this_month'] for a in automations),
-                'average_success_rate': round(sum(a['success_rate'] for a in automations) / len(automations), 2)
+                'total_executions': executions,
+                # Weighted by executions, so unused automations do not count
+                'average_success_rate': round(
+                    sum(a['success_rate'] * a['execution_count'] for a in automations) / executions, 2
+                ) if executions else 0.0
             }
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _apply_automation_fields(automation, data):
+    """Copy request fields onto an automation; ValueError if the trigger or actions are invalid"""
+    for field, attribute in (('name', 'name'), ('type', 'automation_type'), ('description', 'description'),
+                             ('trigger_type', 'trigger_type'), ('trigger_conditions', 'trigger_conditions'),
+                             ('actions', 'actions'), ('priority', 'priority'),
+                             ('max_executions_per_day', 'max_executions_per_day')):
+        if field in data:
+            setattr(automation, attribute, data[field])
+    if 'status' in data:
+        automation.is_active = data['status'] == 'active'
+    if not automation.name or not automation.automation_type:
+        raise ValueError('name and type are required')
+    if automation.trigger_type == 'event_based':
+        compile_trigger(automation.trigger_conditions)
+    validate_actions(automation.actions)
+
 @ai_features_bp.route('/api/ai/automations', methods=['POST'])
-def create_automation():
-    """Create a new smart automation"""
+@token_required
+def create_automation(current_user):
+    """Create a new smart automation.
+
+    Event-based automations run when their event is committed, e.g.
+    trigger_conditions {"event": "job.status_changed", "when": {"to": "completed"}}
+    with actions [{"type": "send_sms", "body": "..."}].
+    """
     try:
-        data = request.get_json()
-        
-        automation = {
-            'id': random.randint(100, 999),
-            'name': data.get('name'),
-            'type': data.get('type'),
-            'description': data.get('description'),
-            'trigger_type': data.get('trigger_type'),
-            'trigger_conditions': data.get('trigger_conditions', {}),
-            'actions': data.get('actions', []),
-            'status': 'active',
-            'success_rate': 0.0,
-            'executions_this_month': 0,
-            'created_at': datetime.now().isoformat()
-        }
+        data = request.get_json() or {}
+        
+        automation = SmartAutomation(
+            company_id=current_user.company_id,
+            trigger_type=data.get('trigger_type', 'event_based'),
+            is_active=True,
+            execution_count=0,
+            success_rate=0.0
+        )
+        try:
+            _apply_automation_fields(automation, data)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        db.session.add(automation)
+        db.session.commit()
         
         return jsonify({
             'success': True,
-            'automation': automation,
+            'automation': automation.to_dict(),
             'message': 'Automation created successfully'
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ai_features_bp.route('/api/ai/automations/<int:automation_id>', methods=['PUT'])
+@token_required
+def update_automation(current_user, automation_id):
+    """Update, pause ("status": "paused") or resume an automation"""
+    try:
+        automation = SmartAutomation.query.filter_by(
+            id=automation_id, company_id=current_user.company_id
+        ).first()
+        if not automation:
+            return jsonify({'success': False, 'error': 'Automation not found'}), 404
+        try:
+            _apply_automation_fields(automation, request.get_json() or {})
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'automation': automation.to_dict()
         })
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # AI Performance Metrics
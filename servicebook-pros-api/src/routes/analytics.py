@@ -5,10 +5,12 @@ from src.models.job import Job, JobStatus
 from src.models.invoice import Invoice, InvoiceStatus
 from src.models.estimate import Estimate, EstimateStatus
 from src.routes.auth import token_required
+from src.utils.replica import read_replica_blueprint
 from datetime import datetime, timedelta
 from sqlalchemy import func, extract
 
 analytics_bp = Blueprint('analytics', __name__)
+read_replica_blueprint(analytics_bp)
 
 @analytics_bp.route('/analytics/dashboard', methods=['GET'])
 @token_required
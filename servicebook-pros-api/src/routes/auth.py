@@ -37,6 +37,28 @@ def token_required(f):
     
     return decorated
 
+def admin_required(f):
+    """Like token_required, for admin-only views that do not take the user"""
+    @wraps(f)
+    @token_required
+    def decorated(current_user, *args, **kwargs):
+        if current_user.role != 'admin':
+            return jsonify({'message': 'Admin privileges required'}), 403
+        return f(*args, **kwargs)
+    
+    return decorated
+
+def current_company_scope():
+    """Data version scope ('company:<id>') of the request's token, or None"""
+    auth_header = request.headers.get('Authorization', '')
+    try:
+        token = auth_header.split(" ")[1]
+        data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+    except (IndexError, jwt.InvalidTokenError):
+        return None
+    user = db.session.get(User, data.get('user_id'))
+    return f'company:{user.company_id}' if user else None
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     try:
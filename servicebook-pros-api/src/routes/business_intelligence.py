@@ -17,8 +17,10 @@ from src.models.invoice import Invoice
 from datetime import datetime, timedelta
 import json
 from sqlalchemy import func, and_, or_
+from src.utils.replica import read_replica_blueprint
 
 business_intelligence_bp = Blueprint('business_intelligence', __name__)
+read_replica_blueprint(business_intelligence_bp)
 
 # Business Metrics Endpoints
 @business_intelligence_bp.route('/metrics', methods=['GET'])
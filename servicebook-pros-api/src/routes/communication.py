@@ -7,13 +7,19 @@ from flask import Blueprint, request, jsonify
 from src.models.user import db
 from src.models.communication import (
     MessageTemplate, CommunicationLog, CustomerQuestion, 
-    NotificationSettings, AutomatedMessage,
+    NotificationSettings, AutomatedMessage, Campaign,
     CommunicationType, CommunicationStatus, CommunicationPriority
 )
 from src.models.customer import Customer
 from src.models.job import Job
 from src.models.technician import Technician
-from datetime import datetime, timedelta
+from src.routes.auth import token_required
+from src.utils.replica import read_replica
+from src.utils.communication_service import queue_message
+from src.utils.campaigns import AUDIENCES, queue_campaign, campaign_progress, cancel_campaign
+from src.utils.rollups import communication_summary
+from src.utils.templating import TemplateError, validate_template
+from datetime import date, datetime, timedelta
 import json
 
 communication_bp = Blueprint('communication', __name__)
@@ -49,6 +55,8 @@ def create_template():
     """Create a new message template"""
     try:
         data = request.get_json()
+        validate_template(data.get('subject'))
+        validate_template(data['message_body'])
         
         template = MessageTemplate(
             company_id=data.get('company_id', 1),
@@ -71,6 +79,8 @@ def create_template():
             'template': template.to_dict()
         }), 201
         
+    except TemplateError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -81,6 +91,8 @@ def update_template(template_id):
     try:
         template = MessageTemplate.query.get_or_404(template_id)
         data = request.get_json()
+        validate_template(data.get('subject'))
+        validate_template(data.get('message_body'))
         
         template.name = data.get('name', template.name)
         template.description = data.get('description', template.description)
@@ -100,6 +112,9 @@ def update_template(template_id):
             'template': template.to_dict()
         }), 200
         
+    except TemplateError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -144,6 +159,13 @@ def send_message():
     try:
         data = request.get_json()
         
+        if data.get('send_immediately', True):
+            scheduled_send_time = datetime.utcnow()
+        elif data.get('scheduled_send_time'):
+            scheduled_send_time = datetime.fromisoformat(data['scheduled_send_time'])
+        else:
+            scheduled_send_time = None
+        
         # Create communication log entry
         comm_log = CommunicationLog(
             company_id=data.get('company_id', 1),
@@ -159,11 +181,25 @@ def send_message():
             job_id=data.get('job_id'),
             template_id=data.get('template_id'),
             sent_by_user_id=data.get('sent_by_user_id'),
-            scheduled_send_time=datetime.utcnow() if data.get('send_immediately', True) else None
+            scheduled_send_time=scheduled_send_time
         )
         
-        # In a real implementation, this would integrate with Twilio/SendGrid
-        # For demo purposes, we'll mark as sent immediately
+        # SMS and email go through the outbox: queued with the log entry in
+        # this transaction and delivered by the outbox worker
+        if comm_log.communication_type == CommunicationType.SMS and not comm_log.recipient_phone:
+            return jsonify({'success': False, 'error': 'recipient_phone is required for SMS'}), 400
+        if comm_log.communication_type == CommunicationType.EMAIL and not comm_log.recipient_email:
+            return jsonify({'success': False, 'error': 'recipient_email is required for email'}), 400
+        if comm_log.communication_type in (CommunicationType.SMS, CommunicationType.EMAIL):
+            queue_message(comm_log)
+            db.session.commit()
+            return jsonify({
+                'success': True,
+                'message': 'Message queued for delivery',
+                'communication_log': comm_log.to_dict()
+            }), 202
+        
+        # Other channels have no provider yet and are marked as sent
         comm_log.status = CommunicationStatus.SENT
         comm_log.sent_at = datetime.utcnow()
         comm_log.external_message_id = f"demo_{datetime.utcnow().timestamp()}"
@@ -322,6 +358,7 @@ def update_notification_settings():
         settings.send_completion_notifications = data.get('send_completion_notifications', settings.send_completion_notifications)
         settings.send_invoice_notifications = data.get('send_invoice_notifications', settings.send_invoice_notifications)
         settings.reminder_hours_before = data.get('reminder_hours_before', settings.reminder_hours_before)
+        settings.reminder_tick_minutes = data.get('reminder_tick_minutes', settings.reminder_tick_minutes)
         settings.updated_at = datetime.utcnow()
         
         # Handle sensitive data (in real implementation, encrypt these)
@@ -341,65 +378,37 @@ def update_notification_settings():
 
 # Analytics
 @communication_bp.route('/analytics', methods=['GET'])
+@read_replica
 def get_communication_analytics():
-    """Get communication analytics"""
+    """Get communication analytics.
+
+    Sums the daily rollups, so any range costs a few rows: pass ``start``
+    and ``end`` (YYYY-MM-DD, inclusive) or ``days`` back from today.
+    """
     try:
-        company_id = request.args.get('company_id', 1)
-        days = int(request.args.get('days', 30))
-        
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Total messages sent
-        total_messages = CommunicationLog.query.filter(
-            CommunicationLog.company_id == company_id,
-            CommunicationLog.created_at >= start_date
-        ).count()
-        
-        # Messages by type
-        sms_count = CommunicationLog.query.filter(
-            CommunicationLog.company_id == company_id,
-            CommunicationLog.communication_type == CommunicationType.SMS,
-            CommunicationLog.created_at >= start_date
-        ).count()
-        
-        email_count = CommunicationLog.query.filter(
-            CommunicationLog.company_id == company_id,
-            CommunicationLog.communication_type == CommunicationType.EMAIL,
-            CommunicationLog.created_at >= start_date
-        ).count()
-        
-        # Success rate
-        successful_messages = CommunicationLog.query.filter(
-            CommunicationLog.company_id == company_id,
-            CommunicationLog.status.in_([CommunicationStatus.SENT, CommunicationStatus.DELIVERED]),
-            CommunicationLog.created_at >= start_date
-        ).count()
-        
-        success_rate = (successful_messages / total_messages * 100) if total_messages > 0 else 0
-        
-        # Pending questions
-        pending_questions = CustomerQuestion.query.filter(
-            CustomerQuestion.company_id == company_id,
-            CustomerQuestion.status == 'pending'
-        ).count()
-        
-        urgent_questions = CustomerQuestion.query.filter(
-            CustomerQuestion.company_id == company_id,
-            CustomerQuestion.is_urgent == True,
-            CustomerQuestion.status == 'pending'
-        ).count()
+        company_id = request.args.get('company_id', 1, type=int)
+        days = max(int(request.args.get('days', 30)), 1)
+        
+        try:
+            end_date = date.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow().date()
+            if request.args.get('start'):
+                start_date = date.fromisoformat(request.args['start'])
+            else:
+                # The range is inclusive, so ``days`` days end with end_date
+                start_date = end_date - timedelta(days=days - 1)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'start and end must be YYYY-MM-DD dates'}), 400
+        
+        analytics = communication_summary(company_id, start_date, end_date)
+        analytics.update({
+            'period_days': (end_date - start_date).days + 1,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        })
         
         return jsonify({
             'success': True,
-            'analytics': {
-                'total_messages': total_messages,
-                'sms_count': sms_count,
-                'email_count': email_count,
-                'success_rate': round(success_rate, 2),
-                'pending_questions': pending_questions,
-                'urgent_questions': urgent_questions,
-                'period_days': days
-            }
+            'analytics': analytics
         }), 200
         
     except Exception as e:
@@ -449,3 +458,129 @@ def create_automated_message():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Campaigns (bulk sends)
+def _campaign_dict(campaign):
+    result = campaign.to_dict()
+    result['progress'] = campaign_progress(campaign)
+    return result
+
+@communication_bp.route('/campaigns', methods=['POST'])
+@token_required
+def create_campaign(current_user):
+    """Send a template to every customer in an audience in one request"""
+    try:
+        data = request.get_json() or {}
+        
+        audience = data.get('audience')
+        if audience not in AUDIENCES:
+            return jsonify({
+                'success': False,
+                'error': f"audience must be one of: {', '.join(sorted(AUDIENCES))}"
+            }), 400
+        
+        if data.get('template_id'):
+            template = MessageTemplate.query.filter_by(
+                id=data['template_id'], company_id=current_user.company_id
+            ).first()
+            if not template:
+                return jsonify({'success': False, 'error': 'Template not found'}), 404
+            communication_type = template.communication_type
+            subject, message_body = template.subject, template.message_body
+        else:
+            communication_type = CommunicationType(data.get('communication_type', 'sms'))
+            subject, message_body = data.get('subject'), data.get('message_body')
+            if not message_body:
+                return jsonify({'success': False, 'error': 'template_id or message_body is required'}), 400
+        # Raises TemplateError (a ValueError, so 400) on an unknown filter
+        validate_template(subject)
+        validate_template(message_body)
+        
+        if communication_type not in (CommunicationType.SMS, CommunicationType.EMAIL):
+            return jsonify({'success': False, 'error': 'Campaigns send SMS or email only'}), 400
+        
+        settings = NotificationSettings.query.filter_by(company_id=current_user.company_id).first()
+        if settings and not (settings.sms_enabled if communication_type == CommunicationType.SMS else settings.email_enabled):
+            return jsonify({'success': False, 'error': f'{communication_type.value} is not enabled for this company'}), 400
+        
+        campaign = Campaign(
+            company_id=current_user.company_id,
+            name=data.get('name') or f"{audience} {datetime.utcnow():%Y-%m-%d %H:%M}",
+            template_id=data.get('template_id'),
+            communication_type=communication_type,
+            subject=subject,
+            message_body=message_body,
+            audience=audience,
+            audience_params=json.dumps(data.get('audience_params', {})),
+            rate_per_minute=data.get('rate_per_minute'),
+            send_at=datetime.fromisoformat(data['send_at']) if data.get('send_at') else None,
+            total_recipients=0,
+            queued_count=0,
+            skipped_count=0,
+            created_by_user_id=current_user.id
+        )
+        db.session.add(campaign)
+        db.session.commit()
+        
+        queue_campaign(campaign)
+        if campaign.status == 'failed':
+            return jsonify({'success': False, 'error': campaign.error_message, 'campaign': _campaign_dict(campaign)}), 500
+        
+        return jsonify({
+            'success': True,
+            'campaign': _campaign_dict(campaign)
+        }), 202
+        
+    except (KeyError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@communication_bp.route('/campaigns', methods=['GET'])
+@token_required
+def get_campaigns(current_user):
+    """Recent campaigns with their progress"""
+    try:
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        campaigns = Campaign.query.filter_by(company_id=current_user.company_id) \
+            .order_by(Campaign.created_at.desc()).limit(limit).all()
+        
+        return jsonify({
+            'success': True,
+            'campaigns': [_campaign_dict(campaign) for campaign in campaigns]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@communication_bp.route('/campaigns/<int:campaign_id>', methods=['GET'])
+@token_required
+def get_campaign(current_user, campaign_id):
+    """One campaign with its progress"""
+    campaign = Campaign.query.filter_by(id=campaign_id, company_id=current_user.company_id).first()
+    if not campaign:
+        return jsonify({'success': False, 'error': 'Campaign not found'}), 404
+    
+    return jsonify({'success': True, 'campaign': _campaign_dict(campaign)}), 200
+
+@communication_bp.route('/campaigns/<int:campaign_id>/cancel', methods=['POST'])
+@token_required
+def cancel_campaign_route(current_user, campaign_id):
+    """Stop the messages of a campaign that have not been sent yet"""
+    try:
+        campaign = Campaign.query.filter_by(id=campaign_id, company_id=current_user.company_id).first()
+        if not campaign:
+            return jsonify({'success': False, 'error': 'Campaign not found'}), 404
+        
+        cancelled = cancel_campaign(campaign)
+        
+        return jsonify({
+            'success': True,
+            'cancelled': cancelled,
+            'campaign': _campaign_dict(campaign)
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from src.models.user import db
 from src.models.customer import Customer, CustomerContact, CustomerHistory
 from src.routes.auth import token_required
+from src.utils.serializer import FieldSelectionError, project, requested_fields, serialize_many
 from datetime import datetime
 import json
 
@@ -43,6 +44,10 @@ def get_customers(current_user):
         # Order by last name, first name
         query = query.order_by(Customer.last_name, Customer.first_name)
         
+        # Only select the columns the requested fields or view need
+        fields = requested_fields(Customer)
+        query = project(query, Customer, fields)
+        
         # Paginate
         customers = query.paginate(
             page=page, 
@@ -51,7 +56,7 @@ def get_customers(current_user):
         )
         
         return jsonify({
-            'customers': [customer.to_dict() for customer in customers.items],
+            'customers': serialize_many(customers.items, fields),
             'total': customers.total,
             'pages': customers.pages,
             'current_page': customers.page,
@@ -60,6 +65,8 @@ def get_customers(current_user):
             'has_prev': customers.has_prev
         }), 200
         
+    except FieldSelectionError as e:
+        return jsonify(e.to_dict()), 400
     except Exception as e:
         return jsonify({'message': f'Failed to get customers: {str(e)}'}), 500
 
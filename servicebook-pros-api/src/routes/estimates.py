@@ -2,12 +2,16 @@ from flask import Blueprint, request, jsonify
 from src.models.user import db
 from src.models.estimate import Estimate, EstimateStatus, EstimateLineItem
 from src.models.customer import Customer
+from src.models.sequence import next_document_number
 from src.routes.auth import token_required
+from src.utils.query_budget import query_budget
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime, timedelta
 
 estimates_bp = Blueprint('estimates', __name__)
 
 @estimates_bp.route('/estimates', methods=['GET'])
+@query_budget(5)
 @token_required
 def get_estimates(current_user):
     try:
@@ -19,7 +23,10 @@ def get_estimates(current_user):
         search = request.args.get('search', '')
         
         # Build query
-        query = Estimate.query.filter_by(company_id=current_user.company_id)
+        query = Estimate.query.options(
+            joinedload(Estimate.customer),
+            selectinload(Estimate.line_items)
+        ).filter_by(company_id=current_user.company_id)
         
         # Apply filters
         if status:
@@ -120,8 +127,7 @@ def create_estimate(current_user):
             return jsonify({'message': 'Customer not found'}), 404
         
         # Generate estimate number
-        estimate_count = Estimate.query.filter_by(company_id=current_user.company_id).count()
-        estimate_number = f"EST-{estimate_count + 1:06d}"
+        estimate_number = next_document_number(current_user.company_id, 'estimate', 'EST', Estimate.estimate_number)
         
         # Set validity period (default 30 days)
         validity_days = data.get('validity_days', 30)
@@ -375,8 +381,7 @@ def convert_estimate_to_job(current_user, estimate_id):
         from src.models.job import Job, JobStatus
         
         # Generate job number
-        job_count = Job.query.filter_by(company_id=current_user.company_id).count()
-        job_number = f"JOB-{job_count + 1:06d}"
+        job_number = next_document_number(current_user.company_id, 'job', 'JOB', Job.job_number)
         
         # Create job from estimate
         job = Job(
@@ -5,6 +5,8 @@ from src.models.inventory import (
     InventoryCategory, UnitOfMeasure, StockMovementType
 )
 from src.routes.auth import token_required
+from src.utils.serializer import FieldSelectionError, project, requested_fields, serialize_many
+from src.utils.cache import cached_view
 from datetime import datetime
 from sqlalchemy import func, and_, or_
 
@@ -50,6 +52,10 @@ def get_inventory_items(current_user):
         # Order by name
         query = query.order_by(InventoryItem.name)
         
+        # Only select the columns the requested fields or view need
+        fields = requested_fields(InventoryItem)
+        query = project(query, InventoryItem, fields)
+        
         # Paginate
         items = query.paginate(
             page=page, 
@@ -58,7 +64,7 @@ def get_inventory_items(current_user):
         )
         
         return jsonify({
-            'inventory_items': [item.to_dict() for item in items.items],
+            'inventory_items': serialize_many(items.items, fields),
             'total': items.total,
             'pages': items.pages,
             'current_page': items.page,
@@ -67,6 +73,8 @@ def get_inventory_items(current_user):
             'has_prev': items.has_prev
         }), 200
         
+    except FieldSelectionError as e:
+        return jsonify(e.to_dict()), 400
     except Exception as e:
         return jsonify({'message': f'Failed to get inventory items: {str(e)}'}), 500
 
@@ -352,6 +360,7 @@ def get_stock_movements(current_user):
 
 @inventory_bp.route('/inventory/categories', methods=['GET'])
 @token_required
+@cached_view(ttl=600)
 def get_inventory_categories(current_user):
     try:
         # Get all available categories
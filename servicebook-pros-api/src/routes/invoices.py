@@ -2,12 +2,31 @@ from flask import Blueprint, request, jsonify
 from src.models.user import db
 from src.models.invoice import Invoice, InvoiceStatus, InvoiceLineItem, Payment, PaymentMethod
 from src.models.customer import Customer
+from src.models.sequence import next_document_number
 from src.routes.auth import token_required
+from src.utils.query_budget import query_budget
+from src.utils.serializer import FieldSelectionError, project, requested_fields, serialize_many, wants_field
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime, timedelta
 
 invoices_bp = Blueprint('invoices', __name__)
 
+def _with_invoice_details(query, fields=None):
+    """Eager-load what Invoice.to_dict() and the customer summary touch.
+
+    With a field selection, relations that were not requested are skipped.
+    """
+    options = []
+    if wants_field(fields, 'customer'):
+        options.append(joinedload(Invoice.customer))
+    if wants_field(fields, 'line_items'):
+        options.append(selectinload(Invoice.line_items))
+    if wants_field(fields, 'payments'):
+        options.append(selectinload(Invoice.payments))
+    return query.options(*options)
+
 @invoices_bp.route('/invoices', methods=['GET'])
+@query_budget(6)
 @token_required
 def get_invoices(current_user):
     try:
@@ -19,8 +38,10 @@ def get_invoices(current_user):
         search = request.args.get('search', '')
         overdue_only = request.args.get('overdue', 'false').lower() == 'true'
         
+        fields = requested_fields(Invoice, extra=('customer',))
+        
         # Build query
-        query = Invoice.query.filter_by(company_id=current_user.company_id)
+        query = _with_invoice_details(Invoice.query, fields).filter_by(company_id=current_user.company_id)
         
         # Apply filters
         if status:
@@ -50,6 +71,9 @@ def get_invoices(current_user):
         # Order by invoice date
         query = query.order_by(Invoice.invoice_date.desc())
         
+        # Only select the columns the requested fields or view need
+        query = project(query, Invoice, fields)
+        
         # Paginate
         invoices = query.paginate(
             page=page, 
@@ -58,17 +82,15 @@ def get_invoices(current_user):
         )
         
         # Include customer info in response
-        invoices_data = []
-        for invoice in invoices.items:
-            invoice_data = invoice.to_dict()
-            if invoice.customer:
+        invoices_data = serialize_many(invoices.items, fields)
+        for invoice, invoice_data in zip(invoices.items, invoices_data):
+            if wants_field(fields, 'customer') and invoice.customer:
                 invoice_data['customer'] = {
                     'id': invoice.customer.id,
                     'name': invoice.customer.display_name,
                     'phone': invoice.customer.phone,
                     'email': invoice.customer.email
                 }
-            invoices_data.append(invoice_data)
         
         return jsonify({
             'invoices': invoices_data,
@@ -80,14 +102,17 @@ def get_invoices(current_user):
             'has_prev': invoices.has_prev
         }), 200
         
+    except FieldSelectionError as e:
+        return jsonify(e.to_dict()), 400
     except Exception as e:
         return jsonify({'message': f'Failed to get invoices: {str(e)}'}), 500
 
 @invoices_bp.route('/invoices/<int:invoice_id>', methods=['GET'])
+@query_budget(5)
 @token_required
 def get_invoice(current_user, invoice_id):
     try:
-        invoice = Invoice.query.filter_by(
+        invoice = _with_invoice_details(Invoice.query).filter_by(
             id=invoice_id, 
             company_id=current_user.company_id
         ).first()
@@ -127,8 +152,7 @@ def create_invoice(current_user):
             return jsonify({'message': 'Customer not found'}), 404
         
         # Generate invoice number
-        invoice_count = Invoice.query.filter_by(company_id=current_user.company_id).count()
-        invoice_number = f"INV-{invoice_count + 1:06d}"
+        invoice_number = next_document_number(current_user.company_id, 'invoice', 'INV', Invoice.invoice_number)
         
         # Set due date based on payment terms
         payment_terms = data.get('payment_terms', 'Net 30')
@@ -387,10 +411,11 @@ def send_invoice(current_user, invoice_id):
         return jsonify({'message': f'Failed to send invoice: {str(e)}'}), 500
 
 @invoices_bp.route('/invoices/overdue', methods=['GET'])
+@query_budget(5)
 @token_required
 def get_overdue_invoices(current_user):
     try:
-        overdue_invoices = Invoice.query.filter(
+        overdue_invoices = _with_invoice_details(Invoice.query).filter(
             Invoice.company_id == current_user.company_id,
             Invoice.due_date < datetime.utcnow(),
             Invoice.balance_due > 0
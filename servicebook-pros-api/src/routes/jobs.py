@@ -2,13 +2,24 @@ from flask import Blueprint, request, jsonify
 from src.models.user import db
 from src.models.job import Job, JobStatus, JobPriority, JobNote, JobTimeEntry
 from src.models.customer import Customer
+from src.models.sequence import next_document_number
 from src.routes.auth import token_required
+from src.utils.query_budget import query_budget
+from src.utils.serializer import FieldSelectionError, project, requested_fields, serialize_many, wants_field
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime, time
 import json
 
 jobs_bp = Blueprint('jobs', __name__)
 
+def _customer_summary(relationship):
+    """Joined load of just the customer columns the list summary shows"""
+    return joinedload(relationship).load_only(
+        Customer.first_name, Customer.last_name, Customer.phone, Customer.email
+    )
+
 @jobs_bp.route('/jobs', methods=['GET'])
+@query_budget(5)
 @token_required
 def get_jobs(current_user):
     try:
@@ -21,8 +32,12 @@ def get_jobs(current_user):
         date_to = request.args.get('date_to', '')
         search = request.args.get('search', '')
         
-        # Build query
+        fields = requested_fields(Job, extra=('customer',))
+        
+        # Build query; customers are serialized per row, so load them up front
         query = Job.query.filter_by(company_id=current_user.company_id)
+        if wants_field(fields, 'customer'):
+            query = query.options(_customer_summary(Job.customer))
         
         # Apply filters
         if status:
@@ -54,6 +69,9 @@ def get_jobs(current_user):
         # Order by scheduled date
         query = query.order_by(Job.scheduled_date.desc())
         
+        # Only select the columns the requested fields or view need
+        query = project(query, Job, fields)
+        
         # Paginate
         jobs = query.paginate(
             page=page, 
@@ -62,17 +80,15 @@ def get_jobs(current_user):
         )
         
         # Include customer info in response
-        jobs_data = []
-        for job in jobs.items:
-            job_data = job.to_dict()
-            if job.customer:
+        jobs_data = serialize_many(jobs.items, fields)
+        for job, job_data in zip(jobs.items, jobs_data):
+            if wants_field(fields, 'customer') and job.customer:
                 job_data['customer'] = {
                     'id': job.customer.id,
                     'name': job.customer.display_name,
                     'phone': job.customer.phone,
                     'email': job.customer.email
                 }
-            jobs_data.append(job_data)
         
         return jsonify({
             'jobs': jobs_data,
@@ -84,14 +100,22 @@ def get_jobs(current_user):
             'has_prev': jobs.has_prev
         }), 200
         
+    except FieldSelectionError as e:
+        return jsonify(e.to_dict()), 400
     except Exception as e:
         return jsonify({'message': f'Failed to get jobs: {str(e)}'}), 500
 
 @jobs_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@query_budget(5)
 @token_required
 def get_job(current_user, job_id):
     try:
-        job = Job.query.filter_by(
+        job = Job.query.options(
+            joinedload(Job.customer),
+            joinedload(Job.assigned_technician),
+            selectinload(Job.notes),
+            selectinload(Job.time_entries)
+        ).filter_by(
             id=job_id, 
             company_id=current_user.company_id
         ).first()
@@ -144,8 +168,7 @@ def create_job(current_user):
             return jsonify({'message': 'Customer not found'}), 404
         
         # Generate job number
-        job_count = Job.query.filter_by(company_id=current_user.company_id).count()
-        job_number = f"JOB-{job_count + 1:06d}"
+        job_number = next_document_number(current_user.company_id, 'job', 'JOB', Job.job_number)
         
         # Parse scheduled date and times
         scheduled_date = None
@@ -416,7 +439,10 @@ def get_jobs_calendar(current_user):
         start_date = request.args.get('start', '')
         end_date = request.args.get('end', '')
         
-        query = Job.query.filter_by(company_id=current_user.company_id)
+        query = Job.query.options(
+            joinedload(Job.customer),
+            joinedload(Job.assigned_technician)
+        ).filter_by(company_id=current_user.company_id)
         
         if start_date:
             start_date_obj = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
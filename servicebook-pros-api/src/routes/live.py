@@ -0,0 +1,110 @@
+import os
+import time
+
+import jwt
+from flask import Blueprint, Response, current_app, jsonify, request
+
+from src.models.user import User, db
+from src.models.technician import Technician
+from src.utils.live import bus
+
+live_bp = Blueprint('live', __name__)
+
+def _stream_user():
+    """The token's user; EventSource cannot set headers, so the token may
+    also come as ?access_token="""
+    auth_header = request.headers.get('Authorization', '')
+    token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else request.args.get('access_token')
+    if not token:
+        return None
+    try:
+        data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        return None
+    return db.session.get(User, data.get('user_id'))
+
+def _last_event_id():
+    # The browser sends the header on reconnect; ?last_event_id= lets a
+    # client resume a stream it opened itself
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+def _filter(technician, types):
+    """Event test for a stream; ``technician`` is (technicians.id, users.id) or None"""
+    def accepts(live_event):
+        if types and live_event.type not in types and live_event.type.split('.', 1)[0] not in types:
+            return False
+        if technician is not None:
+            technician_id, user_id = technician
+            return technician_id in live_event.technician_ids or (
+                user_id is not None and user_id in live_event.user_ids
+            )
+        return True
+    return accepts
+
+def _events(subscription, backlog, heartbeat, max_seconds, retry_ms):
+    yield f'retry: {retry_ms}\n\n'
+    for live_event in backlog:
+        yield live_event.sse()
+    # Streams end after max_seconds (and when the reader falls too far
+    # behind); the browser reconnects with Last-Event-ID and resumes
+    deadline = time.monotonic() + max_seconds
+    while not subscription.closed and time.monotonic() < deadline:
+        live_event = subscription.get(timeout=heartbeat)
+        yield live_event.sse() if live_event else ': keepalive\n\n'
+
+@live_bp.route('/stream', methods=['GET'])
+def stream():
+    """Server-sent events of the company's job, clock-in, material request
+    and message changes.
+
+    ?technician_id= limits the stream to one technician's jobs, time entries,
+    requests and messages; ?types=job,technician.clocked_in limits it to
+    event types or their prefixes.
+    """
+    current_user = _stream_user()
+    if current_user is None:
+        return jsonify({'message': 'Token is missing or invalid'}), 401
+
+    technician = None
+    technician_id = request.args.get('technician_id', type=int)
+    if technician_id is not None:
+        technician = db.session.query(Technician.id, Technician.user_id).filter_by(
+            id=technician_id, company_id=current_user.company_id
+        ).first()
+        if technician is None:
+            return jsonify({'message': 'Technician not found'}), 404
+        technician = tuple(technician)
+
+    types = {name.strip() for name in request.args.get('types', '').split(',') if name.strip()}
+    subscription, backlog = bus.subscribe(
+        current_user.company_id, _filter(technician, types), _last_event_id()
+    )
+    # The stream holds no database connection while it waits for events
+    db.session.remove()
+    if subscription is None:
+        # Every stream thread of this worker is taken. EventSource does not
+        # retry a refused stream, so the client polls until it reconnects.
+        response = jsonify({'message': 'Too many live streams; poll instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
+    response = Response(
+        _events(
+            subscription, backlog,
+            heartbeat=float(os.environ.get('LIVE_HEARTBEAT_SECONDS', 15)),
+            max_seconds=float(os.environ.get('LIVE_MAX_STREAM_SECONDS', 300)),
+            retry_ms=int(os.environ.get('LIVE_RETRY_MS', 3000)),
+        ),
+        mimetype='text/event-stream'
+    )
+    # Runs whether the stream ended, the client went away or it never started
+    response.call_on_close(lambda: bus.unsubscribe(subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    # Let nginx pass events through as they are written
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -5,6 +5,8 @@ from src.models.pricing import (
     PricingHistory, ServiceCategory, PricingTier
 )
 from src.routes.auth import token_required
+from src.utils.serializer import FieldSelectionError, project, requested_fields, serialize_many
+from src.utils.cache import cache, cached_view
 from datetime import datetime
 import json
 
@@ -45,6 +47,10 @@ def get_pricing_items(current_user):
         # Order by category and title
         query = query.order_by(FlatRatePricingItem.category, FlatRatePricingItem.title)
         
+        # Only select the columns the requested fields or view need
+        fields = requested_fields(FlatRatePricingItem)
+        query = project(query, FlatRatePricingItem, fields)
+        
         # Paginate
         items = query.paginate(
             page=page, 
@@ -53,7 +59,7 @@ def get_pricing_items(current_user):
         )
         
         return jsonify({
-            'pricing_items': [item.to_dict() for item in items.items],
+            'pricing_items': serialize_many(items.items, fields),
             'total': items.total,
             'pages': items.pages,
             'current_page': items.page,
@@ -62,6 +68,8 @@ def get_pricing_items(current_user):
             'has_prev': items.has_prev
         }), 200
         
+    except FieldSelectionError as e:
+        return jsonify(e.to_dict()), 400
     except Exception as e:
         return jsonify({'message': f'Failed to get pricing items: {str(e)}'}), 500
 
@@ -332,6 +340,7 @@ def update_all_pricing_for_labor_rate(company_id, old_rate, new_rate, user_id):
 
 @pricing_bp.route('/pricing/categories', methods=['GET'])
 @token_required
+@cached_view(ttl=600)
 def get_pricing_categories(current_user):
     try:
         # Get all available categories
@@ -366,6 +375,12 @@ def get_pricing_categories(current_user):
     except Exception as e:
         return jsonify({'message': f'Failed to get categories: {str(e)}'}), 500
 
+@cache.memoize(ttl=600, tags=('company_pricing_settings',))
+def senior_discount_percentage(company_id):
+    """Senior discount of a company's pricing settings (0 without settings)"""
+    settings = CompanyPricingSettings.query.filter_by(company_id=company_id).first()
+    return settings.senior_discount_percentage if settings else 0
+
 def get_category_description(category):
     """Get description for service category"""
     descriptions = {
@@ -475,9 +490,7 @@ def calculate_pricing(current_user):
         discount_amount = 0
         
         if discounts.get('senior', False):
-            settings = CompanyPricingSettings.query.filter_by(company_id=current_user.company_id).first()
-            if settings:
-                discount_amount += subtotal * (settings.senior_discount_percentage / 100)
+            discount_amount += subtotal * (senior_discount_percentage(current_user.company_id) / 100)
         
         # Calculate final total
         total = subtotal - discount_amount
@@ -5,6 +5,7 @@ from src.models.technician import (
     TechnicianSkillLevel, TechnicianStatus, ScheduleStatus
 )
 from src.routes.auth import token_required
+from src.utils.serializer import FieldSelectionError, project, requested_fields, serialize_many
 from datetime import datetime, date, time, timedelta
 from sqlalchemy import func, and_, or_
 import json
@@ -50,6 +51,10 @@ def get_technicians(current_user):
         # Order by name
         query = query.order_by(Technician.first_name, Technician.last_name)
         
+        # Only select the columns the requested fields or view need
+        fields = requested_fields(Technician)
+        query = project(query, Technician, fields)
+        
         # Paginate
         technicians = query.paginate(
             page=page, 
@@ -58,7 +63,7 @@ def get_technicians(current_user):
         )
         
         return jsonify({
-            'technicians': [tech.to_dict() for tech in technicians.items],
+            'technicians': serialize_many(technicians.items, fields),
             'total': technicians.total,
             'pages': technicians.pages,
             'current_page': technicians.page,
@@ -67,6 +72,8 @@ def get_technicians(current_user):
             'has_prev': technicians.has_prev
         }), 200
         
+    except FieldSelectionError as e:
+        return jsonify(e.to_dict()), 400
     except Exception as e:
         return jsonify({'message': f'Failed to get technicians: {str(e)}'}), 500
 
@@ -0,0 +1,406 @@
+"""
+Smart automation engine for ServiceBook Pros
+Matches committed domain events (src/utils/domain_events.py) against compiled
+SmartAutomation triggers indexed by (company, event type) and runs the
+matching automations' actions on a bounded worker pool
+
+A trigger is stored in ``trigger_conditions``:
+
+    {"event": "job.status_changed", "when": {"to": "completed"}}
+    {"event": "invoice.overdue", "when": {"balance_due": {"gte": 500}}}
+
+and ``actions`` is a list of steps such as
+``{"type": "send_sms", "body": "Hi {{customer_first_name}}, ..."}``.
+"""
+
+import logging
+import operator
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, or_, select, update
+
+from src.models.user import db
+from src.models.ai_features import SmartAutomation
+from src.models.communication import CommunicationLog, CommunicationStatus, CommunicationType
+from src.models.company import Company
+from src.models.customer import Customer
+from src.models.invoice import Invoice, InvoiceStatus
+from src.utils import domain_events
+from src.utils.communication_service import queue_message
+from src.utils.domain_events import DomainEvent
+from src.utils.templating import render, validate_template
+
+logger = logging.getLogger(__name__)
+
+# Domain events ----------------------------------------------------------
+
+# The events a trigger may name; see src/utils/domain_events.py
+EVENT_TYPES = ('job.status_changed', 'invoice.overdue', 'estimate.viewed')
+
+def _publish_events(events: List[DomainEvent]):
+    for domain_event in events:
+        if domain_event.type == 'automation.changed':
+            engine.rules.invalidate(domain_event.company_id)
+    for domain_event in events:
+        if domain_event.type in EVENT_TYPES:
+            engine.publish(domain_event.type, dict(domain_event.data, company_id=domain_event.company_id))
+
+# Triggers ---------------------------------------------------------------
+
+OPERATORS = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'in': lambda value, options: value in options,
+}
+
+class CompiledRule:
+    """A SmartAutomation's trigger as a list of (field, test, expected)"""
+
+    __slots__ = ('id', 'company_id', 'event_type', 'priority', 'checks')
+
+    def __init__(self, automation_id: int, company_id: int, event_type: str, checks, priority: int = 5):
+        self.id = automation_id
+        self.company_id = company_id
+        self.event_type = event_type
+        self.checks = checks
+        self.priority = priority
+
+    def matches(self, payload: Dict) -> bool:
+        for field, test, expected in self.checks:
+            value = payload.get(field)
+            try:
+                if value is None or not test(value, expected):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+def compile_trigger(trigger_conditions: Optional[Dict]) -> Tuple[str, List]:
+    """(event type, checks) of a trigger; ValueError when it is malformed"""
+    conditions = trigger_conditions or {}
+    event_type = conditions.get('event')
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"trigger_conditions.event must be one of {', '.join(EVENT_TYPES)}")
+    checks = []
+    for field, expected in (conditions.get('when') or {}).items():
+        if isinstance(expected, dict):
+            for name, argument in expected.items():
+                if name not in OPERATORS:
+                    raise ValueError(f'Unknown condition operator: {name}')
+                checks.append((field, OPERATORS[name], argument))
+        elif isinstance(expected, list):
+            checks.append((field, OPERATORS['in'], expected))
+        else:
+            checks.append((field, operator.eq, expected))
+    return event_type, checks
+
+class RuleIndex:
+    """Active event-based automations, compiled per company and indexed by
+    event type so an event only evaluates its own company's rules.
+
+    A company's rules are loaded on its first event, reloaded after ``ttl``
+    seconds, and right after a local commit that changed one of them.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        # company_id -> (loaded at, event type -> rules)
+        self._companies: Dict[int, Tuple[float, Dict[str, List[CompiledRule]]]] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, company_id: Optional[int] = None):
+        """Drop one company's rules, or every company's"""
+        with self._lock:
+            if company_id is None:
+                self._companies.clear()
+            else:
+                self._companies.pop(company_id, None)
+
+    def load(self, company_id: int) -> Dict[str, List[CompiledRule]]:
+        rules = defaultdict(list)
+        # Its own connection: events are published from after_commit, where
+        # the session cannot run queries
+        with db.engine.connect() as connection:
+            automations = connection.execute(select(
+                SmartAutomation.id, SmartAutomation.trigger_conditions, SmartAutomation.priority
+            ).where(
+                SmartAutomation.company_id == company_id,
+                SmartAutomation.is_active == True,
+                SmartAutomation.trigger_type == 'event_based'
+            )).all()
+        for automation in automations:
+            try:
+                event_type, checks = compile_trigger(automation.trigger_conditions)
+            except ValueError as e:
+                logger.warning('Automation %s has an invalid trigger: %s', automation.id, e)
+                continue
+            rules[event_type].append(CompiledRule(automation.id, company_id, event_type, checks, automation.priority or 5))
+        for bucket in rules.values():
+            bucket.sort(key=lambda rule: -rule.priority)
+        rules = dict(rules)
+        with self._lock:
+            self._companies[company_id] = (time.monotonic(), rules)
+        return rules
+
+    def rules_for(self, company_id: int, event_type: str) -> List[CompiledRule]:
+        entry = self._companies.get(company_id)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            rules = self.load(company_id)
+        else:
+            rules = entry[1]
+        return rules.get(event_type, [])
+
+# Actions ----------------------------------------------------------------
+
+# type -> function(step, context) run inside an app context
+ACTIONS: Dict[str, Callable[[Dict, Dict], None]] = {}
+
+def action(name: str):
+    """Register an automation step type"""
+    def decorator(f):
+        ACTIONS[name] = f
+        return f
+    return decorator
+
+def _context(payload: Dict) -> Dict:
+    """Template variables for an event: the payload plus customer and company"""
+    context = dict(payload)
+    customer = db.session.get(Customer, payload['customer_id']) if payload.get('customer_id') else None
+    if customer:
+        context.update({
+            'customer_name': f"{customer.first_name} {customer.last_name}",
+            'customer_first_name': customer.first_name,
+            'customer_last_name': customer.last_name,
+            'customer_phone': customer.mobile or customer.phone,
+            'customer_email': customer.email,
+        })
+    company = db.session.get(Company, payload['company_id'])
+    if company:
+        context.update({'company_name': company.name, 'company_phone': company.phone})
+    return context
+
+def _queue(step: Dict, context: Dict, communication_type: CommunicationType, recipient: Optional[str]):
+    if not recipient:
+        raise ValueError(f'Customer has no {communication_type.value} contact')
+    is_sms = communication_type == CommunicationType.SMS
+    comm_log = CommunicationLog(
+        company_id=context['company_id'],
+        customer_id=context.get('customer_id'),
+        job_id=context.get('job_id'),
+        estimate_id=context.get('estimate_id'),
+        invoice_id=context.get('invoice_id'),
+        communication_type=communication_type,
+        recipient_phone=recipient if is_sms else None,
+        recipient_email=None if is_sms else recipient,
+        recipient_name=context.get('customer_name'),
+        subject=None if is_sms else render(step.get('subject'), context),
+        message_body=render(step.get('body'), context),
+        status=CommunicationStatus.PENDING
+    )
+    db.session.add(comm_log)
+    queue_message(comm_log)
+    db.session.commit()
+
+@action('send_sms')
+def send_sms(step, context):
+    _queue(step, context, CommunicationType.SMS, context.get('customer_phone'))
+
+@action('send_email')
+def send_email(step, context):
+    _queue(step, context, CommunicationType.EMAIL, context.get('customer_email'))
+
+@action('log')
+def log_event(step, context):
+    logger.info('Automation: %s', render(step.get('message', '{{event}}'), context))
+
+def validate_actions(actions) -> None:
+    """ValueError unless ``actions`` is a non-empty list of known steps"""
+    if not isinstance(actions, list) or not actions:
+        raise ValueError('actions must be a non-empty list')
+    for step in actions:
+        if not isinstance(step, dict) or step.get('type') not in ACTIONS:
+            raise ValueError(f"Each action needs a type: {', '.join(sorted(ACTIONS))}")
+        for field in ('subject', 'body', 'message'):
+            validate_template(step.get(field))
+
+# Engine -----------------------------------------------------------------
+
+class AutomationEngine:
+    """Matches committed domain events and runs automations in the background.
+
+    At most ``workers`` automations run at once and ``max_pending`` wait;
+    events beyond that are dropped with a warning rather than queued
+    without bound. Each run claims one of the automation's
+    ``max_executions_per_day`` with a conditional UPDATE, so the cap holds
+    across processes, and writes its outcome back to the automation.
+    """
+
+    def __init__(self):
+        self.rules = RuleIndex()
+        self.app = None
+        self.workers = 4
+        self.max_pending = 1000
+        self.enabled = True
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self.dropped = 0
+
+    def configure(self, app, workers: int = 4, max_pending: int = 1000, rules_ttl: float = 60.0,
+                  enabled: bool = True):
+        self.app = app
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rules.ttl = rules_ttl
+        self.enabled = enabled
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # One pool per process, created in forked workers on first use
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='automation')
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def shutdown(self, wait: bool = True):
+        """Stop the pool, by default after the running and waiting automations finish"""
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+    def match(self, event_type: str, payload: Dict) -> List[CompiledRule]:
+        return [rule for rule in self.rules.rules_for(payload.get('company_id'), event_type) if rule.matches(payload)]
+
+    def publish(self, event_type: str, payload: Dict):
+        """Run the automations matching a committed event"""
+        if not self.enabled:
+            return
+        try:
+            matched = self.match(event_type, payload)
+        except Exception:
+            logger.exception('Matching %s failed', event_type)
+            return
+        for rule in matched:
+            if not self._slots.acquire(blocking=False):
+                self.dropped += 1
+                logger.warning('Automation queue full; dropped automation %s for %s', rule.id, event_type)
+                continue
+            self._executor().submit(self._run, rule.id, event_type, dict(payload, event=event_type))
+
+    def _run(self, automation_id: int, event_type: str, payload: Dict):
+        try:
+            with self.app.app_context():
+                self.execute(automation_id, payload)
+        except Exception:
+            logger.exception('Automation %s failed', automation_id)
+        finally:
+            self._slots.release()
+
+    def _claim(self, automation_id: int) -> bool:
+        """Count one execution against today's cap; False when it is used up"""
+        today = datetime.utcnow().date()
+        result = db.session.execute(
+            update(SmartAutomation)
+            .where(
+                SmartAutomation.id == automation_id,
+                SmartAutomation.is_active == True,
+                or_(
+                    SmartAutomation.executions_day.is_(None),
+                    SmartAutomation.executions_day != today,
+                    SmartAutomation.max_executions_per_day.is_(None),
+                    func.coalesce(SmartAutomation.executions_today, 0) < SmartAutomation.max_executions_per_day
+                )
+            )
+            .values(
+                executions_today=case(
+                    (SmartAutomation.executions_day == today, func.coalesce(SmartAutomation.executions_today, 0) + 1),
+                    else_=1
+                ),
+                executions_day=today,
+                updated_at=SmartAutomation.updated_at
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _record(self, automation_id: int, error: Optional[str]):
+        count = func.coalesce(SmartAutomation.execution_count, 0)
+        rate = func.coalesce(SmartAutomation.success_rate, 0.0)
+        db.session.execute(
+            update(SmartAutomation)
+            .where(SmartAutomation.id == automation_id)
+            .values(
+                execution_count=count + 1,
+                # Running mean of successes, from the pre-update values
+                success_rate=(rate * count + (0.0 if error else 1.0)) / (count + 1),
+                last_executed_at=datetime.utcnow(),
+                last_error=error,
+                updated_at=SmartAutomation.updated_at
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+    def execute(self, automation_id: int, payload: Dict) -> bool:
+        """Run one automation's actions for an event; returns whether all succeeded"""
+        if not self._claim(automation_id):
+            logger.info('Automation %s skipped: daily limit reached or inactive', automation_id)
+            return False
+        automation = db.session.get(SmartAutomation, automation_id)
+        context = _context(payload)
+        error = None
+        for step in automation.actions or []:
+            try:
+                ACTIONS[step['type']](step, context)
+            except Exception as e:
+                db.session.rollback()
+                error = f"{step.get('type')}: {e}"[:500]
+                break
+        self._record(automation_id, error)
+        return error is None
+
+engine = AutomationEngine()
+
+def mark_overdue_invoices(batch_size: int = 200) -> int:
+    """Move sent invoices past their due date to overdue, which publishes
+    invoice.overdue for each; returns how many changed"""
+    changed = 0
+    while True:
+        invoices = Invoice.query.filter(
+            Invoice.status.in_([InvoiceStatus.SENT, InvoiceStatus.VIEWED]),
+            Invoice.due_date < datetime.utcnow(),
+            Invoice.balance_due > 0
+        ).order_by(Invoice.id).limit(batch_size).all()
+        if not invoices:
+            return changed
+        for invoice in invoices:
+            invoice.status = InvoiceStatus.OVERDUE
+        db.session.commit()
+        changed += len(invoices)
+
+def init_automations(app):
+    """Run automations for the domain events of db.session commits"""
+    engine.configure(
+        app,
+        workers=int(os.environ.get('AUTOMATION_WORKERS', 4)),
+        max_pending=int(os.environ.get('AUTOMATION_MAX_PENDING', 1000)),
+        rules_ttl=float(os.environ.get('AUTOMATION_RULES_TTL', 60)),
+        enabled=os.environ.get('AUTOMATIONS_ENABLED', 'true').lower() == 'true',
+    )
+    domain_events.on_commit(_publish_events)
+    app.extensions['automations'] = engine
+    return engine
@@ -0,0 +1,407 @@
+"""
+Application cache for ServiceBook Pros
+In-process LRU (default) or Redis (REDIS_URL) backends with single-flight
+loading, tag invalidation on commit and hit/miss/eviction metrics
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Iterable, Optional
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class CacheMetrics:
+    """Counters reported by /api/health/cache"""
+
+    COUNTERS = ('hits', 'misses', 'sets', 'evictions', 'expirations',
+                'invalidations', 'single_flight_waits', 'errors')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        for counter in self.COUNTERS:
+            setattr(self, counter, 0)
+
+    def increment(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def to_dict(self):
+        stats = {counter: getattr(self, counter) for counter in self.COUNTERS}
+        lookups = self.hits + self.misses
+        stats['hit_ratio'] = round(self.hits / lookups, 4) if lookups else 0.0
+        return stats
+
+class MemoryBackend:
+    """LRU dictionary with per-entry expiry, local to the process"""
+
+    name = 'memory'
+
+    def __init__(self, metrics: CacheMetrics, max_entries: int = 10000):
+        self.metrics = metrics
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags: Dict[str, set] = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value, tags = entry
+            if expires_at and expires_at < time.monotonic():
+                self._remove(key)
+                self.metrics.increment('expirations')
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: int, tags: Iterable[str] = ()):
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl if ttl else 0, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.metrics.increment('evictions')
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        removed += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key, (None, None, ()))
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def size(self):
+        return len(self._entries)
+
+class RedisBackend:
+    """Shared cache in Redis; tags are Redis sets of the keys they cover"""
+
+    name = 'redis'
+
+    def __init__(self, metrics: CacheMetrics, url: str, prefix: str):
+        self.metrics = metrics
+        self.client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+        self.prefix = prefix
+
+    def _tag_key(self, tag):
+        return f'{self.prefix}tag:{tag}'
+
+    def get(self, key):
+        data = self.client.get(key)
+        return _MISSING if data is None else pickle.loads(data)
+
+    def set(self, key, value, ttl: int, tags: Iterable[str] = ()):
+        pipeline = self.client.pipeline()
+        pipeline.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=ttl or None)
+        for tag in tags:
+            pipeline.sadd(self._tag_key(tag), key)
+            if ttl:
+                # Tag sets only need to outlive the entries they point at
+                pipeline.expire(self._tag_key(tag), ttl * 2)
+        pipeline.execute()
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            keys = self.client.smembers(tag_key)
+            if keys:
+                removed += self.client.delete(*keys)
+            self.client.delete(tag_key)
+        return removed
+
+    def clear(self):
+        keys = list(self.client.scan_iter(f'{self.prefix}*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def acquire_lock(self, key, timeout: float):
+        return bool(self.client.set(f'{key}:lock', b'1', nx=True, px=int(timeout * 1000)))
+
+    def release_lock(self, key):
+        self.client.delete(f'{key}:lock')
+
+    def size(self):
+        return self.client.dbsize()
+
+class Cache:
+    """Cache facade used by routes and services.
+
+    ``get_or_set`` loads a missing value once per key: concurrent callers in
+    the process wait for the first one (single-flight), and with Redis a
+    short lock keeps other processes from recomputing it at the same time.
+    """
+
+    def __init__(self):
+        self.metrics = CacheMetrics()
+        self.backend = MemoryBackend(self.metrics)
+        self.prefix = 'sbp:'
+        self.default_ttl = 300
+        self.lock_timeout = 10.0
+        self._inflight: Dict[str, threading.Event] = {}
+        self._inflight_lock = threading.Lock()
+
+    def configure(self, redis_url: Optional[str] = None, prefix: str = 'sbp:',
+                  default_ttl: int = 300, max_entries: int = 10000, lock_timeout: float = 10.0):
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        self.lock_timeout = lock_timeout
+        self.backend = MemoryBackend(self.metrics, max_entries=max_entries)
+        if redis_url:
+            if redis is None:
+                logger.warning('REDIS_URL is set but the redis package is not installed; using the in-process cache')
+            else:
+                self.backend = RedisBackend(self.metrics, redis_url, prefix)
+
+    def key(self, *parts) -> str:
+        raw = ':'.join(str(part) for part in parts)
+        if len(raw) > 200:
+            raw = hashlib.sha1(raw.encode()).hexdigest()
+        return f'{self.prefix}{raw}'
+
+    def get(self, key, default=None):
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            self.metrics.increment('errors')
+            logger.exception('Cache read failed')
+            value = _MISSING
+        if value is _MISSING:
+            self.metrics.increment('misses')
+            return default
+        self.metrics.increment('hits')
+        return value
+
+    def set(self, key, value, ttl: Optional[int] = None, tags: Iterable[str] = ()):
+        try:
+            self.backend.set(key, value, self.default_ttl if ttl is None else ttl, tags)
+            self.metrics.increment('sets')
+        except Exception:
+            self.metrics.increment('errors')
+            logger.exception('Cache write failed')
+
+    def delete(self, key):
+        try:
+            self.backend.delete(key)
+        except Exception:
+            self.metrics.increment('errors')
+            logger.exception('Cache delete failed')
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        tags = set(tags)
+        if not tags:
+            return
+        try:
+            removed = self.backend.invalidate_tags(tags)
+            self.metrics.increment('invalidations', removed)
+        except Exception:
+            self.metrics.increment('errors')
+            logger.exception('Cache invalidation failed')
+
+    def get_or_set(self, key, producer: Callable, ttl: Optional[int] = None, tags: Iterable[str] = ()):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._inflight_lock:
+            loading = self._inflight.get(key)
+            if loading is None:
+                self._inflight[key] = threading.Event()
+        if loading is not None:
+            # Another thread is computing this key; wait for its result
+            self.metrics.increment('single_flight_waits')
+            loading.wait(self.lock_timeout)
+            value = self.get(key, _MISSING)
+            return producer() if value is _MISSING else value
+
+        try:
+            return self._load(key, producer, ttl, tags)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key).set()
+
+    def _load(self, key, producer, ttl, tags):
+        acquire = getattr(self.backend, 'acquire_lock', None)
+        locked = False
+        if acquire is not None:
+            try:
+                locked = acquire(key, self.lock_timeout)
+                if not locked:
+                    # Another process holds the lock; give it a moment to fill the key
+                    deadline = time.monotonic() + self.lock_timeout
+                    while time.monotonic() < deadline:
+                        time.sleep(0.05)
+                        value = self.backend.get(key)
+                        if value is not _MISSING:
+                            self.metrics.increment('single_flight_waits')
+                            return value
+            except Exception:
+                self.metrics.increment('errors')
+                logger.exception('Cache lock failed')
+        try:
+            value = producer()
+            self.set(key, value, ttl, tags)
+            return value
+        finally:
+            if locked:
+                try:
+                    self.backend.release_lock(key)
+                except Exception:
+                    self.metrics.increment('errors')
+
+    def memoize(self, ttl: Optional[int] = None, tags: Iterable[str] = ()):
+        """Cache a service function's result per argument list"""
+        def decorator(f):
+            name = f'{f.__module__}.{f.__qualname__}'
+
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                key = self.key('fn', name, repr(args), repr(sorted(kwargs.items())))
+                return self.get_or_set(key, lambda: f(*args, **kwargs), ttl, tags)
+
+            decorated.uncached = f
+            return decorated
+
+        return decorator
+
+    def stats(self) -> Dict:
+        stats = self.metrics.to_dict()
+        stats['backend'] = self.backend.name
+        try:
+            stats['entries'] = self.backend.size()
+        except Exception:
+            stats['entries'] = None
+        return stats
+
+cache = Cache()
+
+def _request_scope_key():
+    """Tenant scope and data versions for the current request, or None"""
+    from src.models.data_version import DataVersion, GLOBAL_SCOPE
+
+    resolver = current_app.extensions.get('http_cache', {}).get('scope')
+    scope = resolver() if resolver else None
+    if scope is None:
+        return None
+    versions = DataVersion.current({scope, GLOBAL_SCOPE})
+    return f'{scope}@{versions[scope]}.{versions[GLOBAL_SCOPE]}'
+
+def cached_view(ttl: Optional[int] = None, tags: Iterable[str] = ()):
+    """Cache a GET view's successful response per URL, tenant and data version.
+
+    Place under the auth decorator. Only for views whose output depends on
+    nothing but the URL and the tenant's data; requests whose tenant cannot
+    be resolved are not cached.
+    """
+    tags = tuple(tags)
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not has_request_context() or request.method != 'GET':
+                return f(*args, **kwargs)
+            scope_key = _request_scope_key()
+            if scope_key is None:
+                return f(*args, **kwargs)
+
+            key = cache.key('view', request.endpoint, request.full_path, scope_key)
+            cached = cache.get(key)
+            if cached is not None:
+                body, status, mimetype = cached
+                return current_app.response_class(body, status=status, mimetype=mimetype)
+
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                cache.set(key, (response.get_data(), response.status_code, response.mimetype), ttl, tags)
+            return response
+
+        return decorated
+
+    return decorator
+
+def _collect_write_tags(session, flush_context):
+    tags = session.info.setdefault('cache_tags', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            tags.add(table)
+            company_id = getattr(obj, 'company_id', None)
+            if company_id is not None:
+                tags.add(f'{table}:company:{company_id}')
+
+def _invalidate_after_commit(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        cache.invalidate_tags(tags)
+
+def _discard_write_tags(session, *args):
+    session.info.pop('cache_tags', None)
+
+def init_cache(app, db):
+    """Configure the shared cache from the environment.
+
+    REDIS_URL           use Redis instead of the in-process LRU
+    CACHE_DEFAULT_TTL   seconds an entry lives when no ttl is given
+    CACHE_MAX_ENTRIES   size of the in-process LRU
+    CACHE_KEY_PREFIX    namespace for keys (one per app sharing a Redis)
+
+    Committed writes invalidate the tags named after the tables they touch,
+    plus '<table>:company:<id>' for tenant rows.
+    """
+    cache.configure(
+        redis_url=os.environ.get('REDIS_URL'),
+        prefix=os.environ.get('CACHE_KEY_PREFIX', f'sbp:{app.import_name}:'),
+        default_ttl=int(os.environ.get('CACHE_DEFAULT_TTL', 300)),
+        max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 10000)),
+    )
+    app.extensions['cache'] = cache
+
+    event.listen(db.session, 'after_flush', _collect_write_tags)
+    event.listen(db.session, 'after_commit', _invalidate_after_commit)
+    event.listen(db.session, 'after_rollback', _discard_write_tags)
+    return cache
@@ -0,0 +1,252 @@
+"""
+Bulk messaging for ServiceBook Pros
+Renders a message for every customer in an audience query and queues them in
+batches, with one Campaign row reporting progress
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from sqlalchemy import func, insert, select, update
+
+from src.models.user import db
+from src.models.company import Company
+from src.models.customer import Customer
+from src.models.job import Job, JobStatus
+from src.models.communication import (
+    Campaign, CampaignRecipient, CommunicationLog, CommunicationStatus, CommunicationType
+)
+from src.utils.communication_service import outbox
+from src.utils.rollups import record_queued
+from src.utils.templating import compile_template
+
+logger = logging.getLogger(__name__)
+
+# name -> function(company_id, params, batch_size) yielding batches of
+# (customer, template variables)
+AUDIENCES: Dict[str, Callable[[int, Dict, int], Iterator[List[Tuple[Customer, Dict]]]]] = {}
+
+def audience(name: str):
+    """Register a recipient query usable as a campaign audience"""
+    def decorator(f):
+        AUDIENCES[name] = f
+        return f
+    return decorator
+
+def batch_size() -> int:
+    return int(os.environ.get('CAMPAIGN_BATCH_SIZE', 500))
+
+def _pages(query, key, size):
+    """Rows of ``query`` in pages of ``size``, keyed on ``key``.
+
+    Each page is a fresh query after the last key seen, so the caller can
+    commit between pages without holding a cursor open.
+    """
+    last = None
+    while True:
+        page = query if last is None else query.filter(key > last)
+        rows = page.order_by(key).limit(size).all()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1].cursor
+
+@audience('all_customers')
+def all_customers(company_id, params, size):
+    """Active customers of the company"""
+    query = db.session.query(Customer.id.label('cursor'), Customer).filter(
+        Customer.company_id == company_id,
+        Customer.status == params.get('status', 'active')
+    )
+    for rows in _pages(query, Customer.id, size):
+        yield [(row.Customer, {}) for row in rows]
+
+@audience('customers')
+def listed_customers(company_id, params, size):
+    """The customers in params['customer_ids']"""
+    query = db.session.query(Customer.id.label('cursor'), Customer).filter(
+        Customer.company_id == company_id,
+        Customer.id.in_(params.get('customer_ids') or [])
+    )
+    for rows in _pages(query, Customer.id, size):
+        yield [(row.Customer, {}) for row in rows]
+
+@audience('jobs_tomorrow')
+def jobs_tomorrow(company_id, params, size):
+    """Customers with a job scheduled tomorrow (or on params['date'], YYYY-MM-DD)"""
+    if params.get('date'):
+        day = datetime.strptime(params['date'], '%Y-%m-%d')
+    else:
+        day = datetime.combine(datetime.utcnow().date() + timedelta(days=1), datetime.min.time())
+    query = db.session.query(Job.id.label('cursor'), Customer, Job) \
+        .join(Customer, Customer.id == Job.customer_id) \
+        .filter(
+            Job.company_id == company_id,
+            Job.scheduled_date >= day,
+            Job.scheduled_date < day + timedelta(days=1),
+            Job.status == JobStatus.SCHEDULED
+        )
+    for rows in _pages(query, Job.id, size):
+        yield [(row.Customer, {
+            'job_id': row.Job.id,
+            'job_title': row.Job.title,
+            'job_scheduled_date': row.Job.scheduled_date,  # for {{job_scheduled_date|date:"..."}}
+            'job_date': row.Job.scheduled_date.strftime('%B %d, %Y'),
+            'job_time': row.Job.scheduled_date.strftime('%I:%M %p'),
+            'job_address': row.Job.service_address or row.Customer.address or '',
+        }) for row in rows]
+
+@audience('churn_risk')
+def churn_risk(company_id, params, size):
+    """Customers whose churn risk score is at least params['min_score'] (default 70)"""
+    from src.models.business_intelligence import CustomerAnalytics
+    at_risk = select(CustomerAnalytics.customer_id).where(
+        CustomerAnalytics.company_id == company_id,
+        CustomerAnalytics.churn_risk_score >= float(params.get('min_score', 70))
+    )
+    query = db.session.query(Customer.id.label('cursor'), Customer).filter(
+        Customer.company_id == company_id,
+        Customer.id.in_(at_risk)
+    )
+    for rows in _pages(query, Customer.id, size):
+        yield [(row.Customer, {}) for row in rows]
+
+def _customer_variables(customer):
+    return {
+        'customer_name': f"{customer.first_name} {customer.last_name}",
+        'customer_first_name': customer.first_name,
+        'customer_last_name': customer.last_name,
+        'job_address': customer.address or '',
+    }
+
+def queue_campaign(campaign: Campaign, size: int = None) -> Campaign:
+    """Render and queue a campaign's messages, one commit per batch.
+
+    Logs, outbox rows and recipient links are bulk-inserted per batch.
+    With ``rate_per_minute`` set, send times are spaced out so the outbox
+    never releases more than that many of the campaign's messages a minute.
+    Customers without a phone number (SMS) or email are counted as skipped.
+    """
+    size = size or batch_size()
+    params = json.loads(campaign.audience_params) if campaign.audience_params else {}
+    is_sms = campaign.communication_type == CommunicationType.SMS
+    channel = 'sms' if is_sms else 'email'
+    company = db.session.get(Company, campaign.company_id)
+    shared = {
+        'company_name': company.name if company else '',
+        'company_phone': company.phone if company else '',
+    }
+    # Parsed once for the whole run
+    subject_template = compile_template(campaign.subject)
+    body_template = compile_template(campaign.message_body)
+    start = campaign.send_at or datetime.utcnow()
+    interval = 60.0 / campaign.rate_per_minute if campaign.rate_per_minute else 0.0
+    seen = set()
+
+    campaign.status = 'queuing'
+    db.session.commit()
+    try:
+        for batch in AUDIENCES[campaign.audience](campaign.company_id, params, size):
+            logs, customer_ids = [], []
+            for customer, variables in batch:
+                # One message per customer, even with several matching jobs
+                if customer.id in seen:
+                    continue
+                seen.add(customer.id)
+                campaign.total_recipients += 1
+                recipient = (customer.mobile or customer.phone) if is_sms else customer.email
+                if not recipient:
+                    campaign.skipped_count += 1
+                    continue
+                data = {**shared, **_customer_variables(customer), **variables}
+                logs.append({
+                    'company_id': campaign.company_id,
+                    'customer_id': customer.id,
+                    'communication_type': campaign.communication_type,
+                    'recipient_phone': recipient if is_sms else None,
+                    'recipient_email': None if is_sms else recipient,
+                    'recipient_name': data['customer_name'],
+                    'subject': subject_template.render(data) or None,
+                    'message_body': body_template.render(data),
+                    'status': CommunicationStatus.PENDING,
+                    'job_id': variables.get('job_id'),
+                    'template_id': campaign.template_id,
+                    'sent_by_user_id': campaign.created_by_user_id,
+                    'scheduled_send_time': start + timedelta(seconds=interval * (campaign.queued_count + len(logs))),
+                })
+                customer_ids.append(customer.id)
+            if logs:
+                log_ids = db.session.scalars(
+                    insert(CommunicationLog).returning(CommunicationLog.id, sort_by_parameter_order=True),
+                    logs
+                ).all()
+                outbox.enqueue_many(db.session, ({
+                    'channel': channel,
+                    'recipient': log['recipient_phone'] or log['recipient_email'],
+                    'subject': log['subject'],
+                    'body': log['message_body'],
+                    'company_id': campaign.company_id,
+                    'source_id': log_id,
+                    'send_at': log['scheduled_send_time'],
+                } for log, log_id in zip(logs, log_ids)))
+                db.session.execute(insert(CampaignRecipient), [
+                    {'campaign_id': campaign.id, 'customer_id': customer_id, 'communication_log_id': log_id}
+                    for customer_id, log_id in zip(customer_ids, log_ids)
+                ])
+                record_queued(db.session, campaign.company_id, campaign.communication_type, len(logs))
+                campaign.queued_count += len(logs)
+            db.session.commit()
+    except Exception as e:
+        # Batches committed so far stay queued; cancel the campaign to stop them
+        db.session.rollback()
+        logger.exception('Campaign %s failed while queuing', campaign.id)
+        campaign.status = 'failed'
+        campaign.error_message = str(e)
+        db.session.commit()
+        return campaign
+
+    campaign.status = 'queued'
+    campaign.queued_at = datetime.utcnow()
+    db.session.commit()
+    return campaign
+
+def _campaign_logs(campaign_id):
+    return select(CampaignRecipient.communication_log_id).where(CampaignRecipient.campaign_id == campaign_id)
+
+def campaign_progress(campaign: Campaign) -> Dict:
+    """Delivery counts of a campaign's messages, from one GROUP BY"""
+    counts = dict(
+        db.session.query(CommunicationLog.status, func.count(CommunicationLog.id))
+        .filter(CommunicationLog.id.in_(_campaign_logs(campaign.id)))
+        .group_by(CommunicationLog.status)
+        .all()
+    )
+    progress = {
+        'pending': counts.get(CommunicationStatus.PENDING, 0),
+        'sent': sum(counts.get(status, 0) for status in (
+            CommunicationStatus.SENT, CommunicationStatus.DELIVERED, CommunicationStatus.READ
+        )),
+        'failed': counts.get(CommunicationStatus.FAILED, 0),
+        'cancelled': counts.get(CommunicationStatus.CANCELLED, 0),
+    }
+    done = campaign.queued_count - progress['pending']
+    progress['percent_complete'] = round(done / campaign.queued_count * 100, 1) if campaign.queued_count else 100.0
+    progress['completed'] = campaign.status in ('queued', 'cancelled') and progress['pending'] == 0
+    return progress
+
+def cancel_campaign(campaign: Campaign) -> int:
+    """Stop a campaign's messages that have not been sent yet; returns how many"""
+    cancelled = outbox.cancel(db.session, _campaign_logs(campaign.id))
+    if cancelled:
+        db.session.execute(
+            update(CommunicationLog)
+            .where(CommunicationLog.id.in_(cancelled))
+            .values(status=CommunicationStatus.CANCELLED, updated_at=datetime.utcnow()),
+            execution_options={'synchronize_session': False}
+        )
+    campaign.status = 'cancelled'
+    db.session.commit()
+    return len(cancelled)
@@ -1,17 +1,75 @@
 """
 Communication service for ServiceBook Pros
-Handles SMS via Twilio and Email via SendGrid
+Queues SMS and email in the outbox; the outbox worker delivers them
 """
 
 import os
 import json
-from datetime import datetime
+from contextlib import contextmanager
 from typing import Dict, List, Optional
 from src.models.communication import (
     CommunicationLog, MessageTemplate, NotificationSettings,
-    CommunicationType, CommunicationStatus
+    CommunicationType, CommunicationStatus, OutboxMessage
 )
 from src.models.user import db
+from src.utils.outbox import Outbox, FakeProvider, outbox_settings, provider_rate
+from src.utils.templating import render, template_plan
+
+# Outbound SMS/email queue, delivered by `flask outbox-worker` or the
+# in-process worker thread (OUTBOX_INLINE_WORKER)
+outbox = Outbox(OutboxMessage)
+
+def _log_sent(session, message):
+    log = session.get(CommunicationLog, message.source_id) if message.source_id else None
+    if log:
+        log.status = CommunicationStatus.SENT
+        log.sent_at = message.sent_at
+        log.external_message_id = message.provider_message_id
+        log.external_status = 'sent'
+
+def _log_dead(session, message):
+    log = session.get(CommunicationLog, message.source_id) if message.source_id else None
+    if log:
+        log.status = CommunicationStatus.FAILED
+        log.external_status = 'dead_letter'
+        log.external_error_message = message.last_error
+
+outbox.on_sent.append(_log_sent)
+outbox.on_dead.append(_log_dead)
+
+def init_outbox(app):
+    """Configure the outbox from OUTBOX_* settings.
+
+    No real SMS/email provider is wired up yet, so both channels use the
+    local fake provider, which accepts every message (as the previous
+    simulated send did) and can be told to fail for testing.
+    """
+    @contextmanager
+    def session_scope():
+        with app.app_context():
+            yield db.session
+    
+    outbox.configure(session_scope, **outbox_settings())
+    for channel in ('sms', 'email'):
+        outbox.register_provider(FakeProvider(channel, rate_per_second=provider_rate(channel)))
+    outbox.watch(db.session)
+    app.extensions['outbox'] = outbox
+    return outbox
+
+def queue_message(comm_log: CommunicationLog) -> OutboxMessage:
+    """Queue delivery of a new SMS/email log entry in the current transaction"""
+    if comm_log.communication_type == CommunicationType.SMS:
+        channel, recipient = 'sms', comm_log.recipient_phone
+    else:
+        channel, recipient = 'email', comm_log.recipient_email
+    comm_log.status = CommunicationStatus.PENDING
+    db.session.add(comm_log)
+    db.session.flush()
+    return outbox.enqueue(
+        db.session, channel, recipient, comm_log.message_body,
+        subject=comm_log.subject, company_id=comm_log.company_id, source_id=comm_log.id,
+        send_at=comm_log.scheduled_send_time
+    )
 
 class CommunicationService:
     """Service for handling SMS and Email communications"""
@@ -49,40 +107,29 @@ class CommunicationService:
             if not settings or not settings.sms_enabled:
                 return {'success': False, 'error': 'SMS not enabled for this company'}
             
-            # In production, this would use Twilio
-            # message = self.twilio_client.messages.create(
-            #     body=message,
-            #     from_=settings.twilio_phone_number,
-            #     to=to_phone
-            # )
-            
-            # For demo purposes, simulate successful send
-            external_message_id = f"demo_sms_{datetime.utcnow().timestamp()}"
-            
-            # Log the communication
+            # Log the communication and queue it in the same transaction;
+            # the outbox worker delivers it and updates the log
             comm_log = CommunicationLog(
                 company_id=company_id,
                 customer_id=customer_id,
                 communication_type=CommunicationType.SMS,
                 recipient_phone=to_phone,
                 message_body=message,
-                status=CommunicationStatus.SENT,
                 job_id=job_id,
-                external_message_id=external_message_id,
-                sent_at=datetime.utcnow(),
                 cost=0.0075  # Typical SMS cost
             )
-            
-            db.session.add(comm_log)
+            queued = queue_message(comm_log)
             db.session.commit()
             
             return {
                 'success': True,
-                'message_id': external_message_id,
+                'status': 'queued',
+                'outbox_id': queued.id,
                 'communication_log_id': comm_log.id
             }
             
         except Exception as e:
+            db.session.rollback()
             return {'success': False, 'error': str(e)}
     
     def send_email(self, to_email: str, subject: str, message: str, company_id: int,
@@ -95,20 +142,6 @@ class CommunicationService:
             if not settings or not settings.email_enabled:
                 return {'success': False, 'error': 'Email not enabled for this company'}
             
-            # In production, this would use SendGrid
-            # from sendgrid.helpers.mail import Mail
-            # message = Mail(
-            #     from_email=settings.from_email,
-            #     to_emails=to_email,
-            #     subject=subject,
-            #     html_content=message
-            # )
-            # response = self.sendgrid_client.send(message)
-            
-            # For demo purposes, simulate successful send
-            external_message_id = f"demo_email_{datetime.utcnow().timestamp()}"
-            
-            # Log the communication
             comm_log = CommunicationLog(
                 company_id=company_id,
                 customer_id=customer_id,
@@ -116,23 +149,21 @@ class CommunicationService:
                 recipient_email=to_email,
                 subject=subject,
                 message_body=message,
-                status=CommunicationStatus.SENT,
                 job_id=job_id,
-                external_message_id=external_message_id,
-                sent_at=datetime.utcnow(),
                 cost=0.0  # Email is typically free
             )
-            
-            db.session.add(comm_log)
+            queued = queue_message(comm_log)
             db.session.commit()
             
             return {
                 'success': True,
-                'message_id': external_message_id,
+                'status': 'queued',
+                'outbox_id': queued.id,
                 'communication_log_id': comm_log.id
             }
             
         except Exception as e:
+            db.session.rollback()
             return {'success': False, 'error': str(e)}
     
     def send_template_message(self, template_id: int, recipient_data: Dict, 
@@ -143,13 +174,10 @@ class CommunicationService:
             if not template:
                 return {'success': False, 'error': 'Template not found'}
             
-            # Replace template variables
-            message_body = self._replace_template_variables(
-                template.message_body, recipient_data
-            )
-            subject = self._replace_template_variables(
-                template.subject or '', recipient_data
-            )
+            # Render with the template's compiled plan
+            subject_plan, body_plan = template_plan(template)
+            message_body = body_plan.render(recipient_data)
+            subject = subject_plan.render(recipient_data)
             
             # Send based on communication type
             if template.communication_type == CommunicationType.SMS:
@@ -174,171 +202,29 @@ class CommunicationService:
             return {'success': False, 'error': str(e)}
     
     def _replace_template_variables(self, text: str, data: Dict) -> str:
-        """Replace template variables with actual data"""
-        if not text:
-            return ''
-        
-        # Common template variables
-        replacements = {
-            '{{customer_name}}': data.get('customer_name', ''),
-            '{{customer_first_name}}': data.get('customer_first_name', ''),
-            '{{customer_last_name}}': data.get('customer_last_name', ''),
-            '{{technician_name}}': data.get('technician_name', ''),
-            '{{job_title}}': data.get('job_title', ''),
-            '{{job_date}}': data.get('job_date', ''),
-            '{{job_time}}': data.get('job_time', ''),
-            '{{company_name}}': data.get('company_name', ''),
-            '{{company_phone}}': data.get('company_phone', ''),
-            '{{estimate_amount}}': data.get('estimate_amount', ''),
-            '{{invoice_amount}}': data.get('invoice_amount', ''),
-            '{{job_address}}': data.get('job_address', ''),
-            '{{completion_time}}': data.get('completion_time', ''),
-        }
-        
-        for variable, value in replacements.items():
-            text = text.replace(variable, str(value))
-        
-        return text
+        """Replace template variables with actual data (see src.utils.templating)"""
+        return render(text, data)
     
     def send_appointment_reminder(self, job_id: int) -> Dict:
-        """Send appointment reminder for a job"""
-        try:
-            from src.models.job import Job
-            from src.models.customer import Customer
-            from src.models.technician import Technician
-            
-            job = Job.query.get(job_id)
-            if not job:
-                return {'success': False, 'error': 'Job not found'}
-            
-            customer = Customer.query.get(job.customer_id)
-            technician = Technician.query.get(job.technician_id)
-            
-            if not customer:
-                return {'success': False, 'error': 'Customer not found'}
-            
-            # Prepare template data
-            template_data = {
-                'customer_name': f"{customer.first_name} {customer.last_name}",
-                'customer_first_name': customer.first_name,
-                'customer_last_name': customer.last_name,
-                'technician_name': f"{technician.first_name} {technician.last_name}" if technician else 'Our technician',
-                'job_title': job.title,
-                'job_date': job.scheduled_date.strftime('%B %d, %Y') if job.scheduled_date else '',
-                'job_time': job.scheduled_date.strftime('%I:%M %p') if job.scheduled_date else '',
-                'job_address': f"{customer.address}, {customer.city}, {customer.state}",
-                'phone': customer.phone,
-                'email': customer.email
-            }
-            
-            # Find appointment reminder template
-            template = MessageTemplate.query.filter_by(
-                company_id=job.company_id,
-                category='appointment_reminder',
-                is_active=True
-            ).first()
-            
-            if template:
-                return self.send_template_message(
-                    template_id=template.id,
-                    recipient_data=template_data,
-                    company_id=job.company_id,
-                    job_id=job_id,
-                    customer_id=customer.id
-                )
-            else:
-                # Send default reminder
-                default_message = f"Hi {template_data['customer_first_name']}, this is a reminder that {template_data['technician_name']} will be arriving for your {template_data['job_title']} appointment on {template_data['job_date']} at {template_data['job_time']}. Please call if you need to reschedule."
-                
-                if customer.phone:
-                    return self.send_sms(
-                        to_phone=customer.phone,
-                        message=default_message,
-                        company_id=job.company_id,
-                        job_id=job_id,
-                        customer_id=customer.id
-                    )
-                elif customer.email:
-                    return self.send_email(
-                        to_email=customer.email,
-                        subject="Appointment Reminder",
-                        message=default_message,
-                        company_id=job.company_id,
-                        job_id=job_id,
-                        customer_id=customer.id
-                    )
-                else:
-                    return {'success': False, 'error': 'No contact information available'}
-                    
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
+        """Queue the appointment reminder for a job now, unless it was already sent"""
+        return self._queue_job_notification('appointment_reminder', job_id)
     
     def send_job_completion_notification(self, job_id: int) -> Dict:
-        """Send job completion notification"""
+        """Queue the completion notification for a job now, unless it was already sent"""
+        return self._queue_job_notification('job_completion', job_id)
+    
+    def _queue_job_notification(self, kind: str, job_id: int) -> Dict:
+        # Same rendering and once-only marking as the reminder scheduler
+        from src.utils.reminders import scheduler
         try:
-            from src.models.job import Job
-            from src.models.customer import Customer
-            from src.models.technician import Technician
-            
-            job = Job.query.get(job_id)
-            if not job:
-                return {'success': False, 'error': 'Job not found'}
-            
-            customer = Customer.query.get(job.customer_id)
-            technician = Technician.query.get(job.technician_id)
-            
-            if not customer:
-                return {'success': False, 'error': 'Customer not found'}
-            
-            # Prepare template data
-            template_data = {
-                'customer_name': f"{customer.first_name} {customer.last_name}",
-                'customer_first_name': customer.first_name,
-                'technician_name': f"{technician.first_name} {technician.last_name}" if technician else 'Our technician',
-                'job_title': job.title,
-                'completion_time': datetime.utcnow().strftime('%I:%M %p'),
-                'phone': customer.phone,
-                'email': customer.email
-            }
-            
-            # Find completion template
-            template = MessageTemplate.query.filter_by(
-                company_id=job.company_id,
-                category='job_completion',
-                is_active=True
-            ).first()
-            
-            if template:
-                return self.send_template_message(
-                    template_id=template.id,
-                    recipient_data=template_data,
-                    company_id=job.company_id,
-                    job_id=job_id,
-                    customer_id=customer.id
-                )
-            else:
-                # Send default completion message
-                default_message = f"Hi {template_data['customer_first_name']}, {template_data['technician_name']} has completed your {template_data['job_title']} service. Thank you for choosing us! Please let us know if you have any questions."
-                
-                if customer.phone:
-                    return self.send_sms(
-                        to_phone=customer.phone,
-                        message=default_message,
-                        company_id=job.company_id,
-                        job_id=job_id,
-                        customer_id=customer.id
-                    )
-                elif customer.email:
-                    return self.send_email(
-                        to_email=customer.email,
-                        subject="Service Completed",
-                        message=default_message,
-                        company_id=job.company_id,
-                        job_id=job_id,
-                        customer_id=customer.id
-                    )
-                    
+            counts = scheduler.queue_for_job(kind, job_id)
+            if counts['queued']:
+                return {'success': True, 'status': 'queued'}
+            if counts['skipped']:
+                return {'success': False, 'error': 'No contact information available'}
+            return {'success': False, 'error': 'Job not found or notification already sent'}
         except Exception as e:
+            db.session.rollback()
             return {'success': False, 'error': str(e)}
 
 # Global communication service instance
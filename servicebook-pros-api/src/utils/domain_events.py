@@ -0,0 +1,290 @@
+"""
+Domain events for ServiceBook Pros
+One set of db.session hooks for everything that reacts to model changes:
+flush handlers run inside the flushing transaction (rollups), commit handlers
+receive the domain events of a committed transaction (automations, live
+updates); events of a rolled back transaction are discarded
+"""
+
+import logging
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+
+from src.models.user import db
+from src.models.ai_features import SmartAutomation
+from src.models.communication import CommunicationLog, CustomerQuestion
+from src.models.estimate import Estimate, EstimateStatus
+from src.models.invoice import Invoice, InvoiceStatus
+from src.models.job import Job
+from src.models.technician import MaterialRequest, TimeEntry
+
+logger = logging.getLogger(__name__)
+
+class DomainEvent:
+    """A committed change. ``technician_ids`` and ``user_ids`` name the
+    technicians (by technicians.id or their users.id) it concerns."""
+
+    __slots__ = ('type', 'company_id', 'data', 'technician_ids', 'user_ids')
+
+    def __init__(self, event_type: str, company_id: int, data: Dict,
+                 technician_ids: Iterable[int] = (), user_ids: Iterable[int] = ()):
+        self.type = event_type
+        self.company_id = company_id
+        self.data = data
+        self.technician_ids = tuple(value for value in technician_ids if value is not None)
+        self.user_ids = tuple(value for value in user_ids if value is not None)
+
+    def __repr__(self):
+        return f'<DomainEvent {self.type} company={self.company_id}>'
+
+# Attribute history ------------------------------------------------------
+
+def value(column_value):
+    """Payload-friendly form of a column value"""
+    if hasattr(column_value, 'value'):  # enums
+        return column_value.value
+    if isinstance(column_value, (datetime, date)):
+        return column_value.isoformat()
+    return column_value
+
+def previous(obj, name):
+    """Value of ``name`` before this flush"""
+    history = inspect(obj).attrs[name].history
+    if not history.has_changes():
+        return getattr(obj, name)
+    # A change from None has no deleted value
+    return history.deleted[0] if history.deleted else None
+
+def changed(obj) -> List[str]:
+    """Column attributes this flush changed"""
+    state = inspect(obj)
+    return [attr.key for attr in state.mapper.column_attrs if state.attrs[attr.key].history.has_changes()]
+
+def status_change(obj) -> Optional[Tuple]:
+    """(previous, current) status when this flush changed it"""
+    history = inspect(obj).attrs.status.history
+    if not history.has_changes() or not history.deleted:
+        return None
+    return history.deleted[0], obj.status
+
+_tracked = set()
+
+def _keep_previous(target, new_value, old_value, initiator):
+    return new_value
+
+def track(*attributes):
+    """Load the old value when these are set on an expired object (as after a
+    commit), so ``previous`` sees what the row held before"""
+    for attribute in attributes:
+        if attribute in _tracked:
+            continue
+        event.listen(attribute, 'set', _keep_previous, active_history=True, retval=True)
+        _tracked.add(attribute)
+
+# Sources ----------------------------------------------------------------
+
+# model -> function(obj, state) returning DomainEvents; state is 'new',
+# 'dirty' or 'deleted'
+SOURCES: Dict[type, Callable] = {}
+
+def source(model, tracked: Iterable[str] = ()):
+    """Register the events a model's flushed changes produce"""
+    def decorator(f):
+        SOURCES[model] = f
+        track(*(getattr(model, name) for name in tracked))
+        return f
+    return decorator
+
+@source(Job, tracked=('status', 'assigned_technician_id'))
+def _job_events(job, state):
+    data = {
+        'job_id': job.id,
+        'job_number': job.job_number,
+        'job_title': job.title,
+        'customer_id': job.customer_id,
+        'status': value(job.status),
+        'assigned_technician_id': job.assigned_technician_id,
+        'scheduled_date': value(job.scheduled_date),
+    }
+    # The previous assignee hears about a reassignment too
+    user_ids = {job.assigned_technician_id}
+    if state == 'new':
+        return [DomainEvent('job.created', job.company_id, data, (), user_ids)]
+    if state == 'deleted':
+        return [DomainEvent('job.deleted', job.company_id, {'job_id': job.id, 'job_number': job.job_number},
+                            (), user_ids)]
+    columns = changed(job)
+    if not columns or columns == ['updated_at']:
+        return []
+    user_ids.add(previous(job, 'assigned_technician_id'))
+    events = [DomainEvent('job.updated', job.company_id, dict(data, changed=columns), (), user_ids)]
+    change = status_change(job)
+    if change is not None:
+        events.append(DomainEvent('job.status_changed', job.company_id,
+                                  dict(data, **{'from': value(change[0]), 'to': value(change[1])}), (), user_ids))
+    return events
+
+@source(Invoice, tracked=('status',))
+def _invoice_events(invoice, state):
+    change = status_change(invoice) if state == 'dirty' else None
+    if change is None or change[1] != InvoiceStatus.OVERDUE:
+        return []
+    return [DomainEvent('invoice.overdue', invoice.company_id, {
+        'invoice_id': invoice.id,
+        'invoice_number': invoice.invoice_number,
+        'job_id': invoice.job_id,
+        'customer_id': invoice.customer_id,
+        'balance_due': invoice.balance_due,
+        'due_date': value(invoice.due_date),
+        'days_overdue': invoice.days_overdue,
+    })]
+
+@source(Estimate, tracked=('status',))
+def _estimate_events(estimate, state):
+    change = status_change(estimate) if state == 'dirty' else None
+    if change is None or change[1] != EstimateStatus.VIEWED:
+        return []
+    return [DomainEvent('estimate.viewed', estimate.company_id, {
+        'estimate_id': estimate.id,
+        'estimate_number': estimate.estimate_number,
+        'estimate_title': estimate.title,
+        'estimate_amount': estimate.total_amount,
+        'customer_id': estimate.customer_id,
+    })]
+
+@source(TimeEntry, tracked=('end_time',))
+def _time_entry_events(entry, state):
+    data = {
+        'time_entry_id': entry.id,
+        'technician_id': entry.technician_id,
+        'job_id': entry.job_id,
+        'start_time': value(entry.start_time),
+        'end_time': value(entry.end_time),
+        'total_hours': entry.total_hours,
+    }
+    if state == 'new' and entry.end_time is None:
+        return [DomainEvent('technician.clocked_in', entry.company_id, data, (entry.technician_id,))]
+    if state == 'dirty' and entry.end_time is not None and previous(entry, 'end_time') is None:
+        return [DomainEvent('technician.clocked_out', entry.company_id, data, (entry.technician_id,))]
+    return []
+
+@source(MaterialRequest, tracked=('status',))
+def _material_request_events(material_request, state):
+    if state == 'deleted' or (state == 'dirty' and 'status' not in changed(material_request)):
+        return []
+    return [DomainEvent(
+        'material_request.created' if state == 'new' else 'material_request.updated',
+        material_request.company_id,
+        {
+            'material_request_id': material_request.id,
+            'job_id': material_request.job_id,
+            'technician_id': material_request.technician_id,
+            'status': material_request.status,
+            'is_urgent': material_request.is_urgent,
+        },
+        (material_request.technician_id,)
+    )]
+
+@source(CommunicationLog, tracked=('status',))
+def _message_events(log, state):
+    if state == 'deleted':
+        return []
+    data = {
+        'message_id': log.id,
+        'communication_type': value(log.communication_type),
+        'status': value(log.status),
+        'customer_id': log.customer_id,
+        'job_id': log.job_id,
+        'recipient_name': log.recipient_name,
+    }
+    if state == 'new':
+        return [DomainEvent('message.created', log.company_id, data, (log.technician_id,), (log.user_id,))]
+    if 'status' in changed(log):
+        return [DomainEvent('message.status_changed', log.company_id,
+                            dict(data, previous_status=value(previous(log, 'status'))),
+                            (log.technician_id,), (log.user_id,))]
+    return []
+
+@source(CustomerQuestion, tracked=('status',))
+def _question_events(question, state):
+    if state == 'deleted' or (state == 'dirty' and 'status' not in changed(question)):
+        return []
+    return [DomainEvent(
+        'question.created' if state == 'new' else 'question.updated',
+        question.company_id,
+        {
+            'question_id': question.id,
+            'job_id': question.job_id,
+            'customer_id': question.customer_id,
+            'status': question.status,
+            'is_urgent': question.is_urgent,
+        }
+    )]
+
+@source(SmartAutomation)
+def _automation_events(automation, state):
+    return [DomainEvent('automation.changed', automation.company_id, {'automation_id': automation.id})]
+
+# Handlers ---------------------------------------------------------------
+
+# function(session, [(obj, state)]) run in the flushing transaction; an
+# exception fails the flush
+_flush_handlers: List[Callable] = []
+# function([DomainEvent]) run after commit; exceptions are logged
+_commit_handlers: List[Callable] = []
+_installed = False
+
+def on_flush(handler: Callable):
+    """Call ``handler(session, changes)`` on every db.session flush"""
+    _install()
+    _flush_handlers.append(handler)
+    return handler
+
+def on_commit(handler: Callable):
+    """Call ``handler(events)`` with each committed transaction's domain events"""
+    _install()
+    _commit_handlers.append(handler)
+    return handler
+
+def _after_flush(session, flush_context):
+    changes = [(obj, state)
+               for state, objects in (('new', session.new), ('dirty', session.dirty), ('deleted', session.deleted))
+               for obj in objects]
+    for handler in _flush_handlers:
+        handler(session, changes)
+    if not _commit_handlers:
+        return
+    events = session.info.setdefault('domain_events', [])
+    for obj, state in changes:
+        producer = SOURCES.get(type(obj))
+        if producer is None:
+            continue
+        try:
+            events.extend(producer(obj, state))
+        except Exception:
+            # Reactions must never block the write that triggers them
+            logger.exception('Collecting domain events from %r failed', obj)
+
+def _after_commit(session):
+    events = session.info.pop('domain_events', None)
+    if not events:
+        return
+    for handler in _commit_handlers:
+        try:
+            handler(events)
+        except Exception:
+            logger.exception('Handling committed domain events in %s failed', getattr(handler, '__name__', handler))
+
+def _after_rollback(session, *args):
+    session.info.pop('domain_events', None)
+
+def _install():
+    global _installed
+    if _installed:
+        return
+    event.listen(db.session, 'after_flush', _after_flush)
+    event.listen(db.session, 'after_commit', _after_commit)
+    event.listen(db.session, 'after_rollback', _after_rollback)
+    _installed = True
@@ -0,0 +1,271 @@
+"""
+HTTP caching and compression for ServiceBook Pros
+Conditional GETs backed by per-tenant data versions, per-blueprint
+Cache-Control and gzip/brotli response compression
+"""
+
+import gzip
+import hashlib
+import os
+
+from flask import current_app, g, request, session
+from sqlalchemy import event, inspect
+from werkzeug.http import remove_entity_headers
+
+from src.models.data_version import DataVersion, GLOBAL_SCOPE
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/css',
+    'text/csv',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+    'text/xml',
+}
+
+class CachePolicy:
+    """How GET responses of one blueprint may be cached.
+
+    cache_control  Cache-Control header for successful GET responses
+    versioned      the response depends only on the URL and the tenant's data,
+                   so its ETag can be derived from the tenant data version and
+                   checked before the view runs
+    families       data families (see ``_write_scope``) the response also
+                   reads, e.g. ('communication',)
+    """
+
+    def __init__(self, cache_control='private, no-cache', versioned=False, families=()):
+        self.cache_control = cache_control
+        self.versioned = versioned
+        self.families = tuple(families)
+
+DEFAULT_POLICY = CachePolicy()
+
+# model class -> [(foreign key attribute, parent model class)]
+_parent_links = {}
+
+def _links(cls):
+    links = _parent_links.get(cls)
+    if links is None:
+        mapper = inspect(cls)
+        classes = {other.local_table: other.class_ for other in mapper.registry.mappers}
+        links = []
+        for column in mapper.local_table.columns:
+            for foreign_key in column.foreign_keys:
+                parent = classes.get(foreign_key.column.table)
+                if parent is None or parent is cls:
+                    continue
+                try:
+                    links.append((mapper.get_property_by_column(column).key, parent))
+                except Exception:  # column not mapped to an attribute
+                    continue
+        _parent_links[cls] = links
+    return links
+
+def _write_scope(session, obj, resolved, depth=0):
+    """Data version scope of a flushed row, or None when no versioned
+    response depends on it.
+
+    A model may define ``data_scope()`` to decide for itself; write-only
+    bookkeeping returns None. Otherwise a row with a company_id belongs to
+    that company, or to ``company:<id>:<data_family>`` when its model names a
+    family: high-volume writes such as message statuses then leave the
+    versions of the tenant's other responses alone. A row without one (line
+    items, notes, join rows) belongs where the first parent row its foreign
+    keys lead to does. Rows that lead to no company, such as the shared
+    catalog tables, belong to the global scope.
+    """
+    if hasattr(type(obj), 'data_scope'):
+        return obj.data_scope()
+    company_id = getattr(obj, 'company_id', None)
+    if company_id is not None:
+        family = getattr(type(obj), 'data_family', None)
+        return f'company:{company_id}:{family}' if family else f'company:{company_id}'
+    if depth < 3:
+        for key, parent_class in _links(type(obj)):
+            parent_id = getattr(obj, key, None)
+            if parent_id is None:
+                continue
+            if (parent_class, parent_id) not in resolved:
+                # Usually in the identity map already; otherwise one SELECT
+                parent = session.get(parent_class, parent_id)
+                resolved[(parent_class, parent_id)] = (
+                    _write_scope(session, parent, resolved, depth + 1) if parent is not None else None
+                )
+            scope = resolved[(parent_class, parent_id)]
+            if scope is not None and scope != GLOBAL_SCOPE:
+                return scope
+    return GLOBAL_SCOPE
+
+def _bump_data_versions(session, flush_context):
+    # Only rows that reach no tenant bump the global scope, which is part of
+    # every tenant's ETag
+    resolved = {}
+    scopes = {_write_scope(session, obj, resolved) for obj in (*session.new, *session.dirty, *session.deleted)}
+    scopes.discard(None)
+    scopes -= session.info.setdefault('bumped_scopes', set())
+    if scopes:
+        DataVersion.bump(session.connection(), scopes)
+        session.info['bumped_scopes'].update(scopes)
+
+def _reset_bumped_scopes(session, *args):
+    session.info.pop('bumped_scopes', None)
+
+def _build_id(root):
+    """Changes whenever the code is redeployed, so cached shapes are dropped"""
+    latest = 0.0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith('.py'):
+                latest = max(latest, os.path.getmtime(os.path.join(directory, name)))
+    return str(int(latest))
+
+def _policy_for_request():
+    policies = current_app.extensions['http_cache']['policies']
+    return policies.get(request.blueprint, DEFAULT_POLICY)
+
+def _versioned_etag(scope, families=()):
+    scopes = [scope, GLOBAL_SCOPE, *(f'{scope}:{family}' for family in families)]
+    versions = DataVersion.current(set(scopes))
+    key = '|'.join([
+        current_app.extensions['http_cache']['build_id'],
+        request.full_path,
+        scope,
+        *(str(versions[name]) for name in scopes),
+        # Responses can differ per user of the same tenant
+        request.headers.get('Authorization', ''),
+        str(session.get('user_id', '')),
+    ])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def _strip_encoding(etag):
+    for suffix in ('-br', '-gzip'):
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)]
+    return etag
+
+def _matching_etag(etag):
+    """The If-None-Match tag naming `etag` in any content encoding, if any"""
+    for tag in request.if_none_match.as_set(include_weak=True):
+        if _strip_encoding(tag) == etag:
+            return tag
+    return None
+
+def _not_modified(etag, policy, response=None):
+    """Turn `response` (or a new one) into a bodiless 304"""
+    if response is None:
+        response = current_app.response_class()
+    response.status_code = 304
+    response.response = []
+    remove_entity_headers(response.headers)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = policy.cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
+def _check_not_modified():
+    if request.method not in ('GET', 'HEAD') or not _policy_for_request().versioned:
+        return None
+    scope = current_app.extensions['http_cache']['scope']()
+    if scope is None:
+        return None
+
+    policy = _policy_for_request()
+    g.etag = _versioned_etag(scope, policy.families)
+    cached = _matching_etag(g.etag)
+    if cached:
+        return _not_modified(cached, policy)
+    return None
+
+def _negotiate_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def _compress(response):
+    config = current_app.config
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = _negotiate_encoding()
+    if encoding is None or len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=config['COMPRESS_BR_QUALITY'])
+    else:
+        compressed = gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+
+    # A strong ETag identifies exact bytes, so the encoded body gets its own
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+def _finalize(response):
+    if request.method in ('GET', 'HEAD'):
+        policy = _policy_for_request()
+        if response.status_code == 200:
+            etag = g.get('etag')
+            if etag:
+                response.set_etag(etag)
+            elif response.mimetype == 'application/json' and not response.is_streamed:
+                # Not versioned: the view has run, but an unchanged body
+                # still need not be sent again
+                response.add_etag()
+                cached = _matching_etag(response.get_etag()[0])
+                if cached:
+                    return _not_modified(cached, policy, response)
+        response.headers.setdefault('Cache-Control', policy.cache_control if response.status_code == 200 else 'no-store')
+    else:
+        response.headers.setdefault('Cache-Control', 'no-store')
+
+    if current_app.config['COMPRESS_ENABLED']:
+        response = _compress(response)
+    return response
+
+def init_http_cache(app, db, scope, policies=None):
+    """Install conditional GET, Cache-Control and compression handling.
+
+    `scope` returns the data version scope of the current request (e.g.
+    'company:7') or None when it cannot be determined; versioned ETags are
+    only used when it returns a scope. `policies` maps blueprint names to
+    CachePolicy; other GET routes get 'private, no-cache' with an ETag over
+    the response body.
+    """
+    app.config.setdefault('COMPRESS_ENABLED', os.environ.get('COMPRESS_ENABLED', 'true').lower() == 'true')
+    app.config.setdefault('COMPRESS_MIN_SIZE', int(os.environ.get('COMPRESS_MIN_SIZE', 1024)))
+    app.config.setdefault('COMPRESS_LEVEL', int(os.environ.get('COMPRESS_LEVEL', 6)))
+    app.config.setdefault('COMPRESS_BR_QUALITY', int(os.environ.get('COMPRESS_BR_QUALITY', 5)))
+
+    app.extensions['http_cache'] = {
+        'scope': scope,
+        'policies': policies or {},
+        'build_id': os.environ.get('CACHE_BUILD_ID') or _build_id(os.path.dirname(app.root_path)),
+    }
+
+    event.listen(db.session, 'after_flush', _bump_data_versions)
+    event.listen(db.session, 'after_commit', _reset_bumped_scopes)
+    event.listen(db.session, 'after_rollback', _reset_bumped_scopes)
+
+    app.before_request(_check_not_modified)
+    app.after_request(_finalize)
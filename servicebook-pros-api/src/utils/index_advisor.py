@@ -0,0 +1,253 @@
+"""
+Index advisor for ServiceBook Pros
+Creates declared indexes and constraints on existing databases and replays query shapes
+through EXPLAIN to flag full table scans
+"""
+
+import json
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import UniqueConstraint, event, func, inspect
+from sqlalchemy.schema import AddConstraint, CreateTable, DropConstraint
+from src.models.user import db
+
+def create_missing_indexes(engine=None) -> List[str]:
+    """Create every index declared on the models that the database lacks.
+
+    ``db.create_all()`` only creates indexes together with new tables, so
+    databases created before an index was declared never receive it. This is
+    the migration step for those databases; it is idempotent and safe to run
+    on every deploy.
+    """
+    engine = engine or db.engine
+    created = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(bind=connection)
+                    created.append(index.name)
+    return created
+
+def create_missing_columns(engine=None) -> List[str]:
+    """Add columns declared on the models that existing tables lack.
+
+    Like indexes, ``db.create_all()`` never alters a table that already
+    exists. Only nullable columns without a server default are added, which
+    every backend supports with a plain ADD COLUMN; anything else needs a
+    real migration and is reported by raising.
+    """
+    engine = engine or db.engine
+    added = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        preparer = connection.dialect.identifier_preparer
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable or column.server_default is not None:
+                    raise RuntimeError(f'{table.name}.{column.name} cannot be added automatically')
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.exec_driver_sql(
+                    f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}'
+                )
+                added.append(f'{table.name}.{column.name}')
+    return added
+
+def replace_unique_constraints(engine=None) -> List[str]:
+    """Bring existing tables' unique constraints in line with the models.
+
+    A constraint cannot be altered in place: Postgres drops and adds it,
+    SQLite rebuilds the table (create, copy, drop, rename) with foreign key
+    checks off. Tables whose constraints already match are left alone, so
+    this is safe to run on every deploy.
+    """
+    engine = engine or db.engine
+    replaced = []
+    with engine.connect() as connection:
+        sqlite = connection.dialect.name == 'sqlite'
+        if sqlite:
+            # Has no effect inside a transaction, so it goes first
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            connection.commit()
+        try:
+            with connection.begin():
+                inspector = inspect(connection)
+                for table in db.metadata.sorted_tables:
+                    if not inspector.has_table(table.name):
+                        continue
+                    declared = {tuple(sorted(column.name for column in constraint.columns)): constraint
+                                for constraint in table.constraints if isinstance(constraint, UniqueConstraint)}
+                    existing = {tuple(sorted(constraint['column_names'])): constraint['name']
+                                for constraint in inspector.get_unique_constraints(table.name)}
+                    stale = [columns for columns in existing if columns not in declared]
+                    missing = [columns for columns in declared if columns not in existing]
+                    if not stale and not missing:
+                        continue
+                    if sqlite:
+                        _rebuild_sqlite_table(connection, table, inspector)
+                    else:
+                        for columns in stale:
+                            connection.execute(DropConstraint(UniqueConstraint(*columns, name=existing[columns])))
+                        for columns in missing:
+                            connection.execute(AddConstraint(declared[columns]))
+                    replaced.append(table.name)
+        finally:
+            if sqlite:
+                connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+                connection.commit()
+    return replaced
+
+def _rebuild_sqlite_table(connection, table, inspector):
+    preparer = connection.dialect.identifier_preparer
+    name = preparer.format_table(table)
+    temporary = preparer.quote(f'_rebuild_{table.name}')
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    columns = ', '.join(preparer.format_column(column) for column in table.columns if column.name in existing)
+
+    create = str(CreateTable(table).compile(dialect=connection.dialect)).strip()
+    connection.exec_driver_sql(create.replace(f'CREATE TABLE {name}', f'CREATE TABLE {temporary}', 1))
+    connection.exec_driver_sql(f'INSERT INTO {temporary} ({columns}) SELECT {columns} FROM {name}')
+    connection.exec_driver_sql(f'DROP TABLE {name}')
+    connection.exec_driver_sql(f'ALTER TABLE {temporary} RENAME TO {name}')
+    # Dropping the old table dropped its indexes
+    for index in table.indexes:
+        index.create(bind=connection)
+
+@contextmanager
+def capture_queries(engine=None):
+    """Record the SELECT statements executed inside the block, one per shape"""
+    engine = engine or db.engine
+    captured: Dict[str, object] = {}
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and statement not in captured:
+            captured[statement] = parameters
+
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, 'before_cursor_execute', _before_cursor_execute)
+
+def install_query_capture(app, path: str):
+    """Append every distinct SELECT shape the app runs to a JSON lines file.
+
+    Enabled with the QUERY_CAPTURE_FILE environment variable; the file can
+    then be replayed with ``flask index-advisor --captured <file>``.
+    """
+    seen = set()
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if executemany or statement in seen or not statement.lstrip().upper().startswith('SELECT'):
+            return
+        seen.add(statement)
+        if not isinstance(parameters, dict):
+            parameters = list(parameters or ())
+        line = json.dumps({'statement': statement, 'parameters': parameters}, default=str)
+        with open(path, 'a') as capture_file:
+            capture_file.write(line + '\n')
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+
+def load_captured_queries(path: str) -> Dict[str, object]:
+    """Read query shapes written by install_query_capture"""
+    captured = {}
+    with open(path) as capture_file:
+        for line in capture_file:
+            if line.strip():
+                entry = json.loads(line)
+                parameters = entry.get('parameters') or ()
+                captured[entry['statement']] = parameters if isinstance(parameters, dict) else tuple(parameters)
+    return captured
+
+def representative_queries(company_id: int) -> Dict[str, object]:
+    """Run the tenant-scoped list and report queries the routes issue and capture their SQL"""
+    from src.models.job import Job, JobStatus
+    from src.models.invoice import Invoice, InvoiceStatus
+    from src.models.estimate import Estimate, EstimateStatus
+    from src.models.customer import Customer
+    from src.models.communication import CommunicationLog, CustomerQuestion
+    from src.models.inventory import StockMovement
+    from src.models.technician import TimeEntry, JobAssignment
+
+    now = datetime.utcnow()
+    month_ago = now - timedelta(days=30)
+
+    with capture_queries() as captured:
+        Job.query.filter_by(company_id=company_id, status=JobStatus.SCHEDULED)\
+            .order_by(Job.scheduled_date.desc()).limit(50).all()
+        Job.query.filter_by(company_id=company_id)\
+            .filter(Job.scheduled_date >= month_ago, Job.scheduled_date <= now).all()
+        Job.query.filter_by(assigned_technician_id=1)\
+            .filter(Job.scheduled_date >= month_ago).all()
+        Invoice.query.filter_by(company_id=company_id, status=InvoiceStatus.SENT)\
+            .order_by(Invoice.created_at.desc()).limit(50).all()
+        db.session.query(func.sum(Invoice.paid_amount))\
+            .filter(Invoice.company_id == company_id, Invoice.paid_at >= month_ago).scalar()
+        Estimate.query.filter_by(company_id=company_id, status=EstimateStatus.SENT).all()
+        Customer.query.filter_by(company_id=company_id, status='active').limit(50).all()
+        CommunicationLog.query.filter(
+            CommunicationLog.company_id == company_id,
+            CommunicationLog.created_at >= month_ago
+        ).count()
+        CommunicationLog.query.filter_by(company_id=company_id)\
+            .order_by(CommunicationLog.created_at.desc()).limit(50).all()
+        CustomerQuestion.query.filter_by(company_id=company_id, status='pending').count()
+        StockMovement.query.filter_by(inventory_item_id=1)\
+            .order_by(StockMovement.movement_date.desc()).limit(10).all()
+        TimeEntry.query.filter_by(technician_id=1).filter(TimeEntry.start_time >= month_ago).all()
+        JobAssignment.query.filter_by(technician_id=1)\
+            .filter(JobAssignment.scheduled_start >= month_ago).all()
+
+    return captured
+
+_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+def explain(statement: str, parameters=None, connection=None) -> Dict:
+    """Return the query plan for a statement and the tables it scans in full"""
+    connection = connection or db.session.connection()
+    dialect = connection.dialect.name
+    parameters = tuple(parameters) if isinstance(parameters, list) else (parameters or ())
+
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+        plan = [row[-1] for row in rows]
+        # "SCAN jobs" is a full scan; "SCAN jobs USING INDEX ..." walks an index
+        full_scans = [line.split()[1] for line in plan
+                      if line.startswith('SCAN ') and 'USING' not in line and 'CONSTANT ROW' not in line]
+    else:
+        rows = connection.exec_driver_sql(f'EXPLAIN {statement}', parameters).fetchall()
+        plan = [row[0] for row in rows]
+        full_scans = [match.group(1) for line in plan for match in [_SEQ_SCAN.search(line)] if match]
+
+    return {'plan': plan, 'full_scans': full_scans}
+
+def run_index_advisor(company_id: int = 1, captured_file: Optional[str] = None) -> List[Dict]:
+    """Explain every representative and captured query shape"""
+    shapes = representative_queries(company_id)
+    if captured_file:
+        shapes.update(load_captured_queries(captured_file))
+
+    report = []
+    for statement, parameters in shapes.items():
+        result = explain(statement, parameters)
+        report.append({
+            'statement': ' '.join(statement.split()),
+            'plan': result['plan'],
+            'full_scans': sorted(set(result['full_scans']))
+        })
+    db.session.rollback()
+    return report
@@ -0,0 +1,308 @@
+"""
+Live updates for ServiceBook Pros
+Publishes committed job, clock-in, material request and message domain events
+to per-company subscribers (the /api/live/stream server-sent events endpoint),
+in process or through Redis pub/sub (REDIS_URL) so every worker sees them
+
+Each worker keeps the last LIVE_BUFFER_SIZE events of every company, so a
+client that reconnects with Last-Event-ID receives what it missed; when the
+buffer no longer reaches back that far it receives a ``reset`` event and
+reloads instead.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.utils import domain_events
+from src.utils.domain_events import DomainEvent
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class LiveEvent:
+    """One published change; ``technician_ids`` and ``user_ids`` name the
+    technicians (by technicians.id or their users.id) it concerns"""
+
+    __slots__ = ('id', 'company_id', 'type', 'data', 'technician_ids', 'user_ids')
+
+    def __init__(self, event_id: int, company_id: int, event_type: str, data: Dict,
+                 technician_ids: Iterable[int] = (), user_ids: Iterable[int] = ()):
+        self.id = event_id
+        self.company_id = company_id
+        self.type = event_type
+        self.data = data
+        self.technician_ids = tuple(technician_ids)
+        self.user_ids = tuple(user_ids)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'id': self.id, 'company_id': self.company_id, 'type': self.type, 'data': self.data,
+            'technician_ids': self.technician_ids, 'user_ids': self.user_ids,
+        })
+
+    @classmethod
+    def from_json(cls, raw) -> 'LiveEvent':
+        item = json.loads(raw)
+        return cls(item['id'], item['company_id'], item['type'], item['data'],
+                   item.get('technician_ids') or (), item.get('user_ids') or ())
+
+    def sse(self) -> str:
+        """The event in text/event-stream framing"""
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n"
+
+class Subscription:
+    """A stream's queue of events; closed by the bus when the reader falls
+    ``max_queue`` events behind, after which the client resumes by id"""
+
+    def __init__(self, company_id: int, accepts: Callable[[LiveEvent], bool], max_queue: int):
+        self.company_id = company_id
+        self.accepts = accepts
+        self.closed = False
+        self._queue: 'queue.Queue[LiveEvent]' = queue.Queue(max_queue)
+
+    def offer(self, live_event: LiveEvent) -> bool:
+        if not self.accepts(live_event):
+            return True
+        try:
+            self._queue.put_nowait(live_event)
+            return True
+        except queue.Full:
+            self.closed = True
+            return False
+
+    def get(self, timeout: float) -> Optional[LiveEvent]:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class EventBus:
+    """Per-company fan-out of live events with a short replay buffer.
+
+    Without Redis, events reach the subscribers of the process that
+    committed them, and ids come from a per-process counter seeded with the
+    clock. With Redis, ids come from one shared counter and every event is
+    PUBLISHed on a single channel that a listener thread in each process
+    delivers to its own subscribers.
+    """
+
+    def __init__(self):
+        self.buffer_size = 200
+        self.max_queue = 500
+        self.max_streams = 16
+        self.client = None
+        self.channel = 'sbp:live'
+        self._lock = threading.Lock()
+        self._buffers: Dict[int, deque] = defaultdict(deque)
+        self._subscribers: Dict[int, List[Subscription]] = defaultdict(list)
+        # Events at or below a company's floor may be missing from its buffer
+        self._floors: Dict[int, int] = {}
+        self._sequence = int(time.time() * 1000)
+        self._base_floor = self._sequence
+        self._listener = None
+        self._listener_pid = None
+        self._listener_ready = threading.Event()
+        self.published = 0
+        self.dropped_subscribers = 0
+        self.refused_streams = 0
+        self.errors = 0
+
+    def configure(self, redis_url: Optional[str] = None, prefix: str = 'sbp:',
+                  buffer_size: int = 200, max_queue: int = 500, max_streams: int = 16):
+        self.buffer_size = buffer_size
+        self.max_queue = max_queue
+        self.max_streams = max_streams
+        self.channel = f'{prefix}live'
+        self.client = None
+        if redis_url:
+            if redis is None:
+                logger.warning('REDIS_URL is set but the redis package is not installed; '
+                               'live updates stay within each process')
+            else:
+                self.client = redis.Redis.from_url(redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+    @property
+    def backend(self) -> str:
+        return 'redis' if self.client is not None else 'memory'
+
+    # Publishing ---------------------------------------------------------
+
+    def publish(self, company_id: int, event_type: str, data: Dict,
+                technician_ids: Iterable[int] = (), user_ids: Iterable[int] = ()):
+        technician_ids = [value for value in technician_ids if value is not None]
+        user_ids = [value for value in user_ids if value is not None]
+        if self.client is None:
+            with self._lock:
+                self._sequence += 1
+                event_id = self._sequence
+            self._deliver(LiveEvent(event_id, company_id, event_type, data, technician_ids, user_ids))
+            return
+        try:
+            event_id = self.client.incr(f'{self.channel}:seq')
+            self.client.publish(self.channel, LiveEvent(
+                event_id, company_id, event_type, data, technician_ids, user_ids
+            ).to_json())
+        except redis.RedisError as e:
+            # The change is committed either way; streams that miss it pick
+            # it up on their next reload
+            self.errors += 1
+            logger.warning('Publishing live event %s failed: %s', event_type, e)
+
+    def _deliver(self, live_event: LiveEvent):
+        with self._lock:
+            buffer = self._buffers[live_event.company_id]
+            if len(buffer) >= self.buffer_size:
+                self._floors[live_event.company_id] = buffer.popleft().id
+            buffer.append(live_event)
+            subscribers = self._subscribers.get(live_event.company_id, [])
+            for subscription in list(subscribers):
+                if not subscription.offer(live_event):
+                    subscribers.remove(subscription)
+                    self.dropped_subscribers += 1
+            self.published += 1
+
+    # Subscribing --------------------------------------------------------
+
+    def subscribe(self, company_id: int, accepts: Callable[[LiveEvent], bool],
+                  last_event_id: Optional[int] = None) -> Tuple[Optional[Subscription], List[LiveEvent]]:
+        """Register a subscriber; returns it with the buffered events after
+        ``last_event_id``. When the buffer no longer reaches back that far the
+        backlog is a single ``reset`` event, whose id moves the client past
+        the gap once it has reloaded.
+
+        Returns (None, []) when this process already has ``max_streams``
+        subscribers: each open stream holds a server thread.
+        """
+        if self.client is not None:
+            self._ensure_listener()
+        subscription = Subscription(company_id, accepts, self.max_queue)
+        with self._lock:
+            if sum(len(items) for items in self._subscribers.values()) >= self.max_streams:
+                self.refused_streams += 1
+                return None, []
+            backlog: List[LiveEvent] = []
+            if last_event_id is not None:
+                buffer = self._buffers.get(company_id, ())
+                floor = max(self._base_floor, self._floors.get(company_id, 0))
+                if last_event_id < floor:
+                    newest = buffer[-1].id if buffer else floor
+                    backlog = [LiveEvent(newest, company_id, 'reset', {'reason': 'missed events'})]
+                else:
+                    backlog = [item for item in buffer if item.id > last_event_id and accepts(item)]
+            self._subscribers[company_id].append(subscription)
+        return subscription, backlog
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.company_id, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.company_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'subscribers': sum(len(items) for items in self._subscribers.values()),
+                'max_streams': self.max_streams,
+                'refused_streams': self.refused_streams,
+                'companies_buffered': len(self._buffers),
+                'published': self.published,
+                'dropped_subscribers': self.dropped_subscribers,
+                'errors': self.errors,
+            }
+
+    # Redis listener -----------------------------------------------------
+
+    def _ensure_listener(self):
+        # Started lazily in the process that serves the stream, so it also
+        # exists in forked server workers
+        if self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._listener_ready.clear()
+            self._listener = threading.Thread(target=self._listen, name='live-listener', daemon=True)
+            self._listener.start()
+        # Events published before the listener subscribed are not replayed,
+        # so wait briefly for it before the stream reads its backlog
+        self._listener_ready.wait(2.0)
+
+    def _listen(self):
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                # Anything published while this process was not listening is
+                # missing from its buffers
+                base_floor = int(self.client.get(f'{self.channel}:seq') or 0)
+                with self._lock:
+                    self._base_floor = base_floor
+                    self._buffers.clear()
+                    self._floors.clear()
+                self._listener_ready.set()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'message':
+                        self._deliver(LiveEvent.from_json(message['data']))
+            except Exception:
+                self.errors += 1
+                logger.exception('Live event listener lost Redis; reconnecting')
+                time.sleep(1.0)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+bus = EventBus()
+
+# Domain events ----------------------------------------------------------
+
+# Committed domain events (src/utils/domain_events.py) that are streamed
+LIVE_EVENT_TYPES = frozenset((
+    'job.created', 'job.updated', 'job.status_changed', 'job.deleted',
+    'technician.clocked_in', 'technician.clocked_out',
+    'material_request.created', 'material_request.updated',
+    'message.created', 'message.status_changed',
+    'question.created', 'question.updated',
+))
+
+def _publish_events(events: List[DomainEvent]):
+    for domain_event in events:
+        if domain_event.type in LIVE_EVENT_TYPES:
+            bus.publish(domain_event.company_id, domain_event.type, domain_event.data,
+                        domain_event.technician_ids, domain_event.user_ids)
+
+def init_live(app):
+    """Publish the domain events of db.session commits to the live event bus.
+
+    REDIS_URL           share events between worker processes
+    LIVE_BUFFER_SIZE    events kept per company for Last-Event-ID resume
+    LIVE_QUEUE_SIZE     events a slow stream may fall behind before it is closed
+    LIVE_MAX_STREAMS    open streams per process; gunicorn.conf.py adds as
+                        many threads, so streams never take the request threads
+    """
+    bus.configure(
+        redis_url=os.environ.get('REDIS_URL'),
+        prefix=os.environ.get('CACHE_KEY_PREFIX', f'sbp:{app.import_name}:'),
+        buffer_size=int(os.environ.get('LIVE_BUFFER_SIZE', 200)),
+        max_queue=int(os.environ.get('LIVE_QUEUE_SIZE', 500)),
+        max_streams=int(os.environ.get('LIVE_MAX_STREAMS', 16)),
+    )
+    domain_events.on_commit(_publish_events)
+    app.extensions['live'] = bus
+    return bus
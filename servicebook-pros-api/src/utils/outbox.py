@@ -0,0 +1,503 @@
+"""
+Outbound message queue for ServiceBook Pros
+SMS and email are written to an outbox table in the caller's transaction
+and delivered by a worker pool with per-provider rate limits, retries with
+exponential backoff and dead-lettering
+"""
+
+import abc
+import itertools
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, ContextManager, Dict, Iterable, List, Optional
+
+from sqlalchemy import Column, DateTime, Integer, String, Text, and_, event, func, insert, or_, update
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+DEAD = 'dead'
+CANCELLED = 'cancelled'
+
+class OutboxMessageMixin:
+    """Columns of an outbox table; each app maps it on its own declarative base"""
+
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer)
+    source_id = Column(Integer)  # row this delivers (communication log / message)
+
+    channel = Column(String(10), nullable=False)  # 'sms' or 'email'
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(500))
+    body = Column(Text, nullable=False)
+
+    status = Column(String(20), nullable=False, default=PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = Column(String(100))
+    locked_until = Column(DateTime)
+    last_error = Column(Text)
+
+    provider = Column(String(50))
+    provider_message_id = Column(String(200))
+    sent_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def data_scope(self):
+        """Delivery bookkeeping moves no data version (see http_cache); the
+        row it delivers records the outcome"""
+        return None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'company_id': self.company_id,
+            'source_id': self.source_id,
+            'channel': self.channel,
+            'recipient': self.recipient,
+            'subject': self.subject,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'provider': self.provider,
+            'provider_message_id': self.provider_message_id,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
+
+class Envelope:
+    """What a provider needs to deliver one outbox row"""
+
+    __slots__ = ('id', 'company_id', 'channel', 'recipient', 'subject', 'body', 'attempt')
+
+    def __init__(self, row):
+        self.id = row.id
+        self.company_id = row.company_id
+        self.channel = row.channel
+        self.recipient = row.recipient
+        self.subject = row.subject
+        self.body = row.body
+        self.attempt = row.attempts
+
+class ProviderError(Exception):
+    """Delivery failed. Permanent errors (bad number, rejected content) go
+    straight to the dead letters; others are retried with backoff."""
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+class RateLimiter:
+    """Token bucket shared by the threads of one process.
+
+    Each process enforces the rate on its own, so with several worker
+    processes give each ``rate / processes``.
+    """
+
+    def __init__(self, rate_per_second: Optional[float] = None, burst: Optional[int] = None):
+        self.rate = rate_per_second
+        self.capacity = float(burst or max(1, int(rate_per_second or 1)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class Provider(abc.ABC):
+    """Delivers one channel. ``send`` returns the provider's message id or
+    raises ProviderError."""
+
+    name = 'provider'
+    channel = 'sms'
+
+    def __init__(self, rate_per_second: Optional[float] = None):
+        self.limiter = RateLimiter(rate_per_second)
+
+    @abc.abstractmethod
+    def send(self, envelope: Envelope) -> Optional[str]:
+        ...
+
+class CallableProvider(Provider):
+    """Adapts a send function (e.g. a Twilio or SendGrid client call)"""
+
+    def __init__(self, name: str, channel: str, send: Callable[[Envelope], Optional[str]],
+                 rate_per_second: Optional[float] = None):
+        super().__init__(rate_per_second)
+        self.name = name
+        self.channel = channel
+        self._send = send
+
+    def send(self, envelope):
+        return self._send(envelope)
+
+class FakeProvider(Provider):
+    """Local provider for development and tests: records what it was asked
+    to send and fails on request"""
+
+    def __init__(self, channel: str, rate_per_second: Optional[float] = None, latency: float = 0.0):
+        super().__init__(rate_per_second)
+        self.name = f'fake_{channel}'
+        self.channel = channel
+        self.latency = latency
+        self.sent: List[Dict] = []
+        self._failures = deque()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def fail_next(self, count: int = 1, permanent: bool = False, error: str = 'simulated provider failure'):
+        with self._lock:
+            self._failures.extend([(error, permanent)] * count)
+
+    def send(self, envelope):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self._failures:
+                error, permanent = self._failures.popleft()
+                raise ProviderError(error, permanent=permanent)
+            message_id = f'{self.name}_{next(self._ids)}'
+            self.sent.append({
+                'id': message_id, 'outbox_id': envelope.id, 'to': envelope.recipient,
+                'subject': envelope.subject, 'body': envelope.body,
+            })
+        return message_id
+
+class Outbox:
+    """Durable queue of outbound messages backed by an OutboxMessageMixin model.
+
+    ``enqueue`` only adds a row to the caller's session, so the message is
+    committed (or rolled back) together with whatever produced it.
+    ``drain`` claims due rows, hands them to the providers on a thread
+    pool and records the outcome.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.providers: Dict[str, Provider] = {}
+        self.on_sent: List[Callable] = []
+        self.on_dead: List[Callable] = []
+        self.session_scope: Optional[Callable[[], ContextManager]] = None
+        self.max_attempts = 5
+        self.backoff_base = 30.0
+        self.backoff_max = 3600.0
+        self.lease_seconds = 120
+        self.batch_size = 50
+        self.concurrency = 4
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._wake = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._thread_lock = threading.Lock()
+        self.inline_worker = False
+
+    def configure(self, session_scope: Callable[[], ContextManager], max_attempts: int = 5,
+                  backoff_base: float = 30.0, backoff_max: float = 3600.0, lease_seconds: int = 120,
+                  batch_size: int = 50, concurrency: int = 4, inline_worker: bool = False):
+        self.session_scope = session_scope
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.inline_worker = inline_worker
+
+    def register_provider(self, provider: Provider):
+        self.providers[provider.channel] = provider
+
+    def watch(self, session_target):
+        """Wake the in-process worker when a session that enqueued commits.
+
+        ``session_target`` is a session, scoped session or sessionmaker.
+        """
+        event.listen(session_target, 'after_commit', self._after_commit)
+
+    def _after_commit(self, session):
+        if session.info.pop('outbox_enqueued', False) and self.inline_worker:
+            self._ensure_inline_worker()
+            self._wake.set()
+
+    def enqueue(self, session, channel: str, recipient: str, body: str, subject: Optional[str] = None,
+                company_id: Optional[int] = None, source_id: Optional[int] = None,
+                send_at: Optional[datetime] = None):
+        """Add a message to ``session``; it is queued when the caller commits"""
+        row = self.model(
+            company_id=company_id,
+            source_id=source_id,
+            channel=channel,
+            recipient=recipient,
+            subject=subject,
+            body=body,
+            status=PENDING,
+            attempts=0,
+            max_attempts=self.max_attempts,
+            next_attempt_at=send_at or datetime.utcnow(),
+        )
+        session.add(row)
+        session.info['outbox_enqueued'] = True
+        return row
+
+    def enqueue_many(self, session, messages: Iterable[Dict]) -> int:
+        """Queue many messages with one executemany INSERT.
+
+        Each message is a dict of ``enqueue`` keyword arguments (channel,
+        recipient, body and optionally subject, company_id, source_id,
+        send_at). Returns the number queued.
+        """
+        now = datetime.utcnow()
+        rows = [{
+            'company_id': message.get('company_id'),
+            'source_id': message.get('source_id'),
+            'channel': message['channel'],
+            'recipient': message['recipient'],
+            'subject': message.get('subject'),
+            'body': message['body'],
+            'status': PENDING,
+            'attempts': 0,
+            'max_attempts': self.max_attempts,
+            'next_attempt_at': message.get('send_at') or now,
+            'created_at': now,
+            'updated_at': now,
+        } for message in messages]
+        if rows:
+            session.execute(insert(self.model), rows)
+            session.info['outbox_enqueued'] = True
+        return len(rows)
+
+    def backoff(self, attempts: int) -> float:
+        """Seconds before retry number ``attempts``, doubling with +/-20% jitter"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** max(0, attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _due(self, now):
+        model = self.model
+        return or_(
+            and_(model.status == PENDING, model.next_attempt_at <= now),
+            # a worker died while sending; its lease ran out
+            and_(model.status == SENDING, model.locked_until < now),
+        )
+
+    def claim(self, limit: Optional[int] = None) -> List[int]:
+        """Lease up to ``limit`` due messages to this worker.
+
+        Each row is taken with a conditional UPDATE, so concurrent workers
+        (threads or processes, SQLite or Postgres) never claim the same row.
+        The attempt is counted here: a worker that dies mid-send still uses
+        one up.
+        """
+        model = self.model
+        now = datetime.utcnow()
+        claimed = []
+        with self.session_scope() as session:
+            candidates = session.query(model.id).filter(self._due(now)) \
+                .order_by(model.next_attempt_at, model.id).limit(limit or self.batch_size).all()
+            for (message_id,) in candidates:
+                result = session.execute(
+                    update(model)
+                    .where(model.id == message_id, self._due(now))
+                    .values(status=SENDING, locked_by=self.worker_id,
+                            locked_until=now + timedelta(seconds=self.lease_seconds),
+                            attempts=model.attempts + 1, updated_at=now)
+                )
+                if result.rowcount == 1:
+                    claimed.append(message_id)
+            session.commit()
+        return claimed
+
+    def deliver(self, message_id: int) -> str:
+        """Send one claimed message and record the outcome; returns the new status"""
+        with self.session_scope() as session:
+            row = session.get(self.model, message_id)
+            if row is None or row.status != SENDING or row.locked_by != self.worker_id:
+                return row.status if row else 'missing'
+            envelope = Envelope(row)
+            # No transaction stays open while the provider is called
+            session.commit()
+
+            provider = self.providers.get(envelope.channel)
+            if provider is not None:
+                provider.limiter.acquire()
+                # Waiting for the rate limit can outlast the lease; renew it
+                # first so a worker that re-claimed the row sends it alone
+                if not self._renew(session, message_id):
+                    return session.get(self.model, message_id).status
+            error, permanent, provider_message_id = None, False, None
+            try:
+                if provider is None:
+                    raise ProviderError(f'No provider configured for {envelope.channel}', permanent=True)
+                provider_message_id = provider.send(envelope)
+            except ProviderError as e:
+                error, permanent = str(e), e.permanent
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+
+            row = session.get(self.model, message_id)
+            if row.locked_by != self.worker_id:
+                # Lease expired and another worker took over; let it record the result
+                session.rollback()
+                return row.status
+
+            now = datetime.utcnow()
+            row.locked_by = None
+            row.locked_until = None
+            row.provider = provider.name if provider else None
+            if error is None:
+                row.status = SENT
+                row.provider_message_id = provider_message_id
+                row.sent_at = now
+                row.last_error = None
+                listeners = self.on_sent
+            elif permanent or row.attempts >= row.max_attempts:
+                row.status = DEAD
+                row.last_error = error
+                listeners = self.on_dead
+                logger.warning('Outbox message %s dead after %s attempts: %s', row.id, row.attempts, error)
+            else:
+                row.status = PENDING
+                row.last_error = error
+                row.next_attempt_at = now + timedelta(seconds=self.backoff(row.attempts))
+                listeners = ()
+            for listener in listeners:
+                listener(session, row)
+            session.commit()
+            return row.status
+
+    def _renew(self, session, message_id: int) -> bool:
+        """Extend this worker's lease on a row; False when it has lost the row"""
+        model = self.model
+        now = datetime.utcnow()
+        result = session.execute(
+            update(model)
+            .where(model.id == message_id, model.status == SENDING, model.locked_by == self.worker_id)
+            .values(locked_until=now + timedelta(seconds=self.lease_seconds), updated_at=now)
+        )
+        session.commit()
+        return result.rowcount == 1
+
+    def drain(self, limit: Optional[int] = None, executor: Optional[ThreadPoolExecutor] = None) -> Dict[str, int]:
+        """Deliver one batch of due messages; returns counts per outcome"""
+        message_ids = self.claim(limit)
+        outcomes: Dict[str, int] = {}
+        if not message_ids:
+            return outcomes
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='outbox') as pool:
+                results = list(pool.map(self._deliver_safely, message_ids))
+        else:
+            results = list(executor.map(self._deliver_safely, message_ids))
+        for status in results:
+            outcomes[status] = outcomes.get(status, 0) + 1
+        return outcomes
+
+    def _deliver_safely(self, message_id):
+        try:
+            return self.deliver(message_id)
+        except Exception:
+            # The lease runs out and the message is retried
+            logger.exception('Outbox delivery of %s failed', message_id)
+            return 'error'
+
+    def run(self, stop: Optional[threading.Event] = None, poll_interval: float = 1.0):
+        """Drain until ``stop`` is set, waiting ``poll_interval`` when idle"""
+        stop = stop or threading.Event()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='outbox') as pool:
+            while not stop.is_set():
+                try:
+                    outcomes = self.drain(executor=pool)
+                except Exception:
+                    logger.exception('Outbox drain failed')
+                    outcomes = {}
+                if not outcomes:
+                    self._wake.wait(poll_interval)
+                    self._wake.clear()
+
+    def _ensure_inline_worker(self):
+        # Started lazily in the process that enqueues, so it also exists in
+        # forked server workers
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+                return
+            self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, name='outbox-worker', daemon=True)
+            self._thread.start()
+
+    def requeue_dead(self, session, message_ids: Optional[List[int]] = None) -> int:
+        """Give dead letters a fresh set of attempts"""
+        model = self.model
+        query = update(model).where(model.status == DEAD)
+        if message_ids:
+            query = query.where(model.id.in_(message_ids))
+        result = session.execute(query.values(status=PENDING, attempts=0, next_attempt_at=datetime.utcnow(),
+                                              updated_at=datetime.utcnow()))
+        return result.rowcount
+
+    def cancel(self, session, source_ids) -> List[int]:
+        """Cancel pending messages for ``source_ids`` (ids or a subquery).
+
+        Messages already claimed by a worker are not stopped. Returns the
+        source ids whose message was cancelled.
+        """
+        model = self.model
+        cancelled = session.execute(
+            update(model)
+            .where(model.status == PENDING, model.source_id.in_(source_ids))
+            .values(status=CANCELLED, updated_at=datetime.utcnow())
+            .returning(model.source_id)
+        ).scalars().all()
+        return cancelled
+
+    def stats(self, session) -> Dict:
+        model = self.model
+        counts = dict(session.query(model.status, func.count(model.id)).group_by(model.status).all())
+        oldest = session.query(func.min(model.created_at)).filter(model.status == PENDING).scalar()
+        return {
+            'counts': {status: counts.get(status, 0) for status in (PENDING, SENDING, SENT, DEAD, CANCELLED)},
+            'oldest_pending_seconds': round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0,
+            'providers': {channel: provider.name for channel, provider in self.providers.items()},
+        }
+
+def outbox_settings() -> Dict:
+    """Outbox.configure keyword arguments from OUTBOX_* environment variables"""
+    return {
+        'max_attempts': int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 5)),
+        'backoff_base': float(os.environ.get('OUTBOX_BACKOFF_SECONDS', 30)),
+        'backoff_max': float(os.environ.get('OUTBOX_BACKOFF_MAX_SECONDS', 3600)),
+        'lease_seconds': int(os.environ.get('OUTBOX_LEASE_SECONDS', 120)),
+        'batch_size': int(os.environ.get('OUTBOX_BATCH_SIZE', 50)),
+        'concurrency': int(os.environ.get('OUTBOX_CONCURRENCY', 4)),
+        'inline_worker': os.environ.get('OUTBOX_INLINE_WORKER', 'true').lower() == 'true',
+    }
+
+def provider_rate(channel: str) -> Optional[float]:
+    """Messages per second allowed for a channel (OUTBOX_SMS_RATE / OUTBOX_EMAIL_RATE)"""
+    default = {'sms': '1', 'email': '10'}.get(channel, '')
+    value = os.environ.get(f'OUTBOX_{channel.upper()}_RATE', default)
+    return float(value) if value else None
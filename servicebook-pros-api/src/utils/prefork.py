@@ -0,0 +1,75 @@
+"""
+Pre-fork warm-up for ServiceBook Pros
+Builds shared read-only state in the server master so forked workers share
+it copy-on-write and resets engines across the fork
+"""
+
+import gc
+import logging
+import time
+from typing import Callable, Dict, List, Tuple
+
+from flask import current_app, request
+
+from src.utils.database import reset_engines
+
+logger = logging.getLogger(__name__)
+
+_warmers: List[Tuple[str, Callable]] = []
+
+def warmup(name: str):
+    """Register a function that builds shared read-only state before forking.
+
+    Warmers run inside an app context, in registration order. A failing
+    warmer is logged and skipped; workers then build that state on demand.
+    """
+    def decorator(f):
+        _warmers.append((name, f))
+        return f
+    return decorator
+
+def render_view(endpoint: str, **values):
+    """Run a GET view without the request hooks, filling its view cache"""
+    path = current_app.url_map.bind('localhost').build(endpoint, values)
+    with current_app.test_request_context(path):
+        view = current_app.view_functions[request.endpoint]
+        current_app.make_response(view(**request.view_args))
+
+def warm_shared_state(app) -> Dict[str, float]:
+    """Run every registered warmer; returns milliseconds per warmer"""
+    timings = {}
+    for name, warmer in _warmers:
+        started = time.perf_counter()
+        # A context each, so a failed warmer leaves no session state behind
+        with app.app_context():
+            try:
+                warmer()
+            except Exception as e:
+                logger.warning('Warm-up %s failed: %s', name, e)
+                continue
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return timings
+
+def prepare_for_fork(app, db) -> Dict[str, float]:
+    """Warm the master, then leave it in a state that is safe to fork.
+
+    The app's mappers and the URL map are compiled once here instead of in
+    every worker. Engines are reset so no connection is inherited, and the
+    surviving objects are moved out of the garbage collector's reach:
+    otherwise the first collection in each worker writes to every object
+    header and un-shares the pages.
+    """
+    started = time.perf_counter()
+    db.Model.registry.configure()
+    app.url_map.update()
+    timings = warm_shared_state(app)
+    reset_engines(app, db, close=True)
+    gc.collect()
+    gc.freeze()
+    logger.info('Warmed shared state in %.0fms (%s)', (time.perf_counter() - started) * 1000,
+                ', '.join(f'{name} {ms:.0f}ms' for name, ms in timings.items()) or 'no warmers')
+    return timings
+
+def after_fork(app, db):
+    """Per-worker reset; the pool inherited from the master must not be reused"""
+    reset_engines(app, db, close=False)
@@ -0,0 +1,331 @@
+"""
+Request profiling for ServiceBook Pros
+Per-request SQL/serialization/Python time, slow-query log, Server-Timing
+headers, Prometheus /metrics and an admin-only sampling profiler
+"""
+
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import Response, current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_SOURCE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)')
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_sql(statement: str) -> str:
+    """Statement with literals and IN-lists collapsed, for grouping"""
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = _PLACEHOLDER_LIST.sub('(?)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+def _call_site() -> str:
+    """Innermost frame of application code that issued the query"""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(_SOURCE_ROOT) and filename != _THIS_FILE:
+            return f'{os.path.relpath(filename, _SOURCE_ROOT)}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+class RequestMetrics:
+    """Process-wide counters rendered in the Prometheus text format.
+
+    Each worker process keeps its own numbers; scrape every worker (or
+    sum per instance) when running several.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Counter = Counter()          # (method, endpoint, status) -> n
+        self.duration_buckets: Dict[str, List[int]] = {}
+        self.duration_sum: Counter = Counter()      # endpoint -> seconds
+        self.duration_count: Counter = Counter()
+        self.sql_queries: Counter = Counter()       # endpoint -> n
+        self.sql_seconds: Counter = Counter()
+        self.serialize_seconds: Counter = Counter()
+        self.slow_queries = 0
+
+    def observe(self, method, endpoint, status, profile):
+        with self._lock:
+            self.requests[(method, endpoint, status)] += 1
+            buckets = self.duration_buckets.setdefault(endpoint, [0] * len(DURATION_BUCKETS))
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if profile['total'] <= bound:
+                    buckets[index] += 1
+            self.duration_sum[endpoint] += profile['total']
+            self.duration_count[endpoint] += 1
+            self.sql_queries[endpoint] += profile['queries']
+            self.sql_seconds[endpoint] += profile['sql']
+            self.serialize_seconds[endpoint] += profile['serialize']
+
+    def render(self) -> str:
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape_label(val)}"' for key, val in labels.items())
+                lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+
+        with self._lock:
+            metric('http_requests_total', 'counter', 'HTTP requests handled',
+                   [({'method': m, 'endpoint': e, 'status': s}, n) for (m, e, s), n in sorted(self.requests.items())])
+
+            histogram = []
+            for endpoint, buckets in sorted(self.duration_buckets.items()):
+                for bound, count in zip(DURATION_BUCKETS, buckets):
+                    histogram.append(({'endpoint': endpoint, 'le': bound}, count))
+                histogram.append(({'endpoint': endpoint, 'le': '+Inf'}, self.duration_count[endpoint]))
+            lines.append('# HELP http_request_duration_seconds Request duration')
+            lines.append('# TYPE http_request_duration_seconds histogram')
+            for labels, value in histogram:
+                lines.append(f'http_request_duration_seconds_bucket{{endpoint="{_escape_label(labels["endpoint"])}",le="{labels["le"]}"}} {value}')
+            for endpoint in sorted(self.duration_count):
+                label = _escape_label(endpoint)
+                lines.append(f'http_request_duration_seconds_sum{{endpoint="{label}"}} {self.duration_sum[endpoint]:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{endpoint="{label}"}} {self.duration_count[endpoint]}')
+
+            metric('db_queries_total', 'counter', 'SQL statements executed by requests',
+                   [({'endpoint': e}, n) for e, n in sorted(self.sql_queries.items())])
+            metric('db_query_seconds_total', 'counter', 'Time spent in SQL statements by requests',
+                   [({'endpoint': e}, f'{n:.6f}') for e, n in sorted(self.sql_seconds.items())])
+            metric('serialization_seconds_total', 'counter', 'Time spent serializing responses',
+                   [({'endpoint': e}, f'{n:.6f}') for e, n in sorted(self.serialize_seconds.items())])
+            metric('db_slow_queries_total', 'counter', 'SQL statements slower than SLOW_QUERY_MS',
+                   [({}, self.slow_queries)])
+
+        lines.extend(_collector_lines())
+        return '\n'.join(lines) + '\n'
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _collector_lines() -> List[str]:
+    """Connection pool and application cache gauges"""
+    from src.utils.cache import cache
+    from src.utils.database import get_pool_metrics
+
+    lines = []
+    pools = get_pool_metrics()
+    for key, help_text in (('checked_out', 'Connections currently checked out'),
+                           ('checkouts', 'Connection checkouts'),
+                           ('wait_time_total_ms', 'Total time spent waiting for a connection')):
+        name = f'db_pool_{key}'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {"gauge" if key == "checked_out" else "counter"}')
+        for engine, stats in sorted(pools.items()):
+            lines.append(f'{name}{{engine="{_escape_label(engine)}"}} {stats[key]}')
+
+    stats = cache.stats()
+    for key in cache.metrics.COUNTERS:
+        lines.append(f'# HELP app_cache_{key}_total Application cache {key.replace("_", " ")}')
+        lines.append(f'# TYPE app_cache_{key}_total counter')
+        lines.append(f'app_cache_{key}_total{{backend="{stats["backend"]}"}} {stats[key]}')
+    return lines
+
+metrics = RequestMetrics()
+
+# Slow statements grouped by normalized SQL, plus the most recent ones
+_slow_lock = threading.Lock()
+_slow_by_statement: Dict[str, Dict] = {}
+_recent_slow = deque(maxlen=100)
+_MAX_SLOW_STATEMENTS = 500
+
+def _record_slow_query(statement, duration, call_site):
+    normalized = normalize_sql(statement)
+    endpoint = request.endpoint if has_request_context() else None
+    duration_ms = round(duration * 1000, 3)
+    with _slow_lock:
+        metrics.slow_queries += 1
+        entry = _slow_by_statement.get(normalized)
+        if entry is None and len(_slow_by_statement) < _MAX_SLOW_STATEMENTS:
+            entry = _slow_by_statement[normalized] = {
+                'statement': normalized, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'call_sites': set()
+            }
+        if entry is not None:
+            entry['count'] += 1
+            entry['total_ms'] += duration_ms
+            entry['max_ms'] = max(entry['max_ms'], duration_ms)
+            entry['call_sites'].add(call_site)
+        _recent_slow.append({
+            'statement': normalized,
+            'duration_ms': duration_ms,
+            'call_site': call_site,
+            'endpoint': endpoint,
+            'at': datetime.utcnow().isoformat(),
+        })
+    logger.warning('Slow query (%.1f ms) at %s [%s]: %s', duration_ms, call_site, endpoint, normalized)
+
+def slow_query_report(limit: int = 20) -> Dict:
+    with _slow_lock:
+        statements = sorted(_slow_by_statement.values(), key=lambda entry: entry['total_ms'], reverse=True)
+        return {
+            'top': [{**entry, 'total_ms': round(entry['total_ms'], 3), 'call_sites': sorted(entry['call_sites'])}
+                    for entry in statements[:limit]],
+            'recent': list(_recent_slow)[-limit:],
+        }
+
+def _profile():
+    if not has_request_context():
+        return None
+    return g.get('profile')
+
+_slow_query_seconds = 0.2
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('profile_query_start')
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    profile = _profile()
+    if profile is not None:
+        profile['sql'] += duration
+        profile['queries'] += 1
+    if duration >= _slow_query_seconds:
+        _record_slow_query(statement, duration, _call_site())
+
+@contextmanager
+def timed(section: str = 'serialize'):
+    """Add the time spent in the block to a section of the request profile"""
+    profile = _profile()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile[section] = profile.get(section, 0.0) + time.perf_counter() - started
+
+def _start_profile():
+    g.profile = {'start': time.perf_counter(), 'sql': 0.0, 'queries': 0, 'serialize': 0.0}
+
+def _finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    profile['total'] = time.perf_counter() - profile.pop('start')
+    profile['python'] = max(profile['total'] - profile['sql'] - profile['serialize'], 0.0)
+
+    endpoint = request.endpoint or 'unmatched'
+    if endpoint != 'profiling_metrics':
+        metrics.observe(request.method, endpoint, response.status_code, profile)
+
+    if current_app.config['SERVER_TIMING_ENABLED']:
+        response.headers['Server-Timing'] = ', '.join([
+            f'sql;dur={profile["sql"] * 1000:.2f};desc="{profile["queries"]} queries"',
+            f'serialize;dur={profile["serialize"] * 1000:.2f}',
+            f'app;dur={profile["python"] * 1000:.2f}',
+            f'total;dur={profile["total"] * 1000:.2f}',
+        ])
+    return response
+
+def _install_timed_json(app):
+    """Count JSON encoding done by jsonify() as serialization time"""
+    provider = app.json
+    dumps = provider.dumps
+
+    def timed_dumps(obj, **kwargs):
+        with timed('serialize'):
+            return dumps(obj, **kwargs)
+
+    provider.dumps = timed_dumps
+
+def sample_stacks(seconds: float, interval: float, ignore_thread: Optional[int] = None) -> Dict:
+    """Sample the stacks of all other threads for `seconds`"""
+    stacks: Counter = Counter()
+    functions: Counter = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == ignore_thread:
+                continue
+            stack = [f'{os.path.basename(f.f_code.co_filename)}:{f.f_code.co_name}' for f, _ in traceback.walk_stack(frame)]
+            if not stack:
+                continue
+            stacks[';'.join(reversed(stack))] += 1
+            functions[stack[0]] += 1
+            samples += 1
+        time.sleep(interval)
+    return {
+        'samples': samples,
+        'functions': [{'function': name, 'samples': count} for name, count in functions.most_common(30)],
+        'stacks': [{'stack': stack, 'samples': count} for stack, count in stacks.most_common(50)],
+    }
+
+def init_profiling(app, db, admin_required):
+    """Instrument requests and SQL, and add /metrics and /api/_debug/profile.
+
+    PROFILING_ENABLED      set to false to turn all of it off
+    SLOW_QUERY_MS          statements at least this slow are logged (200)
+    SERVER_TIMING_ENABLED  add a Server-Timing header to responses (true)
+    METRICS_TOKEN          when set, /metrics requires 'Authorization: Bearer <token>'
+
+    `admin_required` is the app's decorator guarding the sampling profiler.
+    Call before init_http_cache so conditional GETs and compression are
+    included in the request time.
+    """
+    app.config.setdefault('PROFILING_ENABLED', os.environ.get('PROFILING_ENABLED', 'true').lower() == 'true')
+    app.config.setdefault('SLOW_QUERY_MS', int(os.environ.get('SLOW_QUERY_MS', 200)))
+    app.config.setdefault('SERVER_TIMING_ENABLED', os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true')
+    app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+
+    if not app.config['PROFILING_ENABLED']:
+        return
+
+    global _slow_query_seconds
+    _slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    _install_timed_json(app)
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+
+    @app.route('/metrics', endpoint='profiling_metrics')
+    def prometheus_metrics():
+        token = current_app.config['METRICS_TOKEN']
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('unauthorized\n', status=401, mimetype='text/plain')
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/api/_debug/profile', endpoint='profiling_sample')
+    @admin_required
+    def sample_profile():
+        """Sample every thread's stack for ?seconds= (max 30) every ?interval_ms="""
+        seconds = min(max(request.args.get('seconds', 5, type=float), 0.1), 30.0)
+        interval = min(max(request.args.get('interval_ms', 10, type=float), 1.0), 1000.0) / 1000
+        report = sample_stacks(seconds, interval, ignore_thread=threading.get_ident())
+        report.update({
+            'seconds': seconds,
+            'interval_ms': interval * 1000,
+            'slow_queries': slow_query_report(),
+        })
+        return jsonify(report), 200
@@ -0,0 +1,85 @@
+"""
+Query budget (N+1 detector) for ServiceBook Pros
+Counts SQL statements per request and flags routes that exceed their budget
+"""
+
+import logging
+import os
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode (tests) when a route runs more queries than allowed"""
+
+def query_budget(max_queries):
+    """Declare how many SQL statements a route may run per request.
+
+    Place directly under the ``route`` decorator so the budget is attached
+    to the registered view function.
+    """
+    def decorator(f):
+        f.query_budget = max_queries
+        return f
+
+    return decorator
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+def init_query_budget(app, db):
+    """Count queries per request and enforce route budgets.
+
+    Enabled in debug mode or with QUERY_BUDGET_ENABLED=true. Routes without
+    a declared budget use QUERY_BUDGET_DEFAULT. With QUERY_BUDGET_STRICT
+    (or app.testing) an overrun raises QueryBudgetExceeded so the test
+    fails; otherwise it is logged.
+    """
+    app.config.setdefault('QUERY_BUDGET_ENABLED',
+                          app.debug or os.environ.get('QUERY_BUDGET_ENABLED', 'false').lower() == 'true')
+    app.config.setdefault('QUERY_BUDGET_DEFAULT', int(os.environ.get('QUERY_BUDGET_DEFAULT', 25)))
+    app.config.setdefault('QUERY_BUDGET_STRICT', os.environ.get('QUERY_BUDGET_STRICT', 'false').lower() == 'true')
+
+    if not app.config['QUERY_BUDGET_ENABLED']:
+        return
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _count_query)
+
+    @app.after_request
+    def _check_query_budget(response):
+        count = g.get('query_count', 0)
+        response.headers['X-Query-Count'] = str(count)
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', current_app.config['QUERY_BUDGET_DEFAULT'])
+        if count > budget:
+            message = f"{request.method} {request.path} ran {count} queries (budget {budget})"
+            if current_app.config['QUERY_BUDGET_STRICT'] or current_app.testing:
+                raise QueryBudgetExceeded(message)
+            logger.warning('Query budget exceeded: %s', message)
+        return response
+
+@contextmanager
+def assert_max_queries(engine, max_queries):
+    """Fail if the block runs more than `max_queries` statements on `engine`"""
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', _record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', _record)
+
+    if len(statements) > max_queries:
+        raise QueryBudgetExceeded(
+            f"{len(statements)} queries run (budget {max_queries}):\n" + '\n'.join(statements)
+        )
@@ -0,0 +1,314 @@
+"""
+Reminder scheduler for ServiceBook Pros
+Finds jobs due an appointment reminder or completion notice in one joined
+query per tick, renders them in batch and queues them in the outbox
+"""
+
+import abc
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, exists, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from src.models.user import db, User
+from src.models.company import Company
+from src.models.customer import Customer
+from src.models.job import Job, JobStatus
+from src.models.communication import (
+    CommunicationLog, CommunicationStatus, CommunicationType, JobNotification,
+    MessageTemplate, NotificationSettings
+)
+from src.utils.communication_service import outbox
+from src.utils.rollups import record_queued
+from src.utils.templating import compile_template, template_plan
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TICK_MINUTES = 15
+
+class ReminderKind(abc.ABC):
+    """One kind of job notification: which jobs are due and what they say"""
+
+    def __init__(self, name: str, setting: str, default_subject: str, default_body: str):
+        self.name = name
+        self.setting = setting  # NotificationSettings flag enabling it
+        self.default_subject = compile_template(default_subject)
+        self.default_body = compile_template(default_body)
+
+    def enabled(self, settings_by_company: Dict[int, NotificationSettings]) -> Dict[int, NotificationSettings]:
+        return {company_id: settings for company_id, settings in settings_by_company.items()
+                if getattr(settings, self.setting)}
+
+    @abc.abstractmethod
+    def window(self, now: datetime, settings_by_company: Dict[int, NotificationSettings]):
+        """SQL criterion for the jobs due now, given each company's settings"""
+
+class AppointmentReminder(ReminderKind):
+    """Scheduled jobs starting within the company's reminder_hours_before"""
+
+    def window(self, now, settings_by_company):
+        # One clause per distinct lead time rather than one per company
+        companies_by_lead = {}
+        for company_id, settings in settings_by_company.items():
+            companies_by_lead.setdefault(settings.reminder_hours_before or 24, []).append(company_id)
+        return and_(
+            Job.status == JobStatus.SCHEDULED,
+            Job.scheduled_date > now,
+            or_(*[
+                and_(Job.company_id.in_(company_ids), Job.scheduled_date <= now + timedelta(hours=hours))
+                for hours, company_ids in companies_by_lead.items()
+            ])
+        )
+
+class CompletionNotice(ReminderKind):
+    """Jobs completed within the last day; older completions are never announced"""
+
+    LOOKBACK = timedelta(days=1)
+
+    def window(self, now, settings_by_company):
+        return and_(
+            Job.company_id.in_(list(settings_by_company)),
+            Job.status.in_([JobStatus.COMPLETED, JobStatus.INVOICED]),
+            Job.actual_end_time >= now - self.LOOKBACK
+        )
+
+KINDS: List[ReminderKind] = [
+    AppointmentReminder(
+        'appointment_reminder', 'send_appointment_reminders', 'Appointment Reminder',
+        "Hi {{customer_first_name}}, this is a reminder that {{technician_name}} will be arriving for your "
+        "{{job_title}} appointment on {{job_date}} at {{job_time}}. Please call if you need to reschedule."
+    ),
+    CompletionNotice(
+        'job_completion', 'send_completion_notifications', 'Service Completed',
+        "Hi {{customer_first_name}}, {{technician_name}} has completed your {{job_title}} service. "
+        "Thank you for choosing us! Please let us know if you have any questions."
+    ),
+]
+
+def tick_minutes(settings: NotificationSettings) -> int:
+    return settings.reminder_tick_minutes or DEFAULT_TICK_MINUTES
+
+class ReminderScheduler:
+    """Queues due job notifications, each company on its own tick interval.
+
+    A JobNotification row (unique per job and kind) is written with the
+    message in the same transaction. Due jobs are those without one, so a
+    job is notified once however often or wherever the scheduler runs;
+    two processes racing on the same job make one commit fail and roll
+    back.
+    """
+
+    def __init__(self, kinds: Iterable[ReminderKind] = KINDS, batch_size: int = 500):
+        self.kinds = list(kinds)
+        self.batch_size = batch_size
+        self._last_tick: Dict[int, datetime] = {}
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    def due_companies(self, now: datetime) -> Dict[int, NotificationSettings]:
+        """Settings of the companies whose tick interval has elapsed"""
+        due = {}
+        for settings in NotificationSettings.query.all():
+            last = self._last_tick.get(settings.company_id)
+            if last is None or now - last >= timedelta(minutes=tick_minutes(settings)):
+                due.setdefault(settings.company_id, settings)
+        return due
+
+    def _due_jobs(self, kind, now, settings_by_company, job_ids=None):
+        technician = aliased(User)
+        query = db.session.query(
+            Job, Customer, Company.name, Company.phone, technician.first_name, technician.last_name
+        ) \
+            .join(Customer, Customer.id == Job.customer_id) \
+            .join(Company, Company.id == Job.company_id) \
+            .outerjoin(technician, technician.id == Job.assigned_technician_id) \
+            .filter(~exists().where(JobNotification.job_id == Job.id, JobNotification.kind == kind.name))
+        if job_ids is not None:
+            query = query.filter(Job.id.in_(job_ids))
+        else:
+            query = query.filter(kind.window(now, settings_by_company))
+        return query.order_by(Job.id).limit(self.batch_size).all()
+
+    def _templates(self, kind, company_ids):
+        """Compiled (subject, body, type) per company; templates are cached by id and updated_at"""
+        templates = {}
+        rows = MessageTemplate.query.filter(
+            MessageTemplate.company_id.in_(company_ids),
+            MessageTemplate.category == kind.name,
+            MessageTemplate.is_active == True
+        ).order_by(MessageTemplate.id).all()
+        for template in rows:
+            if template.company_id not in templates:
+                subject, body = template_plan(template)
+                templates[template.company_id] = (template.id, subject, body, template.communication_type)
+        return templates
+
+    def queue_kind(self, kind: ReminderKind, now: datetime, settings_by_company: Dict[int, NotificationSettings],
+                   job_ids: Optional[List[int]] = None) -> Dict[str, int]:
+        """Queue every due notification of one kind, a batch per transaction"""
+        counts = {'queued': 0, 'skipped': 0}
+        if job_ids is None:
+            settings_by_company = kind.enabled(settings_by_company)
+            if not settings_by_company:
+                return counts
+        # Every selected job is marked, so each batch shrinks the due set
+        while True:
+            rows = self._due_jobs(kind, now, settings_by_company, job_ids)
+            if not rows:
+                return counts
+            templates = self._templates(kind, {job.company_id for job, *_ in rows})
+            logs, marks = [], []
+            for job, customer, company_name, company_phone, tech_first, tech_last in rows:
+                template_id, subject, body, communication_type = templates.get(
+                    job.company_id, (None, kind.default_subject, kind.default_body, None)
+                )
+                if communication_type is None:
+                    communication_type = CommunicationType.SMS if customer.phone else CommunicationType.EMAIL
+                is_sms = communication_type == CommunicationType.SMS
+                recipient = (customer.mobile or customer.phone) if is_sms else customer.email
+                mark = {'company_id': job.company_id, 'job_id': job.id, 'kind': kind.name, 'created_at': now}
+                if not recipient:
+                    marks.append(dict(mark, status='skipped'))
+                    continue
+                data = {
+                    'customer_name': f"{customer.first_name} {customer.last_name}",
+                    'customer_first_name': customer.first_name,
+                    'customer_last_name': customer.last_name,
+                    'technician_name': f"{tech_first} {tech_last}" if tech_first else 'Our technician',
+                    'job_title': job.title,
+                    'job_scheduled_date': job.scheduled_date,
+                    'job_date': job.scheduled_date.strftime('%B %d, %Y') if job.scheduled_date else '',
+                    'job_time': job.scheduled_date.strftime('%I:%M %p') if job.scheduled_date else '',
+                    'job_address': job.service_address or f"{customer.address}, {customer.city}, {customer.state}",
+                    'completion_time': job.actual_end_time.strftime('%I:%M %p') if job.actual_end_time else '',
+                    'company_name': company_name,
+                    'company_phone': company_phone,
+                }
+                logs.append({
+                    'company_id': job.company_id,
+                    'customer_id': customer.id,
+                    'communication_type': communication_type,
+                    'recipient_phone': recipient if is_sms else None,
+                    'recipient_email': None if is_sms else recipient,
+                    'recipient_name': data['customer_name'],
+                    'subject': None if is_sms else subject.render(data),
+                    'message_body': body.render(data),
+                    'status': CommunicationStatus.PENDING,
+                    'job_id': job.id,
+                    'template_id': template_id,
+                    'scheduled_send_time': now,
+                })
+                marks.append(dict(mark, status='queued'))
+
+            try:
+                queued_marks = [mark for mark in marks if mark['status'] == 'queued']
+                if logs:
+                    log_ids = db.session.scalars(
+                        insert(CommunicationLog).returning(CommunicationLog.id, sort_by_parameter_order=True),
+                        logs
+                    ).all()
+                    for mark, log_id in zip(queued_marks, log_ids):
+                        mark['communication_log_id'] = log_id
+                    outbox.enqueue_many(db.session, ({
+                        'channel': 'sms' if log['recipient_phone'] else 'email',
+                        'recipient': log['recipient_phone'] or log['recipient_email'],
+                        'subject': log['subject'],
+                        'body': log['message_body'],
+                        'company_id': log['company_id'],
+                        'source_id': log_id,
+                    } for log, log_id in zip(logs, log_ids)))
+                    for (company_id, communication_type), count in Counter(
+                        (log['company_id'], log['communication_type']) for log in logs
+                    ).items():
+                        record_queued(db.session, company_id, communication_type, count)
+                db.session.execute(insert(JobNotification), marks)
+                db.session.commit()
+            except IntegrityError:
+                # Another scheduler queued some of these first; it owns them
+                db.session.rollback()
+                logger.info('Reminder batch for %s already queued elsewhere', kind.name)
+                return counts
+            counts['queued'] += len(logs)
+            counts['skipped'] += len(marks) - len(logs)
+            if job_ids is not None:
+                return counts
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict[str, Dict[str, int]]:
+        """One tick: queue what is due for every company whose interval has elapsed"""
+        now = now or datetime.utcnow()
+        settings_by_company = self.due_companies(now)
+        if not settings_by_company:
+            return {}
+        results = {kind.name: self.queue_kind(kind, now, settings_by_company) for kind in self.kinds}
+        for company_id in settings_by_company:
+            self._last_tick[company_id] = now
+        return results
+
+    def queue_for_job(self, kind_name: str, job_id: int) -> Dict[str, int]:
+        """Queue one job's notification now, unless it was already sent"""
+        kind = next(kind for kind in self.kinds if kind.name == kind_name)
+        return self.queue_kind(kind, datetime.utcnow(), {}, job_ids=[job_id])
+
+    def seconds_until_next_tick(self, now: Optional[datetime] = None) -> float:
+        now = now or datetime.utcnow()
+        waits = []
+        for settings in NotificationSettings.query.all():
+            last = self._last_tick.get(settings.company_id)
+            if last is None:
+                return 1.0
+            waits.append((last + timedelta(minutes=tick_minutes(settings)) - now).total_seconds())
+        return max(1.0, min(waits, default=DEFAULT_TICK_MINUTES * 60))
+
+    def run(self, app, stop: Optional[threading.Event] = None):
+        """Tick until ``stop`` is set"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            with app.app_context():
+                try:
+                    results = self.run_once()
+                    if any(counts['queued'] for counts in results.values()):
+                        logger.info('Reminders queued: %s', results)
+                    wait = self.seconds_until_next_tick()
+                except Exception:
+                    logger.exception('Reminder tick failed')
+                    db.session.rollback()
+                    wait = 60.0
+                finally:
+                    db.session.remove()
+            stop.wait(wait)
+
+    def ensure_thread(self, app):
+        """Start the in-process scheduler thread once per process (after forking too)"""
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, args=(app,), name='reminder-scheduler', daemon=True)
+            self._thread.start()
+
+scheduler = ReminderScheduler()
+
+def inline_scheduler_enabled() -> bool:
+    return os.environ.get('REMINDER_SCHEDULER_INLINE', 'true').lower() == 'true'
+
+def init_reminders(app):
+    """Run the scheduler in the web process unless REMINDER_SCHEDULER_INLINE=false.
+
+    The thread starts on the first request of each process, so a
+    preloading server master and CLI commands never run it.
+    """
+    if inline_scheduler_enabled():
+        @app.before_request
+        def _start_reminder_scheduler():
+            scheduler.ensure_thread(app)
+    app.extensions['reminders'] = scheduler
+    return scheduler
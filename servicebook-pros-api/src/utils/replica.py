@@ -0,0 +1,160 @@
+"""
+Read-replica routing for ServiceBook Pros
+Sends SELECTs from routes marked read-only to the 'replica' bind
+"""
+
+import os
+import sqlite3
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, jsonify, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+REPLICA_BIND = 'replica'
+
+class RoutingSession(Session):
+    """Session that reads from the replica bind while a route has opted in.
+
+    Writes, flushes and non-SELECT statements always use the primary. Once
+    the session has flushed, later reads also go to the primary (even after
+    commit) so a request sees its own writes while the replica lags behind.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._should_use_replica(clause):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _should_use_replica(self, clause):
+        if not has_app_context() or not g.get('use_replica'):
+            return False
+        if self._flushing or self.info.get('has_writes'):
+            return False
+        return clause is not None and getattr(clause, 'is_select', False)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_session_written(session, flush_context):
+    session.info['has_writes'] = True
+
+class ReplicaRouter:
+    """Configures the replica bind and decides per request whether to use it.
+
+    REPLICA_DATABASE_URL   replica connection URL (a second SQLite file works locally)
+    REPLICA_FALLBACK       'primary' (default) reads from the primary when the replica
+                           is unreachable; 'error' returns 503 instead
+    REPLICA_RETRY_SECONDS  how long an unreachable replica is skipped before retrying
+    REPLICA_HEALTH_SECONDS how long a successful probe is trusted; a connection error
+                           on the replica ends that early
+    """
+
+    def __init__(self, app=None, db=None):
+        self.db = db
+        self.unavailable_until = 0.0
+        self.healthy_until = 0.0
+        self.retry_seconds = 30
+        self.health_seconds = 5
+        self._watched = set()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        from src.utils.database import engine_options, normalize_database_url
+
+        self.db = db
+        url = os.environ.get('REPLICA_DATABASE_URL')
+        app.config.setdefault('REPLICA_FALLBACK', os.environ.get('REPLICA_FALLBACK', 'primary'))
+        app.config.setdefault('REPLICA_RETRY_SECONDS', int(os.environ.get('REPLICA_RETRY_SECONDS', 30)))
+        app.config.setdefault('REPLICA_HEALTH_SECONDS', float(os.environ.get('REPLICA_HEALTH_SECONDS', 5)))
+        self.retry_seconds = app.config['REPLICA_RETRY_SECONDS']
+        self.health_seconds = app.config['REPLICA_HEALTH_SECONDS']
+        if url:
+            url = normalize_database_url(url)
+            binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+            binds[REPLICA_BIND] = {'url': url, **engine_options(url)}
+        app.extensions['replica_router'] = self
+
+    def activate(self, app):
+        """Route this request's reads to the replica if it is reachable.
+
+        Reachability is probed at most once per REPLICA_HEALTH_SECONDS
+        rather than on every request.
+        """
+        engine = self.db.engines.get(REPLICA_BIND)
+        if engine is None:
+            return None
+        self._watch(engine)
+        now = time.monotonic()
+        if now < self.healthy_until:
+            g.use_replica = True
+            return None
+        if now >= self.unavailable_until:
+            try:
+                with engine.connect():
+                    pass
+                self.healthy_until = time.monotonic() + self.health_seconds
+                g.use_replica = True
+                return None
+            except DBAPIError:
+                self.mark_unavailable()
+        if app.config['REPLICA_FALLBACK'] == 'error':
+            return jsonify({'message': 'Reporting database unavailable'}), 503
+        return None
+
+    def mark_unavailable(self):
+        """Send reads to the primary (or refuse them) for REPLICA_RETRY_SECONDS"""
+        self.healthy_until = 0.0
+        self.unavailable_until = time.monotonic() + self.retry_seconds
+
+    def _watch(self, engine):
+        # A replica that goes away between probes fails the request that hits
+        # it; the requests after it skip the replica without waiting for the
+        # cached probe to expire
+        if engine in self._watched:
+            return
+        event.listen(engine, 'handle_error', self._replica_error)
+        self._watched.add(engine)
+
+    def _replica_error(self, context):
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+            self.mark_unavailable()
+
+def read_replica(f):
+    """Mark a route as read-only so its queries may be served by the replica"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        router = current_app.extensions.get('replica_router')
+        if router is not None:
+            error = router.activate(current_app)
+            if error is not None:
+                return error
+        return f(*args, **kwargs)
+
+    return decorated
+
+def read_replica_blueprint(blueprint):
+    """Route every GET request of a blueprint to the replica"""
+    @blueprint.before_request
+    def _use_replica():
+        if request.method != 'GET':
+            return None
+        router = current_app.extensions.get('replica_router')
+        if router is not None:
+            return router.activate(current_app)
+        return None
+
+    return blueprint
+
+def sync_sqlite_replica(primary_path, replica_path):
+    """Copy a SQLite primary into the replica file for local testing"""
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,193 @@
+"""
+Communication rollups for ServiceBook Pros
+Keeps CommunicationDailyStat current as communication logs and customer
+questions are written, and answers analytics queries by summing its rows
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Optional
+
+from sqlalchemy import case, delete, func, select
+
+from src.models.user import db
+from src.models.communication import (
+    CommunicationDailyStat, CommunicationLog, CommunicationStatus, CommunicationType, CustomerQuestion
+)
+from src.utils.domain_events import on_flush, previous, track
+
+logger = logging.getLogger(__name__)
+
+SENT_STATUSES = (CommunicationStatus.SENT, CommunicationStatus.DELIVERED, CommunicationStatus.READ)
+DELIVERED_STATUSES = (CommunicationStatus.DELIVERED, CommunicationStatus.READ)
+QUESTIONS = CommunicationDailyStat.QUESTIONS_CHANNEL
+
+def _day(value) -> date:
+    return (value or datetime.utcnow()).date()
+
+def _channel(communication_type) -> str:
+    return communication_type.value if isinstance(communication_type, CommunicationType) else str(communication_type)
+
+def _log_counters(status) -> Dict[str, int]:
+    return {
+        'message_count': 1,
+        'sent_count': int(status in SENT_STATUSES),
+        'delivered_count': int(status in DELIVERED_STATUSES),
+        'failed_count': int(status == CommunicationStatus.FAILED),
+    }
+
+def _question_counters(status, is_urgent, created_at, answered_at) -> Dict[str, float]:
+    pending = status == 'pending'
+    answered = answered_at is not None
+    response = (answered_at - created_at).total_seconds() if answered and created_at else 0.0
+    return {
+        'question_count': 1,
+        'pending_question_count': int(pending),
+        'urgent_question_count': int(pending and bool(is_urgent)),
+        'answered_question_count': int(answered),
+        'response_seconds': max(response, 0.0),
+    }
+
+def _accumulate(deltas, key, counters, sign=1):
+    for name, value in counters.items():
+        deltas[key][name] += sign * value
+
+def _collect(obj, deltas, state):
+    """Add ``obj``'s counters to ``deltas``: state is 'new', 'dirty' or 'deleted'"""
+    if isinstance(obj, CommunicationLog):
+        key = (obj.company_id, _day(obj.created_at), _channel(obj.communication_type))
+        if state != 'new':
+            _accumulate(deltas, key, _log_counters(previous(obj, 'status')), -1)
+        if state != 'deleted':
+            _accumulate(deltas, key, _log_counters(obj.status))
+    elif isinstance(obj, CustomerQuestion):
+        key = (obj.company_id, _day(obj.created_at), QUESTIONS)
+        if state != 'new':
+            _accumulate(deltas, key, _question_counters(
+                previous(obj, 'status'), previous(obj, 'is_urgent'), obj.created_at, previous(obj, 'answered_at')
+            ), -1)
+        if state != 'deleted':
+            _accumulate(deltas, key, _question_counters(obj.status, obj.is_urgent, obj.created_at, obj.answered_at))
+
+def _update_rollups(session, changes):
+    # Runs in the flushing transaction, so the counters commit or roll back
+    # together with the rows they describe
+    deltas = defaultdict(lambda: defaultdict(int))
+    for obj, state in changes:
+        if isinstance(obj, (CommunicationLog, CustomerQuestion)):
+            _collect(obj, deltas, state)
+    if deltas:
+        CommunicationDailyStat.add(session.connection(), deltas)
+
+def record_queued(session, company_id: int, communication_type, count: int, day: Optional[date] = None):
+    """Count logs bulk-inserted as pending, which bypass the flush listener"""
+    if count:
+        CommunicationDailyStat.add(session.connection(), {
+            (company_id, day or datetime.utcnow().date(), _channel(communication_type)): {'message_count': count}
+        })
+
+def init_rollups(app=None):
+    # The flush subtracts what a row counted before, so its old values must
+    # be loaded even when they are set on an expired object
+    track(CommunicationLog.status, CustomerQuestion.status,
+          CustomerQuestion.is_urgent, CustomerQuestion.answered_at)
+    on_flush(_update_rollups)
+
+def rebuild_rollups(company_id: Optional[int] = None) -> int:
+    """Recompute the rollups from the logs and questions; returns rows written.
+
+    For databases with history from before the rollups existed, or after
+    changes made outside the ORM (bulk SQL updates).
+    """
+    stats = CommunicationDailyStat
+    company_filter = [] if company_id is None else [CommunicationLog.company_id == company_id]
+    db.session.execute(delete(stats).where(*([] if company_id is None else [stats.company_id == company_id])))
+    deltas = defaultdict(lambda: defaultdict(int))
+    day = func.date(CommunicationLog.created_at)
+    rows = db.session.execute(
+        select(
+            CommunicationLog.company_id, day.label('day'), CommunicationLog.communication_type,
+            func.count(CommunicationLog.id),
+            func.sum(case((CommunicationLog.status.in_(SENT_STATUSES), 1), else_=0)),
+            func.sum(case((CommunicationLog.status.in_(DELIVERED_STATUSES), 1), else_=0)),
+            func.sum(case((CommunicationLog.status == CommunicationStatus.FAILED, 1), else_=0)),
+        ).where(*company_filter).group_by(CommunicationLog.company_id, day, CommunicationLog.communication_type)
+    ).all()
+    for company, row_day, communication_type, total, sent, delivered, failed in rows:
+        # func.date is a string on SQLite and a date on PostgreSQL
+        key = (company, date.fromisoformat(str(row_day)), _channel(communication_type))
+        _accumulate(deltas, key, {
+            'message_count': total, 'sent_count': sent, 'delivered_count': delivered, 'failed_count': failed
+        })
+    # Questions are few; response times are summed here rather than with
+    # backend-specific date arithmetic
+    questions = db.session.execute(
+        select(CustomerQuestion.company_id, CustomerQuestion.status, CustomerQuestion.is_urgent,
+               CustomerQuestion.created_at, CustomerQuestion.answered_at)
+        .where(*([] if company_id is None else [CustomerQuestion.company_id == company_id]))
+        .execution_options(yield_per=1000)
+    )
+    for company, status, is_urgent, created_at, answered_at in questions:
+        _accumulate(deltas, (company, _day(created_at), QUESTIONS),
+                    _question_counters(status, is_urgent, created_at, answered_at))
+    CommunicationDailyStat.add(db.session.connection(), deltas)
+    db.session.commit()
+    return len(deltas)
+
+def backfill_rollups() -> int:
+    """Build the rollups once for a database that has none yet"""
+    if db.session.query(CommunicationDailyStat.id).first() is not None:
+        return 0
+    if db.session.query(CommunicationLog.id).first() is None and db.session.query(CustomerQuestion.id).first() is None:
+        return 0
+    written = rebuild_rollups()
+    logger.info('Built %d communication rollup rows', written)
+    return written
+
+def communication_summary(company_id: int, start: date, end: date) -> Dict:
+    """Analytics for messages created between ``start`` and ``end`` (inclusive).
+
+    Message and question counts come from the days in range; pending and
+    urgent questions are current totals across all days.
+    """
+    stats = CommunicationDailyStat
+    rows = db.session.execute(
+        select(stats.channel, *(func.sum(getattr(stats, name)).label(name) for name in stats.COUNTERS))
+        .where(stats.company_id == company_id, stats.day >= start, stats.day <= end)
+        .group_by(stats.channel)
+    ).all()
+    open_questions = db.session.execute(
+        select(func.sum(stats.pending_question_count), func.sum(stats.urgent_question_count))
+        .where(stats.company_id == company_id, stats.channel == QUESTIONS)
+    ).one()
+
+    by_type, questions = {}, None
+    for row in rows:
+        if row.channel == QUESTIONS:
+            questions = row
+            continue
+        by_type[row.channel] = {
+            'total': row.message_count or 0,
+            'sent': row.sent_count or 0,
+            'delivered': row.delivered_count or 0,
+            'failed': row.failed_count or 0,
+        }
+    total = sum(counts['total'] for counts in by_type.values())
+    sent = sum(counts['sent'] for counts in by_type.values())
+    answered = (questions.answered_question_count or 0) if questions else 0
+    response_seconds = (questions.response_seconds or 0.0) if questions else 0.0
+    return {
+        'total_messages': total,
+        'sms_count': by_type.get(CommunicationType.SMS.value, {}).get('total', 0),
+        'email_count': by_type.get(CommunicationType.EMAIL.value, {}).get('total', 0),
+        'success_rate': round(sent / total * 100, 2) if total else 0,
+        'delivered_count': sum(counts['delivered'] for counts in by_type.values()),
+        'failed_count': sum(counts['failed'] for counts in by_type.values()),
+        'by_type': by_type,
+        'questions_asked': (questions.question_count or 0) if questions else 0,
+        'questions_answered': answered,
+        'avg_response_minutes': round(response_seconds / answered / 60, 1) if answered else None,
+        'pending_questions': int(open_questions[0] or 0),
+        'urgent_questions': int(open_questions[1] or 0),
+    }
@@ -0,0 +1,306 @@
+"""
+Schema-driven serialization for ServiceBook Pros
+Compiles a field plan per model once and reuses it for every row, with
+optional field selection and orjson encoding when it is installed
+"""
+
+import json
+import os
+from operator import attrgetter
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import Date, DateTime, Enum, Time, inspect
+from sqlalchemy.orm import load_only
+
+from src.utils.profiling import timed
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+# Converters mirror the hand-written to_dict() methods: falsy values become
+# None (or an empty list for JSON / comma separated columns).
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+def _enum_value(value):
+    return value.value if value else None
+
+def _json_list(value):
+    return _loads(value) if value else []
+
+def _csv_list(value):
+    return value.split(',') if value else []
+
+def _time_format(fmt):
+    def convert(value):
+        return value.strftime(fmt) if value else None
+    return convert
+
+def _nested_list(items):
+    return [item.to_dict() for item in items]
+
+class ModelSchema:
+    """Serialization options for one model.
+
+    Columns are picked up from the mapper; only the exceptions need to be
+    declared here.
+
+    json_fields   Text columns holding a JSON array, decoded to a list
+    csv_fields    Text columns holding comma separated values
+    time_format   strftime format for Time columns (default isoformat)
+    computed      name -> (callable(obj), columns the value depends on)
+    nested        relationships serialized with the child's to_dict()
+    exclude       columns left out of the output
+    views         named field selections for ``?view=``; 'full' is every field
+    """
+
+    def __init__(self, model, json_fields=(), csv_fields=(), time_format=None,
+                 computed=None, nested=(), exclude=(), views=None):
+        self.model = model
+        self.json_fields = set(json_fields)
+        self.csv_fields = set(csv_fields)
+        self.time_format = time_format
+        self.computed = computed or {}
+        self.nested = tuple(nested)
+        self.exclude = set(exclude)
+        self.views = {name: frozenset(fields) for name, fields in (views or {}).items()}
+        self._plans: Dict[Optional[FrozenSet[str]], Tuple] = {}
+        self._full_plan = self._compile()
+        self.field_names = tuple(entry[0] for entry in self._full_plan)
+
+    def _converter(self, column):
+        name = column.key
+        if name in self.json_fields:
+            return _json_list
+        if name in self.csv_fields:
+            return _csv_list
+        column_type = column.columns[0].type
+        if isinstance(column_type, Enum):
+            return _enum_value
+        if isinstance(column_type, Time) and self.time_format:
+            return _time_format(self.time_format)
+        if isinstance(column_type, (DateTime, Date, Time)):
+            return _isoformat
+        return None
+
+    def _compile(self) -> Tuple:
+        # Entries are (name, is_column, getter, converter)
+        plan = []
+        for column in inspect(self.model).column_attrs:
+            if column.key not in self.exclude:
+                plan.append((column.key, True, attrgetter(column.key), self._converter(column)))
+        for name, (getter, _) in self.computed.items():
+            plan.append((name, False, getter, None))
+        for name in self.nested:
+            plan.append((name, False, attrgetter(name), _nested_list))
+        return tuple(plan)
+
+    def plan(self, fields: Optional[FrozenSet[str]] = None) -> Tuple:
+        """The compiled plan entries for a field selection"""
+        if fields is None:
+            return self._full_plan
+        # Key the cache on known names only so arbitrary input cannot grow it
+        fields = fields.intersection(self.field_names)
+        plan = self._plans.get(fields)
+        if plan is None:
+            plan = tuple(entry for entry in self._full_plan if entry[0] in fields)
+            self._plans[fields] = plan
+        return plan
+
+    def columns_for(self, fields: Optional[FrozenSet[str]] = None) -> List[str]:
+        """Mapped columns needed to serialize a field selection"""
+        columns = []
+        for name, is_column, _, _ in self.plan(fields):
+            if name in self.computed:
+                columns.extend(self.computed[name][1])
+            elif is_column:
+                columns.append(name)
+        return list(dict.fromkeys(columns))
+
+    def project(self, query, fields: Optional[FrozenSet[str]] = None):
+        """Limit the SELECT to the columns a field selection needs"""
+        if fields is None:
+            return query
+        primary_key = [column.key for column in inspect(self.model).primary_key]
+        columns = self.columns_for(fields) + primary_key
+        return query.options(load_only(*[getattr(self.model, name) for name in dict.fromkeys(columns)]))
+
+    def dump(self, obj, fields: Optional[FrozenSet[str]] = None) -> Dict:
+        return _dump(self.plan(fields), obj)
+
+def _dump(plan: Tuple, obj) -> Dict:
+    # Loaded column values sit in the instance __dict__; reading them there
+    # skips the attribute instrumentation. Expired or deferred columns are
+    # missing from it and go through the getter, which loads them.
+    state = obj.__dict__
+    row = {}
+    for name, is_column, getter, convert in plan:
+        value = state[name] if is_column and name in state else getter(obj)
+        row[name] = convert(value) if convert is not None else value
+    return row
+
+_schemas: Dict[type, ModelSchema] = {}
+
+def register_schema(model, **options) -> ModelSchema:
+    schema = ModelSchema(model, **options)
+    _schemas[model] = schema
+    return schema
+
+def _register_default_schemas():
+    from src.models.job import Job
+    from src.models.invoice import Invoice
+    from src.models.customer import Customer
+    from src.models.technician import Technician
+    from src.models.inventory import InventoryItem
+    from src.models.pricing import FlatRatePricingItem
+
+    # 'customer' in the job and invoice views is the summary the list routes add
+    register_schema(
+        Job,
+        views={'compact': ('id', 'job_number', 'title', 'status', 'priority', 'scheduled_date',
+                           'customer_id', 'assigned_technician_id', 'customer')}
+    )
+    register_schema(
+        Invoice,
+        nested=('line_items', 'payments'),
+        views={'compact': ('id', 'invoice_number', 'title', 'status', 'invoice_date', 'due_date',
+                           'total_amount', 'balance_due', 'customer_id', 'customer')}
+    )
+    register_schema(
+        Customer,
+        csv_fields=('tags',),
+        computed={'display_name': (attrgetter('display_name'), ('first_name', 'last_name'))},
+        views={'compact': ('id', 'display_name', 'company_name', 'phone', 'mobile', 'email', 'status')}
+    )
+    register_schema(
+        Technician,
+        json_fields=('specialties', 'certifications', 'licenses', 'equipment_assigned'),
+        time_format='%H:%M',
+        computed={'full_name': (lambda tech: f"{tech.first_name} {tech.last_name}",
+                                ('first_name', 'last_name'))},
+        views={'compact': ('id', 'employee_id', 'full_name', 'phone', 'mobile_phone', 'status',
+                           'skill_level', 'available_for_emergency')}
+    )
+    register_schema(
+        InventoryItem,
+        computed={'needs_reorder': (lambda item: item.quantity_available <= item.reorder_point,
+                                    ('quantity_available', 'reorder_point'))},
+        views={'compact': ('id', 'sku', 'name', 'category', 'quantity_available', 'unit_of_measure',
+                           'retail_price', 'needs_reorder')}
+    )
+    register_schema(
+        FlatRatePricingItem,
+        json_fields=('tags',),
+        views={'compact': ('id', 'item_code', 'title', 'category', 'subcategory',
+                           'good_price', 'better_price', 'best_price', 'is_emergency')}
+    )
+
+def get_schema(model) -> Optional[ModelSchema]:
+    if not _schemas:
+        _register_default_schemas()
+    return _schemas.get(model)
+
+def serialize(obj, fields: Optional[FrozenSet[str]] = None) -> Dict:
+    """Serialize one model instance, limited to `fields` when given.
+
+    Models without a registered schema fall back to their to_dict().
+    """
+    schema = get_schema(type(obj))
+    if schema is not None:
+        return schema.dump(obj, fields)
+    data = obj.to_dict()
+    if fields is not None:
+        data = {key: value for key, value in data.items() if key in fields}
+    return data
+
+def serialize_many(objs: Iterable, fields: Optional[FrozenSet[str]] = None) -> List[Dict]:
+    """Serialize a list of instances with one compiled plan lookup"""
+    objs = list(objs)
+    if not objs:
+        return []
+    with timed('serialize'):
+        schema = get_schema(type(objs[0]))
+        if schema is None:
+            return [serialize(obj, fields) for obj in objs]
+        plan = schema.plan(fields)
+        return [_dump(plan, obj) for obj in objs]
+
+class FieldSelectionError(ValueError):
+    """A ``?fields=`` or ``?view=`` value the model does not offer"""
+
+    def __init__(self, message: str, unknown: Iterable[str], valid: Iterable[str]):
+        super().__init__(message)
+        self.unknown = sorted(unknown)
+        self.valid = sorted(valid)
+
+    def to_dict(self) -> Dict:
+        return {'message': str(self), 'unknown': self.unknown, 'valid': self.valid}
+
+def requested_fields(model=None, extra: Iterable[str] = ()) -> Optional[FrozenSet[str]]:
+    """Fields asked for with ``?fields=id,title,status`` or ``?view=compact``.
+
+    An explicit field list wins over a view; None means every field.
+    ``extra`` names the keys the route adds to each row by hand. Raises
+    FieldSelectionError for names the model's schema does not know, rather
+    than answering with fewer fields than the client expects.
+    """
+    schema = get_schema(model) if model is not None else None
+    value = request.args.get('fields', '')
+    fields = frozenset(field.strip() for field in value.split(',') if field.strip())
+    if fields:
+        if schema is not None:
+            valid = set(schema.field_names).union(extra)
+            unknown = fields - valid
+            if unknown:
+                raise FieldSelectionError(f"Unknown fields: {', '.join(sorted(unknown))}", unknown, valid)
+        return fields
+    view = request.args.get('view', '')
+    if schema is not None and view:
+        if view == 'full':
+            return None
+        if view not in schema.views:
+            raise FieldSelectionError(f'Unknown view: {view}', (view,), ('full', *schema.views))
+        return schema.views[view]
+    return None
+
+def project(query, model, fields: Optional[FrozenSet[str]]):
+    """Push a field selection down into the query with load_only()"""
+    schema = get_schema(model)
+    if schema is None:
+        return query
+    return schema.project(query, fields)
+
+def wants_field(fields: Optional[FrozenSet[str]], name: str) -> bool:
+    """Whether an extra key a route adds by hand was requested"""
+    return fields is None or name in fields
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    Types orjson does not handle natively (dates, Decimal, ...) go through
+    Flask's default hook so responses keep their existing format.
+    """
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+def init_json(app):
+    """Use orjson for jsonify() when it is installed (JSON_USE_ORJSON=false to opt out)"""
+    enabled = os.environ.get('JSON_USE_ORJSON', 'true').lower() == 'true'
+    if orjson is not None and enabled:
+        app.json = OrjsonProvider(app)
@@ -0,0 +1,98 @@
+"""
+Startup helpers for ServiceBook Pros
+Phase timing for the boot report, the AUTO_INIT_DB switch and blueprints
+whose import is deferred until the server loads them
+"""
+
+import importlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+class StartupTimer:
+    """Wall time of each boot phase, in the order they ran"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, name: str):
+        """Record the time since the previous mark as phase `name`"""
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self._last
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str):
+        self.mark('other')
+        try:
+            yield
+        finally:
+            self.mark(name)
+
+    def report(self) -> Dict:
+        phases = {name: round(seconds * 1000, 1) for name, seconds in self.phases.items() if seconds}
+        return {
+            'pid': os.getpid(),
+            'total_ms': round((self._last - self.started) * 1000, 1),
+            'phases_ms': phases,
+        }
+
+    def log(self, app_name: str):
+        report = self.report()
+        phases = ', '.join(f'{name} {ms:.0f}ms' for name, ms in report['phases_ms'].items())
+        logger.info('%s started in %.0fms (%s)', app_name, report['total_ms'], phases)
+        return report
+
+def auto_init_db() -> bool:
+    """Whether boot creates the schema and seeds demo data.
+
+    On by default for local development. Deployments set AUTO_INIT_DB=false
+    and run ``flask init-db`` / ``flask seed-demo`` once instead of in
+    every worker.
+    """
+    return os.environ.get('AUTO_INIT_DB', 'true').lower() == 'true'
+
+def lazy_blueprints_enabled() -> bool:
+    """Whether LazyBlueprint defers importing its blueprint.
+
+    Off by default: Flask refuses new routes once it has served a request,
+    so the blueprints must be loaded by a server hook that runs before the
+    first request. gunicorn.conf.py turns it on and loads them in the
+    preloading master or, without preloading, before a worker serves.
+    """
+    return os.environ.get('LAZY_BLUEPRINTS', 'false').lower() == 'true'
+
+class LazyBlueprint:
+    """A blueprint whose import is deferred until ``load`` is called.
+
+    Importing the app (CLI commands, the outbox worker) skips the import;
+    the server loads it with ``load_lazy_blueprints`` before serving.
+    """
+
+    def __init__(self, app, import_name: str, attribute: str, url_prefix: str):
+        self.app = app
+        self.import_name = import_name
+        self.attribute = attribute
+        self.url_prefix = url_prefix
+        self.blueprint = None
+        app.extensions.setdefault('lazy_blueprints', []).append(self)
+
+    def load(self):
+        if self.blueprint is None:
+            started = time.perf_counter()
+            blueprint = getattr(importlib.import_module(self.import_name), self.attribute)
+            self.app.register_blueprint(blueprint, url_prefix=self.url_prefix)
+            self.blueprint = blueprint
+            logger.info('Loaded blueprint %s in %.0fms', blueprint.name, (time.perf_counter() - started) * 1000)
+        return self.blueprint
+
+def load_lazy_blueprints(app):
+    """Register every lazy blueprint of the app; call before it serves"""
+    for lazy in app.extensions.get('lazy_blueprints', []):
+        lazy.load()
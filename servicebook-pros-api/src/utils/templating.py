@@ -0,0 +1,159 @@
+"""
+Message templating for ServiceBook Pros
+Parses {{variable}} placeholders once into literal text and filter chains,
+with filters for dates, times and currency
+
+    Hi {{customer_first_name}}, see you {{job_date|date:"%A, %B %d"}}.
+    Your estimate is {{estimate_amount|currency}}.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# {{ name }} or {{ name|filter }} or {{ name|filter:"argument"|filter }}
+PLACEHOLDER = re.compile(r'\{\{\s*([A-Za-z_][\w.]*)\s*((?:\|\s*\w+(?:\s*:\s*(?:"[^"]*"|\'[^\']*\'|[^|}\s]+))?\s*)*)\}\}')
+FILTER = re.compile(r'\|\s*(\w+)(?:\s*:\s*("[^"]*"|\'[^\']*\'|[^|}\s]+))?')
+
+class TemplateError(ValueError):
+    """A placeholder uses an unknown filter"""
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    return datetime.fromisoformat(str(value))
+
+def _date(value, fmt='%B %d, %Y'):
+    try:
+        return _as_datetime(value).strftime(fmt)
+    except (TypeError, ValueError):
+        return str(value)
+
+def _time(value, fmt='%I:%M %p'):
+    return _date(value, fmt)
+
+def _currency(value, symbol='$'):
+    try:
+        return f'{symbol}{float(value):,.2f}'
+    except (TypeError, ValueError):
+        return str(value)
+
+def _default(value, fallback=''):
+    return value if value not in (None, '') else fallback
+
+FILTERS: Dict[str, Callable] = {
+    'date': _date,
+    'time': _time,
+    'currency': _currency,
+    'default': _default,
+    'upper': lambda value: str(value).upper(),
+    'lower': lambda value: str(value).lower(),
+    'title': lambda value: str(value).title(),
+}
+
+def _compile_filters(spec: str) -> List[Tuple[Callable, Tuple]]:
+    filters = []
+    for name, argument in FILTER.findall(spec):
+        if name not in FILTERS:
+            raise TemplateError(f'Unknown template filter: {name}')
+        if argument[:1] in ('"', "'"):
+            argument = argument[1:-1]
+        filters.append((FILTERS[name], (argument,) if argument else ()))
+    return filters
+
+def _apply_filters(filters):
+    def apply(value):
+        for f, arguments in filters:
+            if value is not None or f is _default:
+                value = f(value, *arguments)
+        return '' if value is None else value
+    return apply
+
+class CompiledTemplate:
+    """A template parsed once into literal text and placeholders.
+
+    ``head`` is the text before the first placeholder and ``fields`` holds
+    (variable, filter chain or None, text after it) for each placeholder,
+    so rendering is one pass of dict lookups and a join; template text is
+    only ever data. Missing and None variables render as ''.
+    """
+
+    __slots__ = ('source', 'variables', 'head', 'fields')
+
+    def __init__(self, source: str):
+        self.source = source or ''
+        fields, variables = [], []
+        head, name, apply = None, None, None
+        position = 0
+        for match in PLACEHOLDER.finditer(self.source):
+            literal = self.source[position:match.start()]
+            if head is None:
+                head = literal
+            else:
+                fields.append((name, apply, literal))
+            name, spec = match.group(1), match.group(2)
+            apply = _apply_filters(_compile_filters(spec)) if spec else None
+            variables.append(name)
+            position = match.end()
+        if head is None:
+            head = self.source
+        else:
+            fields.append((name, apply, self.source[position:]))
+        self.head = head
+        self.fields = tuple(fields)
+        self.variables = tuple(dict.fromkeys(variables))
+
+    def render(self, data: Dict) -> str:
+        parts = [self.head]
+        get = data.get
+        for name, apply, literal in self.fields:
+            value = get(name)
+            if apply is not None:
+                value = apply(value)
+            parts.append('' if value is None else str(value))
+            parts.append(literal)
+        return ''.join(parts)
+
+    def render_many(self, rows: Iterable[Dict]) -> List[str]:
+        render = self.render
+        return [render(data) for data in rows]
+
+@lru_cache(maxsize=1024)
+def compile_template(source: Optional[str]) -> CompiledTemplate:
+    """The compiled form of ``source``, parsed once per distinct text"""
+    return CompiledTemplate(source or '')
+
+def render(source: Optional[str], data: Dict) -> str:
+    return compile_template(source).render(data)
+
+def validate_template(source: Optional[str]) -> None:
+    """TemplateError when ``source`` uses an unknown filter; call before saving"""
+    compile_template(source)
+
+_plans: 'OrderedDict[Tuple, Tuple[CompiledTemplate, CompiledTemplate]]' = OrderedDict()
+_plans_lock = threading.Lock()
+PLAN_CACHE_SIZE = 512
+
+def template_plan(template) -> Tuple[CompiledTemplate, CompiledTemplate]:
+    """Compiled (subject, body) of a MessageTemplate.
+
+    Cached by id and ``updated_at``, so an edited template is recompiled
+    on its next use without explicit invalidation.
+    """
+    key = (template.id, template.updated_at)
+    with _plans_lock:
+        plan = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            return plan
+    plan = (CompiledTemplate(template.subject or ''), CompiledTemplate(template.message_body or ''))
+    with _plans_lock:
+        _plans[key] = plan
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
@@ -0,0 +1,220 @@
+"""
+Test fixtures for the ServiceBook Pros API
+The app is imported once per session on a fresh SQLite database; each test
+gets its own company so tests never see each other's rows. Fixtures write in
+their own app context and return ids: a request made while a test holds an
+app context would share its ``g`` with every other request of that test.
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_workdir = tempfile.mkdtemp(prefix='sbp-test-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ['AUTO_INIT_DB'] = 'false'
+os.environ['LAZY_BLUEPRINTS'] = 'false'
+os.environ['OUTBOX_INLINE_WORKER'] = 'false'
+os.environ['REMINDER_SCHEDULER_INLINE'] = 'false'
+os.environ['QUERY_BUDGET_ENABLED'] = 'true'
+os.environ.pop('REDIS_URL', None)
+os.environ.pop('REPLICA_DATABASE_URL', None)
+
+_numbers = itertools.count(1)
+
+@pytest.fixture(scope='session')
+def app():
+    from src.main import app, init_db
+
+    # Query budget overruns raise QueryBudgetExceeded under app.testing
+    app.config['TESTING'] = True
+    with app.app_context():
+        init_db()
+    return app
+
+@pytest.fixture
+def app_context(app):
+    from src.models.user import db
+
+    with app.app_context():
+        yield
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def make_company(app):
+    """Create a company with an admin user; returns the company id"""
+    from werkzeug.security import generate_password_hash
+    from src.models.user import db, User
+    from src.models.company import Company
+
+    def make():
+        number = next(_numbers)
+        with app.app_context():
+            company = Company(name=f'Test Company {number}', email=f'office{number}@example.com', phone='555-0100')
+            db.session.add(company)
+            db.session.flush()
+            db.session.add(User(
+                username=f'admin{number}', email=f'admin{number}@example.com',
+                password_hash=generate_password_hash('secret'), first_name='Test', last_name='Admin',
+                role='admin', company_id=company.id
+            ))
+            db.session.commit()
+            return company.id
+    return make
+
+@pytest.fixture
+def company_id(make_company):
+    return make_company()
+
+@pytest.fixture
+def admin_id(app, company_id):
+    from src.models.user import User
+
+    with app.app_context():
+        return User.query.filter_by(company_id=company_id).first().id
+
+@pytest.fixture
+def headers_for(app):
+    """Authorization headers for the admin of a company"""
+    from src.models.user import User
+
+    def headers(company_id):
+        with app.app_context():
+            user_id = User.query.filter_by(company_id=company_id).first().id
+        token = jwt.encode({'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)},
+                           app.config['SECRET_KEY'], algorithm='HS256')
+        return {'Authorization': f'Bearer {token}'}
+    return headers
+
+@pytest.fixture
+def auth_headers(company_id, headers_for):
+    return headers_for(company_id)
+
+@pytest.fixture
+def make_customer(app, company_id):
+    """Create a customer of the company; keyword arguments override the defaults"""
+    from src.models.user import db
+    from src.models.customer import Customer
+
+    def make(**fields):
+        number = next(_numbers)
+        with app.app_context():
+            customer = Customer(**{
+                'company_id': company_id,
+                'first_name': 'Customer',
+                'last_name': str(number),
+                'phone': f'555-01{number:02d}',
+                'email': f'customer{number}@example.com',
+                'status': 'active',
+                **fields,
+            })
+            db.session.add(customer)
+            db.session.commit()
+            return customer.id
+    return make
+
+@pytest.fixture
+def make_job(app, company_id, make_customer):
+    """Create a job of the company; keyword arguments override the defaults"""
+    from src.models.user import db
+    from src.models.job import Job, JobStatus
+
+    def make(**fields):
+        number = next(_numbers)
+        if 'customer_id' not in fields:
+            fields['customer_id'] = make_customer()
+        with app.app_context():
+            job = Job(**{
+                'company_id': company_id,
+                'job_number': f'T{company_id}-{number:05d}',
+                'title': f'Job {number}',
+                'status': JobStatus.SCHEDULED,
+                'scheduled_date': datetime.utcnow() + timedelta(days=1),
+                **fields,
+            })
+            db.session.add(job)
+            db.session.commit()
+            return job.id
+    return make
+
+@pytest.fixture
+def make_campaign(app, company_id, admin_id):
+    """Create an SMS campaign to all customers; keyword arguments override the defaults"""
+    from src.models.user import db
+    from src.models.communication import Campaign, CommunicationType
+
+    def make(**fields):
+        with app.app_context():
+            campaign = Campaign(**{
+                'company_id': company_id,
+                'name': 'Spring tune-up',
+                'communication_type': CommunicationType.SMS,
+                'message_body': 'Hi {{customer_first_name}}, {{company_name}} here',
+                'audience': 'all_customers',
+                'total_recipients': 0,
+                'queued_count': 0,
+                'skipped_count': 0,
+                'created_by_user_id': admin_id,
+                **fields,
+            })
+            db.session.add(campaign)
+            db.session.commit()
+            return campaign.id
+    return make
+
+@pytest.fixture
+def make_log(app, company_id):
+    """Create a pending SMS communication log; keyword arguments override the defaults"""
+    from src.models.user import db
+    from src.models.communication import CommunicationLog, CommunicationStatus, CommunicationType
+
+    def make(**fields):
+        with app.app_context():
+            log = CommunicationLog(**{
+                'company_id': company_id,
+                'communication_type': CommunicationType.SMS,
+                'recipient_phone': '555-0100',
+                'message_body': 'Hello',
+                'status': CommunicationStatus.PENDING,
+                **fields,
+            })
+            db.session.add(log)
+            db.session.commit()
+            return log.id
+    return make
+
+@pytest.fixture
+def make_automation(app, company_id):
+    """Create an active automation logging completed jobs, capped at two runs
+    a day; keyword arguments override the defaults"""
+    from src.models.user import db
+    from src.models.ai_features import SmartAutomation
+
+    def make(**fields):
+        with app.app_context():
+            automation = SmartAutomation(**{
+                'company_id': company_id,
+                'name': 'Log completions',
+                'automation_type': 'follow_up',
+                'trigger_type': 'event_based',
+                'trigger_conditions': {'event': 'job.status_changed', 'when': {'to': 'completed'}},
+                'actions': [{'type': 'log', 'message': '{{job_title}} done'}],
+                'is_active': True,
+                'max_executions_per_day': 2,
+                **fields,
+            })
+            db.session.add(automation)
+            db.session.commit()
+            return automation.id
+    return make
@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from src.models.user import db
+from src.models.ai_features import SmartAutomation
+from src.models.communication import CommunicationLog
+from src.models.job import Job, JobStatus
+from src.utils.automations import engine
+
+def _automation(automation_id):
+    db.session.expire_all()
+    return db.session.get(SmartAutomation, automation_id)
+
+def test_daily_cap_stops_further_runs(app_context, company_id, make_automation):
+    automation_id = make_automation()
+    payload = {'company_id': company_id, 'event': 'job.status_changed', 'job_title': 'Panel upgrade'}
+
+    assert [engine.execute(automation_id, payload) for _ in range(3)] == [True, True, False]
+    automation = _automation(automation_id)
+    assert automation.executions_today == 2
+    assert automation.execution_count == 2
+    assert automation.success_rate == 1.0
+
+def test_cap_resets_on_a_new_day(app_context, company_id, make_automation):
+    automation_id = make_automation(max_executions_per_day=1)
+    payload = {'company_id': company_id}
+    assert engine.execute(automation_id, payload)
+    assert not engine.execute(automation_id, payload)
+
+    _automation(automation_id).executions_day = datetime.utcnow().date() - timedelta(days=1)
+    db.session.commit()
+    assert engine.execute(automation_id, payload)
+    assert _automation(automation_id).executions_today == 1
+
+def test_inactive_automation_does_not_run(app_context, company_id, make_automation):
+    automation_id = make_automation(is_active=False)
+    assert not engine.execute(automation_id, {'company_id': company_id})
+
+def test_concurrent_runs_respect_the_cap(app, make_automation):
+    automation_id = make_automation(max_executions_per_day=3)
+
+    def claim(_):
+        with app.app_context():
+            try:
+                return engine._claim(automation_id)
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        claims = list(pool.map(claim, range(8)))
+    assert claims.count(True) == 3
+
+def test_failed_action_is_recorded(app_context, company_id, make_automation):
+    # The payload names no customer, so there is no phone to text
+    automation_id = make_automation(actions=[{'type': 'send_sms', 'body': 'Hi'}])
+    assert not engine.execute(automation_id, {'company_id': company_id})
+    automation = _automation(automation_id)
+    assert automation.last_error == 'send_sms: Customer has no sms contact'
+    assert automation.success_rate == 0.0
+
+def test_committed_event_runs_matching_automation_up_to_the_cap(app, client, auth_headers, company_id, make_job):
+    response = client.post('/api/ai/api/ai/automations', headers=auth_headers, json={
+        'name': 'Thank you text', 'type': 'follow_up', 'max_executions_per_day': 1,
+        'trigger_conditions': {'event': 'job.status_changed', 'when': {'to': 'completed'}},
+        'actions': [{'type': 'send_sms', 'body': 'Thanks {{customer_first_name}}, {{job_title}} is done'}],
+    })
+    assert response.status_code == 201
+    job_ids = [make_job(title='Furnace tune-up'), make_job(title='Leaking faucet')]
+
+    with app.app_context():
+        for job_id in job_ids:
+            db.session.get(Job, job_id).status = JobStatus.COMPLETED
+            db.session.commit()
+        # Wait for the background runs
+        engine.shutdown()
+        logs = CommunicationLog.query.filter(CommunicationLog.job_id.in_(job_ids)).all()
+        assert [log.message_body for log in logs] == ['Thanks Customer, Furnace tune-up is done']
+
+def test_automations_belong_to_the_caller_company(client, auth_headers, make_company, make_automation):
+    assert client.get('/api/ai/api/ai/automations').status_code == 401
+
+    other_automation = make_automation(company_id=make_company())
+    response = client.put(f'/api/ai/api/ai/automations/{other_automation}', headers=auth_headers,
+                          json={'status': 'paused'})
+    assert response.status_code == 404
+
+    listed = client.get('/api/ai/api/ai/automations', headers=auth_headers).get_json()
+    assert other_automation not in [automation['id'] for automation in listed['automations']]
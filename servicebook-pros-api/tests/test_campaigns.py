@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+from src.models.user import db
+from src.models.company import Company
+from src.models.customer import Customer
+from src.models.communication import Campaign, CampaignRecipient, CommunicationLog, CommunicationStatus, OutboxMessage
+from src.utils.campaigns import _pages, cancel_campaign, campaign_progress, queue_campaign
+
+def _logs(campaign):
+    return CommunicationLog.query.filter(CommunicationLog.id.in_(
+        db.session.query(CampaignRecipient.communication_log_id).filter_by(campaign_id=campaign.id)
+    )).order_by(CommunicationLog.id).all()
+
+def test_pages_walk_the_key_without_gaps_or_repeats(app_context, company_id, make_customer):
+    ids = [make_customer() for _ in range(7)]
+    query = db.session.query(Customer.id.label('cursor'), Customer).filter(Customer.company_id == company_id)
+
+    pages = [[row.cursor for row in rows] for rows in _pages(query, Customer.id, 3)]
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [customer_id for page in pages for customer_id in page] == ids
+
+def test_pages_continue_after_a_commit_between_pages(app_context, company_id, make_customer):
+    ids = [make_customer() for _ in range(4)]
+    query = db.session.query(Customer.id.label('cursor'), Customer).filter(Customer.company_id == company_id)
+
+    seen = []
+    for rows in _pages(query, Customer.id, 2):
+        seen.extend(row.cursor for row in rows)
+        db.session.commit()
+    assert seen == ids
+
+def _campaign(campaign_id):
+    return db.session.get(Campaign, campaign_id)
+
+def test_campaign_queues_one_message_per_reachable_customer(app_context, make_campaign, make_customer):
+    reachable = [make_customer(first_name=name) for name in ('Ann', 'Bob', 'Cy')]
+    make_customer(phone=None, mobile=None)
+    make_customer(status='inactive')
+    campaign = _campaign(make_campaign())
+
+    queue_campaign(campaign, size=2)
+
+    assert campaign.status == 'queued'
+    assert (campaign.total_recipients, campaign.queued_count, campaign.skipped_count) == (4, 3, 1)
+    logs = _logs(campaign)
+    assert [log.customer_id for log in logs] == reachable
+    assert logs[0].message_body == f'Hi Ann, {db.session.get(Company, campaign.company_id).name} here'
+    assert all(log.status == CommunicationStatus.PENDING for log in logs)
+    outbox = OutboxMessage.query.filter(OutboxMessage.source_id.in_([log.id for log in logs])).all()
+    assert len(outbox) == 3 and {row.channel for row in outbox} == {'sms'}
+
+def test_jobs_tomorrow_messages_each_customer_once(app_context, make_campaign, make_customer, make_job):
+    tomorrow = datetime.combine(datetime.utcnow().date() + timedelta(days=1), datetime.min.time())
+    customer_id = make_customer(first_name='Dee')
+    make_job(customer_id=customer_id, title='Water heater', scheduled_date=tomorrow + timedelta(hours=9))
+    make_job(customer_id=customer_id, title='Second visit', scheduled_date=tomorrow + timedelta(hours=14))
+    make_job(scheduled_date=tomorrow + timedelta(days=2))
+    campaign = _campaign(make_campaign(audience='jobs_tomorrow', message_body='{{job_title}} at {{job_time}}'))
+
+    queue_campaign(campaign, size=1)
+
+    assert (campaign.total_recipients, campaign.queued_count) == (1, 1)
+    (log,) = _logs(campaign)
+    assert log.message_body == 'Water heater at 09:00 AM'
+
+def test_rate_limit_spaces_send_times(app_context, make_campaign, make_customer):
+    for _ in range(3):
+        make_customer()
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(hours=1)
+    campaign = _campaign(make_campaign(rate_per_minute=30, send_at=start))
+
+    queue_campaign(campaign, size=2)
+
+    times = [log.scheduled_send_time for log in _logs(campaign)]
+    assert times == [start, start + timedelta(seconds=2), start + timedelta(seconds=4)]
+
+def test_cancel_stops_unsent_messages(app_context, make_campaign, make_customer):
+    for _ in range(3):
+        make_customer()
+    campaign = _campaign(make_campaign())
+    queue_campaign(campaign, size=2)
+
+    assert cancel_campaign(campaign) == 3
+    progress = campaign_progress(campaign)
+    assert progress['cancelled'] == 3 and progress['pending'] == 0 and progress['completed']
+    assert {row.status for row in OutboxMessage.query.filter(
+        OutboxMessage.source_id.in_([log.id for log in _logs(campaign)])
+    )} == {'cancelled'}
@@ -0,0 +1,49 @@
+from src.models.user import db
+from src.models.communication import CommunicationLog, CommunicationStatus, CommunicationType
+from src.models.data_version import DataVersion
+from src.utils.communication_service import outbox, queue_message
+
+def _versions(company_id):
+    scope = f'company:{company_id}'
+    db.session.expire_all()
+    versions = DataVersion.current({scope, f'{scope}:communication'})
+    return versions[scope], versions[f'{scope}:communication']
+
+def _queue(company_id, count):
+    for number in range(count):
+        queue_message(CommunicationLog(
+            company_id=company_id, communication_type=CommunicationType.SMS,
+            recipient_phone=f'555-01{number:02d}', message_body='Hello'
+        ))
+    db.session.commit()
+
+def test_sending_messages_leaves_the_tenant_version_alone(app_context, company_id):
+    _queue(company_id, 3)
+    tenant, communication = _versions(company_id)
+
+    # Other tests' companies may have messages waiting too
+    outbox.drain()
+    assert CommunicationLog.query.filter_by(
+        company_id=company_id, status=CommunicationStatus.SENT
+    ).count() == 3
+    # The logs' new status is one communication write per send, the outbox
+    # rows none at all
+    assert _versions(company_id) == (tenant, communication + 3)
+
+def test_message_traffic_keeps_pricing_etags(app, client, auth_headers, company_id):
+    first = client.get('/api/pricing/pricing/items', headers=auth_headers)
+    etag = first.headers['ETag']
+
+    with app.app_context():
+        _queue(company_id, 2)
+        outbox.drain()
+    response = client.get('/api/pricing/pricing/items', headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    response = client.post('/api/pricing/pricing/items', headers=auth_headers, json={
+        'item_code': 'EL-100', 'title': 'Outlet install', 'description': 'Replace one outlet',
+        'category': 'electrical', 'good_price': 120, 'better_price': 150, 'best_price': 180,
+    })
+    assert response.status_code == 201
+    response = client.get('/api/pricing/pricing/items', headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 200
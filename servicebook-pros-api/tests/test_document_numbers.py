@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+
+from src.models.user import db
+from src.models.job import Job
+from src.models.sequence import DocumentSequence, next_document_number
+from src.utils.index_advisor import replace_unique_constraints
+
+def _create(client, headers, customer_id, document):
+    response = client.post(f'/api/{document}s/{document}s', headers=headers,
+                           json={'customer_id': customer_id, 'title': 'Panel upgrade'})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()[document][f'{document}_number']
+
+@pytest.mark.parametrize('document, prefix', [('job', 'JOB'), ('estimate', 'EST'), ('invoice', 'INV')])
+def test_each_tenant_numbers_from_one(client, make_company, headers_for, make_customer, document, prefix):
+    tenants = [make_company(), make_company()]
+    numbers = {
+        company_id: [_create(client, headers_for(company_id), make_customer(company_id=company_id), document)
+                     for _ in range(2)]
+        for company_id in tenants
+    }
+    for company_id in tenants:
+        assert numbers[company_id] == [f'{prefix}-000001', f'{prefix}-000002']
+
+def test_first_allocation_continues_after_existing_numbers(app_context, make_company, make_job):
+    company_id = make_company()
+    make_job(company_id=company_id, job_number='JOB-000041')
+    assert next_document_number(company_id, 'job', 'JOB', Job.job_number) == 'JOB-000042'
+    assert DocumentSequence.allocate_block(company_id, 'job', 3) == range(43, 46)
+    db.session.rollback()
+
+def test_existing_tables_get_the_per_company_constraint(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    db.metadata.create_all(engine)
+    # The jobs table as created while job numbers were unique across companies
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO companies (id, name, email) VALUES (1, 'First', 'a@example.com'), (2, 'Second', 'b@example.com')")
+        connection.exec_driver_sql("INSERT INTO customers (id, company_id, first_name, last_name) VALUES (1, 1, 'A', 'B')")
+        sql = connection.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'jobs'").scalar()
+        connection.exec_driver_sql('DROP TABLE jobs')
+        connection.exec_driver_sql(sql.replace(
+            'CONSTRAINT uq_jobs_company_job_number UNIQUE (company_id, job_number)', 'UNIQUE (job_number)'
+        ))
+        connection.exec_driver_sql(
+            "INSERT INTO jobs (company_id, customer_id, job_number, title) VALUES (1, 1, 'JOB-000001', 'Old')"
+        )
+
+    assert replace_unique_constraints(engine) == ['jobs']
+    assert replace_unique_constraints(engine) == []
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO jobs (company_id, customer_id, job_number, title) VALUES (2, 1, 'JOB-000001', 'New')"
+        )
+        assert connection.exec_driver_sql('SELECT title FROM jobs ORDER BY id').scalars().all() == ['Old', 'New']
+        index_names = {row[0] for row in connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'jobs'"
+        )}
+        assert 'ix_jobs_company_status' in index_names
+    with pytest.raises(IntegrityError), engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO jobs (company_id, customer_id, job_number, title) VALUES (2, 1, 'JOB-000001', 'Again')"
+        )
+    engine.dispose()
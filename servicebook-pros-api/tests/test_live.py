@@ -0,0 +1,133 @@
+import pytest
+
+from src.utils.live import EventBus, bus
+
+@pytest.fixture
+def event_bus():
+    event_bus = EventBus()
+    event_bus.configure(buffer_size=3, max_queue=2)
+    return event_bus
+
+def _accept_all(live_event):
+    return True
+
+def _publish(event_bus, company_id, count, event_type='job.updated'):
+    for number in range(count):
+        event_bus.publish(company_id, event_type, {'number': number})
+    return [live_event.id for live_event in event_bus._buffers[company_id]]
+
+def test_backlog_holds_the_events_after_last_event_id(event_bus):
+    ids = _publish(event_bus, 1, 3)
+    _publish(event_bus, 2, 2)
+
+    subscription, backlog = event_bus.subscribe(1, _accept_all, last_event_id=ids[0])
+    assert [live_event.id for live_event in backlog] == ids[1:]
+    assert {live_event.company_id for live_event in backlog} == {1}
+    assert event_bus.subscribe(1, _accept_all)[1] == []
+
+    event_bus.publish(1, 'job.deleted', {})
+    assert subscription.get(timeout=0).type == 'job.deleted'
+    assert subscription.get(timeout=0) is None
+
+def test_backlog_is_filtered(event_bus):
+    first = _publish(event_bus, 1, 1)[0]
+    event_bus.publish(1, 'technician.clocked_in', {}, technician_ids=[7])
+    event_bus.publish(1, 'job.updated', {}, technician_ids=[8])
+
+    _, backlog = event_bus.subscribe(1, lambda live_event: 7 in live_event.technician_ids, last_event_id=first)
+    assert [live_event.type for live_event in backlog] == ['technician.clocked_in']
+
+def test_reset_when_the_buffer_no_longer_reaches_back(event_bus):
+    first, second = _publish(event_bus, 1, 2)
+    ids = _publish(event_bus, 1, 3)
+    assert second not in ids
+
+    # Only the events after ``first`` are missing
+    _, backlog = event_bus.subscribe(1, _accept_all, last_event_id=first)
+    (reset,) = backlog
+    assert reset.type == 'reset'
+    # Resuming from the reset's id picks up only newer events
+    assert reset.id == ids[-1]
+    assert event_bus.subscribe(1, _accept_all, last_event_id=reset.id)[1] == []
+
+    # The event just before the buffer resumes normally
+    _, backlog = event_bus.subscribe(1, _accept_all, last_event_id=second)
+    assert [live_event.id for live_event in backlog] == ids
+
+def test_ids_from_before_the_process_started_reset(event_bus):
+    _publish(event_bus, 1, 1)
+    _, backlog = event_bus.subscribe(1, _accept_all, last_event_id=event_bus._base_floor - 1)
+    assert [live_event.type for live_event in backlog] == ['reset']
+
+def test_slow_subscriber_is_closed_and_dropped(event_bus):
+    subscription, _ = event_bus.subscribe(1, _accept_all)
+    _publish(event_bus, 1, 3)
+
+    assert subscription.closed
+    assert event_bus.stats()['dropped_subscribers'] == 1
+    assert event_bus.stats()['subscribers'] == 0
+
+def test_streams_beyond_the_cap_are_refused(event_bus):
+    event_bus.max_streams = 2
+    first, _ = event_bus.subscribe(1, _accept_all)
+    event_bus.subscribe(2, _accept_all)
+    assert event_bus.subscribe(1, _accept_all) == (None, [])
+    assert event_bus.stats()['refused_streams'] == 1
+
+    event_bus.unsubscribe(first)
+    assert event_bus.subscribe(1, _accept_all)[0] is not None
+
+def test_unsubscribed_stream_gets_no_events(event_bus):
+    subscription, _ = event_bus.subscribe(1, _accept_all)
+    event_bus.unsubscribe(subscription)
+    _publish(event_bus, 1, 1)
+    assert subscription.get(timeout=0) is None
+    assert 1 not in event_bus._subscribers
+
+@pytest.fixture
+def stream(client, monkeypatch):
+    # Streams end right after their backlog
+    monkeypatch.setenv('LIVE_MAX_STREAM_SECONDS', '0')
+
+    def stream(query=''):
+        response = client.get(f'/api/live/stream{query}')
+        body = response.get_data(as_text=True)
+        response.close()
+        return response, body
+    return stream
+
+def test_stream_requires_a_token(stream):
+    response, _ = stream()
+    assert response.status_code == 401
+    response, _ = stream('?access_token=not-a-token')
+    assert response.status_code == 401
+
+def test_stream_replays_committed_events(stream, auth_headers, company_id, make_job):
+    token = auth_headers['Authorization'].split(' ')[1]
+    make_job(title='Attic fan')
+
+    response, body = stream(f'?access_token={token}&last_event_id={bus._base_floor}')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert body.startswith('retry: 3000\n\n')
+    assert 'event: job.created\n' in body and 'Attic fan' in body
+
+    response, body = stream(f'?access_token={token}&last_event_id={bus._base_floor}&types=technician')
+    assert 'event: job.created' not in body
+    assert bus.stats()['subscribers'] == 0
+
+def test_stream_resets_after_the_buffer_moves_on(stream, auth_headers, company_id, monkeypatch):
+    token = auth_headers['Authorization'].split(' ')[1]
+    monkeypatch.setattr(bus, 'buffer_size', 2)
+    ids = _publish(bus, company_id, 4)
+
+    response, body = stream(f'?access_token={token}&last_event_id={ids[0] - 2}')
+    assert body == f'retry: 3000\n\nid: {ids[-1]}\nevent: reset\ndata: {{"reason": "missed events"}}\n\n'
+
+def test_stream_refused_when_every_thread_is_taken(stream, auth_headers, monkeypatch):
+    token = auth_headers['Authorization'].split(' ')[1]
+    monkeypatch.setattr(bus, 'max_streams', 0)
+
+    response, _ = stream(f'?access_token={token}')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '30'
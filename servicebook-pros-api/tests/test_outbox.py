@@ -0,0 +1,194 @@
+"""Outbox claim, lease and retry on its own SQLite database"""
+
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from src.utils.outbox import (
+    DEAD, PENDING, SENDING, SENT, FakeProvider, Outbox, OutboxMessageMixin
+)
+
+Base = declarative_base()
+
+class Message(OutboxMessageMixin, Base):
+    __tablename__ = 'outbox_test_messages'
+
+@pytest.fixture
+def outbox(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(engine)
+
+    @contextmanager
+    def session_scope():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    outbox = Outbox(Message)
+    outbox.configure(session_scope, max_attempts=3, backoff_base=30, lease_seconds=60, batch_size=10)
+    outbox.register_provider(FakeProvider('sms'))
+    yield outbox
+    engine.dispose()
+
+def _enqueue(outbox, count=1, **fields):
+    with outbox.session_scope() as session:
+        rows = [outbox.enqueue(session, 'sms', f'+1555010{number}', f'Message {number}', **fields)
+                for number in range(count)]
+        session.commit()
+        return [row.id for row in rows]
+
+def _row(outbox, message_id):
+    with outbox.session_scope() as session:
+        row = session.get(Message, message_id)
+        session.expunge(row)
+        return row
+
+def test_claim_leases_each_row_once(outbox):
+    ids = _enqueue(outbox, 3)
+    assert sorted(outbox.claim()) == ids
+    assert outbox.claim() == []
+
+    row = _row(outbox, ids[0])
+    assert row.status == SENDING
+    assert row.locked_by == outbox.worker_id
+    assert row.attempts == 1
+    assert row.locked_until > datetime.utcnow() + timedelta(seconds=50)
+
+def test_concurrent_workers_never_claim_the_same_row(outbox):
+    ids = _enqueue(outbox, 20)
+    workers = []
+    for number in range(4):
+        worker = copy.copy(outbox)
+        worker.worker_id = f'worker-{number}'
+        workers.append(worker)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        claims = list(pool.map(lambda worker: worker.claim(limit=20), workers))
+
+    claimed = [message_id for claim in claims for message_id in claim]
+    assert sorted(claimed) == ids
+    for worker, claim in zip(workers, claims):
+        assert all(_row(outbox, message_id).locked_by == worker.worker_id for message_id in claim)
+
+def test_claim_skips_messages_not_due(outbox):
+    _enqueue(outbox, send_at=datetime.utcnow() + timedelta(hours=1))
+    assert outbox.claim() == []
+
+def test_expired_lease_is_taken_over(outbox):
+    (message_id,) = _enqueue(outbox)
+    outbox.claim()
+    first_worker = outbox.worker_id
+
+    with outbox.session_scope() as session:
+        session.get(Message, message_id).locked_until = datetime.utcnow() - timedelta(seconds=1)
+        session.commit()
+    outbox.worker_id = 'second-worker'
+    assert outbox.claim() == [message_id]
+    assert _row(outbox, message_id).attempts == 2
+
+    # The first worker finishing late leaves the result to the new owner
+    outbox.worker_id = first_worker
+    assert outbox.deliver(message_id) == SENDING
+    assert outbox.providers['sms'].sent == []
+
+def test_delivery_records_success(outbox):
+    (message_id,) = _enqueue(outbox)
+    assert outbox.drain() == {SENT: 1}
+
+    row = _row(outbox, message_id)
+    assert row.status == SENT
+    assert row.provider == 'fake_sms'
+    assert row.provider_message_id
+    assert row.locked_by is None and row.locked_until is None
+    assert outbox.providers['sms'].sent[0]['to'] == '+15550100'
+
+def test_failure_is_retried_with_backoff_then_dead(outbox):
+    (message_id,) = _enqueue(outbox)
+    provider = outbox.providers['sms']
+    provider.fail_next(3)
+
+    assert outbox.drain() == {PENDING: 1}
+    row = _row(outbox, message_id)
+    assert row.last_error == 'simulated provider failure'
+    # 30s base delay with +/-20% jitter
+    assert datetime.utcnow() + timedelta(seconds=20) < row.next_attempt_at < datetime.utcnow() + timedelta(seconds=40)
+    assert outbox.drain() == {}
+
+    for _ in range(2):
+        with outbox.session_scope() as session:
+            session.get(Message, message_id).next_attempt_at = datetime.utcnow()
+            session.commit()
+        outcome = outbox.drain()
+    assert outcome == {DEAD: 1}
+    row = _row(outbox, message_id)
+    assert row.status == DEAD and row.attempts == 3
+
+    with outbox.session_scope() as session:
+        assert outbox.requeue_dead(session) == 1
+        session.commit()
+    assert outbox.drain() == {SENT: 1}
+
+def test_permanent_failure_is_dead_at_once(outbox):
+    (message_id,) = _enqueue(outbox)
+    outbox.providers['sms'].fail_next(permanent=True, error='invalid number')
+    assert outbox.drain() == {DEAD: 1}
+    row = _row(outbox, message_id)
+    assert row.attempts == 1 and row.last_error == 'invalid number'
+
+def test_backoff_doubles_up_to_the_maximum(outbox):
+    outbox.backoff_max = 100
+    assert 24 <= outbox.backoff(1) <= 36
+    assert 48 <= outbox.backoff(2) <= 72
+    assert 80 <= outbox.backoff(10) <= 120
+
+def test_cancel_stops_pending_messages_only(outbox):
+    _enqueue(outbox, source_id=10)
+    _enqueue(outbox, source_id=11)
+    outbox.claim(limit=1)
+
+    with outbox.session_scope() as session:
+        assert outbox.cancel(session, [10, 11]) == [11]
+        session.commit()
+
+class _ReclaimedWhileWaiting:
+    """Rate limiter whose wait outlasts the lease of the row being sent"""
+
+    def __init__(self, outbox, message_id, new_owner):
+        self.outbox, self.message_id, self.new_owner = outbox, message_id, new_owner
+
+    def acquire(self):
+        with self.outbox.session_scope() as session:
+            row = session.get(Message, self.message_id)
+            row.locked_until = datetime.utcnow() - timedelta(seconds=1)
+            if self.new_owner:
+                row.locked_by = self.new_owner
+            session.commit()
+
+def test_lease_lost_while_rate_limited_is_not_sent(outbox):
+    (message_id,) = _enqueue(outbox)
+    outbox.claim()
+    provider = outbox.providers['sms']
+    provider.limiter = _ReclaimedWhileWaiting(outbox, message_id, 'second-worker')
+
+    assert outbox.deliver(message_id) == SENDING
+    assert provider.sent == []
+    assert _row(outbox, message_id).locked_by == 'second-worker'
+
+def test_lease_is_renewed_after_the_rate_limit_wait(outbox):
+    (message_id,) = _enqueue(outbox)
+    outbox.claim()
+    outbox.providers['sms'].limiter = _ReclaimedWhileWaiting(outbox, message_id, None)
+
+    # Expired but not yet taken over: the renewal keeps the row
+    with outbox.session_scope() as session:
+        assert outbox._renew(session, message_id)
+        assert session.get(Message, message_id).locked_until > datetime.utcnow() + timedelta(seconds=50)
+    assert outbox.deliver(message_id) == SENT
+    assert len(outbox.providers['sms'].sent) == 1
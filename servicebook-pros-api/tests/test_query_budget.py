@@ -0,0 +1,49 @@
+import logging
+
+import pytest
+
+from src.models.user import db
+from src.models.job import Job
+from src.utils.query_budget import QueryBudgetExceeded, assert_max_queries
+
+def _query_count(client, path, headers):
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return int(response.headers['X-Query-Count'])
+
+def test_job_list_queries_do_not_grow_with_rows(client, auth_headers, make_job):
+    make_job()
+    one = _query_count(client, '/api/jobs/jobs', auth_headers)
+    for _ in range(10):
+        make_job()
+    assert _query_count(client, '/api/jobs/jobs', auth_headers) == one
+    assert one <= client.application.view_functions['jobs.get_jobs'].query_budget
+
+def test_overrun_fails_under_testing(client, auth_headers, make_job, monkeypatch):
+    make_job()
+    monkeypatch.setattr(client.application.view_functions['jobs.get_jobs'], 'query_budget', 1)
+    with pytest.raises(QueryBudgetExceeded, match=r'GET /api/jobs/jobs ran \d+ queries \(budget 1\)'):
+        client.get('/api/jobs/jobs', headers=auth_headers)
+
+def test_overrun_is_logged_outside_tests(client, auth_headers, make_job, monkeypatch, caplog):
+    make_job()
+    monkeypatch.setattr(client.application.view_functions['jobs.get_jobs'], 'query_budget', 1)
+    monkeypatch.setitem(client.application.config, 'TESTING', False)
+    with caplog.at_level(logging.WARNING, logger='src.utils.query_budget'):
+        response = client.get('/api/jobs/jobs', headers=auth_headers)
+    assert response.status_code == 200
+    assert 'Query budget exceeded: GET /api/jobs/jobs' in caplog.text
+
+def test_assert_max_queries(app_context, company_id, make_job):
+    make_job()
+    make_job()
+    with assert_max_queries(db.engine, 1) as statements:
+        jobs = Job.query.filter_by(company_id=company_id).all()
+    assert len(jobs) == 2 and len(statements) == 1
+
+    with pytest.raises(QueryBudgetExceeded, match='2 queries run'):
+        with assert_max_queries(db.engine, 1):
+            # Lazy loading each job's customer is one query per row
+            db.session.expire_all()
+            for job in Job.query.filter_by(company_id=company_id).limit(1):
+                job.customer.first_name
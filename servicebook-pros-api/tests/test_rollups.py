@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+from src.models.user import db
+from src.models.job import Job
+from src.models.communication import (
+    CommunicationDailyStat, CommunicationLog, CommunicationStatus, CommunicationType, CustomerQuestion
+)
+from src.utils.rollups import QUESTIONS, communication_summary, rebuild_rollups
+
+COUNTS = ('message_count', 'sent_count', 'delivered_count', 'failed_count')
+QUESTION_COUNTS = ('question_count', 'pending_question_count', 'urgent_question_count', 'answered_question_count')
+
+def _counts(company_id, channel, names=COUNTS):
+    db.session.expire_all()
+    row = CommunicationDailyStat.query.filter_by(company_id=company_id, channel=channel).one_or_none()
+    return tuple(getattr(row, name) for name in names) if row else (0,) * len(names)
+
+def _log(log_id):
+    return db.session.get(CommunicationLog, log_id)
+
+def test_status_changes_move_the_counters(app_context, company_id, make_log):
+    log = _log(make_log())
+    assert _counts(company_id, 'sms') == (1, 0, 0, 0)
+
+    # Each change is made on an object expired by the previous commit
+    log.status = CommunicationStatus.SENT
+    db.session.commit()
+    assert _counts(company_id, 'sms') == (1, 1, 0, 0)
+    log.status = CommunicationStatus.DELIVERED
+    db.session.commit()
+    assert _counts(company_id, 'sms') == (1, 1, 1, 0)
+    log.status = CommunicationStatus.FAILED
+    db.session.commit()
+    assert _counts(company_id, 'sms') == (1, 0, 0, 1)
+
+    db.session.delete(log)
+    db.session.commit()
+    assert _counts(company_id, 'sms') == (0, 0, 0, 0)
+
+def test_channels_are_counted_apart(app_context, company_id, make_log):
+    make_log()
+    make_log(communication_type=CommunicationType.EMAIL, recipient_email='a@example.com', recipient_phone=None,
+             status=CommunicationStatus.SENT)
+    assert _counts(company_id, 'sms') == (1, 0, 0, 0)
+    assert _counts(company_id, 'email') == (1, 1, 0, 0)
+
+def test_rolled_back_changes_are_not_counted(app_context, company_id, make_log):
+    log = _log(make_log())
+    log.status = CommunicationStatus.SENT
+    db.session.flush()
+    db.session.rollback()
+    make_log(status=CommunicationStatus.FAILED)
+    db.session.rollback()
+    assert _counts(company_id, 'sms') == (2, 0, 0, 1)
+
+def test_several_flushes_in_one_transaction(app_context, company_id, make_log):
+    log = _log(make_log())
+    log.status = CommunicationStatus.SENT
+    db.session.flush()
+    log.status = CommunicationStatus.READ
+    db.session.flush()
+    db.session.commit()
+    assert _counts(company_id, 'sms') == (1, 1, 1, 0)
+
+def test_question_counters(app_context, company_id, make_job):
+    job = db.session.get(Job, make_job())
+    asked = datetime.utcnow() - timedelta(minutes=30)
+    question = CustomerQuestion(company_id=company_id, job_id=job.id, customer_id=job.customer_id,
+                                question_text='When will you arrive?', is_urgent=True, created_at=asked)
+    db.session.add(question)
+    db.session.commit()
+    assert _counts(company_id, QUESTIONS, QUESTION_COUNTS) == (1, 1, 1, 0)
+
+    question.status = 'answered'
+    question.answered_at = asked + timedelta(minutes=20)
+    db.session.commit()
+    assert _counts(company_id, QUESTIONS, QUESTION_COUNTS) == (1, 0, 0, 1)
+    summary = communication_summary(company_id, asked.date(), asked.date())
+    assert summary['avg_response_minutes'] == 20.0
+    assert summary['pending_questions'] == 0
+
+def test_rebuild_matches_the_incremental_counters(app_context, company_id, make_log):
+    make_log(status=CommunicationStatus.DELIVERED)
+    make_log(status=CommunicationStatus.FAILED)
+    _log(make_log()).status = CommunicationStatus.SENT
+    db.session.commit()
+    incremental = _counts(company_id, 'sms')
+
+    rebuild_rollups(company_id)
+    assert _counts(company_id, 'sms') == incremental == (3, 2, 1, 1)
+
+def test_days_covers_exactly_that_many_days(client, company_id, make_log):
+    today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    for days_ago in (0, 1, 2):
+        make_log(status=CommunicationStatus.SENT, created_at=today - timedelta(days=days_ago))
+
+    for days, expected in ((1, 1), (2, 2), (3, 3), (0, 1)):
+        analytics = client.get(
+            f'/api/communication/analytics?company_id={company_id}&days={days}'
+        ).get_json()['analytics']
+        assert analytics['total_messages'] == expected
+        assert analytics['period_days'] == max(days, 1)
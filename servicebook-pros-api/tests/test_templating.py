@@ -0,0 +1,79 @@
+from datetime import date, datetime
+
+import pytest
+
+from src.utils.templating import TemplateError, compile_template, render, validate_template
+
+@pytest.mark.parametrize('source, data, expected', [
+    ('Hi {{name}}!', {'name': 'Ann'}, 'Hi Ann!'),
+    ('Hi {{ name }}', {'name': 'Ann'}, 'Hi Ann'),
+    ('{{a}}{{b}}', {'a': 1, 'b': 0}, '10'),
+    ('Hi {{missing}}.', {}, 'Hi .'),
+    ('Hi {{name}}.', {'name': None}, 'Hi .'),
+    ('no placeholders', {}, 'no placeholders'),
+    ('{{when|date}}', {'when': datetime(2024, 3, 5, 14, 30)}, 'March 05, 2024'),
+    ('{{when|date:"%A"}}', {'when': date(2024, 3, 4)}, 'Monday'),
+    ('{{when|date:"%d/%m"}}', {'when': '2024-03-05T14:30:00'}, '05/03'),
+    ('{{when|date}}', {'when': 'soon'}, 'soon'),
+    ('{{when|time}}', {'when': datetime(2024, 3, 5, 14, 30)}, '02:30 PM'),
+    ('{{amount|currency}}', {'amount': 1234.5}, '$1,234.50'),
+    ('{{amount|currency:"EUR "}}', {'amount': '12'}, 'EUR 12.00'),
+    ('{{amount|currency}}', {'amount': 'n/a'}, 'n/a'),
+    ('{{name|default:"there"}}', {}, 'there'),
+    ('{{name|default:"there"}}', {'name': ''}, 'there'),
+    ('{{name|default:"there"}}', {'name': 'Ann'}, 'Ann'),
+    ('{{name|upper}} {{name|lower}} {{name|title}}', {'name': 'mIxEd case'}, 'MIXED CASE mixed case Mixed Case'),
+    ('{{name|default:"friend"|upper}}', {}, 'FRIEND'),
+    ('{{name|upper}}', {}, ''),
+])
+def test_render(source, data, expected):
+    assert render(source, data) == expected
+
+def test_template_text_is_never_evaluated():
+    source = "{{name}}'); __import__('os').system('false'); ('{{name}}\"\"\" {{ name }}"
+    assert render(source, {'name': 'x'}) == "x'); __import__('os').system('false'); ('x\"\"\" x"
+    assert render('{{__class__}} {{ name.attr }}', {'name.attr': 'dotted'}) == ' dotted'
+
+def test_unknown_filter_is_rejected():
+    with pytest.raises(TemplateError, match='Unknown template filter: shout'):
+        validate_template('Hi {{name|shout}}')
+    validate_template(None)
+    validate_template('Hi {{name|upper}}')
+
+def test_compiled_template_is_cached_and_lists_variables():
+    template = compile_template('{{a}} {{b|upper}} {{a}}')
+    assert compile_template('{{a}} {{b|upper}} {{a}}') is template
+    assert template.variables == ('a', 'b')
+    assert template.render_many([{'a': 1, 'b': 'x'}, {'a': 2}]) == ['1 X 1', '2  2']
+
+def test_unknown_filters_are_refused_when_saved(client, auth_headers, company_id):
+    response = client.post('/api/communication/templates', json={
+        'company_id': company_id, 'name': 'Reminder', 'communication_type': 'sms',
+        'message_body': 'See you {{job_date|weekday}}',
+    })
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Unknown template filter: weekday'
+
+    response = client.post('/api/communication/templates', json={
+        'company_id': company_id, 'name': 'Reminder', 'communication_type': 'sms',
+        'message_body': 'See you {{job_date|date:"%A"}}',
+    })
+    assert response.status_code == 201
+    template_id = response.get_json()['template']['id']
+    response = client.put(f'/api/communication/templates/{template_id}',
+                          json={'message_body': '{{job_date|weekday}}'})
+    assert response.status_code == 400
+
+    response = client.post('/api/communication/campaigns', headers=auth_headers, json={
+        'audience': 'all_customers', 'message_body': 'Hi {{customer_first_name|shout}}',
+    })
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Unknown template filter: shout'
+
+    response = client.post('/api/ai/api/ai/automations', headers=auth_headers, json={
+        'name': 'Thanks', 'type': 'communication', 'trigger_type': 'event_based',
+        'trigger_conditions': {'event': 'job.status_changed', 'when': {'to': 'completed'}},
+        'actions': [{'type': 'send_sms', 'body': 'Thanks {{customer_first_name|shout}}'}],
+    })
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Unknown template filter: shout'
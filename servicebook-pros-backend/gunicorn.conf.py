@@ -0,0 +1,29 @@
+"""
+Gunicorn configuration for ServiceBook Pros
+The app is loaded once in the master and its read-only state warmed before
+the workers fork, so they share those pages copy-on-write
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+# GUNICORN_PRELOAD=false loads the app in every worker instead (the memory
+# report uses it as the baseline)
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+def when_ready(server):
+    if preload_app:
+        from src.main import app
+        from src.models.user import db
+        from src.utils.prefork import prepare_for_fork
+        prepare_for_fork(app, db)
+
+def post_fork(server, worker):
+    if preload_app:
+        from src.main import app
+        from src.models.user import db
+        from src.utils.prefork import after_fork
+        after_fork(app, db)
@@ -5,7 +5,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory, jsonify
 from flask_cors import CORS
 from src.models.user import db, User
-from src.routes.auth import auth_bp
+from src.routes.auth import auth_bp, admin_required
 from src.routes.user import user_bp
 from src.routes.pricing import pricing_bp
 from src.routes.customers import customers_bp
@@ -18,6 +18,11 @@ from src.routes.settings import settings_bp
 from src.routes.payments import payments_bp
 from src.routes.communication import communication_bp
 from src.routes.calendar import calendar_bp
+from src.utils.database import configure_database, init_engines, get_pool_metrics
+from src.utils.profiling import init_profiling
+from src.utils.http_cache import CachePolicy, init_http_cache
+from src.utils.cache import init_cache
+from src.models.data_version import DataVersion, GLOBAL_SCOPE
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'sbp-dev-secret-change-in-prod')
@@ -44,14 +49,23 @@ app.register_blueprint(calendar_bp, url_prefix='/api/calendar')
 # Database configuration
 database_dir = os.path.join(os.path.dirname(__file__), 'database')
 os.makedirs(database_dir, exist_ok=True)
-db_url = os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(database_dir, 'app.db')}")
-# Railway provides postgres:// but SQLAlchemy needs postgresql://
-if db_url.startswith('postgres://'):
-    db_url = db_url.replace('postgres://', 'postgresql://', 1)
-app.config['SQLALCHEMY_DATABASE_URI'] = db_url
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# DATABASE_URL switches to Postgres; pool sizing and SQLite PRAGMAs come from utils.database
+configure_database(app, f"sqlite:///{os.path.join(database_dir, 'app.db')}")
 
 db.init_app(app)
+init_engines(app, db)
+# Request timing, slow-query log, Server-Timing, /metrics and /api/_debug/profile
+init_profiling(app, db, admin_required=admin_required)
+
+# Conditional GETs and compression. The pricing catalog is not tenant
+# specific, so its ETags follow the global data version.
+init_http_cache(app, db, scope=lambda: GLOBAL_SCOPE, policies={
+    'pricing': CachePolicy('public, no-cache', versioned=True),
+    'auth': CachePolicy('no-store'),
+})
+
+# Application cache for catalog lookups (REDIS_URL to share it across workers)
+cache = init_cache(app, db)
 
 with app.app_context():
     db.create_all()
@@ -71,6 +85,14 @@ with app.app_context():
 def health():
     return jsonify({'status': 'ok'}), 200
 
+@app.get('/api/health/database')
+def database_health():
+    return jsonify({'status': 'ok', 'pools': get_pool_metrics()}), 200
+
+@app.get('/api/health/cache')
+def cache_health():
+    return jsonify({'status': 'ok', 'cache': cache.stats()}), 200
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
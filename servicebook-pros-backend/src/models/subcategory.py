@@ -17,12 +17,14 @@ class ServiceSubcategory(db.Model):
     # Relationship to parent category
     parent_category = db.relationship('ServiceCategory', backref='subcategories')
     
-    def to_dict(self):
-        from src.models.pricing import ElectricalService
-        service_count = ElectricalService.query.filter_by(
-            subcategory_code=self.subcategory_code,
-            is_active=True
-        ).count()
+    def to_dict(self, service_count=None):
+        """Pass `service_count` when it is already known to skip the count query"""
+        if service_count is None:
+            from src.models.pricing import ElectricalService
+            service_count = ElectricalService.query.filter_by(
+                subcategory_code=self.subcategory_code,
+                is_active=True
+            ).count()
         
         return {
             'id': self.id,
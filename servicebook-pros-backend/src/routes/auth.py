@@ -34,6 +34,16 @@ def token_required(f):
         return f(current_user, *args, **kwargs)
     return decorated
 
+def admin_required(f):
+    """Like token_required, for admin-only views that do not take the user"""
+    @wraps(f)
+    @token_required
+    def decorated(current_user, *args, **kwargs):
+        if current_user.role != 'admin':
+            return jsonify({'error': 'Admin privileges required'}), 403
+        return f(*args, **kwargs)
+    return decorated
+
 @auth_bp.route('/auth/login', methods=['POST'])
 def login():
     data = request.get_json() or {}
@@ -5,12 +5,19 @@ from src.models.pricing import (
     ElectricalService, PricingSettings, ServiceCategory, 
     Estimate, EstimateItem
 )
+from src.utils.catalog_counts import ServiceCounts
+from src.utils.cache import cached_view
+from src.utils.prefork import render_view, warmup
 from decimal import Decimal
 import uuid
 from datetime import datetime
 
 pricing_bp = Blueprint('pricing', __name__)
 
+# Active service counts per category/subcategory, one GROUP BY shared by
+# the category grid, subcategory lists and stats
+service_counts = ServiceCounts(ElectricalService)
+
 @pricing_bp.route('/', methods=['GET'])
 def get_pricing_list():
     """Root endpoint — returns empty list (catalog uses in-memory sample data)."""
@@ -48,11 +55,7 @@ def get_categories():
         result = []
         for category in categories:
             category_dict = category.to_dict()
-            service_count = ElectricalService.query.filter_by(
-                category_code=category.category_code, 
-                is_active=True
-            ).count()
-            category_dict['service_count'] = service_count
+            category_dict['service_count'] = service_counts.for_category(category.category_code)
             result.append(category_dict)
         
         return jsonify({
@@ -64,6 +67,7 @@ def get_categories():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @pricing_bp.route('/categories/<category_code>/services', methods=['GET'])
+@cached_view(ttl=600)
 def get_services_by_category(category_code):
     """Get all services for a specific category"""
     try:
@@ -107,6 +111,7 @@ def get_services_by_category(category_code):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @pricing_bp.route('/services/search', methods=['GET'])
+@cached_view(ttl=600)
 def search_services():
     """Search services across all categories"""
     try:
@@ -160,6 +165,7 @@ def search_services():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @pricing_bp.route('/services/<service_code>', methods=['GET'])
+@cached_view(ttl=600)
 def get_service_by_code(service_code):
     """Get a specific service by its code"""
     try:
@@ -423,23 +429,17 @@ def get_estimates(contractor_id):
 def get_stats():
     """Get platform statistics"""
     try:
-        total_services = ElectricalService.query.filter_by(is_active=True).count()
-        total_categories = ServiceCategory.query.filter_by(is_active=True).count()
+        categories = ServiceCategory.query.filter_by(is_active=True).order_by(ServiceCategory.sort_order).all()
+        total_services = service_counts.total()
+        total_categories = len(categories)
         
         # Category breakdown
         category_stats = []
-        categories = ServiceCategory.query.filter_by(is_active=True).order_by(ServiceCategory.sort_order).all()
-        
         for category in categories:
-            service_count = ElectricalService.query.filter_by(
-                category_code=category.category_code, 
-                is_active=True
-            ).count()
-            
             category_stats.append({
                 'category_code': category.category_code,
                 'category_name': category.category_name,
-                'service_count': service_count
+                'service_count': service_counts.for_category(category.category_code)
             })
         
         return jsonify({
@@ -575,13 +575,17 @@ def get_subcategories(category_code):
         
         return jsonify({
             'success': True,
-            'subcategories': [subcategory.to_dict() for subcategory in subcategories],
+            'subcategories': [
+                subcategory.to_dict(service_count=service_counts.for_subcategory(subcategory.subcategory_code))
+                for subcategory in subcategories
+            ],
             'total': len(subcategories)
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @pricing_bp.route("/subcategories/<subcategory_code>/services", methods=["GET"])
+@cached_view(ttl=600)
 def get_services_by_subcategory(subcategory_code):
     """Get all services for a specific subcategory"""
     try:
@@ -612,3 +616,16 @@ def get_services_by_subcategory(subcategory_code):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@warmup('pricing catalog')
+def warm_pricing_catalog():
+    """Service counts and the first page of every category"""
+    service_counts.summary()
+    for category in ServiceCategory.query.filter_by(is_active=True).all():
+        render_view('pricing.get_services_by_category', category_code=category.category_code)
+
+@warmup('pricing subcategories')
+def warm_pricing_subcategories():
+    from src.models.subcategory import ServiceSubcategory
+    
+    for subcategory in ServiceSubcategory.query.filter_by(is_active=True).all():
+        render_view('pricing.get_services_by_subcategory', subcategory_code=subcategory.subcategory_code)
@@ -0,0 +1,85 @@
+"""
+Test fixtures for the ServiceBook Pros backend
+The app is imported once per session on a fresh SQLite database; the
+pricing catalog is shared by every tenant, so tests use catalog codes no
+other test uses.
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_workdir = tempfile.mkdtemp(prefix='sbp-backend-test-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ.pop('REDIS_URL', None)
+
+_numbers = itertools.count(1)
+
+@pytest.fixture(scope='session')
+def app():
+    from src.main import app
+
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def app_context(app):
+    from src.models.user import db
+
+    with app.app_context():
+        yield
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def make_category(app):
+    """Create an active service category; returns its code"""
+    from src.models.user import db
+    from src.models.pricing import ServiceCategory
+
+    def make(**fields):
+        number = next(_numbers)
+        with app.app_context():
+            category = ServiceCategory(**{
+                'category_code': f'T{number:03d}',
+                'category_name': f'Category {number}',
+                'description': 'Test category',
+                'sort_order': 1000 + number,
+                **fields,
+            })
+            db.session.add(category)
+            db.session.commit()
+            return category.category_code
+    return make
+
+@pytest.fixture
+def make_service(app):
+    """Create an active service in a category; returns its id"""
+    from src.models.user import db
+    from src.models.pricing import ElectricalService
+
+    def make(category_code, **fields):
+        number = next(_numbers)
+        with app.app_context():
+            service = ElectricalService(**{
+                'service_code': f'{category_code}-{number:03d}',
+                'category_code': category_code,
+                'category_name': 'Category',
+                'service_name': f'Service {number}',
+                'description': 'Test service',
+                'base_price': 100,
+                'labor_hours': 1,
+                **fields,
+            })
+            db.session.add(service)
+            db.session.commit()
+            return service.id
+    return make
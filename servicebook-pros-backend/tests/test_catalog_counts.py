@@ -0,0 +1,94 @@
+import pytest
+
+from src.models.user import db
+from src.models.pricing import ElectricalService
+from src.routes.pricing import service_counts
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Number of GROUP BY queries the shared counts have run"""
+    calls = []
+    load = service_counts._load
+
+    def counted_load():
+        calls.append(1)
+        return load()
+
+    monkeypatch.setattr(service_counts, '_load', counted_load)
+    service_counts.invalidate()
+    return calls
+
+def _category_counts(client):
+    response = client.get('/api/pricing/categories')
+    assert response.status_code == 200
+    return {category['category_code']: category['service_count'] for category in response.get_json()['categories']}
+
+def test_counts_are_cached_until_the_catalog_changes(client, make_category, make_service, loads):
+    category_code = make_category()
+    make_service(category_code, subcategory_code=f'{category_code}-A')
+    make_service(category_code, is_active=False)
+
+    assert _category_counts(client)[category_code] == 1
+    assert _category_counts(client)[category_code] == 1
+    assert len(loads) == 1
+
+    make_service(category_code)
+    assert _category_counts(client)[category_code] == 2
+    assert len(loads) == 2
+
+def test_subcategory_and_total_counts(app_context, make_category, make_service, loads):
+    category_code = make_category()
+    for _ in range(2):
+        make_service(category_code, subcategory_code=f'{category_code}-A')
+    total = service_counts.total()
+
+    assert service_counts.for_subcategory(f'{category_code}-A') == 2
+    assert service_counts.for_category('none') == 0
+    service_id = make_service(category_code)
+    assert service_counts.total() == total + 1
+
+    db.session.get(ElectricalService, service_id).is_active = False
+    db.session.commit()
+    assert service_counts.total() == total
+    assert len(loads) == 3
+
+def test_rolled_back_writes_keep_the_cache(app_context, make_category, make_service, loads):
+    category_code = make_category()
+    service_id = make_service(category_code)
+    service_counts.summary()
+
+    db.session.get(ElectricalService, service_id).is_active = False
+    db.session.flush()
+    db.session.rollback()
+    assert service_counts.for_category(category_code) == 1
+    assert len(loads) == 1
+
+def test_counts_read_before_an_invalidation_are_not_kept(app_context, make_category, make_service, monkeypatch):
+    category_code = make_category()
+    load = service_counts._load
+
+    def load_while_the_catalog_changes():
+        summary = load()
+        make_service(category_code)
+        return summary
+
+    monkeypatch.setattr(service_counts, '_load', load_while_the_catalog_changes)
+    service_counts.invalidate()
+    assert service_counts.for_category(category_code) == 0
+    monkeypatch.setattr(service_counts, '_load', load)
+    assert service_counts.for_category(category_code) == 1
+
+def test_other_processes_changes_show_after_the_ttl(app_context, make_category, monkeypatch):
+    category_code = make_category()
+    service_counts.invalidate()
+    service_counts.summary()
+
+    # A write committed elsewhere does not reach this process's listeners
+    db.session.execute(ElectricalService.__table__.insert().values(
+        service_code=f'{category_code}-999', category_code=category_code, category_name='Category',
+        service_name='Elsewhere', description='Test service', base_price=1, labor_hours=1, is_active=True
+    ))
+    db.session.commit()
+    assert service_counts.for_category(category_code) == 0
+    monkeypatch.setattr(service_counts, 'ttl', 0)
+    assert service_counts.for_category(category_code) == 1
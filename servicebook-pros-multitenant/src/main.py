@@ -3,18 +3,28 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+from src.utils.startup import StartupTimer, auto_init_db
+startup = StartupTimer()
+
+import click
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
 from src.models.materials import MaterialCategory, MaterialSubcategory, MasterMaterial, CompanyMaterial
 from src.routes.user import user_bp
-from src.routes.auth import auth_bp
+from src.utils.database import configure_database, init_engines, get_pool_metrics
+from src.utils.profiling import init_profiling
+from src.utils.http_cache import CachePolicy, init_http_cache
+from src.utils.cache import init_cache
+from src.utils.prefork import warmup
+from src.routes.auth import auth_bp, get_current_company, require_admin
 from src.routes.company import company_bp
 from src.routes.pricing import pricing_bp
 from src.routes.materials import materials_bp
 from src.routes.admin import admin_bp
 from src.routes.invoice import invoice_bp
-from src.routes.communication import communication_bp
+from src.routes.communication import communication_bp, init_message_tables, init_outbox, init_webhooks
+startup.mark('imports')
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'servicebook-pros-multitenant-secret-key-2025'
@@ -35,11 +45,39 @@ app.register_blueprint(materials_bp)
 app.register_blueprint(admin_bp)
 app.register_blueprint(invoice_bp)
 app.register_blueprint(communication_bp)
+startup.mark('blueprints')
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_database(app, f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}")
 db.init_app(app)
+init_engines(app, db)
+# Request timing, slow-query log, Server-Timing, /metrics and /api/_debug/profile
+init_profiling(app, db, admin_required=require_admin)
+
+def current_company_scope():
+    company = get_current_company()
+    return f'company:{company.id}' if company else None
+
+# Conditional GETs and compression. Pricing and materials reads depend only
+# on the company's data and the shared catalog, so their ETags come from the
+# data versions and repeat requests are answered before the view runs.
+init_http_cache(app, db, scope=current_company_scope, policies={
+    'pricing': CachePolicy('private, no-cache', versioned=True),
+    'materials': CachePolicy('private, no-cache', versioned=True),
+    'auth': CachePolicy('no-store'),
+})
+
+# Application cache for catalog lookups (REDIS_URL to share it across workers)
+cache = init_cache(app, db)
+
+# SMS/email outbox (OUTBOX_* settings); delivered by `flask outbox-worker` or,
+# with OUTBOX_INLINE_WORKER, by a thread in the process that queued them
+outbox = init_outbox(app)
+
+# SendGrid/Twilio status callbacks (WEBHOOK_* settings); applied by
+# `flask webhooks-apply` or, with WEBHOOK_INLINE_WORKER, in process
+webhooks = init_webhooks(app)
+startup.mark('extensions')
 
 # Import all models to ensure they're created
 from src.models.company import Company, CompanyUser
@@ -51,17 +89,143 @@ from src.models.invoice import (
     Customer, WorkOrder, Invoice, InvoiceLineItem, 
     Payment, InvoiceTemplate
 )
+from src.models.sequence import DocumentSequence
+from src.models.data_version import DataVersion
+startup.mark('models')
 
-with app.app_context():
-    db.create_all()
-    
-    # Initialize demo data
+def seed_demo():
     try:
         from init_demo_data import init_demo_data
         init_demo_data()
     except Exception as e:
         print(f"Warning: Could not initialize demo data: {e}")
 
+# Local development builds the schema and demo data at boot. Deployments set
+# AUTO_INIT_DB=false and run `flask init-db` / `flask seed-demo` once instead.
+if auto_init_db():
+    with app.app_context():
+        with startup.phase('schema'):
+            db.create_all()
+            init_message_tables()
+        with startup.phase('seed'):
+            seed_demo()
+startup.log('ServiceBook Pros Multi-Tenant')
+
+# Invoice PDFs import reportlab on demand; a preloading server builds the
+# stylesheet once in the master instead
+@warmup('invoice pdf styles')
+def warm_pdf_styles():
+    from src.utils.pdf_generator import invoice_styles
+    invoice_styles()
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create missing tables"""
+    db.create_all()
+    init_message_tables()
+    click.echo('Schema ready')
+
+@app.cli.command('seed-demo')
+def seed_demo_command():
+    """Load the demo companies, catalog and materials"""
+    db.create_all()
+    seed_demo()
+    click.echo('Demo data loaded')
+
+@app.cli.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Deliver one batch of due messages and exit')
+@click.option('--concurrency', type=int, help='Parallel deliveries (default OUTBOX_CONCURRENCY)')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to wait when the queue is empty')
+def outbox_worker(once, concurrency, poll_interval):
+    """Deliver queued SMS and email"""
+    outbox.inline_worker = False
+    if concurrency:
+        outbox.concurrency = concurrency
+    if once:
+        outcomes = outbox.drain()
+        click.echo(', '.join(f'{status} {count}' for status, count in outcomes.items()) or 'Nothing due')
+        return
+    click.echo(f'Outbox worker {outbox.worker_id} running with {outbox.concurrency} threads')
+    try:
+        outbox.run(poll_interval=poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+@app.cli.command('webhooks-apply')
+@click.option('--once', is_flag=True, help='Apply the due batches and exit')
+@click.option('--poll-interval', default=5.0, show_default=True, help='Seconds to wait when nothing is due')
+def webhooks_apply(once, poll_interval):
+    """Apply stored SendGrid and Twilio status events"""
+    webhooks.inline_worker = False
+    if once:
+        counts = webhooks.drain()
+        click.echo(', '.join(f'{name} {count}' for name, count in counts.items()) or 'Nothing due')
+        return
+    try:
+        webhooks.run(poll_interval=poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+@app.cli.command('outbox-requeue')
+@click.argument('message_ids', nargs=-1, type=int)
+def outbox_requeue(message_ids):
+    """Retry dead-lettered messages (all of them when no ids are given)"""
+    with outbox.session_scope() as session:
+        count = outbox.requeue_dead(session, list(message_ids))
+        session.commit()
+    click.echo(f'Requeued {count} messages')
+
+@app.cli.command('conversations-rebuild')
+@click.option('--company-id', type=int, help='Only rebuild this company\'s conversations')
+def conversations_rebuild(company_id):
+    """Recompute conversation threads from the stored messages"""
+    from src.routes.communication import SessionLocal
+    from src.utils.conversations import rebuild_conversations
+    session = SessionLocal()
+    try:
+        count = rebuild_conversations(session, company_id)
+        session.commit()
+    finally:
+        session.close()
+    click.echo(f'Threaded {count} messages')
+
+@app.cli.command('inbound-number-add')
+@click.argument('phone')
+@click.argument('company_id', type=int)
+def inbound_number_add(phone, company_id):
+    """Route SMS sent to PHONE (a Twilio number) to COMPANY_ID"""
+    from src.routes.communication import SessionLocal
+    from src.utils.inbound import add_inbound_number
+    session = SessionLocal()
+    try:
+        number = add_inbound_number(session, phone, company_id)
+        session.commit()
+        click.echo(f'{number.phone_e164} -> company {number.company_id}')
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    finally:
+        session.close()
+
+@app.cli.command('inbound-numbers')
+def inbound_numbers():
+    """List the numbers inbound SMS are routed by"""
+    from src.routes.communication import SessionLocal
+    from src.models.message import InboundNumber
+    session = SessionLocal()
+    try:
+        for number in session.query(InboundNumber).order_by(InboundNumber.company_id, InboundNumber.phone_e164):
+            click.echo(f'{number.phone_e164} -> company {number.company_id}')
+    finally:
+        session.close()
+
+@app.cli.command('startup-report')
+def startup_report_command():
+    """Print how long each phase of this process's boot took"""
+    report = startup.report()
+    click.echo(f"total {report['total_ms']:.0f}ms")
+    for name, ms in report['phases_ms'].items():
+        click.echo(f"  {name:<12} {ms:>8.1f}ms")
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -83,5 +247,27 @@ def serve(path):
 def health_check():
     return {'status': 'healthy', 'service': 'ServiceBook Pros Multi-Tenant'}, 200
 
+# Database pool metrics
+@app.route('/api/health/database')
+def database_health():
+    return {'status': 'healthy', 'pools': get_pool_metrics()}, 200
+
+# Application cache metrics
+@app.route('/api/health/cache')
+def cache_health():
+    return {'status': 'healthy', 'cache': cache.stats()}, 200
+
+# Outbox queue depth and dead letters
+@app.route('/api/health/outbox')
+def outbox_health():
+    with outbox.session_scope() as session:
+        stats = outbox.stats(session)
+    return {'status': 'degraded' if stats['counts']['dead'] else 'healthy', 'outbox': stats}, 200
+
+# Boot phase timings of this worker
+@app.route('/api/health/startup')
+def startup_health():
+    return {'status': 'healthy', 'startup': startup.report(), 'auto_init_db': auto_init_db()}, 200
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -29,6 +29,10 @@ class Company(db.Model):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = Column(Boolean, default=True)
     
+    def data_scope(self):
+        """A company's own row is part of its data version (see http_cache)"""
+        return f'company:{self.id}'
+
     def to_dict(self):
         return {
             'id': self.id,
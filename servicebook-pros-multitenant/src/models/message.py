@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import column_property, validates
 from datetime import datetime
+from src.utils.communication import CommunicationService
+from src.utils.outbox import OutboxMessageMixin
 
 Base = declarative_base()
 
@@ -9,7 +11,8 @@ class Message(Base):
     __tablename__ = 'messages'
     
     id = Column(Integer, primary_key=True)
-    company_id = Column(Integer, ForeignKey('companies.id'), nullable=False)
+    company_id = Column(Integer, nullable=False, index=True)  # companies.id in the app database
+    conversation_id = Column(Integer, nullable=True)  # set when the message is inserted
     customer_id = Column(Integer, nullable=True)  # Can be null for new customers
     customer_name = Column(String(255), nullable=True)
     customer_phone = Column(String(20), nullable=True)
@@ -27,17 +30,25 @@ class Message(Base):
     
     # Status and metadata
     status = Column(String(20), default='sent')  # sent, delivered, failed, read
-    read = Column(Boolean, default=False)
+    # The previous value is loaded before a change so the conversation's
+    # unread count can follow it even when the row was expired
+    read = column_property(Column(Boolean, default=False), active_history=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationships
-    company = relationship("Company", back_populates="messages")
+    __table_args__ = (
+        # A thread's messages, newest first
+        Index('ix_messages_conversation_id', 'conversation_id', 'id'),
+        # Provider status callbacks look messages up by these
+        Index('ix_messages_twilio_sid', 'twilio_sid'),
+        Index('ix_messages_sendgrid_message_id', 'sendgrid_message_id'),
+    )
     
     def to_dict(self):
         return {
             'id': self.id,
             'company_id': self.company_id,
+            'conversation_id': self.conversation_id,
             'customer_id': self.customer_id,
             'customer_name': self.customer_name,
             'customer_phone': self.customer_phone,
@@ -54,14 +65,70 @@ class Message(Base):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class Conversation(Base):
+    """Summary of one thread: everything exchanged with a customer, phone or email.
+
+    Maintained as messages are inserted (src/utils/conversations.py), so
+    the inbox reads one row per thread.
+    """
+    __tablename__ = 'conversations'
+    
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    participant_key = Column(String(300), nullable=False)  # customer:<id>, phone:<e164> or email:<address>
+    customer_id = Column(Integer, nullable=True)
+    customer_name = Column(String(255), nullable=True)
+    customer_phone = Column(String(20), nullable=True)
+    customer_email = Column(String(255), nullable=True)
+    
+    # Last message
+    last_message_id = Column(Integer, nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    last_message_preview = Column(String(200), nullable=True)
+    last_message_type = Column(String(10), nullable=True)
+    last_direction = Column(String(10), nullable=True)
+    
+    # Counters
+    message_count = Column(Integer, nullable=False, default=0)
+    unread_count = Column(Integer, nullable=False, default=0)  # unread inbound messages
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint('company_id', 'participant_key', name='uq_conversations_participant'),
+        Index('ix_conversations_company_last_message', 'company_id', 'last_message_at', 'id'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'company_id': self.company_id,
+            'customer_id': self.customer_id,
+            'customer_name': self.customer_name,
+            'customer_phone': self.customer_phone,
+            'customer_email': self.customer_email,
+            'last_message': {
+                'id': self.last_message_id,
+                'content': self.last_message_preview,
+                'message_type': self.last_message_type,
+                'direction': self.last_direction,
+                'created_at': self.last_message_at.isoformat() if self.last_message_at else None
+            },
+            'message_count': self.message_count,
+            'unread_count': self.unread_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 class Customer(Base):
     __tablename__ = 'customers'
     
     id = Column(Integer, primary_key=True)
-    company_id = Column(Integer, ForeignKey('companies.id'), nullable=False)
+    company_id = Column(Integer, nullable=False, index=True)  # companies.id in the app database
     name = Column(String(255), nullable=False)
     email = Column(String(255), nullable=True)
     phone = Column(String(20), nullable=True)
+    phone_e164 = Column(String(20), nullable=True)  # normalized from phone, for inbound lookups
     address = Column(Text, nullable=True)
     city = Column(String(100), nullable=True)
     state = Column(String(50), nullable=True)
@@ -75,8 +142,15 @@ class Customer(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationships
-    company = relationship("Company", back_populates="customers")
+    __table_args__ = (
+        # A unique index rather than a constraint, so existing databases can add it
+        Index('uq_customers_company_phone_e164', 'company_id', 'phone_e164', unique=True),
+    )
+    
+    @validates('phone')
+    def _normalize_phone(self, key, phone):
+        self.phone_e164 = CommunicationService.normalize_phone(phone)
+        return phone
     
     def to_dict(self):
         return {
@@ -85,6 +159,7 @@ class Customer(Base):
             'name': self.name,
             'email': self.email,
             'phone': self.phone,
+            'phone_e164': self.phone_e164,
             'address': self.address,
             'city': self.city,
             'state': self.state,
@@ -96,3 +171,47 @@ class Customer(Base):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class InboundNumber(Base):
+    """A phone number the app receives SMS on, and the company it belongs to"""
+    __tablename__ = 'inbound_numbers'
+    
+    id = Column(Integer, primary_key=True)
+    phone_e164 = Column(String(20), nullable=False, unique=True)
+    company_id = Column(Integer, nullable=False)  # companies.id in the app database
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'phone_e164': self.phone_e164,
+            'company_id': self.company_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class WebhookBatch(Base):
+    """Delivery status events received from a provider, waiting to be applied"""
+    __tablename__ = 'webhook_batches'
+    __table_args__ = (
+        Index('ix_webhook_batches_pending', 'processed_at', 'next_attempt_at'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    provider = Column(String(20), nullable=False)  # 'sendgrid' or 'twilio'
+    events = Column(Text, nullable=False)  # JSON list of normalized events
+    event_count = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+    
+    def data_scope(self):
+        """Ingestion bookkeeping moves no data version (see http_cache)"""
+        return None
+
+class OutboxMessage(OutboxMessageMixin, Base):
+    """Outbound SMS/email waiting for (or done with) delivery"""
+    __tablename__ = 'outbox_messages'
+    __table_args__ = (
+        Index('ix_outbox_messages_status_next_attempt', 'status', 'next_attempt_at'),
+        Index('ix_outbox_messages_company_status', 'company_id', 'status'),
+    )
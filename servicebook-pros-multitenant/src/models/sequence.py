@@ -0,0 +1,84 @@
+from src.models.user import db
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint, update
+from sqlalchemy.exc import IntegrityError
+
+class DocumentSequence(db.Model):
+    """Per-company, per-document-type counter used for invoice numbering"""
+    __tablename__ = 'document_sequences'
+
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, ForeignKey('companies.id'), nullable=False)
+    document_type = Column(String(50), nullable=False)  # e.g. invoice-2025
+
+    # Last number handed out for this company and document type
+    last_value = Column(Integer, nullable=False, default=0)
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Constraints
+    __table_args__ = (
+        UniqueConstraint('company_id', 'document_type', name='uq_document_sequence_company_type'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'company_id': self.company_id,
+            'document_type': self.document_type,
+            'last_value': self.last_value,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    @classmethod
+    def allocate(cls, company_id, document_type, count=1, seed=None):
+        """Atomically reserve `count` consecutive numbers and return the first one.
+
+        The counter is bumped with a single ``UPDATE ... RETURNING`` so the row
+        lock (or SQLite's write lock) is held before the value is read and two
+        concurrent requests never receive the same number. ``seed`` is an
+        optional callable returning the highest number already in use; it only
+        runs when the counter row is first created.
+        """
+        if count < 1:
+            raise ValueError('count must be at least 1')
+
+        last_value = cls._increment(company_id, document_type, count)
+        if last_value is None:
+            cls._create(company_id, document_type, seed() if seed else 0)
+            last_value = cls._increment(company_id, document_type, count)
+
+        return last_value - count + 1
+
+    @classmethod
+    def allocate_block(cls, company_id, document_type, count, seed=None):
+        """Reserve a block of numbers for bulk imports, returned as a range"""
+        first = cls.allocate(company_id, document_type, count=count, seed=seed)
+        return range(first, first + count)
+
+    @classmethod
+    def _increment(cls, company_id, document_type, count):
+        result = db.session.execute(
+            update(cls)
+            .where(cls.company_id == company_id, cls.document_type == document_type)
+            .values(last_value=cls.last_value + count, updated_at=datetime.utcnow())
+            .returning(cls.last_value)
+        )
+        return result.scalar()
+
+    @classmethod
+    def _create(cls, company_id, document_type, start_value):
+        # A concurrent request may insert the row first; the unique
+        # constraint rejects ours and the retried UPDATE uses theirs.
+        try:
+            with db.session.begin_nested():
+                db.session.add(cls(
+                    company_id=company_id,
+                    document_type=document_type,
+                    last_value=start_value or 0
+                ))
+        except IntegrityError:
+            pass
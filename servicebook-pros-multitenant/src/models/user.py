@@ -27,6 +27,11 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
     
+    def data_scope(self):
+        """Users span companies and no versioned response includes them, so
+        their writes (such as last_login) bump no data version"""
+        return None
+    
     def set_password(self, password):
         """Set password hash"""
         self.password_hash = generate_password_hash(password)
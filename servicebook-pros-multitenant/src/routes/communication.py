@@ -1,11 +1,21 @@
 from flask import Blueprint, request, jsonify
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine, desc
-from src.models.message import Message, Customer
+from sqlalchemy import create_engine, desc, inspect
+from sqlalchemy.exc import IntegrityError
+from src.models.message import Base, Conversation, Message, Customer, OutboxMessage
 from src.models.company import Company
+from src.utils import communication as providers
 from src.utils.communication import CommunicationService
+from src.utils import conversations as conversation_threads
+from src.utils import inbound
+from src.utils.webhooks import WebhookIngestor, sendgrid_events, twilio_events, webhook_settings
+from src.utils.outbox import (
+    Outbox, CallableProvider, FakeProvider, ProviderError, outbox_settings, provider_rate
+)
+from contextlib import contextmanager
 from datetime import datetime
 import logging
+import os
 
 # Create blueprint
 communication_bp = Blueprint('communication', __name__)
@@ -14,9 +24,138 @@ communication_bp = Blueprint('communication', __name__)
 DATABASE_URL = "sqlite:///servicebook_pros.db"
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Conversation summaries follow every message flushed through SessionLocal
+conversation_threads.watch(SessionLocal)
 
 logger = logging.getLogger(__name__)
 
+def _upgrade_message_tables():
+    """Add the nullable columns and indexes that existing tables lack.
+
+    ``create_all`` never alters a table that already exists.
+    """
+    added = []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        preparer = connection.dialect.identifier_preparer
+        for table in Base.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable and column.server_default is None:
+                    connection.exec_driver_sql(
+                        f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN '
+                        f'{preparer.format_column(column)} {column.type.compile(dialect=connection.dialect)}'
+                    )
+                    added.append(f'{table.name}.{column.name}')
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(bind=connection)
+                    added.append(index.name)
+    return added
+
+def init_message_tables():
+    """Create the messaging tables, which live outside the app database"""
+    Base.metadata.create_all(engine)
+    for name in _upgrade_message_tables():
+        logger.info(f"Added {name} to the messaging database")
+    db = SessionLocal()
+    try:
+        filled, duplicates = inbound.backfill_customer_phones(db)
+        if filled or duplicates:
+            logger.info(f"Normalized {filled} customer phone numbers ({duplicates} duplicates left empty)")
+        routed = inbound.backfill_inbound_numbers(db)
+        if routed:
+            logger.info(f"Routed {routed} configured Twilio numbers for inbound SMS")
+    finally:
+        db.close()
+
+# Outbound SMS/email queue. Messages are queued with their Message row and
+# delivered by `flask outbox-worker` or the in-process worker thread.
+outbox = Outbox(OutboxMessage)
+
+@contextmanager
+def _outbox_session():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+def _twilio_send(envelope):
+    result = CommunicationService.send_sms(envelope.recipient, envelope.body)
+    if not result['success']:
+        raise ProviderError(result['error'])
+    return result['message_sid']
+
+def _sendgrid_send(envelope):
+    result = CommunicationService.send_email(envelope.recipient, envelope.subject, envelope.body)
+    if not result['success']:
+        raise ProviderError(result['error'])
+    return result['message_id']
+
+def _message_sent(session, row):
+    message = session.get(Message, row.source_id) if row.source_id else None
+    if message:
+        message.status = 'sent'
+        if row.channel == 'sms':
+            message.twilio_sid = row.provider_message_id
+        else:
+            message.sendgrid_message_id = row.provider_message_id
+
+def _message_failed(session, row):
+    message = session.get(Message, row.source_id) if row.source_id else None
+    if message:
+        message.status = 'failed'
+
+outbox.on_sent.append(_message_sent)
+outbox.on_dead.append(_message_failed)
+
+# Provider status callbacks, stored by the webhooks and applied in bulk by
+# `flask webhooks-apply` or the in-process worker thread
+webhooks = WebhookIngestor()
+
+def init_webhooks(app):
+    """Configure webhook ingestion from WEBHOOK_* settings"""
+    webhooks.configure(_outbox_session, **webhook_settings())
+    webhooks.watch(SessionLocal)
+    app.extensions['webhooks'] = webhooks
+    return webhooks
+
+def init_outbox(app):
+    """Configure the outbox from OUTBOX_* settings.
+
+    Twilio and SendGrid deliver when their libraries are installed;
+    OUTBOX_PROVIDER=fake uses the local fake providers instead.
+    """
+    outbox.configure(_outbox_session, **outbox_settings())
+    use_fake = os.environ.get('OUTBOX_PROVIDER', '').lower() == 'fake'
+    if use_fake or providers.twilio_client is None:
+        outbox.register_provider(FakeProvider('sms', rate_per_second=provider_rate('sms')))
+    else:
+        outbox.register_provider(CallableProvider('twilio', 'sms', _twilio_send, provider_rate('sms')))
+    if use_fake or providers.sendgrid_client is None:
+        outbox.register_provider(FakeProvider('email', rate_per_second=provider_rate('email')))
+    else:
+        outbox.register_provider(CallableProvider('sendgrid', 'email', _sendgrid_send, provider_rate('email')))
+    outbox.watch(SessionLocal)
+    app.extensions['outbox'] = outbox
+    return outbox
+
+def queue_message(db, message):
+    """Add an outbound message and queue its delivery in the same transaction"""
+    message.status = 'queued'
+    db.add(message)
+    db.flush()
+    if message.message_type == 'sms':
+        recipient = message.customer_phone
+    else:
+        recipient = message.customer_email
+    return outbox.enqueue(
+        db, message.message_type, recipient, message.content, subject=message.subject,
+        company_id=message.company_id, source_id=message.id
+    )
+
 @communication_bp.route('/api/messages', methods=['GET'])
 def get_messages():
     """Get all messages for a company"""
@@ -93,15 +232,6 @@ def send_message():
                 content = CommunicationService.create_sms_template(template_type, **template_data)
                 message.content = content
             
-            # Send SMS
-            result = CommunicationService.send_sms(to_phone, content)
-            
-            if result['success']:
-                message.twilio_sid = result['message_sid']
-                message.status = result['status']
-            else:
-                message.status = 'failed'
-                
         elif message_type == 'email':
             if not to_email:
                 return jsonify({'success': False, 'error': 'Email address required for email'}), 400
@@ -115,32 +245,23 @@ def send_message():
                 )
                 message.subject = email_subject
                 message.content = email_content
-                content = email_content
-                subject = email_subject
-            
-            # Send email
-            result = CommunicationService.send_email(to_email, subject, content)
-            
-            if result['success']:
-                message.sendgrid_message_id = result['message_id']
-                message.status = 'sent'
-            else:
-                message.status = 'failed'
         
         else:
             return jsonify({'success': False, 'error': 'Invalid message type'}), 400
         
-        # Save message to database
-        db.add(message)
+        # Save the message and queue its delivery; the outbox worker sends it
+        # and updates the message status
+        queue_message(db, message)
         db.commit()
         
+        result = message.to_dict()
+        
         db.close()
         
         return jsonify({
-            'success': result['success'],
-            'message': message.to_dict(),
-            'error': result.get('error')
-        })
+            'success': True,
+            'message': result
+        }), 202
         
     except Exception as e:
         logger.error(f"Error sending message: {str(e)}")
@@ -148,64 +269,70 @@ def send_message():
 
 @communication_bp.route('/api/webhooks/twilio', methods=['POST'])
 def twilio_webhook():
-    """Handle incoming SMS from Twilio"""
+    """Handle incoming SMS from Twilio.
+
+    The company comes from the number texted (To) and the customer from the
+    sender (From), each one indexed lookup; everything is stored in a
+    single commit so Twilio gets its response right away.
+    """
     try:
         # Get Twilio webhook data
         message_sid = request.form.get('MessageSid')
         from_phone = request.form.get('From')
         to_phone = request.form.get('To')
-        body = request.form.get('Body')
-        
-        logger.info(f"Received SMS from {from_phone}: {body}")
+        body = request.form.get('Body') or ''
         
         db = SessionLocal()
-        
-        # Try to find existing customer by phone
-        customer = db.query(Customer).filter(
-            Customer.phone.like(f"%{from_phone[-10:]}%")
-        ).first()
-        
-        # Create message record
-        message = Message(
-            company_id=1,  # Default company
-            customer_id=customer.id if customer else None,
-            customer_name=customer.name if customer else None,
-            customer_phone=from_phone,
-            message_type='sms',
-            direction='inbound',
-            content=body,
-            twilio_sid=message_sid,
-            status='received'
-        )
-        
-        db.add(message)
-        db.commit()
-        
-        # Handle opt-out requests
-        if body.upper().strip() in ['STOP', 'UNSUBSCRIBE', 'QUIT']:
-            if customer:
-                customer.opt_out_sms = True
-                db.commit()
+        try:
+            company_id = inbound.router.company_for(db, to_phone)
+            if company_id is None:
+                # Acknowledge anyway: a retry would not find a route either.
+                # A lost opt-out must still be honoured, so it is an error.
+                if body.upper().strip() in ['STOP', 'UNSUBSCRIBE', 'QUIT']:
+                    logger.error(f"Opt-out from {from_phone} to unrouted number {to_phone} dropped "
+                                 f"(message {message_sid}); add the number with `flask inbound-number-add`")
+                else:
+                    logger.warning(f"No company receives SMS on {to_phone}; dropped message {message_sid}")
+                return '', 200
             
-            # Send confirmation
-            CommunicationService.send_sms(
-                from_phone, 
-                "You have been unsubscribed from SMS notifications. Reply START to resubscribe."
-            )
-        
-        # Handle opt-in requests
-        elif body.upper().strip() == 'START':
-            if customer:
-                customer.opt_out_sms = False
-                db.commit()
+            logger.info(f"Received SMS for company {company_id} from {from_phone}")
+            
+            customer = inbound.find_customer(db, company_id, from_phone)
             
-            # Send confirmation
-            CommunicationService.send_sms(
-                from_phone, 
-                "You have been resubscribed to SMS notifications. Reply STOP to unsubscribe."
+            # Create message record
+            message = Message(
+                company_id=company_id,
+                customer_id=customer.id if customer else None,
+                customer_name=customer.name if customer else None,
+                customer_phone=CommunicationService.normalize_phone(from_phone) or from_phone,
+                message_type='sms',
+                direction='inbound',
+                content=body,
+                twilio_sid=message_sid,
+                status='received'
             )
-        
-        db.close()
+            db.add(message)
+            
+            keyword = body.upper().strip()
+            # Handle opt-out requests
+            if keyword in ['STOP', 'UNSUBSCRIBE', 'QUIT']:
+                if customer:
+                    customer.opt_out_sms = True
+                db.flush()
+                # Send confirmation
+                _queue_reply(db, message, "You have been unsubscribed from SMS notifications. Reply START to resubscribe.")
+            
+            # Handle opt-in requests
+            elif keyword == 'START':
+                if customer:
+                    customer.opt_out_sms = False
+                db.flush()
+                # Send confirmation
+                _queue_reply(db, message, "You have been resubscribed to SMS notifications. Reply STOP to unsubscribe.")
+            
+            db.commit()
+        finally:
+            db.close()
         
         return '', 200
         
@@ -213,41 +340,57 @@ def twilio_webhook():
         logger.error(f"Error processing Twilio webhook: {str(e)}")
         return '', 500
 
+def _queue_reply(db, received, content):
+    queue_message(db, Message(
+        company_id=received.company_id,
+        customer_id=received.customer_id,
+        customer_name=received.customer_name,
+        customer_phone=received.customer_phone,
+        message_type='sms',
+        direction='outbound',
+        content=content
+    ))
+
 @communication_bp.route('/api/webhooks/sendgrid', methods=['POST'])
 def sendgrid_webhook():
-    """Handle email events from SendGrid"""
+    """Handle email events from SendGrid.
+
+    The batch (up to 1,000 events) is stored as one row and acknowledged;
+    status changes are applied in bulk outside the request.
+    """
     try:
-        events = request.get_json()
+        events = request.get_json(silent=True)
+        if not isinstance(events, list):
+            return '', 400
         
         db = SessionLocal()
+        try:
+            webhooks.ingest(db, 'sendgrid', sendgrid_events(events))
+            db.commit()
+        finally:
+            db.close()
         
-        for event in events:
-            message_id = event.get('sg_message_id')
-            event_type = event.get('event')
-            
-            # Find message by SendGrid message ID
-            message = db.query(Message).filter(
-                Message.sendgrid_message_id == message_id
-            ).first()
-            
-            if message:
-                # Update message status based on event
-                if event_type == 'delivered':
-                    message.status = 'delivered'
-                elif event_type == 'bounce':
-                    message.status = 'failed'
-                elif event_type == 'open':
-                    message.read = True
-                
-                message.updated_at = datetime.utcnow()
+        return '', 200
         
-        db.commit()
-        db.close()
+    except Exception as e:
+        logger.error(f"Error processing SendGrid webhook: {str(e)}")
+        return '', 500
+
+@communication_bp.route('/api/webhooks/twilio/status', methods=['POST'])
+def twilio_status_webhook():
+    """Handle SMS status callbacks from Twilio (see TWILIO_STATUS_CALLBACK_URL)"""
+    try:
+        db = SessionLocal()
+        try:
+            webhooks.ingest(db, 'twilio', twilio_events(request.form))
+            db.commit()
+        finally:
+            db.close()
         
         return '', 200
         
     except Exception as e:
-        logger.error(f"Error processing SendGrid webhook: {str(e)}")
+        logger.error(f"Error processing Twilio status callback: {str(e)}")
         return '', 500
 
 @communication_bp.route('/api/customers', methods=['GET'])
@@ -302,7 +445,12 @@ def create_customer():
         )
         
         db.add(customer)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            db.close()
+            return jsonify({'success': False, 'error': 'A customer with this phone number already exists'}), 409
         
         result = customer.to_dict()
         
@@ -319,60 +467,108 @@ def create_customer():
 
 @communication_bp.route('/api/conversations', methods=['GET'])
 def get_conversations():
-    """Get conversation threads grouped by customer"""
+    """Get a page of conversation threads, most recent first.
+
+    Threads are summarised as messages arrive, so this reads one row per
+    conversation. Pass the returned ``next_cursor`` as ``cursor`` for the
+    next page, and fetch a thread's messages from
+    /api/conversations/<id>/messages.
+    """
     try:
-        company_id = request.args.get('company_id', 1)
+        company_id = request.args.get('company_id', 1, type=int)
+        limit = min(request.args.get('limit', 25, type=int), 100)
+        unread_only = request.args.get('unread_only', '').lower() in ('1', 'true', 'yes')
         
         db = SessionLocal()
+        try:
+            page, next_cursor = conversation_threads.inbox_page(
+                db, company_id, limit, cursor=request.args.get('cursor'), unread_only=unread_only
+            )
+        except ValueError:
+            db.close()
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
         
-        # Get latest message for each customer/phone/email combination
-        conversations = db.query(Message).filter(
-            Message.company_id == company_id
-        ).order_by(desc(Message.created_at)).all()
-        
-        # Group by customer
-        grouped = {}
-        for message in conversations:
-            key = message.customer_id or message.customer_phone or message.customer_email
-            if key not in grouped:
-                grouped[key] = {
-                    'customer_id': message.customer_id,
-                    'customer_name': message.customer_name,
-                    'customer_phone': message.customer_phone,
-                    'customer_email': message.customer_email,
-                    'last_message': message.to_dict(),
-                    'unread_count': 0,
-                    'messages': []
-                }
-            
-            grouped[key]['messages'].append(message.to_dict())
-            if not message.read and message.direction == 'inbound':
-                grouped[key]['unread_count'] += 1
-        
-        # Sort by last message time
-        conversations_list = list(grouped.values())
-        conversations_list.sort(
-            key=lambda x: x['last_message']['created_at'], 
-            reverse=True
-        )
+        conversations_list = [conversation.to_dict() for conversation in page]
         
         db.close()
         
         return jsonify({
             'success': True,
-            'conversations': conversations_list
+            'conversations': conversations_list,
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
         logger.error(f"Error fetching conversations: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@communication_bp.route('/api/conversations/<int:conversation_id>/messages', methods=['GET'])
+def get_conversation_messages(conversation_id):
+    """Get a conversation's messages, newest first; pass ``next_before`` as ``before`` for older ones"""
+    try:
+        company_id = request.args.get('company_id', 1, type=int)
+        limit = min(request.args.get('limit', 50, type=int), 200)
+        before = request.args.get('before', type=int)
+        
+        db = SessionLocal()
+        
+        conversation = db.query(Conversation).filter(
+            Conversation.id == conversation_id,
+            Conversation.company_id == company_id
+        ).first()
+        
+        if not conversation:
+            db.close()
+            return jsonify({'success': False, 'error': 'Conversation not found'}), 404
+        
+        page, next_before = conversation_threads.thread_page(db, conversation.id, limit, before=before)
+        result = {
+            'success': True,
+            'conversation': conversation.to_dict(),
+            'messages': [message.to_dict() for message in page],
+            'next_before': next_before
+        }
+        
+        db.close()
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        logger.error(f"Error fetching conversation messages: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@communication_bp.route('/api/conversations/<int:conversation_id>/read', methods=['PUT'])
+def mark_conversation_read(conversation_id):
+    """Mark every inbound message in a conversation as read"""
+    try:
+        company_id = request.args.get('company_id', 1, type=int)
+        
+        db = SessionLocal()
+        
+        conversation = db.query(Conversation).filter(
+            Conversation.id == conversation_id,
+            Conversation.company_id == company_id
+        ).first()
+        
+        if not conversation:
+            db.close()
+            return jsonify({'success': False, 'error': 'Conversation not found'}), 404
+        
+        updated = conversation_threads.mark_conversation_read(db, conversation)
+        
+        db.commit()
+        db.close()
+        
+        return jsonify({'success': True, 'updated': updated})
+        
+    except Exception as e:
+        logger.error(f"Error marking conversation as read: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @communication_bp.route('/api/messages/<int:message_id>/read', methods=['PUT'])
-def mark_message_read():
+def mark_message_read(message_id):
     """Mark a message as read"""
     try:
-        message_id = request.view_args['message_id']
-        
         db = SessionLocal()
         
         message = db.query(Message).filter(Message.id == message_id).first()
@@ -4,6 +4,7 @@ from sqlalchemy import create_engine
 from src.models.communication_config import CommunicationConfig, PhoneNumberPool, EmailDomain
 from src.models.company import Company
 from src.utils.communication import CommunicationService
+from src.utils import inbound
 from datetime import datetime
 import logging
 import os
@@ -79,6 +80,13 @@ def update_communication_config():
         if 'twilio_auth_token' in data:
             config.twilio_auth_token = data['twilio_auth_token']
         if 'twilio_phone_number' in data:
+            # Inbound SMS are routed to the company by this number
+            try:
+                inbound.set_company_number(db, company_id, config.twilio_phone_number, data['twilio_phone_number'])
+            except ValueError as e:
+                db.rollback()
+                db.close()
+                return jsonify({'success': False, 'error': str(e)}), 409 if isinstance(e, inbound.InboundNumberTaken) else 400
             config.twilio_phone_number = data['twilio_phone_number']
         if 'sendgrid_api_key' in data:
             config.sendgrid_api_key = data['sendgrid_api_key']
@@ -203,6 +211,12 @@ def purchase_phone_number():
             config = CommunicationConfig(company_id=company_id)
             db.add(config)
         
+        try:
+            inbound.set_company_number(db, company_id, config.twilio_phone_number, phone_number)
+        except ValueError as e:
+            db.rollback()
+            db.close()
+            return jsonify({'success': False, 'error': str(e)}), 409 if isinstance(e, inbound.InboundNumberTaken) else 400
         config.twilio_phone_number = phone_number
         config.twilio_webhook_url = f"{os.getenv('BASE_URL', 'https://your-domain.com')}/api/webhooks/twilio/{company_id}"
         config.updated_at = datetime.utcnow()
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, send_file
 from src.models.user import db
 from src.models.invoice import Invoice, InvoiceLineItem, Payment, Customer, WorkOrder, InvoiceTemplate
 from src.models.company import Company
+from src.models.sequence import DocumentSequence
 from src.routes.auth import require_auth, get_current_company
 from datetime import datetime, date, timedelta
 from sqlalchemy import and_, or_, desc, asc
@@ -11,31 +12,45 @@ import json
 
 invoice_bp = Blueprint('invoice', __name__)
 
-# Helper function to generate invoice number
-def generate_invoice_number(company_id):
-    """Generate a unique invoice number for the company"""
-    current_year = datetime.now().year
-    
-    # Get the last invoice number for this company and year
+# Helper functions to generate invoice numbers
+def _highest_invoice_sequence(company_id, year):
+    """Highest sequence already used for the company and year (seeds the counter once)"""
     last_invoice = db.session.query(Invoice).filter(
         and_(
             Invoice.company_id == company_id,
-            Invoice.invoice_number.like(f'INV-{current_year}-%')
+            Invoice.invoice_number.like(f'INV-{year}-%')
         )
     ).order_by(desc(Invoice.id)).first()
     
     if last_invoice:
-        # Extract the sequence number and increment
         try:
-            last_seq = int(last_invoice.invoice_number.split('-')[-1])
-            next_seq = last_seq + 1
+            return int(last_invoice.invoice_number.split('-')[-1])
         except (ValueError, IndexError):
-            next_seq = 1
-    else:
-        next_seq = 1
+            return 0
+    return 0
+
+def generate_invoice_number(company_id):
+    """Generate a unique invoice number for the company"""
+    current_year = datetime.now().year
+    
+    next_seq = DocumentSequence.allocate(
+        company_id, f'invoice-{current_year}',
+        seed=lambda: _highest_invoice_sequence(company_id, current_year)
+    )
     
     return f'INV-{current_year}-{next_seq:06d}'
 
+def generate_invoice_numbers(company_id, count):
+    """Reserve a block of consecutive invoice numbers for bulk imports"""
+    current_year = datetime.now().year
+    
+    block = DocumentSequence.allocate_block(
+        company_id, f'invoice-{current_year}', count,
+        seed=lambda: _highest_invoice_sequence(company_id, current_year)
+    )
+    
+    return [f'INV-{current_year}-{seq:06d}' for seq in block]
+
 # Invoice CRUD Operations
 
 @invoice_bp.route('/api/invoices', methods=['GET'])
@@ -6,6 +6,8 @@ from flask import Blueprint, request, jsonify, session
 from src.models.user import db
 from src.models.materials import MaterialCategory, MaterialSubcategory, MasterMaterial, CompanyMaterial
 from src.models.company import Company, CompanyUser
+from src.utils.cache import cache, cached_view
+from src.utils.prefork import warmup
 from functools import wraps
 
 materials_bp = Blueprint('materials', __name__, url_prefix='/api/materials')
@@ -30,15 +32,33 @@ def get_user_company():
         return Company.query.get(company_user.company_id)
     return None
 
+# The category tree is master data shared by every company, so it is cached
+# once for all of them and dropped when a category row changes
+@cache.memoize(ttl=3600, tags=('material_categories',))
+def active_categories():
+    return [cat.to_dict() for cat in MaterialCategory.query.filter_by(is_active=True).all()]
+
+@cache.memoize(ttl=3600, tags=('material_subcategories',))
+def active_subcategories(category_code=None):
+    query = MaterialSubcategory.query.filter_by(is_active=True)
+    if category_code:
+        query = query.filter_by(category_code=category_code)
+    return [subcat.to_dict() for subcat in query.all()]
+
+@warmup('material category tree')
+def warm_category_tree():
+    active_subcategories(None)
+    for category in active_categories():
+        active_subcategories(category['category_code'])
+
 @materials_bp.route('/categories', methods=['GET'])
 @require_auth
 def get_categories():
     """Get all material categories"""
     try:
-        categories = MaterialCategory.query.filter_by(is_active=True).all()
         return jsonify({
             'success': True,
-            'categories': [cat.to_dict() for cat in categories]
+            'categories': active_categories()
         })
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -49,21 +69,16 @@ def get_subcategories():
     """Get subcategories, optionally filtered by category"""
     try:
         category_code = request.args.get('category_code')
-        
-        query = MaterialSubcategory.query.filter_by(is_active=True)
-        if category_code:
-            query = query.filter_by(category_code=category_code)
-        
-        subcategories = query.all()
         return jsonify({
             'success': True,
-            'subcategories': [subcat.to_dict() for subcat in subcategories]
+            'subcategories': active_subcategories(category_code)
         })
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @materials_bp.route('/catalog', methods=['GET'])
 @require_auth
+@cached_view(ttl=600)
 def get_materials_catalog():
     """Get materials catalog with optional filtering"""
     try:
@@ -6,11 +6,16 @@ from src.models.pricing import (
     CompanyService, CompanyTaxRate, CompanyLaborRate
 )
 from src.routes.auth import require_auth, require_admin, get_current_company
+from src.utils.catalog_counts import ServiceCounts
 from datetime import datetime
 from sqlalchemy import or_, and_
 
 pricing_bp = Blueprint('pricing', __name__, url_prefix='/api/pricing')
 
+# Active master service counts per category/subcategory, one GROUP BY
+# shared by the category grid and subcategory lists
+service_counts = ServiceCounts(MasterService)
+
 # ===== MASTER CATALOG ROUTES (READ-ONLY FOR COMPANIES) =====
 
 @pricing_bp.route('/categories', methods=['GET'])
@@ -24,10 +29,7 @@ def get_categories():
         result = []
         for category in categories:
             category_dict = category.to_dict()
-            category_dict['service_count'] = MasterService.query.filter_by(
-                category_code=category.category_code, 
-                is_active=True
-            ).count()
+            category_dict['service_count'] = service_counts.for_category(category.category_code)
             result.append(category_dict)
         
         return jsonify({
@@ -53,10 +55,7 @@ def get_subcategories(category_code):
         result = []
         for subcategory in subcategories:
             subcategory_dict = subcategory.to_dict()
-            subcategory_dict['service_count'] = MasterService.query.filter_by(
-                subcategory_code=subcategory.subcategory_code, 
-                is_active=True
-            ).count()
+            subcategory_dict['service_count'] = service_counts.for_subcategory(subcategory.subcategory_code)
             result.append(subcategory_dict)
         
         return jsonify({
@@ -0,0 +1,91 @@
+# Generated copy: edit servicebook-pros-backend/src/utils/catalog_counts.py and run scripts/sync_shared_modules.py
+"""
+Catalog service counts for ServiceBook Pros
+Active service counts per category and subcategory from one GROUP BY,
+cached in process and dropped when catalog rows change
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import event, func
+
+from src.models.user import db
+
+class ServiceCounts:
+    """Cached active-service counts for a catalog model.
+
+    The model needs ``category_code``, ``subcategory_code`` and ``is_active``
+    columns. Commits that touch the model drop the cache in this process;
+    other processes pick the change up within CATALOG_COUNTS_TTL seconds.
+    """
+
+    def __init__(self, service_model, ttl: Optional[int] = None):
+        self.model = service_model
+        self.ttl = ttl if ttl is not None else int(os.environ.get('CATALOG_COUNTS_TTL', 300))
+        self._lock = threading.Lock()
+        self._summary = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+        event.listen(db.session, 'after_flush', self._note_catalog_write)
+        event.listen(db.session, 'after_commit', self._invalidate_after_commit)
+
+    def _note_catalog_write(self, session, flush_context):
+        if any(isinstance(obj, self.model) for obj in (*session.new, *session.dirty, *session.deleted)):
+            session.info['catalog_counts_stale'] = True
+
+    def _invalidate_after_commit(self, session):
+        # Dropped only once the write is visible, so a concurrent request
+        # cannot cache the old counts again
+        if session.info.pop('catalog_counts_stale', False):
+            self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._summary = None
+            self._generation += 1
+
+    def _load(self) -> Dict:
+        model = self.model
+        rows = db.session.query(
+            model.category_code, model.subcategory_code, func.count(model.id)
+        ).filter(model.is_active == True).group_by(model.category_code, model.subcategory_code).all()
+
+        categories: Dict[str, int] = {}
+        subcategories: Dict[str, int] = {}
+        for category_code, subcategory_code, count in rows:
+            categories[category_code] = categories.get(category_code, 0) + count
+            if subcategory_code:
+                subcategories[subcategory_code] = subcategories.get(subcategory_code, 0) + count
+        return {
+            'categories': categories,
+            'subcategories': subcategories,
+            'total': sum(categories.values()),
+        }
+
+    def summary(self) -> Dict:
+        """{'categories': {code: n}, 'subcategories': {code: n}, 'total': n}"""
+        with self._lock:
+            summary = self._summary
+            if summary is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return summary
+            generation = self._generation
+        summary = self._load()
+        with self._lock:
+            # Skip storing counts read before an invalidation landed
+            if generation == self._generation:
+                self._summary = summary
+                self._loaded_at = time.monotonic()
+        return summary
+
+    def for_category(self, category_code: str) -> int:
+        return self.summary()['categories'].get(category_code, 0)
+
+    def for_subcategory(self, subcategory_code: str) -> int:
+        return self.summary()['subcategories'].get(subcategory_code, 0)
+
+    def total(self) -> int:
+        return self.summary()['total']
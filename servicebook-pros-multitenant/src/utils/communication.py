@@ -1,20 +1,30 @@
 import os
-from twilio.rest import Client
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 import logging
 
+try:
+    from twilio.rest import Client
+except ImportError:  # optional dependency
+    Client = None
+
+try:
+    from sendgrid import SendGridAPIClient
+    from sendgrid.helpers.mail import Mail
+except ImportError:  # optional dependency
+    SendGridAPIClient = None
+
 # Twilio Configuration - Use environment variables
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "your_twilio_account_sid")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "your_twilio_auth_token")
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER", "+1234567890")
+# Public URL of /api/webhooks/twilio/status; delivery updates are only sent when set
+TWILIO_STATUS_CALLBACK_URL = os.getenv("TWILIO_STATUS_CALLBACK_URL")
 
 # SendGrid Configuration - Use environment variables
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY", "your_sendgrid_api_key")
 
-# Initialize clients
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-sendgrid_client = SendGridAPIClient(api_key=SENDGRID_API_KEY)
+# Initialize clients (None when the library is not installed)
+twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN) if Client else None
+sendgrid_client = SendGridAPIClient(api_key=SENDGRID_API_KEY) if SendGridAPIClient else None
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +36,9 @@ class CommunicationService:
         Send SMS using Twilio
         """
         try:
+            if twilio_client is None:
+                raise RuntimeError('twilio is not installed')
+            
             # Ensure phone number is in E.164 format
             if not to_phone.startswith('+'):
                 # Assume US number if no country code
@@ -36,10 +49,12 @@ class CommunicationService:
                 else:
                     to_phone = f"+1{to_phone}"
             
+            options = {'status_callback': TWILIO_STATUS_CALLBACK_URL} if TWILIO_STATUS_CALLBACK_URL else {}
             message = twilio_client.messages.create(
                 body=message_body,
                 from_=from_phone,
-                to=to_phone
+                to=to_phone,
+                **options
             )
             
             logger.info(f"SMS sent successfully. SID: {message.sid}")
@@ -65,6 +80,9 @@ class CommunicationService:
         Send email using SendGrid
         """
         try:
+            if sendgrid_client is None:
+                raise RuntimeError('sendgrid is not installed')
+            
             message = Mail(
                 from_email=(from_email, from_name),
                 to_emails=to_email,
@@ -108,6 +126,17 @@ class CommunicationService:
             # Return as-is if already formatted or international
             return phone if phone.startswith('+') else f"+1{digits}"
     
+    @staticmethod
+    def normalize_phone(phone):
+        """
+        Canonical E.164 form of a phone number for lookups, or None when it
+        has no digits. Unlike format_phone_number, never keeps punctuation.
+        """
+        if not phone or not any(c.isdigit() for c in phone):
+            return None
+        formatted = CommunicationService.format_phone_number(phone)
+        return '+' + ''.join(filter(str.isdigit, formatted))
+    
     @staticmethod
     def validate_email(email):
         """
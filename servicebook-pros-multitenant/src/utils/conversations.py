@@ -0,0 +1,210 @@
+"""
+Conversation summaries for ServiceBook Pros
+Keeps one Conversation row per thread current as messages are inserted or
+read, so the inbox and thread views never scan a company's message history
+"""
+
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, event, func, inspect, or_, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.models.message import Conversation, Message
+from src.utils.communication import CommunicationService
+
+PREVIEW_LENGTH = 200
+
+conversations = Conversation.__table__
+messages = Message.__table__
+
+def participant_key(message) -> str:
+    """Thread a message belongs to: its customer, else its phone number or email"""
+    if message.customer_id:
+        return f'customer:{message.customer_id}'
+    if message.customer_phone:
+        return f'phone:{CommunicationService.format_phone_number(message.customer_phone)}'
+    if message.customer_email:
+        return f'email:{message.customer_email.strip().lower()}'
+    return 'unknown'
+
+def _conversation_id(connection, message, now):
+    key = participant_key(message)
+    lookup = select(conversations.c.id).where(
+        conversations.c.company_id == message.company_id,
+        conversations.c.participant_key == key
+    )
+    conversation_id = connection.execute(lookup).scalar()
+    if conversation_id is not None:
+        return conversation_id
+    # Another transaction may create the same thread between the SELECT and
+    # the INSERT; uq_conversations_participant keeps one row and both use it
+    values = dict(company_id=message.company_id, participant_key=key, customer_id=message.customer_id,
+                  message_count=0, unread_count=0, created_at=now, updated_at=now)
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+        connection.execute(
+            insert(conversations).values(**values).on_conflict_do_nothing(
+                index_elements=[conversations.c.company_id, conversations.c.participant_key]
+            )
+        )
+    else:
+        try:
+            with connection.begin_nested():
+                connection.execute(conversations.insert().values(**values))
+        except IntegrityError:
+            pass
+    return connection.execute(lookup).scalar_one()
+
+def _attach(connection, message, now):
+    """Add an inserted message to its conversation's summary"""
+    conversation_id = _conversation_id(connection, message, now)
+    unread = 1 if message.direction == 'inbound' and not message.read else 0
+    connection.execute(
+        conversations.update().where(conversations.c.id == conversation_id).values(
+            message_count=conversations.c.message_count + 1,
+            unread_count=conversations.c.unread_count + unread,
+            customer_id=func.coalesce(conversations.c.customer_id, message.customer_id),
+            customer_name=func.coalesce(message.customer_name, conversations.c.customer_name),
+            customer_phone=func.coalesce(message.customer_phone, conversations.c.customer_phone),
+            customer_email=func.coalesce(message.customer_email, conversations.c.customer_email),
+            updated_at=now
+        )
+    )
+    # Only a newer message replaces the summary (rebuilds insert in id order)
+    connection.execute(
+        conversations.update().where(
+            conversations.c.id == conversation_id,
+            or_(conversations.c.last_message_at.is_(None), conversations.c.last_message_at <= message.created_at)
+        ).values(
+            last_message_id=message.id,
+            last_message_at=message.created_at,
+            last_message_preview=(message.content or '')[:PREVIEW_LENGTH],
+            last_message_type=message.message_type,
+            last_direction=message.direction
+        )
+    )
+    connection.execute(messages.update().where(messages.c.id == message.id).values(conversation_id=conversation_id))
+    set_committed_value(message, 'conversation_id', conversation_id)
+
+def _read_changes(message) -> int:
+    """-1 when an inbound message was just read, +1 when marked unread again"""
+    if message.direction != 'inbound' or not message.conversation_id:
+        return 0
+    history = inspect(message).attrs.read.history
+    if not history.has_changes():
+        return 0
+    before = bool(history.deleted[0]) if history.deleted else False
+    after = bool(message.read)
+    return (before and not after) - (after and not before)
+
+def _after_flush(session, flush_context):
+    # new/dirty still describe what was just flushed, and the rows have ids
+    now = datetime.utcnow()
+    connection = session.connection()
+    for message in sorted((obj for obj in session.new if isinstance(obj, Message)), key=lambda m: m.id):
+        _attach(connection, message, now)
+    for message in session.dirty:
+        if isinstance(message, Message):
+            delta = _read_changes(message)
+            if delta:
+                connection.execute(
+                    conversations.update().where(conversations.c.id == message.conversation_id).values(
+                        unread_count=func.max(conversations.c.unread_count + delta, 0), updated_at=now
+                    )
+                )
+
+def watch(session_target):
+    """Maintain conversations for messages flushed through ``session_target``"""
+    event.listen(session_target, 'after_flush', _after_flush)
+
+def mark_conversation_read(session, conversation: Conversation) -> int:
+    """Mark every inbound message of a thread read; returns how many changed"""
+    result = session.execute(
+        messages.update().where(
+            messages.c.conversation_id == conversation.id,
+            messages.c.direction == 'inbound',
+            messages.c.read == False
+        ).values(read=True, updated_at=datetime.utcnow())
+    )
+    conversation.unread_count = 0
+    return result.rowcount
+
+def rebuild_conversations(session, company_id: Optional[int] = None, batch_size: int = 1000) -> int:
+    """Recompute conversations from the messages, e.g. for messages stored
+    before conversations existed. Returns the number of messages threaded."""
+    company_filter = [] if company_id is None else [messages.c.company_id == company_id]
+    session.execute(conversations.delete().where(
+        *([] if company_id is None else [conversations.c.company_id == company_id])
+    ))
+    session.execute(messages.update().where(*company_filter).values(conversation_id=None))
+    now = datetime.utcnow()
+    connection = session.connection()
+    threaded, last_id = 0, 0
+    while True:
+        query = session.query(Message).filter(Message.id > last_id)
+        if company_id is not None:
+            query = query.filter(Message.company_id == company_id)
+        batch = query.order_by(Message.id).limit(batch_size).all()
+        if not batch:
+            break
+        for message in batch:
+            _attach(connection, message, now)
+        threaded += len(batch)
+        last_id = batch[-1].id
+    # Unread counts are recomputed from scratch rather than accumulated
+    unread = select(func.count(messages.c.id)).where(
+        messages.c.conversation_id == conversations.c.id,
+        messages.c.direction == 'inbound',
+        messages.c.read == False
+    ).scalar_subquery()
+    session.execute(conversations.update().where(
+        *([] if company_id is None else [conversations.c.company_id == company_id])
+    ).values(unread_count=unread))
+    return threaded
+
+def encode_cursor(conversation: Conversation) -> str:
+    raw = f'{conversation.last_message_at.isoformat()}|{conversation.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(last_message_at, id) of the last conversation on the previous page; ValueError if malformed"""
+    try:
+        at, conversation_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(at), int(conversation_id)
+    except (UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError('Invalid cursor') from e
+
+def inbox_page(session, company_id: int, limit: int, cursor: Optional[str] = None,
+               unread_only: bool = False) -> Tuple[List[Conversation], Optional[str]]:
+    """One page of a company's threads, most recent first, and the next page's cursor"""
+    query = session.query(Conversation).filter(
+        Conversation.company_id == company_id,
+        Conversation.last_message_at.isnot(None)
+    )
+    if unread_only:
+        query = query.filter(Conversation.unread_count > 0)
+    if cursor:
+        at, conversation_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Conversation.last_message_at < at,
+            and_(Conversation.last_message_at == at, Conversation.id < conversation_id)
+        ))
+    rows = query.order_by(Conversation.last_message_at.desc(), Conversation.id.desc()).limit(limit + 1).all()
+    page = rows[:limit]
+    return page, encode_cursor(page[-1]) if len(rows) > limit else None
+
+def thread_page(session, conversation_id: int, limit: int,
+                before: Optional[int] = None) -> Tuple[List[Message], Optional[int]]:
+    """One page of a thread's messages, newest first; pass the returned id as ``before`` for older ones"""
+    query = session.query(Message).filter(Message.conversation_id == conversation_id)
+    if before:
+        query = query.filter(Message.id < before)
+    rows = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    page = rows[:limit]
+    return page, page[-1].id if len(rows) > limit else None
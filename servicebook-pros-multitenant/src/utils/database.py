@@ -0,0 +1,181 @@
+# Generated copy: edit servicebook-pros-api/src/utils/database.py and run scripts/sync_shared_modules.py
+"""
+Database engine configuration for ServiceBook Pros
+Applies SQLite PRAGMA tuning, Postgres pool sizing and pool metrics
+"""
+
+import os
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import event
+
+# SQLite tuning, applied to every new DBAPI connection. WAL lets readers
+# run alongside a writer, busy_timeout makes writers wait for the lock
+# instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -20000)),  # negative = KiB
+    'temp_store': 'MEMORY',
+}
+
+def normalize_database_url(url: str) -> str:
+    """Railway/Heroku provide postgres:// but SQLAlchemy needs postgresql://"""
+    if url.startswith('postgres://'):
+        return url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+def engine_options(url: str) -> Dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for a database URL, tuned from the environment"""
+    if url.startswith('sqlite'):
+        # The sqlite3 driver has its own lock wait; keep it in step with busy_timeout
+        return {
+            'connect_args': {
+                'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+                'check_same_thread': False,
+            },
+        }
+
+    options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
+    statement_timeout = os.environ.get('DB_STATEMENT_TIMEOUT_MS', '30000')
+    if url.startswith('postgresql') and statement_timeout:
+        options['connect_args'] = {'options': f'-c statement_timeout={int(statement_timeout)}'}
+    return options
+
+def configure_database(app, default_url: str):
+    """Set the database URI and engine options on the app config.
+
+    DATABASE_URL overrides ``default_url``. Call before ``db.init_app(app)``.
+    """
+    url = normalize_database_url(os.environ.get('DATABASE_URL', default_url))
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(url),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+    }
+
+class PoolMetrics:
+    """Connection pool counters for one engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.wait_time_total += seconds
+            self.wait_time_max = max(self.wait_time_max, seconds)
+
+    def increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def reset(self):
+        with self._lock:
+            self.connects = self.checkouts = self.checkins = self.invalidations = 0
+            self.wait_time_total = self.wait_time_max = 0.0
+
+    def to_dict(self):
+        pool = self.engine.pool
+        stats = {
+            'database': self.engine.url.get_backend_name(),
+            'pool_class': type(pool).__name__,
+            'connects': self.connects,
+            'checkouts': self.checkouts,
+            'checkins': self.checkins,
+            'invalidations': self.invalidations,
+            'checked_out': self.checkouts - self.checkins,
+            'wait_time_total_ms': round(self.wait_time_total * 1000, 3),
+            'wait_time_avg_ms': round(self.wait_time_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+            'wait_time_max_ms': round(self.wait_time_max * 1000, 3),
+        }
+        for attribute in ('size', 'overflow', 'checkedin'):
+            method = getattr(pool, attribute, None)
+            if callable(method):
+                stats[f'pool_{attribute}'] = method()
+        return stats
+
+_pool_metrics: Dict[str, PoolMetrics] = {}
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma}={value}')
+    finally:
+        cursor.close()
+
+def instrument_engine(engine, name: str = 'default') -> PoolMetrics:
+    """Attach PRAGMA tuning (SQLite) and pool metrics listeners to an engine"""
+    if name in _pool_metrics:
+        return _pool_metrics[name]
+
+    metrics = PoolMetrics(engine)
+    _pool_metrics[name] = metrics
+
+    if engine.url.get_backend_name() == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+        event.listen(engine, 'connect', _apply_sqlite_pragmas)
+
+    event.listen(engine, 'connect', lambda *args: metrics.increment('connects'))
+    event.listen(engine, 'checkout', lambda *args: metrics.increment('checkouts'))
+    event.listen(engine, 'checkin', lambda *args: metrics.increment('checkins'))
+    event.listen(engine, 'invalidate', lambda *args: metrics.increment('invalidations'))
+    _time_pool_connect(engine.pool, metrics)
+    return metrics
+
+def _time_pool_connect(pool, metrics: PoolMetrics):
+    # The pool has no "checkout requested" event, so time the call itself to
+    # measure how long requests wait for a free connection.
+    pool_connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return pool_connect()
+        finally:
+            metrics.record_wait(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+
+def init_engines(app, db):
+    """Instrument every engine (default and binds) after ``db.init_app(app)``"""
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            instrument_engine(engine, bind_key or 'default')
+
+def reset_engines(app, db, close: bool = True):
+    """Give every engine a fresh, empty pool.
+
+    Call with ``close=True`` in a server's master before forking and with
+    ``close=False`` in each forked worker, so no two processes ever share a
+    database connection. The new pool keeps the listeners but starts its
+    metrics from zero.
+    """
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            engine.dispose(close=close)
+            metrics = _pool_metrics.get(bind_key or 'default')
+            if metrics is not None:
+                metrics.reset()
+                _time_pool_connect(engine.pool, metrics)
+
+def get_pool_metrics() -> Dict[str, Dict]:
+    """Current pool metrics for every instrumented engine"""
+    return {name: metrics.to_dict() for name, metrics in _pool_metrics.items()}
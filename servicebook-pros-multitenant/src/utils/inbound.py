@@ -0,0 +1,173 @@
+"""
+Inbound SMS routing for ServiceBook Pros
+Maps the number a text was sent to onto its company, and the sender's number
+onto a customer, with indexed equality lookups on E.164 numbers
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import inspect, select, update
+
+from src.models.communication_config import CommunicationConfig
+from src.models.message import Customer, InboundNumber
+from src.utils.communication import CommunicationService
+
+logger = logging.getLogger(__name__)
+
+class InboundRouter:
+    """Receiving number -> company id, cached in process.
+
+    The table is tiny and read on every webhook, so lookups are served from
+    memory and refreshed after ``ttl`` seconds; numbers added from another
+    process are picked up within that time.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._routes: Dict[str, int] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, session):
+        routes = dict(session.execute(select(InboundNumber.phone_e164, InboundNumber.company_id)).all())
+        with self._lock:
+            self._routes = routes
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def company_for(self, session, to_phone: Optional[str]) -> Optional[int]:
+        """Company owning ``to_phone``, else INBOUND_DEFAULT_COMPANY_ID if set"""
+        if time.monotonic() - self._loaded_at > self.ttl:
+            self._load(session)
+        company_id = self._routes.get(CommunicationService.normalize_phone(to_phone))
+        if company_id is None and os.environ.get('INBOUND_DEFAULT_COMPANY_ID'):
+            company_id = int(os.environ['INBOUND_DEFAULT_COMPANY_ID'])
+        return company_id
+
+router = InboundRouter(float(os.environ.get('INBOUND_ROUTE_CACHE_SECONDS', 60)))
+
+def find_customer(session, company_id: int, phone: Optional[str]) -> Optional[Customer]:
+    """The company's customer with this phone number (one unique-index probe)"""
+    phone_e164 = CommunicationService.normalize_phone(phone)
+    if not phone_e164:
+        return None
+    return session.query(Customer).filter(
+        Customer.company_id == company_id,
+        Customer.phone_e164 == phone_e164
+    ).first()
+
+class InboundNumberTaken(ValueError):
+    """The number already routes texts to another company"""
+
+def add_inbound_number(session, phone: str, company_id: int, replace: bool = True) -> InboundNumber:
+    """Route texts sent to ``phone`` to ``company_id``. A number another
+    company receives on moves over when ``replace``, else raises
+    InboundNumberTaken."""
+    phone_e164 = CommunicationService.normalize_phone(phone)
+    if not phone_e164:
+        raise ValueError(f'Not a phone number: {phone}')
+    number = session.query(InboundNumber).filter(InboundNumber.phone_e164 == phone_e164).first()
+    if number is None:
+        number = InboundNumber(phone_e164=phone_e164)
+        session.add(number)
+    elif number.company_id != company_id and not replace:
+        raise InboundNumberTaken(f'{phone_e164} already receives SMS for another company')
+    number.company_id = company_id
+    router.invalidate()
+    return number
+
+def set_company_number(session, company_id: int, previous: Optional[str], phone: Optional[str]):
+    """Follow a change of the company's configured Twilio number: route the
+    new number to it and stop routing the one it replaced"""
+    if phone:
+        add_inbound_number(session, phone, company_id, replace=False)
+    previous_e164 = CommunicationService.normalize_phone(previous)
+    if previous_e164 and previous_e164 != CommunicationService.normalize_phone(phone):
+        session.query(InboundNumber).filter(
+            InboundNumber.phone_e164 == previous_e164,
+            InboundNumber.company_id == company_id
+        ).delete(synchronize_session=False)
+        router.invalidate()
+
+def backfill_inbound_numbers(session) -> int:
+    """Route every configured Twilio number that has no route yet.
+
+    Numbers were only kept on CommunicationConfig before inbound_numbers
+    existed; a number set for two companies stays with the first and is
+    logged.
+    """
+    if not inspect(session.get_bind()).has_table(CommunicationConfig.__tablename__):
+        return 0
+    routed = dict(session.execute(select(InboundNumber.phone_e164, InboundNumber.company_id)).all())
+    added = 0
+    configs = session.execute(
+        select(CommunicationConfig.company_id, CommunicationConfig.twilio_phone_number)
+        .where(CommunicationConfig.twilio_phone_number.isnot(None))
+        .order_by(CommunicationConfig.id)
+    ).all()
+    for company_id, phone in configs:
+        phone_e164 = CommunicationService.normalize_phone(phone)
+        if not phone_e164:
+            continue
+        if phone_e164 in routed:
+            if routed[phone_e164] != company_id:
+                logger.warning('Twilio number %s of company %s already routes to company %s',
+                               phone_e164, company_id, routed[phone_e164])
+            continue
+        session.add(InboundNumber(phone_e164=phone_e164, company_id=company_id))
+        routed[phone_e164] = company_id
+        added += 1
+    session.commit()
+    router.invalidate()
+    return added
+
+def backfill_customer_phones(session, batch_size: int = 1000) -> Tuple[int, int]:
+    """Fill phone_e164 for customers stored before it existed.
+
+    Returns (filled, duplicates). A customer whose number another customer of
+    the same company already has keeps phone_e164 empty and is logged, as
+    the unique index allows one customer per number per company.
+    """
+    filled = duplicates = 0
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(Customer.id, Customer.company_id, Customer.phone)
+            .where(Customer.id > last_id, Customer.phone_e164.is_(None), Customer.phone.isnot(None))
+            .order_by(Customer.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        wanted = {}
+        for row in rows:
+            phone_e164 = CommunicationService.normalize_phone(row.phone)
+            if phone_e164:
+                wanted.setdefault((row.company_id, phone_e164), []).append(row.id)
+        taken = set(session.execute(
+            select(Customer.company_id, Customer.phone_e164).where(
+                Customer.phone_e164.in_({phone_e164 for _, phone_e164 in wanted})
+            )
+        ).all())
+        for (company_id, phone_e164), customer_ids in wanted.items():
+            if (company_id, phone_e164) in taken:
+                keep, rest = None, customer_ids
+            else:
+                keep, rest = customer_ids[0], customer_ids[1:]
+            if keep is not None:
+                session.execute(update(Customer).where(Customer.id == keep).values(phone_e164=phone_e164))
+                filled += 1
+            for customer_id in rest:
+                logger.warning('Customer %s shares phone %s with another customer of company %s',
+                               customer_id, phone_e164, company_id)
+            duplicates += len(rest)
+        session.commit()
+    return filled, duplicates
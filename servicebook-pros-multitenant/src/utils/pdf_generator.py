@@ -10,60 +10,65 @@ from reportlab.lib.units import inch
 from reportlab.pdfgen import canvas
 from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER
 from datetime import datetime
+from functools import lru_cache
 import io
 import os
 
+@lru_cache(maxsize=1)
+def invoice_styles():
+    """Stylesheet shared by every invoice; platypus only reads it"""
+    styles = getSampleStyleSheet()
+    
+    styles.add(ParagraphStyle(
+        name='InvoiceTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#2563eb'),
+        alignment=TA_CENTER,
+        spaceAfter=20
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='CompanyName',
+        parent=styles['Heading2'],
+        fontSize=18,
+        textColor=colors.HexColor('#1f2937'),
+        alignment=TA_LEFT,
+        spaceAfter=10
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='SectionHeader',
+        parent=styles['Heading3'],
+        fontSize=12,
+        textColor=colors.HexColor('#374151'),
+        alignment=TA_LEFT,
+        spaceAfter=8,
+        spaceBefore=15
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='InvoiceInfo',
+        parent=styles['Normal'],
+        fontSize=10,
+        textColor=colors.HexColor('#6b7280'),
+        alignment=TA_LEFT
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='TotalAmount',
+        parent=styles['Normal'],
+        fontSize=14,
+        textColor=colors.HexColor('#059669'),
+        alignment=TA_RIGHT,
+        fontName='Helvetica-Bold'
+    ))
+    
+    return styles
+
 class InvoicePDFGenerator:
     def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self.setup_custom_styles()
-    
-    def setup_custom_styles(self):
-        """Setup custom paragraph styles for the invoice"""
-        self.styles.add(ParagraphStyle(
-            name='InvoiceTitle',
-            parent=self.styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#2563eb'),
-            alignment=TA_CENTER,
-            spaceAfter=20
-        ))
-        
-        self.styles.add(ParagraphStyle(
-            name='CompanyName',
-            parent=self.styles['Heading2'],
-            fontSize=18,
-            textColor=colors.HexColor('#1f2937'),
-            alignment=TA_LEFT,
-            spaceAfter=10
-        ))
-        
-        self.styles.add(ParagraphStyle(
-            name='SectionHeader',
-            parent=self.styles['Heading3'],
-            fontSize=12,
-            textColor=colors.HexColor('#374151'),
-            alignment=TA_LEFT,
-            spaceAfter=8,
-            spaceBefore=15
-        ))
-        
-        self.styles.add(ParagraphStyle(
-            name='InvoiceInfo',
-            parent=self.styles['Normal'],
-            fontSize=10,
-            textColor=colors.HexColor('#6b7280'),
-            alignment=TA_LEFT
-        ))
-        
-        self.styles.add(ParagraphStyle(
-            name='TotalAmount',
-            parent=self.styles['Normal'],
-            fontSize=14,
-            textColor=colors.HexColor('#059669'),
-            alignment=TA_RIGHT,
-            fontName='Helvetica-Bold'
-        ))
+        self.styles = invoice_styles()
 
     def generate_invoice_pdf(self, invoice_data, company_data, customer_data, line_items):
         """
@@ -0,0 +1,221 @@
+"""
+Delivery status webhooks for ServiceBook Pros
+Stores each SendGrid or Twilio callback as one batch row and acknowledges it;
+batches are then applied with one indexed IN lookup and one bulk UPDATE
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, select, update
+
+from src.models.message import Message, WebhookBatch
+
+logger = logging.getLogger(__name__)
+
+# Statuses only move forward, so repeated and out-of-order events are no-ops.
+# 'delivered' and 'failed' are both final: whichever arrives first stands.
+STATUS_RANK = {'queued': 0, 'sending': 1, 'sent': 2, 'delivered': 3, 'failed': 3}
+
+SENDGRID_STATUSES = {'delivered': 'delivered', 'bounce': 'failed', 'dropped': 'failed'}
+TWILIO_STATUSES = {
+    'queued': 'queued', 'sending': 'sending', 'sent': 'sent', 'delivered': 'delivered',
+    'undelivered': 'failed', 'failed': 'failed',
+}
+
+PROVIDER_IDS = {
+    'sendgrid': Message.sendgrid_message_id,
+    'twilio': Message.twilio_sid,
+}
+
+LOOKUP_CHUNK = 500
+
+def sendgrid_events(payload) -> List[Dict]:
+    """Normalized events from a SendGrid Event Webhook batch"""
+    events = []
+    for item in payload or []:
+        message_id = item.get('sg_message_id')
+        if not message_id:
+            continue
+        events.append({
+            # sg_message_id is the X-Message-Id returned on send plus a suffix
+            'id': message_id.split('.', 1)[0],
+            'status': SENDGRID_STATUSES.get(item.get('event')),
+            'read': item.get('event') == 'open',
+            'at': item.get('timestamp') or 0,
+        })
+    return events
+
+def twilio_events(form) -> List[Dict]:
+    """Normalized event from a Twilio status callback"""
+    if not form.get('MessageSid'):
+        return []
+    status = form.get('MessageStatus')
+    return [{
+        'id': form.get('MessageSid'),
+        'status': TWILIO_STATUSES.get(status),
+        'read': status == 'read',
+        'at': 0,
+    }]
+
+def _advance(state: Dict, item: Dict) -> bool:
+    changed = False
+    status = item.get('status')
+    if status and STATUS_RANK.get(status, -1) > STATUS_RANK.get(state['status'], -1):
+        state['status'] = status
+        changed = True
+    if item.get('read') and not state['read']:
+        state['read'] = True
+        changed = True
+    return changed
+
+class WebhookIngestor:
+    """Accepts provider callbacks and applies them in the background.
+
+    ``ingest`` adds one WebhookBatch row to the request's session, so the
+    webhook responds after a single INSERT. ``apply_due`` applies pending
+    batches; events whose message is not stored yet (a callback that beat
+    the outbox's commit of the provider id) are retried a few times.
+    """
+
+    def __init__(self):
+        self.session_factory: Optional[Callable] = None
+        self.max_attempts = 5
+        self.retry_seconds = 30.0
+        self.batch_size = 20
+        self.inline_worker = False
+        self._wake = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._thread_lock = threading.Lock()
+
+    def configure(self, session_factory: Callable, max_attempts: int = 5, retry_seconds: float = 30.0,
+                  batch_size: int = 20, inline_worker: bool = False):
+        """``session_factory`` is a context manager yielding a session"""
+        self.session_factory = session_factory
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.batch_size = batch_size
+        self.inline_worker = inline_worker
+
+    def watch(self, session_target):
+        """Wake the in-process worker when a session that ingested commits"""
+        event.listen(session_target, 'after_commit', self._after_commit)
+
+    def _after_commit(self, session):
+        if session.info.pop('webhooks_ingested', False) and self.inline_worker:
+            self._ensure_inline_worker()
+            self._wake.set()
+
+    def ingest(self, session, provider: str, events: List[Dict]) -> Optional[WebhookBatch]:
+        """Store a batch of normalized events; applied once the caller commits"""
+        events = [item for item in events if item.get('status') or item.get('read')]
+        if not events:
+            return None
+        batch = WebhookBatch(
+            provider=provider,
+            events=json.dumps(events),
+            event_count=len(events),
+            attempts=0,
+            next_attempt_at=datetime.utcnow(),
+        )
+        session.add(batch)
+        session.info['webhooks_ingested'] = True
+        return batch
+
+    def apply_events(self, session, provider: str, events: Iterable[Dict]) -> List[Dict]:
+        """Apply events to their messages; returns the events with no message"""
+        column = PROVIDER_IDS[provider]
+        events = sorted(events, key=lambda item: item.get('at') or 0)
+        ids = list({item['id'] for item in events})
+        states = {}
+        for start in range(0, len(ids), LOOKUP_CHUNK):
+            rows = session.execute(
+                select(Message.id, column.label('provider_id'), Message.status, Message.read)
+                .where(column.in_(ids[start:start + LOOKUP_CHUNK]))
+            ).all()
+            for row in rows:
+                states[row.provider_id] = {'id': row.id, 'status': row.status, 'read': bool(row.read)}
+        changed, unmatched = {}, []
+        for item in events:
+            state = states.get(item['id'])
+            if state is None:
+                unmatched.append(item)
+            elif _advance(state, item):
+                changed[state['id']] = state
+        if changed:
+            now = datetime.utcnow()
+            # Bulk UPDATE by primary key; session flush events do not fire
+            session.execute(update(Message), [
+                {'id': state['id'], 'status': state['status'], 'read': state['read'], 'updated_at': now}
+                for state in changed.values()
+            ])
+        return unmatched
+
+    def apply_due(self, session) -> Dict[str, int]:
+        """Apply the pending batches that are due; returns event counts"""
+        now = datetime.utcnow()
+        batches = session.query(WebhookBatch).filter(
+            WebhookBatch.processed_at.is_(None),
+            WebhookBatch.next_attempt_at <= now
+        ).order_by(WebhookBatch.id).limit(self.batch_size).all()
+        counts = {'applied': 0, 'retrying': 0, 'dropped': 0}
+        for batch in batches:
+            events = json.loads(batch.events)
+            unmatched = self.apply_events(session, batch.provider, events)
+            counts['applied'] += len(events) - len(unmatched)
+            batch.attempts += 1
+            if unmatched and batch.attempts < self.max_attempts:
+                batch.events = json.dumps(unmatched)
+                batch.event_count = len(unmatched)
+                batch.next_attempt_at = now + timedelta(seconds=self.retry_seconds * batch.attempts)
+                counts['retrying'] += len(unmatched)
+            else:
+                if unmatched:
+                    logger.warning('Dropped %d %s events for unknown messages', len(unmatched), batch.provider)
+                    counts['dropped'] += len(unmatched)
+                batch.processed_at = now
+            session.commit()
+        return {name: count for name, count in counts.items() if count}
+
+    def drain(self) -> Dict[str, int]:
+        with self.session_factory() as session:
+            return self.apply_due(session)
+
+    def run(self, stop: Optional[threading.Event] = None, poll_interval: float = 5.0):
+        """Apply batches until ``stop`` is set, waiting ``poll_interval`` when idle"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                counts = self.drain()
+            except Exception:
+                logger.exception('Applying webhook batches failed')
+                counts = {}
+            if not counts.get('applied'):
+                self._wake.wait(poll_interval)
+                self._wake.clear()
+
+    def _ensure_inline_worker(self):
+        # Started lazily in the process that received the webhook, so it
+        # also exists in forked server workers
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, name='webhook-worker', daemon=True)
+            self._thread.start()
+
+def webhook_settings() -> Dict:
+    """WebhookIngestor.configure keyword arguments from WEBHOOK_* environment variables"""
+    return {
+        'max_attempts': int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 5)),
+        'retry_seconds': float(os.environ.get('WEBHOOK_RETRY_SECONDS', 30)),
+        'batch_size': int(os.environ.get('WEBHOOK_BATCH_SIZE', 20)),
+        'inline_worker': os.environ.get('WEBHOOK_INLINE_WORKER', 'true').lower() == 'true',
+    }
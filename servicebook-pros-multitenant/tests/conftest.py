@@ -0,0 +1,106 @@
+"""
+Test fixtures for ServiceBook Pros Multi-Tenant
+The app is imported once per session from a temporary directory, so the app
+database and the messaging database (servicebook_pros.db, relative to the
+working directory) are both fresh. Each test gets its own company id, and
+messaging rows are written through their own SessionLocal session.
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_workdir = tempfile.mkdtemp(prefix='sbp-multitenant-test-')
+os.chdir(_workdir)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'app.db')}"
+os.environ['AUTO_INIT_DB'] = 'false'
+os.environ['OUTBOX_INLINE_WORKER'] = 'false'
+os.environ['WEBHOOK_INLINE_WORKER'] = 'false'
+os.environ.pop('INBOUND_DEFAULT_COMPANY_ID', None)
+os.environ.pop('REDIS_URL', None)
+
+_numbers = itertools.count(1)
+
+@pytest.fixture(scope='session')
+def app():
+    from src.main import app
+    from src.models.user import db
+    from src.routes.communication import init_message_tables
+
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+    init_message_tables()
+    return app
+
+@pytest.fixture
+def app_context(app):
+    from src.models.user import db
+
+    with app.app_context():
+        yield
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def _new_company_id():
+    # Messaging rows only store the company id, so no company row is needed
+    return 1000 + next(_numbers)
+
+@pytest.fixture
+def company_id():
+    """A company id no other test uses"""
+    return _new_company_id()
+
+@pytest.fixture
+def other_company_id():
+    return _new_company_id()
+
+@pytest.fixture
+def make_company(app):
+    """Create a company in the app database; returns its id"""
+    from src.models.user import db
+    from src.models.company import Company
+
+    def make():
+        number = next(_numbers)
+        with app.app_context():
+            company = Company(company_name=f'Test Company {number}', company_code=f'TEST{number}',
+                              contact_email=f'office{number}@example.com')
+            db.session.add(company)
+            db.session.commit()
+            return company.id
+    return make
+
+@pytest.fixture
+def session(app):
+    from src.routes.communication import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def make_customer(session, company_id):
+    """Create a messaging customer of the company; returns its id"""
+    from src.models.message import Customer
+
+    def make(**fields):
+        number = next(_numbers)
+        customer = Customer(**{
+            'company_id': company_id,
+            'name': f'Customer {number}',
+            'phone': f'(555) 010-{number:04d}',
+            **fields,
+        })
+        session.add(customer)
+        session.commit()
+        return customer.id
+    return make
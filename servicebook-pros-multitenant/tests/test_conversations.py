@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+from src.models.message import Conversation, Message
+from src.utils import conversations as conversation_threads
+
+def _add(session, company_id, content, direction='inbound', **fields):
+    message = Message(company_id=company_id, message_type='sms', direction=direction, content=content, **fields)
+    session.add(message)
+    session.commit()
+    return message
+
+def _conversation(session, conversation_id):
+    session.expire_all()
+    return session.get(Conversation, conversation_id)
+
+def test_messages_are_threaded_with_counts(session, company_id, make_customer):
+    customer_id = make_customer()
+    first = _add(session, company_id, 'Is Tuesday ok?', customer_id=customer_id)
+    reply = _add(session, company_id, 'Tuesday works', direction='outbound', customer_id=customer_id)
+    _add(session, company_id, 'Hello', customer_phone='(555) 777-0000')
+
+    assert reply.conversation_id == first.conversation_id
+    conversation = _conversation(session, first.conversation_id)
+    assert conversation.participant_key == f'customer:{customer_id}'
+    assert (conversation.message_count, conversation.unread_count) == (2, 1)
+    assert (conversation.last_message_preview, conversation.last_direction) == ('Tuesday works', 'outbound')
+    assert session.query(Conversation).filter_by(company_id=company_id).count() == 2
+
+def test_an_older_message_does_not_replace_the_preview(session, company_id):
+    phone = '555-777-0001'
+    latest = _add(session, company_id, 'Latest', customer_phone=phone)
+    _add(session, company_id, 'Imported', customer_phone=phone, created_at=datetime.utcnow() - timedelta(days=1))
+
+    conversation = _conversation(session, latest.conversation_id)
+    assert conversation.message_count == 2
+    assert conversation.last_message_preview == 'Latest'
+
+def test_reading_updates_the_unread_count(session, company_id):
+    messages = [_add(session, company_id, f'Message {number}', customer_email='Pat@Example.com ')
+                for number in range(3)]
+    conversation_id = messages[0].conversation_id
+    assert _conversation(session, conversation_id).unread_count == 3
+
+    messages[0].read = True
+    session.commit()
+    assert _conversation(session, conversation_id).unread_count == 2
+    messages[0].read = False
+    session.commit()
+    assert _conversation(session, conversation_id).unread_count == 3
+
+    assert conversation_threads.mark_conversation_read(session, _conversation(session, conversation_id)) == 3
+    session.commit()
+    assert _conversation(session, conversation_id).unread_count == 0
+
+class _CreatedConcurrently:
+    """Connection whose first lookup misses, as if another transaction
+    inserted the conversation right after it"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.dialect = connection.dialect
+        self.missed = False
+
+    def execute(self, statement, *args, **kwargs):
+        result = self.connection.execute(statement, *args, **kwargs)
+        if not self.missed:
+            self.missed = True
+            result.scalar()
+            return _Missing()
+        return result
+
+class _Missing:
+    def scalar(self):
+        return None
+
+def test_a_thread_created_concurrently_is_reused(session, company_id):
+    existing = _add(session, company_id, 'First', customer_phone='555-777-0002')
+    message = Message(company_id=company_id, message_type='sms', direction='inbound',
+                      content='Second', customer_phone='+15557770002')
+
+    connection = _CreatedConcurrently(session.connection())
+    conversation_id = conversation_threads._conversation_id(connection, message, datetime.utcnow())
+    assert connection.missed
+    assert conversation_id == existing.conversation_id
+    assert session.query(Conversation).filter_by(company_id=company_id).count() == 1
+    session.rollback()
+
+def test_rebuild_matches_the_incremental_summaries(session, company_id, make_customer):
+    customer_id = make_customer()
+    for number in range(3):
+        message = _add(session, company_id, f'Update {number}', customer_id=customer_id)
+    message.read = True
+    _add(session, company_id, 'Other thread', customer_phone='555-777-0003')
+    session.commit()
+
+    def summaries():
+        session.expire_all()
+        return sorted(
+            (conversation.participant_key, conversation.message_count, conversation.unread_count,
+             conversation.last_message_preview)
+            for conversation in session.query(Conversation).filter_by(company_id=company_id)
+        )
+
+    incremental = summaries()
+    assert conversation_threads.rebuild_conversations(session, company_id) == 4
+    session.commit()
+    assert summaries() == incremental
+    assert incremental[0][1:] == (3, 2, 'Update 2')
+
+def test_inbox_pages_most_recent_first(client, session, company_id, other_company_id):
+    now = datetime.utcnow()
+    for number in range(3):
+        _add(session, company_id, f'Thread {number}', customer_phone=f'555-778-000{number}',
+             created_at=now + timedelta(minutes=number), read=number == 1)
+    _add(session, other_company_id, 'Another company', customer_phone='555-778-0000')
+
+    first = client.get(f'/api/conversations?company_id={company_id}&limit=2').get_json()
+    assert [item['last_message']['content'] for item in first['conversations']] == ['Thread 2', 'Thread 1']
+    second = client.get(f"/api/conversations?company_id={company_id}&limit=2&cursor={first['next_cursor']}").get_json()
+    assert [item['last_message']['content'] for item in second['conversations']] == ['Thread 0']
+    assert second['next_cursor'] is None
+
+    unread = client.get(f'/api/conversations?company_id={company_id}&unread_only=true').get_json()
+    assert [item['last_message']['content'] for item in unread['conversations']] == ['Thread 2', 'Thread 0']
+    assert client.get(f'/api/conversations?company_id={company_id}&cursor=bad').status_code == 400
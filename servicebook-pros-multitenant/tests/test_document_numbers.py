@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from src.models.user import db
+from src.models.sequence import DocumentSequence
+from src.routes.invoice import generate_invoice_number, generate_invoice_numbers
+
+def test_each_company_numbers_from_one(app_context, make_company):
+    year = datetime.now().year
+    tenants = [make_company(), make_company()]
+    numbers = {company_id: [generate_invoice_number(company_id) for _ in range(2)] for company_id in tenants}
+    db.session.commit()
+
+    for company_id in tenants:
+        assert numbers[company_id] == [f'INV-{year}-000001', f'INV-{year}-000002']
+    assert generate_invoice_numbers(tenants[0], 2) == [f'INV-{year}-000003', f'INV-{year}-000004']
+    db.session.rollback()
+
+def test_seed_runs_only_when_the_counter_is_created(app_context, make_company):
+    company_id = make_company()
+    seeds = []
+
+    def seed():
+        seeds.append(1)
+        return 41
+
+    assert DocumentSequence.allocate(company_id, 'invoice-import', seed=seed) == 42
+    assert DocumentSequence.allocate_block(company_id, 'invoice-import', 3, seed=seed) == range(43, 46)
+    assert seeds == [1]
+    db.session.rollback()
+
+def test_concurrent_allocations_never_share_a_number(app, make_company):
+    company_id = make_company()
+
+    def allocate(_):
+        with app.app_context():
+            try:
+                number = DocumentSequence.allocate(company_id, 'invoice-concurrent')
+                db.session.commit()
+                return number
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        numbers = list(pool.map(allocate, range(40)))
+    assert sorted(numbers) == list(range(1, 41))
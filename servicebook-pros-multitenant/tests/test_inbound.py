@@ -0,0 +1,109 @@
+import logging
+
+import pytest
+from flask import Flask
+
+from src.models.communication_config import CommunicationConfig
+from src.models.message import Customer, InboundNumber, Message, OutboxMessage
+from src.routes.communication import communication_bp
+from src.utils import inbound
+
+def _text(client, to_phone, from_phone, body, sid):
+    return client.post('/api/webhooks/twilio', data={
+        'MessageSid': sid, 'From': from_phone, 'To': to_phone, 'Body': body,
+    })
+
+def _route(session, phone, company_id):
+    inbound.add_inbound_number(session, phone, company_id)
+    session.commit()
+
+def test_text_is_stored_for_the_company_and_customer(client, session, company_id, other_company_id, make_customer):
+    _route(session, '+1 (555) 200-0001', company_id)
+    _route(session, '555-200-0002', other_company_id)
+    customer_id = make_customer(phone='(555) 300-0001')
+
+    assert _text(client, '+15552000001', '+15553000001', 'Running late?', 'SMroute1').status_code == 200
+    assert _text(client, '+15552000002', '+15553000001', 'Wrong shop', 'SMroute2').status_code == 200
+
+    message = session.query(Message).filter_by(twilio_sid='SMroute1').one()
+    assert (message.company_id, message.customer_id, message.direction) == (company_id, customer_id, 'inbound')
+    # Same sender, but not a customer of the other company
+    message = session.query(Message).filter_by(twilio_sid='SMroute2').one()
+    assert (message.company_id, message.customer_id) == (other_company_id, None)
+
+def test_stop_opts_the_customer_out(client, session, company_id, make_customer):
+    _route(session, '+15552000003', company_id)
+    customer_id = make_customer(phone='555-300-0003')
+
+    _text(client, '+15552000003', '+15553000003', ' stop ', 'SMstop1')
+    session.expire_all()
+    assert session.get(Customer, customer_id).opt_out_sms
+    reply = session.query(Message).filter_by(company_id=company_id, direction='outbound').one()
+    assert reply.content.startswith('You have been unsubscribed')
+    assert session.query(OutboxMessage).filter_by(source_id=reply.id).one().recipient == '+15553000003'
+
+    _text(client, '+15552000003', '+15553000003', 'START', 'SMstart1')
+    session.expire_all()
+    assert not session.get(Customer, customer_id).opt_out_sms
+
+def test_text_to_an_unrouted_number_is_acknowledged_and_logged(client, session, caplog):
+    with caplog.at_level(logging.WARNING, logger='src.routes.communication'):
+        assert _text(client, '+15552009999', '+15553000004', 'Hello', 'SMlost1').status_code == 200
+        assert _text(client, '+15552009999', '+15553000004', 'STOP', 'SMlost2').status_code == 200
+
+    assert session.query(Message).filter(Message.twilio_sid.in_(['SMlost1', 'SMlost2'])).count() == 0
+    assert [record.levelname for record in caplog.records] == ['WARNING', 'ERROR']
+    assert 'Opt-out from +15553000004' in caplog.records[1].getMessage()
+
+def test_default_company_receives_unrouted_texts(client, session, company_id, monkeypatch):
+    monkeypatch.setenv('INBOUND_DEFAULT_COMPANY_ID', str(company_id))
+    _text(client, '+15552009998', '+15553000005', 'Hello', 'SMdefault1')
+    assert session.query(Message).filter_by(twilio_sid='SMdefault1').one().company_id == company_id
+
+def test_changing_the_company_number_moves_its_route(session, company_id, other_company_id):
+    inbound.set_company_number(session, company_id, None, '555-200-0006')
+    session.commit()
+    with pytest.raises(inbound.InboundNumberTaken):
+        inbound.set_company_number(session, other_company_id, None, '+15552000006')
+    session.rollback()
+    with pytest.raises(ValueError):
+        inbound.set_company_number(session, company_id, None, 'none')
+    session.rollback()
+
+    inbound.set_company_number(session, company_id, '555-200-0006', '555-200-0007')
+    session.commit()
+    routes = dict(session.query(InboundNumber.phone_e164, InboundNumber.company_id)
+                  .filter(InboundNumber.phone_e164.in_(['+15552000006', '+15552000007'])))
+    assert routes == {'+15552000007': company_id}
+    assert inbound.router.company_for(session, '(555) 200-0007') == company_id
+    assert inbound.router.company_for(session, '555-200-0006') is None
+
+def test_backfill_routes_configured_numbers(session, company_id, other_company_id, caplog):
+    CommunicationConfig.__table__.create(session.get_bind(), checkfirst=True)
+    session.add_all([
+        CommunicationConfig(company_id=company_id, twilio_phone_number='(555) 200-0008'),
+        CommunicationConfig(company_id=other_company_id, twilio_phone_number='+15552000008'),
+    ])
+    session.commit()
+
+    with caplog.at_level(logging.WARNING, logger='src.utils.inbound'):
+        assert inbound.backfill_inbound_numbers(session) == 1
+    assert inbound.router.company_for(session, '+15552000008') == company_id
+    assert f'already routes to company {company_id}' in caplog.text
+    assert inbound.backfill_inbound_numbers(session) == 0
+
+def test_customer_phone_is_unique_per_company(app, company_id, other_company_id):
+    # The app serves /api/customers from the invoice blueprint, registered
+    # first, so the messaging route is exercised on its own
+    messaging = Flask(__name__)
+    messaging.register_blueprint(communication_bp)
+    client = messaging.test_client()
+
+    def create(company_id, phone):
+        return client.post('/api/customers', json={'company_id': company_id, 'name': 'Pat', 'phone': phone})
+
+    assert create(company_id, '(555) 300-0009').status_code == 200
+    response = create(company_id, '+1 555 300 0009')
+    assert response.status_code == 409
+    assert response.get_json()['error'] == 'A customer with this phone number already exists'
+    assert create(other_company_id, '555-300-0009').status_code == 200
@@ -0,0 +1,92 @@
+import pytest
+
+from src.models.message import Message, WebhookBatch
+from src.routes.communication import webhooks
+
+@pytest.fixture
+def make_message(session, company_id):
+    """Store an outbound message with provider ids; returns its id"""
+    def make(**fields):
+        message = Message(**{
+            'company_id': company_id,
+            'customer_phone': '+15554000000',
+            'message_type': 'sms',
+            'direction': 'outbound',
+            'content': 'Your technician is on the way',
+            'status': 'sent',
+            **fields,
+        })
+        session.add(message)
+        session.commit()
+        return message.id
+    return make
+
+@pytest.fixture
+def message_state(session):
+    def state(message_id):
+        session.expire_all()
+        message = session.get(Message, message_id)
+        return message.status, message.read
+    return state
+
+def _twilio(client, sid, status):
+    response = client.post('/api/webhooks/twilio/status', data={'MessageSid': sid, 'MessageStatus': status})
+    assert response.status_code == 200
+
+def test_out_of_order_and_repeated_callbacks_do_not_move_status_back(client, make_message, message_state):
+    message_id = make_message(twilio_sid='SMorder1', status='queued')
+
+    _twilio(client, 'SMorder1', 'delivered')
+    _twilio(client, 'SMorder1', 'sent')
+    webhooks.drain()
+    assert message_state(message_id) == ('delivered', False)
+
+    # Retried and late callbacks, including a failure after delivery
+    for status in ('delivered', 'sending', 'undelivered'):
+        _twilio(client, 'SMorder1', status)
+    webhooks.drain()
+    assert message_state(message_id) == ('delivered', False)
+
+def test_sendgrid_batch_is_applied_in_timestamp_order(client, make_message, message_state):
+    message_id = make_message(message_type='email', sendgrid_message_id='sgorder2', status='queued')
+
+    response = client.post('/api/webhooks/sendgrid', json=[
+        {'sg_message_id': 'sgorder2.filter0001', 'event': 'open', 'timestamp': 30},
+        {'sg_message_id': 'sgorder2.filter0001', 'event': 'bounce', 'timestamp': 20},
+        {'sg_message_id': 'sgorder2.filter0001', 'event': 'delivered', 'timestamp': 10},
+        {'sg_message_id': 'sgorder2.filter0001', 'event': 'processed', 'timestamp': 5},
+    ])
+    assert response.status_code == 200
+    webhooks.drain()
+    assert message_state(message_id) == ('delivered', True)
+    assert client.post('/api/webhooks/sendgrid', json={'event': 'open'}).status_code == 400
+
+def test_callbacks_without_a_change_are_not_stored(client, session):
+    before = session.query(WebhookBatch).count()
+    _twilio(client, 'SMignored3', 'accepted')
+    client.post('/api/webhooks/sendgrid', json=[{'sg_message_id': 'sgignored3', 'event': 'processed'}])
+    assert session.query(WebhookBatch).count() == before
+
+def test_callback_before_the_message_is_stored_is_retried(client, session, make_message, message_state,
+                                                          monkeypatch):
+    monkeypatch.setattr(webhooks, 'retry_seconds', 0)
+    webhooks.drain()
+
+    _twilio(client, 'SMearly4', 'delivered')
+    assert webhooks.drain() == {'retrying': 1}
+    message_id = make_message(twilio_sid='SMearly4')
+    assert webhooks.drain() == {'applied': 1}
+    assert message_state(message_id) == ('delivered', False)
+    assert session.query(WebhookBatch).filter(WebhookBatch.processed_at.is_(None)).count() == 0
+
+def test_unmatched_callback_is_dropped_after_the_last_attempt(client, session, monkeypatch):
+    monkeypatch.setattr(webhooks, 'retry_seconds', 0)
+    monkeypatch.setattr(webhooks, 'max_attempts', 2)
+    webhooks.drain()
+
+    _twilio(client, 'SMunknown5', 'delivered')
+    assert webhooks.drain() == {'retrying': 1}
+    assert webhooks.drain() == {'dropped': 1}
+    assert webhooks.drain() == {}
+    batch = session.query(WebhookBatch).order_by(WebhookBatch.id.desc()).first()
+    assert batch.attempts == 2 and batch.processed_at is not None
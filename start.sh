@@ -5,7 +5,6 @@ set -e
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 cd "$SCRIPT_DIR/servicebook-pros-backend"
 
-PORT="${PORT:-8080}"
-GUNICORN_WORKERS="${GUNICORN_WORKERS:-2}"
-
-exec gunicorn -w "$GUNICORN_WORKERS" -k gthread -b 0.0.0.0:"$PORT" src.main:app
+# Bind address, worker count (GUNICORN_WORKERS) and the pre-fork warm-up
+# come from servicebook-pros-backend/gunicorn.conf.py
+exec gunicorn -c gunicorn.conf.py src.main:app